@@ -2,6 +2,13 @@
 
 from .backend_bridge import BackendBridge
 from .database_manager import DatabaseManager
-from .model_handler import ModelHandler
 
-__all__ = ['BackendBridge', 'DatabaseManager', 'ModelHandler']
\ No newline at end of file
+__all__ = ['BackendBridge', 'DatabaseManager', 'ModelHandler']
+
+
+def __getattr__(name):
+    # ModelHandler imports TensorFlow, which is only loaded when it is first needed
+    if name == "ModelHandler":
+        from .model_handler import ModelHandler
+        return ModelHandler
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
\ No newline at end of file
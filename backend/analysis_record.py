@@ -0,0 +1,31 @@
+"""The database form of an analysis result.
+
+Analyses saved from the GUI, from the offline queue and by the batch CLI all
+go through ``analysis_record``, so each of them stores the same metadata.
+"""
+
+import json
+from typing import Any, Dict
+
+
+def analysis_record(patient_id: int, image_path: str, result: Dict[str, Any],
+                    metadata: Dict[str, str]) -> Dict[str, Any]:
+    """The ``DatabaseManager.add_analysis`` data of an analysis result."""
+    analysis_data = {
+        "patient_id": patient_id,
+        "image_path": image_path,
+        "melanoma_probability": result["melanoma_probability"],
+        "predictions": json.dumps(result["predictions"]),
+        "diagnosis_text": result["diagnosis"],
+        "metadata": {
+            # "detail_text": result["detail_text"],
+            # "benign_probability": str(1.0 - result["melanoma_probability"])
+            "engine": result.get("engine", "remote"),
+        }
+    }
+    analysis_data["metadata"].update(metadata)
+    if result.get("reused_from"):
+        analysis_data["metadata"]["reused_from"] = str(result["reused_from"])
+    if result.get("mole_detection_probability") is not None:
+        analysis_data["metadata"]["mole_detection_probability"] = str(result["mole_detection_probability"])
+    return analysis_data
@@ -0,0 +1,85 @@
+"""The current analysis result as a QML object.
+
+QML binds to the typed properties of ``backend.currentResult`` once; the
+``changed`` signal re-evaluates those bindings only when a new result
+arrives, is saved or is cleared, instead of every binding calling into Python
+and converting the whole result dict again.
+"""
+
+from typing import Any, Dict
+
+from PySide6.QtCore import QObject, Property, Signal
+
+
+class AnalysisResult(QObject):
+    changed = Signal()
+
+    def __init__(self, parent=None):
+        super().__init__(parent)
+        self._data: Dict[str, Any] = {}
+
+    def update(self, result: Dict[str, Any]):
+        """Replace the result with a new analysis outcome."""
+        self._data = dict(result)
+        self.changed.emit()
+
+    def clear(self):
+        if self._data:
+            self._data = {}
+            self.changed.emit()
+
+    def mark_saved(self):
+        if self._data and not self._data.get("saved"):
+            self._data["saved"] = True
+            self.changed.emit()
+
+    def to_dict(self) -> Dict[str, Any]:
+        return dict(self._data)
+
+    @Property(bool, notify=changed)
+    def available(self) -> bool:
+        return bool(self._data)
+
+    @Property(bool, notify=changed)
+    def isMole(self) -> bool:
+        return bool(self._data.get("is_mole", False))
+
+    @Property(float, notify=changed)
+    def moleDetectionProbability(self) -> float:
+        # None when the local model answered, it has no mole detector
+        return float(self._data.get("mole_detection_probability") or 0.0)
+
+    @Property(float, notify=changed)
+    def melanomaProbability(self) -> float:
+        """Probability of melanoma in [0, 1]."""
+        return float(self._data.get("melanoma_probability", 0.0))
+
+    @Property("QVariantMap", notify=changed)
+    def predictions(self) -> Dict[str, float]:
+        return dict(self._data.get("predictions") or {})
+
+    @Property(str, notify=changed)
+    def diagnosis(self) -> str:
+        return self._data.get("diagnosis", "")
+
+    @Property(str, notify=changed)
+    def detailText(self) -> str:
+        return self._data.get("detail_text", "")
+
+    @Property(str, notify=changed)
+    def imagePath(self) -> str:
+        return self._data.get("image_path", "")
+
+    @Property(str, notify=changed)
+    def engine(self) -> str:
+        """Which model produced the result: "remote" or "local"."""
+        return self._data.get("engine", "")
+
+    @Property(bool, notify=changed)
+    def saved(self) -> bool:
+        return bool(self._data.get("saved", False))
+
+    @Property(int, notify=changed)
+    def reusedFrom(self) -> int:
+        """ID of the earlier analysis of a re-captured image whose result is shown, or 0."""
+        return int(self._data.get("reused_from") or 0)
@@ -0,0 +1,207 @@
+"""Clinic-wide analytics over saved analyses.
+
+Counting and averaging happen in SQL (see ``DatabaseManager.get_clinic_analytics``),
+so only one row per period, age band or gender leaves the server. The only
+per-analysis data fetched are the class probabilities of the ``predictions``
+JSON, which SQL extracts once the class names are known. ``ClassMatrix``
+keeps them as a NumPy matrix and afterwards only fetches analyses added
+since, as analyses are never changed once saved.
+
+Results are kept in an ``AnalyticsCache``. An entry is valid as long as
+no analysis was added. This is checked with ``MAX(id)`` of ``mole_analyses``,
+which also catches analyses saved through other connections.
+"""
+
+import threading
+from collections import OrderedDict
+from datetime import date, datetime
+from typing import Any, Dict, Hashable, List, Optional, Sequence, Tuple, Union
+
+import numpy as np
+
+# Same boundaries as ModelHandler.get_prediction_text
+MEDIUM_RISK = 0.4
+HIGH_RISK = 0.7
+RISK_LEVELS = ("low", "medium", "high")
+
+# Lower bounds of the age bands after the first one, in years at the time of the analysis
+AGE_BANDS = (18, 30, 45, 60, 75)
+
+# DATE_FORMAT patterns; weeks are ISO weeks
+PERIOD_FORMATS = {
+    "day": "%Y-%m-%d",
+    "week": "%x-W%v",
+    "month": "%Y-%m",
+    "year": "%Y",
+}
+
+TimeBound = Union[date, datetime, str, None]
+
+
+def age_band_labels(bands: Sequence[int] = AGE_BANDS) -> List[str]:
+    """Labels for the results of ``INTERVAL(age, *bands)``: "<18", "18-29", ..., "75+"."""
+    labels = [f"<{bands[0]}"]
+    labels += [f"{low}-{high - 1}" for low, high in zip(bands, bands[1:])]
+    labels.append(f"{bands[-1]}+")
+    return labels
+
+
+def risk_sums_sql(column: str = "a.melanoma_probability") -> str:
+    """SELECT expressions counting the analyses of each risk level."""
+    return (f"SUM({column} <= {MEDIUM_RISK}) AS low, "
+            f"SUM({column} > {MEDIUM_RISK} AND {column} <= {HIGH_RISK}) AS medium, "
+            f"SUM({column} > {HIGH_RISK}) AS high")
+
+
+def risk_rows(rows: List[Dict[str, Any]], key: str,
+              labels: Optional[Sequence[str]] = None) -> List[Dict[str, Any]]:
+    """Turn grouped SQL rows into counts and shares per risk level.
+
+    ``labels`` maps integer group keys (e.g. age band numbers) to names.
+    """
+    if not rows:
+        return []
+    # MySQL returns SUM() as Decimal; one conversion for the whole matrix
+    counts = np.array([[row[level] or 0 for level in RISK_LEVELS] for row in rows], dtype=np.int64)
+    totals = counts.sum(axis=1)
+    shares = counts / np.maximum(totals, 1)[:, np.newaxis]
+    result = []
+    for row, count, share, total in zip(rows, counts.tolist(), shares.round(4).tolist(), totals.tolist()):
+        group = row[key]
+        entry = {key: labels[int(group)] if labels is not None else group, "analyses": total}
+        entry.update(zip(RISK_LEVELS, count))
+        entry.update((f"{level}_share", s) for level, s in zip(RISK_LEVELS, share))
+        entry["mean_probability"] = round(float(row["mean_probability"] or 0.0), 4)
+        result.append(entry)
+    return result
+
+
+def _to_datetime64(value: TimeBound) -> Optional[np.datetime64]:
+    if value is None:
+        return None
+    return np.datetime64(value.isoformat() if isinstance(value, (date, datetime)) else value, "s")
+
+
+class ClassMatrix:
+    """Class probabilities of every analysis as an (analyses x classes) matrix.
+
+    Rows are appended in analysis id order. A class seen for the first time
+    adds a column, which is NaN for earlier analyses.
+    """
+
+    def __init__(self):
+        self.classes: List[str] = []
+        self.last_id = 0
+        self.analyzed_at = np.empty(0, dtype="datetime64[s]")
+        self.probabilities = np.empty((0, 0), dtype=np.float32)
+        self._lock = threading.Lock()
+
+    def __len__(self) -> int:
+        return len(self.analyzed_at)
+
+    def append(self, classes: Sequence[str], rows: Sequence[Sequence[Any]]):
+        """Append ``(id, seconds since the epoch, probability of each of classes...)`` rows.
+
+        Missing probabilities are None. Rows must have ids above ``last_id``.
+        """
+        if not len(rows):
+            return
+        block = np.array(rows, dtype=np.float64).reshape(len(rows), len(classes) + 2)
+        with self._lock:
+            for name in classes:
+                if name not in self.classes:
+                    self.classes.append(name)
+            columns = [self.classes.index(name) for name in classes]
+            values = np.full((len(block), len(self.classes)), np.nan, dtype=np.float32)
+            values[:, columns] = block[:, 2:]
+            old = self.probabilities
+            if old.shape[1] < len(self.classes):
+                old = np.pad(old, ((0, 0), (0, len(self.classes) - old.shape[1])), constant_values=np.nan)
+            self.probabilities = np.vstack([old, values])
+            self.analyzed_at = np.concatenate([self.analyzed_at, block[:, 1].astype("datetime64[s]")])
+            self.last_id = max(self.last_id, int(block[:, 0].max()))
+
+    def summary(self, since: TimeBound = None, until: TimeBound = None) -> List[Dict[str, Any]]:
+        """Per class: mean probability, share of analyses where it is the top class, count above 0.5."""
+        with self._lock:
+            mask = np.ones(len(self.analyzed_at), dtype=bool)
+            if since is not None:
+                mask &= self.analyzed_at >= _to_datetime64(since)
+            if until is not None:
+                mask &= self.analyzed_at < _to_datetime64(until)
+            matrix = self.probabilities[mask]
+            classes = list(self.classes)
+        if not len(matrix) or not classes:
+            return []
+        present = ~np.isnan(matrix)
+        predicted = present.any(axis=1)  # analyses saved without predictions are left out
+        filled = np.where(present, matrix, -np.inf)
+        top = np.bincount(filled.argmax(axis=1)[predicted], minlength=len(classes))
+        seen = present.sum(axis=0)
+        means = np.where(seen > 0, np.nansum(matrix, axis=0) / np.maximum(seen, 1), np.nan)
+        above = (np.nan_to_num(matrix, nan=0.0) > 0.5).sum(axis=0)
+        order = np.argsort(-np.nan_to_num(means, nan=-1.0))
+        return [
+            {
+                "class": classes[i],
+                "analyses": int(seen[i]),
+                "mean_probability": round(float(means[i]), 4),
+                "top_share": round(float(top[i] / max(predicted.sum(), 1)), 4),
+                "above_half": int(above[i]),
+            }
+            for i in order if seen[i]
+        ]
+
+
+class AnalyticsCache:
+    """Analytics results keyed by query, valid while the analyses table is unchanged."""
+
+    def __init__(self, max_entries: int = 32):
+        self.max_entries = max_entries
+        self._entries: "OrderedDict[Hashable, Tuple[Any, Any]]" = OrderedDict()
+        self._generation = 0
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    @property
+    def generation(self) -> int:
+        """Changes on every invalidation; results computed before it must not be stored."""
+        return self._generation
+
+    def get(self, key: Hashable, stamp: Any) -> Optional[Any]:
+        """The cached result for ``key`` if it was computed at data version ``stamp``."""
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None or entry[0] != stamp:
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return entry[1]
+
+    def put(self, key: Hashable, stamp: Any, value: Any, generation: int):
+        with self._lock:
+            if generation != self._generation:
+                return
+            self._entries[key] = (stamp, value)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def resize(self, max_entries: int):
+        """Change the capacity, dropping the least recently used entries beyond it."""
+        with self._lock:
+            self.max_entries = max_entries
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def invalidate(self, *args):
+        """Drop every entry (analyses were added or patients changed)."""
+        with self._lock:
+            self._entries.clear()
+            self._generation += 1
+
+    def stats(self) -> Dict[str, int]:
+        with self._lock:
+            return {"entries": len(self._entries), "hits": self.hits, "misses": self.misses}
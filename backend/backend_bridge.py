@@ -1,11 +1,52 @@
 import os
-from datetime import datetime
-from typing import Dict, List, Optional, Any
-from PySide6.QtCore import QObject, Slot, Signal, Property
-import json 
+import logging
+import threading
+import time
+from typing import Dict, List, NamedTuple, Optional, Any
+from PySide6.QtCore import QObject, QTimer, Slot, Signal, Property
+
+from .config import CONFIG, Config, get_config
+from .database_manager import DatabaseManager, parse_metadata
+from .analysis_record import analysis_record
+from .analysis_result import AnalysisResult
+from .endpoint_pool import RoutedCall
+from .prediction_client import PredictionCancelled, PredictionUnavailable
+from .image_store import ImageStore, resolve_uploads_dir
+from .thumbnails import ThumbnailCache
+from .image_session import ImageSession
+from .metrics import REGISTRY, MetricsExporter
+from .near_duplicates import NearDuplicateIndex, perceptual_hashes
+from .offline_queue import QUEUE_DEPTH, OfflineDrain, OfflineQueue, QueuedAnalysis, SaveFailed, is_retryable
+from .patient_list_model import PatientListModel
+from .search_cache import SearchCache
+from .search_service import SearchService
+from .similarity_index import SimilarityIndex
+from .storage_maintenance import StorageMaintenance
+from .tracing import Tracer
+
+logger = logging.getLogger(__name__)
+
+ANALYSES = REGISTRY.counter("skinsight_analyses_total", "Analyses by outcome", ["outcome"])
+ANALYSIS_SECONDS = REGISTRY.histogram("skinsight_analysis_seconds",
+                                      "Time from starting an analysis to its result")
+ANALYSIS_JOBS = REGISTRY.gauge("skinsight_analysis_jobs", "Analyses running in the background")
+IMAGES_SAVED = REGISTRY.counter("skinsight_images_saved_total", "Images saved for analysis", ["deduplicated"])
+IMAGE_BYTES = REGISTRY.counter("skinsight_image_bytes_written_total", "Bytes of new image files written")
+RESULTS_SAVED = REGISTRY.counter("skinsight_results_saved_total", "Analysis results saved to the database")
+CACHE_LOOKUPS = REGISTRY.counter("skinsight_cache_lookups_total", "Cache lookups", ["cache", "result"])
+CACHE_ENTRIES = REGISTRY.gauge("skinsight_cache_entries", "Entries held by a cache", ["cache"])
+INDEXED_LESIONS = REGISTRY.gauge("skinsight_indexed_lesions", "Analyses held by a lesion index", ["index"])
+
+
+class _AnalysisJob(NamedTuple):
+    call: RoutedCall
+    session: Optional[ImageSession]
+    started: float
+    # What the offline queue needs if the prediction API cannot be reached
+    image_path: str
+    patient_id: Optional[int]
+    metadata: Dict[str, str]
 
-from .database_manager import DatabaseManager
-from .model_handler import ModelHandler
 
 class BackendBridge(QObject):
     # Signals for QML communication
@@ -15,22 +56,186 @@ class BackendBridge(QObject):
     patientUpdated = Signal(int)  # Emits patient ID
     analysisStarted = Signal()
     analysisProgress = Signal(float)  # Progress percentage
+    analysisCancelled = Signal(int)  # Emits job ID
+    analysisFailed = Signal(int, str)  # Job ID, error message; errorOccurred is emitted as well
+    analysisQueued = Signal(int, int)  # Offline queue ID, job ID (0 if not queued from a job)
+    queuedAnalysisFinished = Signal(int, int, int)  # Queue ID, patient ID, saved analysis ID (0 if none)
+    offlineQueueChanged = Signal()
+    # Job ID, model result, cancelled, error message, retryable; delivered to the GUI thread
+    _analysisFinished = Signal(int, dict, bool, str, bool)
+    # Queue entry, outcome, error message; delivered to the GUI thread
+    _queuedAnalysisDone = Signal(object, dict, str)
     userChanged = Signal()
+    currentPatientIdChanged = Signal()
+    currentImagePathChanged = Signal()
+    storageMaintenanceFinished = Signal(dict)  # Emits the maintenance report
+    patientSearchResults = Signal(str, int, list)  # Search box key, sequence number, results
+    databaseReadyChanged = Signal()
+    modelReadyChanged = Signal()
+    initializingChanged = Signal()
+    # Subsystem name, instance (None on failure), error message; delivered to the GUI thread
+    _subsystemLoaded = Signal(str, object, str)
+    # Reloaded config, changed sections; delivered to the GUI thread
+    _configReloaded = Signal(object, list)
+
+    def __init__(self, parent=None, deferred_init: bool = False, upload_dir: Optional[str] = None):
+        """Create the bridge.
 
-    def __init__(self, parent=None):
+        With ``deferred_init`` the database and the model are not loaded here;
+        call ``initialize()`` once the window is shown to load them in the background.
+        Uploads, with the caches and the offline queue kept beside them, go to
+        ``upload_dir`` or else to ``application.uploads_dir``.
+        """
         super().__init__(parent)
-        self.upload_dir = os.path.join(os.path.dirname(os.path.dirname(__file__)), "uploads")
+        config = get_config()
+        self.upload_dir = upload_dir or str(resolve_uploads_dir(config.application.uploads_dir))
         os.makedirs(self.upload_dir, exist_ok=True)
-        
-        try:
-            self.db = DatabaseManager()
-            self._current_patient_id = None
-            self._current_image_path = None
-            self._user_name = "Доктор"
-            self._clinic_name = "SkinSight"
-            self.model = ModelHandler()
-        except Exception as e:
-            self.errorOccurred.emit(str(e))
+        self.image_store = ImageStore(self.upload_dir)
+        self.thumbnails = ThumbnailCache(os.path.join(self.upload_dir, ".thumbnails"))
+        self.similarity_index = SimilarityIndex(os.path.join(self.upload_dir, ".similarity"))
+        self.near_duplicates = NearDuplicateIndex(dict(config.recapture))
+        self._current_hashes: Dict[str, str] = {}
+        # Analyses that failed while the prediction API was unreachable; drained once the model is loaded
+        self.offline_queue = OfflineQueue(os.path.join(self.upload_dir, ".offline", "queue.sqlite3"))
+        self.offline_drain = OfflineDrain(self.offline_queue, self._process_queued_analysis,
+                                          self._queuedAnalysisDone.emit, dict(config.offline_queue))
+        self._offline_db = None
+        self._queuedAnalysisDone.connect(self._on_queued_analysis_done)
+        self.tracer = Tracer(os.path.join(os.path.dirname(os.path.dirname(__file__)), "logs", "trace.log"))
+        self._trace_id = None
+        self._image_session = None
+        self._current_patient_id = None
+        self._current_image_path = None
+        self._current_result = AnalysisResult(self)
+        self._user_name = config.application.default_user
+        self._clinic_name = config.application.default_clinic
+        self._search_models: Dict[str, PatientListModel] = {}
+        self._search_seq = 0
+        self._analysis_jobs: Dict[int, _AnalysisJob] = {}
+        self._analysis_job_seq = 0
+        self._analysisFinished.connect(self._on_analysis_finished)
+        # Searches run on their own connection so a slow query never blocks typing
+        search_cache = SearchCache(config.caches.patient_search_entries, config.caches.patient_search_rows)
+        self.search_service = SearchService(DatabaseManager, cache=search_cache, parent=self)
+        # Connected before any model refresh so that refreshed searches miss the cache
+        self.patientAdded.connect(self.search_service.invalidate_cache)
+        self.patientUpdated.connect(self.search_service.invalidate_cache)
+        self.search_service.resultsReady.connect(self._on_search_results)
+        self.search_service.searchFailed.connect(
+            lambda key, seq, message: self.errorOccurred.emit(f"Error searching patients: {message}")
+        )
+
+        self.db = None
+        self.model = None
+        self._initializing = False
+        self._subsystemLoaded.connect(self._on_subsystem_loaded)
+        if not deferred_init:
+            self._load_subsystems(self._on_subsystem_loaded)
+
+        # Orphan cleanup uses its own connection because it runs on a worker thread
+        storage_settings = dict(config.storage)
+        self.storage_maintenance = StorageMaintenance(
+            self.image_store, DatabaseManager, self.thumbnails,
+            protected_paths=lambda: [self._current_image_path] + self.offline_queue.image_paths(),
+            settings=storage_settings
+        )
+        self._maintenance_timer = QTimer(self)
+        self._maintenance_timer.setInterval(int(storage_settings["interval_hours"] * 3600 * 1000))
+        self._maintenance_timer.timeout.connect(self.start_storage_maintenance)
+        self._maintenance_timer.start()
+
+        REGISTRY.add_collector("backend", self._collect_metrics)
+        self.metrics_exporter = MetricsExporter(REGISTRY, dict(config.metrics))
+        self.metrics_exporter.start()
+
+        # Edits of config.json apply without a restart
+        self._configReloaded.connect(self._apply_config)
+        unsubscribe = CONFIG.subscribe(self._configReloaded.emit)
+        self.destroyed.connect(lambda *args: unsubscribe())
+        CONFIG.watch()
+
+    def _load_subsystems(self, deliver):
+        """Create the database connection and then the model handler, reporting each one."""
+        def create_model_handler():
+            # Imported here, off the GUI thread; TensorFlow itself only loads with the local model
+            from .model_handler import ModelHandler
+            return ModelHandler(tracer=self.tracer)
+
+        for name, factory in (("database", DatabaseManager), ("model", create_model_handler)):
+            try:
+                deliver(name, factory(), "")
+            except Exception as e:
+                deliver(name, None, str(e))
+
+    @Slot()
+    def initialize(self):
+        """Load the database and the model in the background.
+
+        Progress is reported through databaseReady, modelReady and initializing;
+        failures are reported through errorOccurred.
+        """
+        if self._initializing or (self.db is not None and self.model is not None):
+            return
+        self._initializing = True
+        self.initializingChanged.emit()
+        threading.Thread(
+            target=self._load_subsystems, args=(self._subsystemLoaded.emit,),
+            name="backend-init", daemon=True
+        ).start()
+
+    def _on_subsystem_loaded(self, name: str, instance: Any, error: str):
+        if error:
+            logger.error("Could not initialize %s: %s", name, error)
+            self.errorOccurred.emit(error)
+        elif name == "database":
+            self.db = instance
+            self.databaseReadyChanged.emit()
+            # Picks up analyses saved while the application was not running
+            self.similarity_index.start_sync(DatabaseManager)
+        else:
+            self.model = instance
+            self.modelReadyChanged.emit()
+            self.offline_drain.start()
+
+        # The model is loaded last
+        if name == "model" and self._initializing:
+            self._initializing = False
+            self.initializingChanged.emit()
+
+    def _apply_config(self, config: Config, changed: List[str]):
+        """Reconfigure the components whose config sections changed."""
+        if "storage" in changed:
+            self.storage_maintenance.settings.update(config.storage)
+            self._maintenance_timer.setInterval(int(config.storage.interval_hours * 3600 * 1000))
+        if "recapture" in changed:
+            self.near_duplicates.settings.update(config.recapture)
+        if "metrics" in changed:
+            self.metrics_exporter.reconfigure(dict(config.metrics))
+        if "offline_queue" in changed:
+            self.offline_drain.settings.update(config.offline_queue)
+            self.offline_drain.wake()
+        if "caches" in changed:
+            self.search_service.cache.resize(config.caches.patient_search_entries,
+                                             config.caches.patient_search_rows)
+            if self.db is not None:
+                self.db.analytics_cache.resize(config.caches.analytics_entries)
+        if "database" in changed and self.db is not None:
+            self.db.reconfigure(config.database)
+        if self.model is not None:
+            self.model.reconfigure(config, changed)
+
+    @Property(bool, notify=databaseReadyChanged)
+    def databaseReady(self) -> bool:
+        return self.db is not None
+
+    @Property(bool, notify=modelReadyChanged)
+    def modelReady(self) -> bool:
+        return self.model is not None
+
+    @Property(bool, notify=initializingChanged)
+    def initializing(self) -> bool:
+        """True while the database and the model are being loaded in the background."""
+        return self._initializing
 
     @Slot(dict, result=int)
     def add_patient(self, patient_data: Dict[str, Any]) -> int:
@@ -43,20 +248,60 @@ class BackendBridge(QObject):
             self.errorOccurred.emit(f"Error adding patient: {e}")
             return -1
 
+    @property
+    def image_session(self) -> Optional[ImageSession]:
+        """The image currently loaded for analysis, if any."""
+        return self._image_session
+
+    @Slot(str, result=str)
+    def load_image(self, image_path: str) -> str:
+        """Open an image once for preview, saving and analysis; returns the preview URL."""
+        try:
+            self.release_image_session()
+            self._image_session = ImageSession.open(image_path)
+            return f"image://session/{self._image_session.id}"
+        except Exception as e:
+            self.errorOccurred.emit(f"Error loading image: {e}")
+            return ""
+
+    @Slot()
+    def release_image_session(self):
+        """Free the memory held by the loaded image once the analysis is finished."""
+        if self._image_session is not None:
+            self._image_session.release()
+
     @Slot(str, result=str)
     def save_image(self, image_path: str) -> str:
         """Save uploaded image to the uploads directory."""
         try:
-            timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
-            ext = os.path.splitext(image_path)[1]
-            filename = f"mole_{timestamp}{ext}"
-            save_path = os.path.join(self.upload_dir, filename)
+            # A new image starts a new analysis trace
+            self._trace_id = self.tracer.new_trace_id()
             image_path = image_path.replace("file://", "")
-            # Copy the file
-            with open(image_path, "rb") as src, open(save_path, "wb") as dst:
-                dst.write(src.read())
+            session = self._image_session
+            if session is not None and (session.released or session.source_path != image_path):
+                session = None
+            # Stored under its content hash; re-saving the same image reuses the file
+            with self.tracer.span("save_image", self._trace_id) as span:
+                if session is not None:
+                    stored = self.image_store.save_bytes(session.raw, session.ext)
+                    session.stored_path = stored.path
+                else:
+                    stored = self.image_store.save(image_path)
+                span.add_bytes(0 if stored.deduplicated else stored.size)
+                span.set(deduplicated=stored.deduplicated)
+            IMAGES_SAVED.inc(deduplicated=str(stored.deduplicated).lower())
+            if not stored.deduplicated:
+                IMAGE_BYTES.inc(stored.size)
+            save_path = stored.path
+            # History views will only ever need the small previews
+            self.thumbnails.prefetch(save_path, session.image if session is not None else None)
+            try:
+                self._current_hashes = perceptual_hashes(session.image if session is not None else save_path)
+            except Exception as e:
+                logger.warning("Could not hash %s: %s", save_path, e)
+                self._current_hashes = {}
             
-            self._current_image_path = save_path
+            self.currentImagePath = save_path
             return save_path
         except Exception as e:
             self.errorOccurred.emit(f"Error saving image: {e}")
@@ -68,40 +313,139 @@ class BackendBridge(QObject):
         if not self._current_image_path:
             self.errorOccurred.emit("No image loaded for analysis")
             return {}
+        if self.model is None:
+            self.errorOccurred.emit("The model is not ready yet")
+            return {}
 
         try:
             self.analysisStarted.emit()
 
-            model_result = self.model.predict(self._current_image_path)
-            print(model_result)
-            result = {}
-
-            if(not model_result["is_mole"]):
-                result = {
-                    "image_path": self._current_image_path,
-                    "is_mole": model_result["is_mole"],
-                    "mole_detection_probability": model_result["mole_detection_probability"]
-                }
-            else:
-                diagnosis, detail_text = self.model.get_prediction_text(model_result["predictions"]["Melanoma"])
-                result = {
-                    "melanoma_probability": model_result["predictions"]["Melanoma"],
-                    "predictions": model_result["predictions"],
-                    "diagnosis": "Melanoma", #diagnosis,
-                    "detail_text": detail_text,
-                    "image_path": self._current_image_path,
-                    "is_mole": model_result["is_mole"],
-                    "mole_detection_probability": model_result["mole_detection_probability"]
-                }
-            print("Resultat: ", result)
-                            
-            self._current_result = result
+            if not self._trace_id:
+                self._trace_id = self.tracer.new_trace_id()
+            started = time.perf_counter()
+            with self.tracer.span("analysis", self._trace_id):
+                model_result = self.model.predict(self._current_image_path, trace_id=self._trace_id,
+                                                  session=self._image_session)
+            result = self._build_result(model_result, self._current_image_path)
+            ANALYSES.inc(outcome="completed")
+            ANALYSIS_SECONDS.observe(time.perf_counter() - started)
+            self._current_result.update(result)
             self.analysisComplete.emit(result)
             return result
         except Exception as e:
-            print(f"Error during analysis: {e}")
+            if is_retryable(e) and self._queue_analysis(self._current_patient_id, self._current_image_path,
+                                                        self._current_hashes, str(e)):
+                return {}
+            logger.error("Error during analysis: %s", e)
+            ANALYSES.inc(outcome="failed")
             self.errorOccurred.emit(f"Error during analysis: {e}")
             return {}
+        finally:
+            self.release_image_session()
+
+    @Slot(result=int)
+    def start_analysis(self) -> int:
+        """Analyze the currently loaded image without blocking the UI.
+
+        Returns a job ID for cancel_analysis (0 if no image is loaded). The
+        outcome arrives via analysisComplete, analysisCancelled or errorOccurred.
+        """
+        if not self._current_image_path:
+            self.errorOccurred.emit("No image loaded for analysis")
+            return 0
+        if self.model is None:
+            self.errorOccurred.emit("The model is not ready yet")
+            return 0
+        # Only one analysis runs at a time
+        for job_id in list(self._analysis_jobs):
+            self.cancel_analysis(job_id)
+
+        self._analysis_job_seq += 1
+        job_id = self._analysis_job_seq
+        session = self._image_session
+        # The job's own share: loading another image releases only the bridge's session
+        if session is not None:
+            session = None if session.released else session.share()
+        job = _AnalysisJob(self.model.create_call(), session, time.perf_counter(),
+                           self._current_image_path, self._current_patient_id, dict(self._current_hashes))
+        self._analysis_jobs[job_id] = job
+        if not self._trace_id:
+            self._trace_id = self.tracer.new_trace_id()
+        self.analysisStarted.emit()
+        threading.Thread(
+            target=self._run_analysis,
+            args=(job_id, job, self._current_image_path, self._trace_id),
+            name=f"analysis-{job_id}", daemon=True
+        ).start()
+        return job_id
+
+    @Slot(int, result=bool)
+    def cancel_analysis(self, job_id: int) -> bool:
+        """Abort a running analysis, including a transfer in progress."""
+        job = self._analysis_jobs.get(job_id)
+        if job is None:
+            return False
+        job.call.cancel()
+        return True
+
+    def _run_analysis(self, job_id: int, job: _AnalysisJob, image_path: str, trace_id: str):
+        try:
+            with self.tracer.span("analysis", trace_id):
+                model_result = self.model.predict(image_path, trace_id=trace_id,
+                                                  session=job.session, call=job.call)
+            self._analysisFinished.emit(job_id, model_result, False, "", False)
+        except PredictionCancelled:
+            self._analysisFinished.emit(job_id, {}, True, "", False)
+        except Exception as e:
+            self._analysisFinished.emit(job_id, {}, False, str(e), is_retryable(e))
+
+    def _on_analysis_finished(self, job_id: int, model_result: dict, cancelled: bool, error: str,
+                              retryable: bool):
+        job = self._analysis_jobs.pop(job_id, None)
+        if job is None:
+            return
+        if job.session is not None:
+            job.session.release()
+            if self._image_session is not None and self._image_session.id == job.session.id:
+                self.release_image_session()
+
+        if not cancelled and job.image_path != self._current_image_path:
+            # Finished just before the image was replaced; its result belongs to no image on screen
+            logger.info("Analysis %d of a replaced image dropped", job_id)
+            cancelled = True
+        if cancelled:
+            logger.info("Analysis %d cancelled", job_id)
+            ANALYSES.inc(outcome="cancelled")
+            self.analysisCancelled.emit(job_id)
+            return
+        if error:
+            if retryable and self._queue_analysis(job.patient_id, job.image_path, job.metadata, error, job_id):
+                return
+            logger.error("Error during analysis: %s", error)
+            self._analysis_failed(job_id, f"Error during analysis: {error}")
+            return
+        try:
+            result = self._build_result(model_result, job.image_path)
+        except Exception as e:
+            logger.error("Unexpected model result: %s", e)
+            self._analysis_failed(job_id, f"Error during analysis: {e}")
+            return
+        ANALYSES.inc(outcome="completed")
+        ANALYSIS_SECONDS.observe(time.perf_counter() - job.started)
+        self._current_result.update(result)
+        self.analysisComplete.emit(result)
+
+    def _analysis_failed(self, job_id: int, message: str):
+        ANALYSES.inc(outcome="failed")
+        self.analysisFailed.emit(job_id, message)
+        self.errorOccurred.emit(message)
+
+    def _build_result(self, model_result: Dict[str, Any], image_path: str) -> Dict[str, Any]:
+        """Turn the prediction API response for ``image_path`` into the analysis result shown and saved."""
+        logger.debug("Model result: %s", model_result)
+        result = self.model.to_analysis_result(model_result, image_path)
+        logger.debug("Analysis result: %s", result)
+        return result
 
     @Slot(str, result=list)
     def search_patients(self, search_term: str) -> List[Dict[str, Any]]:
@@ -112,6 +456,29 @@ class BackendBridge(QObject):
             self.errorOccurred.emit(f"Error searching patients: {e}")
             return []
 
+    @Slot(str, str, result=int)
+    def search_patients_async(self, key: str, search_term: str) -> int:
+        """Queue a search for one search box; results arrive via patientSearchResults."""
+        self._search_seq += 1
+        self.search_service.submit(f"slot:{key}", self._search_seq, search_term, 20)
+        return self._search_seq
+
+    def _on_search_results(self, key: str, seq: int, offset: int, rows: list, has_more: bool):
+        if key.startswith("slot:"):
+            self.patientSearchResults.emit(key[len("slot:"):], seq, rows)
+
+    @Slot(str, result=QObject)
+    def patient_search_model(self, key: str) -> PatientListModel:
+        """Get the paged search result model used by one search box."""
+        model = self._search_models.get(key)
+        if model is None:
+            model = PatientListModel(self.search_service, f"model:{key}", parent=self)
+            # Keep visible results current when patients change
+            self.patientAdded.connect(lambda _: model.refresh())
+            self.patientUpdated.connect(lambda _: model.refresh())
+            self._search_models[key] = model
+        return model
+
     @Slot(int, result=dict)
     def get_patient_details(self, patient_id: int) -> Dict[str, Any]:
         """Get detailed patient information including analysis history."""
@@ -124,6 +491,15 @@ class BackendBridge(QObject):
             self.errorOccurred.emit(f"Error fetching patient details: {e}")
             return {}
 
+    @Slot(str, result=dict)
+    def get_clinic_analytics(self, period: str) -> Dict[str, Any]:
+        """Risk distribution of all analyses by period, age band and gender, for dashboards."""
+        try:
+            return self.db.get_clinic_analytics(period or "month")
+        except Exception as e:
+            self.errorOccurred.emit(f"Error computing clinic analytics: {e}")
+            return {}
+
     @Slot(int, dict, result=bool)
     def update_patient(self, patient_id: int, patient_data: Dict[str, Any]) -> bool:
         """Update an existing patient's information."""
@@ -144,8 +520,8 @@ class BackendBridge(QObject):
                 return {}
             
             # Check if we have a cached result
-            if hasattr(self, '_current_result'):
-                return self._current_result
+            if self._current_result.available:
+                return self._current_result.to_dict()
             
             current_result = {
                 "image_path": self._current_image_path,
@@ -160,42 +536,222 @@ class BackendBridge(QObject):
             self.errorOccurred.emit(f"Error retrieving analysis result: {e}")
             return {}
 
+    @Slot(result=bool)
+    def start_storage_maintenance(self) -> bool:
+        """Start orphan cleanup and recompression of uploads in the background."""
+        return self.storage_maintenance.start(self.storageMaintenanceFinished.emit)
+
+    @Slot(result=dict)
+    def get_trace_summary(self) -> Dict[str, Any]:
+        """Get p50/p95 latency and byte totals per analysis stage."""
+        return self.tracer.summary()
+
+    @Slot(result=list)
+    def get_diagnostics(self) -> List[Dict[str, Any]]:
+        """Current value of every runtime metric, for the diagnostics panel."""
+        return REGISTRY.snapshot()
+
+    def _collect_metrics(self):
+        ANALYSIS_JOBS.set(len(self._analysis_jobs))
+        QUEUE_DEPTH.set(len(self.offline_queue))
+        caches = {"patient_search": self.search_service.cache}
+        if self.db is not None:
+            caches["analytics"] = self.db.analytics_cache
+        for name, cache in caches.items():
+            if cache is None:
+                continue
+            stats = cache.stats()
+            CACHE_LOOKUPS.set_total(stats["hits"], cache=name, result="hit")
+            CACHE_LOOKUPS.set_total(stats["misses"], cache=name, result="miss")
+            CACHE_ENTRIES.set(stats["entries"], cache=name)
+        INDEXED_LESIONS.set(len(self.similarity_index), index="similarity")
+        INDEXED_LESIONS.set(len(self.near_duplicates), index="recapture")
+
     @Slot(result=bool)
     def save_analysis_result(self) -> bool:
         """Save the current analysis result to the database."""
         try:
-            print("save_analysis_result")
-            if not hasattr(self, '_current_result') or not self._current_result:
+            if not self._current_result.available:
                 self.errorOccurred.emit("No analysis result to save")
                 return False
-            print("_current_patient_id")
             if not self._current_patient_id:
                 self.errorOccurred.emit("No patient selected")
                 return False
+            result = self._current_result.to_dict()
 
-            print(self._current_patient_id,  self._current_result)
-            predi_str = json.dumps(self._current_result["predictions"])
-            print(predi_str)
-            analysis_data = {
-                "patient_id": self._current_patient_id,
-                "image_path": self._current_image_path,
-                "melanoma_probability": self._current_result["melanoma_probability"],
-                "predictions": predi_str,
-                "diagnosis_text": self._current_result["diagnosis"],
-                # "metadata": {
-                #     "detail_text": self._current_result["detail_text"],
-                #     "benign_probability": str(1.0 - self._current_result["melanoma_probability"])
-                # }
-            }
-            print(analysis_data)
+            analysis_data = analysis_record(self._current_patient_id, self._current_image_path,
+                                            result, self._current_hashes)
+            logger.debug("Saving analysis: %s", analysis_data)
 
-            analysis_id = self.db.add_analysis(analysis_data)
-            self._current_result["saved"] = True
+            with self.tracer.span("add_analysis", self._trace_id) as span:
+                analysis_id = self.db.add_analysis(analysis_data)
+                span.add_bytes(len(analysis_data["predictions"]))
+                span.set(analysis_id=analysis_id, patient_id=self._current_patient_id)
+            if analysis_id > 0:
+                RESULTS_SAVED.inc()
+                self._current_result.mark_saved()
+                self.similarity_index.add_async(analysis_id, self._current_patient_id, self._current_image_path)
+                self.near_duplicates.add(analysis_id, self._current_patient_id, time.time(), self._current_hashes)
             return analysis_id > 0
         except Exception as e:
             self.errorOccurred.emit(f"Error saving analysis result: {e}")
             return False
 
+    def _queue_analysis(self, patient_id: Optional[int], image_path: Optional[str],
+                        metadata: Dict[str, str], error: str, job_id: int = 0) -> int:
+        """Put an analysis that could not reach the prediction API into the offline queue.
+
+        Returns the queue ID, or 0 if it was not queued (the queue is
+        disabled or no patient is selected); the caller then reports the error.
+        ``job_id`` is the start_analysis() job the analysis came from, if any.
+        """
+        if not self.offline_drain.settings["enabled"] or not patient_id or not image_path:
+            return 0
+        metadata = dict(metadata, captured_at=time.strftime("%Y-%m-%dT%H:%M:%S"))
+        try:
+            queue_id = self.offline_queue.put(patient_id, image_path, metadata)
+        except Exception as e:
+            logger.error("Could not queue the analysis: %s", e)
+            return 0
+        logger.warning("Prediction API unavailable, analysis queued as %d: %s", queue_id, error)
+        ANALYSES.inc(outcome="queued")
+        self.offline_drain.wake()
+        self.offlineQueueChanged.emit()
+        self.analysisQueued.emit(queue_id, job_id)
+        return queue_id
+
+    @Slot(result=int)
+    def queue_current_image(self) -> int:
+        """Queue the current image for analysis in the background without waiting for it.
+
+        Returns the queue ID (0 on failure); the saved result is announced
+        through queuedAnalysisFinished.
+        """
+        if not self._current_image_path or not self._current_patient_id:
+            self.errorOccurred.emit("Select a patient and an image to queue an analysis")
+            return 0
+        queue_id = self._queue_analysis(self._current_patient_id, self._current_image_path,
+                                        self._current_hashes, "queued by the user")
+        if not queue_id:
+            self.errorOccurred.emit("Could not queue the analysis")
+        self.release_image_session()
+        return queue_id
+
+    @Property(int, notify=offlineQueueChanged)
+    def offlineQueueSize(self) -> int:
+        """Analyses waiting in the offline queue."""
+        return len(self.offline_queue)
+
+    def _process_queued_analysis(self, entry: QueuedAnalysis) -> Dict[str, Any]:
+        """Analyze and save a queued analysis; runs on the offline queue's thread."""
+        result = entry.result
+        if result is None:
+            if self.model is None:
+                raise PredictionUnavailable("The model is not ready yet")
+            trace_id = self.tracer.new_trace_id()
+            with self.tracer.span("queued_analysis", trace_id):
+                model_result = self.model.predict(entry.image_path, trace_id=trace_id)
+            result = self.model.to_analysis_result(model_result, entry.image_path)
+        if not result.get("is_mole"):
+            return {"analysis_id": 0, "is_mole": False}
+        try:
+            # The GUI thread's connection must not be used from here
+            if self._offline_db is None:
+                self._offline_db = DatabaseManager()
+            analysis_id = self._offline_db.add_analysis(
+                analysis_record(entry.patient_id, entry.image_path, result, entry.metadata)
+            )
+        except Exception as e:
+            raise SaveFailed(f"Error saving analysis result: {e}", result) from e
+        return {"analysis_id": analysis_id, "is_mole": True}
+
+    def _on_queued_analysis_done(self, entry: QueuedAnalysis, outcome: dict, error: str):
+        self.offlineQueueChanged.emit()
+        if error:
+            self.errorOccurred.emit(
+                f"Queued analysis of {os.path.basename(entry.image_path)} failed: {error}"
+            )
+            self.queuedAnalysisFinished.emit(entry.id, entry.patient_id, 0)
+            return
+        analysis_id = outcome.get("analysis_id") or 0
+        if analysis_id:
+            RESULTS_SAVED.inc()
+            # Saved on another connection, so this one's analytics do not know about it yet
+            if self.db is not None:
+                self.db.analytics_cache.invalidate()
+            self.similarity_index.add_async(analysis_id, entry.patient_id, entry.image_path)
+            self.near_duplicates.add(analysis_id, entry.patient_id, time.time(), entry.metadata)
+        else:
+            logger.info("Queued analysis %d: the image does not show a mole, nothing saved", entry.id)
+        self.queuedAnalysisFinished.emit(entry.id, entry.patient_id, analysis_id)
+
+    @Slot(result=dict)
+    def find_recapture(self) -> Dict[str, Any]:
+        """A recent analysis of the current patient whose photo looks like the current image, or {}."""
+        try:
+            if not self._current_hashes or not self._current_patient_id or self.db is None:
+                return {}
+            if not self.near_duplicates.loaded:
+                self.near_duplicates.load(self.db)
+            match = self.near_duplicates.find(self._current_patient_id, self._current_hashes)
+            if match is None:
+                return {}
+            analysis = self.db.get_analysis(match["analysis_id"])
+            if not analysis:
+                return {}
+            return dict(match, melanoma_probability=analysis["melanoma_probability"],
+                        diagnosis_text=analysis["diagnosis_text"], image_path=analysis["image_path"])
+        except Exception as e:
+            logger.warning("Could not look for a re-captured image: %s", e)
+            return {}
+
+    @Slot(int, result=bool)
+    def reuse_analysis(self, analysis_id: int) -> bool:
+        """Show the result of an earlier analysis for the current image instead of running the model."""
+        try:
+            analysis = self.db.get_analysis(analysis_id)
+            if not analysis or not analysis["predictions"]:
+                self.errorOccurred.emit(f"Analysis {analysis_id} not found")
+                return False
+            metadata = analysis["metadata"]
+            detection = metadata.get("mole_detection_probability")
+            model_result = {
+                "is_mole": True,
+                "mole_detection_probability": float(detection) if detection else None,
+                "predictions": analysis["predictions"],
+                "engine": metadata.get("engine", "remote"),
+            }
+            result = self._build_result(model_result, self._current_image_path)
+            result["reused_from"] = analysis_id
+            ANALYSES.inc(outcome="reused")
+            self.release_image_session()
+            self._current_result.update(result)
+            self.analysisComplete.emit(result)
+            return True
+        except Exception as e:
+            self.errorOccurred.emit(f"Error reusing analysis: {e}")
+            return False
+
+    @Slot(int, bool, result=list)
+    def find_similar_lesions(self, count: int, same_patient: bool) -> List[Dict[str, Any]]:
+        """Saved analyses whose images look most like the current image, best first."""
+        try:
+            if not self._current_image_path:
+                return []
+            session = self._image_session
+            image = session.image if session is not None and not session.released else self._current_image_path
+            patient_id = self._current_patient_id if same_patient else None
+            # A few extra in case the current image itself was saved before
+            hits = self.similarity_index.search(image, count + 3, patient_id=patient_id)
+            analyses = self.db.get_analyses_by_ids([hit["analysis_id"] for hit in hits])
+            scores = {hit["analysis_id"]: hit["score"] for hit in hits}
+            similar = [dict(analysis, similarity=scores[analysis["id"]]) for analysis in analyses
+                       if analysis["image_path"] != self._current_image_path]
+            return similar[:count]
+        except Exception as e:
+            self.errorOccurred.emit(f"Error finding similar lesions: {e}")
+            return []
+
     @Slot(int, result=list)
     def get_patient_analyses(self, patient_id: int) -> List[Dict[str, Any]]:
         """Get all analyses for a specific patient."""
@@ -205,30 +761,25 @@ class BackendBridge(QObject):
             # Process metadata if present
             for analysis in analyses:
                 if "metadata" in analysis and analysis["metadata"]:
-                    metadata_dict = {}
-                    for item in analysis["metadata"].split(","):
-                        if ":" in item:
-                            key, value = item.split(":", 1)
-                            metadata_dict[key] = value
-                    analysis["metadata"] = metadata_dict
+                    analysis["metadata"] = parse_metadata(analysis["metadata"])
             
             return analyses
         except Exception as e:
             self.errorOccurred.emit(f"Error fetching patient analyses: {e}")
             return []
 
-    @Property(int)
+    @Property(int, notify=currentPatientIdChanged)
     def currentPatientId(self) -> Optional[int]:
         """Current patient ID property for QML."""
-        print(self._current_patient_id)
         return self._current_patient_id
 
     @currentPatientId.setter
     def currentPatientId(self, patient_id: int):
         if self._current_patient_id != patient_id:
             self._current_patient_id = patient_id
+            self.currentPatientIdChanged.emit()
 
-    @Property(str)
+    @Property(str, notify=currentImagePathChanged)
     def currentImagePath(self) -> Optional[str]:
         """Current image path property for QML."""
         return self._current_image_path
@@ -236,7 +787,16 @@ class BackendBridge(QObject):
     @currentImagePath.setter
     def currentImagePath(self, image_path: str):
         if self._current_image_path != image_path:
+            # An analysis still running is for the previous image
+            for job_id in list(self._analysis_jobs):
+                self.cancel_analysis(job_id)
             self._current_image_path = image_path
+            self.currentImagePathChanged.emit()
+
+    @Property(QObject, constant=True)
+    def currentResult(self) -> AnalysisResult:
+        """The most recent analysis result; its properties notify when a new result arrives."""
+        return self._current_result
 
     @Property(str, notify=userChanged)
     def userName(self) -> str:
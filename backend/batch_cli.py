@@ -0,0 +1,227 @@
+"""Headless batch analysis.
+
+    skinsight-batch photos/ --workers 4 --output results.jsonl
+    skinsight-batch --manifest visits.csv --save
+
+Images are taken from directories (searched recursively), single files or a
+manifest: a CSV file with an ``image_path`` column and an optional
+``patient_id`` column, or a JSON-lines file with the same keys. Every image is
+sent to the prediction API, one JSON line with the analysis result (or the
+error) is written per image, and throughput and latency statistics are
+printed once all images are done. With ``--save`` the results of images tied
+to a patient are stored in the database like analyses saved from the GUI.
+"""
+
+import argparse
+import csv
+import json
+import logging
+import os
+import sys
+import time
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from pathlib import Path
+from typing import Any, Callable, Dict, Iterable, List, NamedTuple, Optional, TextIO
+
+from .analysis_record import analysis_record
+from .config import get_config
+from .near_duplicates import perceptual_hashes
+from .tracing import latency_stats
+
+logger = logging.getLogger(__name__)
+
+IMAGE_EXTENSIONS = {".jpg", ".jpeg", ".png", ".bmp"}
+
+
+class BatchItem(NamedTuple):
+    image_path: str
+    patient_id: Optional[int] = None
+
+
+def _parse_patient_id(value: Any) -> Optional[int]:
+    if value is None or str(value).strip() == "":
+        return None
+    return int(value)
+
+
+def iter_images(path: Path) -> Iterable[Path]:
+    """Image files below a directory, in a stable order."""
+    for candidate in sorted(path.rglob("*")):
+        if candidate.is_file() and candidate.suffix.lower() in IMAGE_EXTENSIONS:
+            yield candidate
+
+
+def read_manifest(path: str) -> List[BatchItem]:
+    """Read a CSV or JSON-lines manifest; relative image paths are resolved against its directory."""
+    manifest = Path(path)
+    with open(manifest, "r", encoding="utf-8", newline="") as f:
+        if manifest.suffix.lower() in (".jsonl", ".json"):
+            rows = [json.loads(line) for line in f if line.strip()]
+        else:
+            rows = list(csv.DictReader(f))
+
+    items = []
+    for row in rows:
+        image_path = Path(row["image_path"])
+        if not image_path.is_absolute():
+            image_path = manifest.parent / image_path
+        items.append(BatchItem(str(image_path), _parse_patient_id(row.get("patient_id"))))
+    return items
+
+
+def collect_items(inputs: Iterable[str], manifest: Optional[str] = None,
+                  patient_id: Optional[int] = None) -> List[BatchItem]:
+    """Build the work list from files, directories and an optional manifest."""
+    items = read_manifest(manifest) if manifest else []
+    for entry in inputs:
+        path = Path(entry)
+        if path.is_dir():
+            items.extend(BatchItem(str(p), patient_id) for p in iter_images(path))
+        elif path.is_file():
+            items.append(BatchItem(str(path), patient_id))
+        else:
+            raise FileNotFoundError(f"No such file or directory: {entry}")
+    return items
+
+
+def analyze_item(model, index: int, item: BatchItem) -> Dict[str, Any]:
+    """Analyze one image; failures are returned as records instead of raised."""
+    record: Dict[str, Any] = {"index": index, "image_path": item.image_path, "patient_id": item.patient_id}
+    started = time.perf_counter()
+    try:
+        model_result = model.predict(item.image_path)
+        record["status"] = "ok"
+        record["result"] = model.to_analysis_result(model_result, item.image_path)
+    except Exception as e:
+        record["status"] = "error"
+        record["error"] = str(e)
+    record["latency_ms"] = round((time.perf_counter() - started) * 1000, 3)
+    return record
+
+
+def persist(db, image_store, record: Dict[str, Any]) -> Optional[int]:
+    """Store a successful mole analysis of a known patient; returns the analysis id."""
+    result = record.get("result")
+    if record["status"] != "ok" or not record["patient_id"] or not result.get("is_mole"):
+        return None
+    stored = image_store.save(record["image_path"])
+    metadata = {}
+    try:
+        # Lets the application recognize later re-captures of the same lesion
+        metadata.update(perceptual_hashes(record["image_path"]))
+    except Exception as e:
+        logger.warning("Could not hash %s: %s", record["image_path"], e)
+    return db.add_analysis(analysis_record(record["patient_id"], stored.path, result, metadata))
+
+
+def run_batch(items: List[BatchItem], model, workers: int = 4,
+              output: Optional[TextIO] = None, db=None, image_store=None,
+              on_record: Optional[Callable[[Dict[str, Any]], None]] = None) -> Dict[str, Any]:
+    """Analyze all items with ``workers`` concurrent requests and return the statistics.
+
+    Records are written as they complete. Database writes and output happen
+    on the calling thread only, because a ``DatabaseManager`` holds one connection.
+    """
+    stats = {"images": len(items), "ok": 0, "errors": 0, "not_mole": 0, "saved": 0, "save_errors": 0}
+    latencies = []
+    started = time.perf_counter()
+
+    with ThreadPoolExecutor(max_workers=max(1, workers), thread_name_prefix="batch") as pool:
+        futures = [pool.submit(analyze_item, model, index, item) for index, item in enumerate(items)]
+        for future in as_completed(futures):
+            record = future.result()
+            latencies.append(record["latency_ms"])
+            if record["status"] == "ok":
+                stats["ok"] += 1
+                if not record["result"].get("is_mole"):
+                    stats["not_mole"] += 1
+            else:
+                stats["errors"] += 1
+
+            if db is not None:
+                try:
+                    analysis_id = persist(db, image_store, record)
+                    if analysis_id:
+                        record["analysis_id"] = analysis_id
+                        stats["saved"] += 1
+                except Exception as e:
+                    record["save_error"] = str(e)
+                    stats["save_errors"] += 1
+
+            if output is not None:
+                output.write(json.dumps(record, ensure_ascii=False) + "\n")
+                output.flush()
+            if on_record is not None:
+                on_record(record)
+
+    wall_s = time.perf_counter() - started
+    stats["wall_s"] = round(wall_s, 3)
+    stats["throughput_per_s"] = round(len(items) / wall_s, 3) if wall_s > 0 else 0.0
+    stats["latency"] = latency_stats(latencies)
+    return stats
+
+
+def format_stats(stats: Dict[str, Any]) -> str:
+    latency = stats["latency"]
+    return (
+        f"images {stats['images']}  ok {stats['ok']}  errors {stats['errors']}  "
+        f"not a mole {stats['not_mole']}  saved {stats['saved']}\n"
+        f"wall {stats['wall_s']:.2f}s  throughput {stats['throughput_per_s']:.2f} images/s\n"
+        f"latency ms  mean {latency['mean_ms']:.1f}  p50 {latency['p50_ms']:.1f}  "
+        f"p95 {latency['p95_ms']:.1f}  p99 {latency['p99_ms']:.1f}  max {latency['max_ms']:.1f}"
+    )
+
+
+def build_parser() -> argparse.ArgumentParser:
+    parser = argparse.ArgumentParser(prog="skinsight-batch", description="Analyze images without the GUI.")
+    parser.add_argument("inputs", nargs="*", help="image files or directories")
+    parser.add_argument("--manifest", help="CSV or JSON-lines file with image_path[,patient_id]")
+    parser.add_argument("--patient-id", type=int, help="patient of all images given as inputs")
+    parser.add_argument("--workers", type=int, default=4, help="concurrent requests (default: 4)")
+    parser.add_argument("--output", default="-", help="JSON-lines result file (default: stdout)")
+    parser.add_argument("--save", action="store_true", help="store results of patients' images in the database")
+    parser.add_argument("--api-url", help="prediction endpoint overriding config.json")
+    parser.add_argument("--stats-json", action="store_true", help="print the statistics as JSON")
+    return parser
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    args = build_parser().parse_args(argv)
+    logging.basicConfig(level=os.environ.get("SKINSIGHT_LOG_LEVEL", "WARNING").upper(),
+                        format="%(asctime)s %(levelname)s %(name)s: %(message)s")
+    try:
+        items = collect_items(args.inputs, args.manifest, args.patient_id)
+    except (OSError, KeyError, ValueError) as e:
+        print(f"skinsight-batch: {e}", file=sys.stderr)
+        return 2
+    if not items:
+        print("skinsight-batch: no images to analyze", file=sys.stderr)
+        return 2
+
+    from .model_handler import ModelHandler
+    model = ModelHandler()
+    if args.api_url:
+        model.api_url = args.api_url
+
+    db = image_store = None
+    if args.save:
+        from .database_manager import DatabaseManager
+        from .image_store import ImageStore, resolve_uploads_dir
+        db = DatabaseManager()
+        image_store = ImageStore(str(resolve_uploads_dir(get_config().application.uploads_dir)))
+
+    output = sys.stdout if args.output == "-" else open(args.output, "w", encoding="utf-8")
+    try:
+        stats = run_batch(items, model, args.workers, output, db, image_store)
+    finally:
+        if output is not sys.stdout:
+            output.close()
+        if db is not None:
+            db.close()
+
+    print(json.dumps(stats) if args.stats_json else format_stats(stats), file=sys.stderr)
+    return 0 if stats["errors"] == 0 and stats["save_errors"] == 0 else 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())
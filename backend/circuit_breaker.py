@@ -0,0 +1,153 @@
+"""Circuit breaker for the remote prediction path.
+
+The breaker watches the outcome and latency of the most recent remote
+calls. While it is closed every call goes out. Once the error rate or the
+p95 latency of the window passes its limit the breaker opens: calls are not
+attempted for ``open_seconds`` and the caller uses its fallback right away
+instead of waiting for another timeout. After that the breaker is half-open
+and lets a few trial calls through; if they succeed it closes again,
+otherwise it opens for another period.
+"""
+
+import logging
+import threading
+import time
+from collections import deque
+from typing import Any, Callable, Deque, Dict, Optional, Tuple
+
+from .config import DEFAULT_BREAKER
+from .tracing import latency_stats
+
+logger = logging.getLogger(__name__)
+
+CLOSED = "closed"
+OPEN = "open"
+HALF_OPEN = "half_open"
+
+
+class CircuitBreaker:
+    """Thread-safe breaker; ``on_change(old, new)`` is called after every state change."""
+
+    def __init__(self, settings: Optional[Dict[str, float]] = None,
+                 on_change: Optional[Callable[[str, str], None]] = None,
+                 clock: Callable[[], float] = time.monotonic):
+        self.settings = dict(DEFAULT_BREAKER)
+        self.settings.update(settings or {})
+        self.on_change = on_change
+        self._clock = clock
+        self._lock = threading.Lock()
+        self._calls: Deque[Tuple[bool, float]] = deque(maxlen=int(self.settings["window"]))
+        self._state = CLOSED
+        self._opened_at = 0.0
+        self._trials = 0
+        self._trial_successes = 0
+
+    @property
+    def state(self) -> str:
+        with self._lock:
+            change = self._refresh()
+            state = self._state
+        self._notify(change)
+        return state
+
+    def retry_in(self) -> float:
+        """Seconds until an open breaker lets trial calls through."""
+        with self._lock:
+            if self._state != OPEN:
+                return 0.0
+            return max(0.0, self._opened_at + self.settings["open_seconds"] - self._clock())
+
+    def allow(self) -> bool:
+        """Whether a remote call may be attempted now; counts half-open trials."""
+        with self._lock:
+            change = self._refresh()
+            if self._state == CLOSED:
+                allowed = True
+            elif self._state == HALF_OPEN and self._trials < self.settings["half_open_calls"]:
+                self._trials += 1
+                allowed = True
+            else:
+                allowed = False
+        self._notify(change)
+        return allowed
+
+    def record(self, success: bool, latency_ms: float = 0.0):
+        """Account the outcome of a call that allow() let through."""
+        with self._lock:
+            before = self._state
+            if self._state == HALF_OPEN:
+                if not success:
+                    self._open()
+                else:
+                    self._trial_successes += 1
+                    if self._trial_successes >= self.settings["half_open_calls"]:
+                        self._state = CLOSED
+                        self._calls.clear()
+            elif self._state == CLOSED:
+                self._calls.append((success, latency_ms))
+                if self._breached():
+                    self._open()
+            change = (before, self._state) if before != self._state else None
+        self._notify(change)
+
+    def reconfigure(self, settings: Dict[str, float]):
+        """Apply new limits; the recent calls are kept, up to the new window size."""
+        with self._lock:
+            self.settings = dict(DEFAULT_BREAKER)
+            self.settings.update(settings)
+            self._calls = deque(self._calls, maxlen=int(self.settings["window"]))
+            change = None
+            if self._state == CLOSED and self._breached():
+                change = (CLOSED, OPEN)
+                self._open()
+        self._notify(change)
+
+    def discard(self):
+        """Forget a call that allow() let through but that ended without an outcome (cancelled)."""
+        with self._lock:
+            if self._state == HALF_OPEN and self._trials > self._trial_successes:
+                self._trials -= 1
+
+    def snapshot(self) -> Dict[str, Any]:
+        state = self.state
+        with self._lock:
+            calls = list(self._calls)
+        return {
+            "state": state,
+            "calls": len(calls),
+            "error_rate": round(self._error_rate(calls), 3),
+            "p95_ms": latency_stats(l for ok, l in calls if ok)["p95_ms"],
+        }
+
+    @staticmethod
+    def _error_rate(calls) -> float:
+        return sum(1 for ok, _ in calls if not ok) / len(calls) if calls else 0.0
+
+    def _breached(self) -> bool:
+        calls = list(self._calls)
+        if len(calls) < self.settings["min_calls"]:
+            return False
+        if self._error_rate(calls) > self.settings["max_error_rate"]:
+            return True
+        max_p95 = self.settings["max_p95_ms"]
+        return bool(max_p95) and latency_stats(l for _, l in calls)["p95_ms"] > max_p95
+
+    def _open(self):
+        self._state = OPEN
+        self._opened_at = self._clock()
+        self._calls.clear()
+
+    def _refresh(self) -> Optional[Tuple[str, str]]:
+        if self._state == OPEN and self._clock() - self._opened_at >= self.settings["open_seconds"]:
+            self._state = HALF_OPEN
+            self._trials = 0
+            self._trial_successes = 0
+            return OPEN, HALF_OPEN
+        return None
+
+    def _notify(self, change: Optional[Tuple[str, str]]):
+        if change is None:
+            return
+        logger.warning("Prediction circuit breaker %s -> %s", *change)
+        if self.on_change is not None:
+            self.on_change(*change)
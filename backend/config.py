@@ -0,0 +1,402 @@
+"""The application configuration: ``config.json`` read once and shared.
+
+Every section has its defaults here. A value's type must match its
+default's: a float setting also takes an int, and ``processes`` also
+takes "auto". Numbers cannot be negative. Keys that do not belong to a
+section are reported and ignored. Only the ``database`` section passes
+extra keys on, to the MySQL connector.
+
+``get_config()`` returns the current ``Config``. Sections read like dicts
+(``config["prediction"]["hedge"]``) or attributes
+(``config.application.api_url``), and cannot be modified.
+
+``CONFIG.watch()`` checks the file for changes every few seconds. A valid
+new version replaces the current one, and ``subscribe()`` callbacks are
+then told which sections changed, so components can reconfigure without
+a restart. An invalid version is logged and ignored. At startup an invalid
+value falls back to its default instead, so one typo does not stop the
+application.
+"""
+
+import json
+import logging
+import os
+import threading
+from pathlib import Path
+from typing import Any, Callable, Dict, Iterator, List, Mapping, Optional, Tuple, Union
+
+logger = logging.getLogger(__name__)
+
+CONFIG_PATH = Path(__file__).parent.parent / "config.json"
+
+DEFAULT_DATABASE = {
+    "host": "localhost",
+    "user": "root",
+    "password": "",
+    "database": "skinsight",
+}
+
+DEFAULT_APPLICATION = {
+    "uploads_dir": "uploads",
+    "api_url": "",
+    "models_dir": "models",
+    "model_file": "model.h5",
+    "default_clinic": "SkinSight",
+    "default_user": "Доктор",
+}
+
+DEFAULT_TIMEOUTS = {
+    "connect_timeout": 5.0,
+    "upload_timeout": 30.0,
+    "response_timeout": 60.0,
+}
+
+DEFAULT_ROUTING = {
+    "endpoints": [],
+    "hedge": True,
+    "initial_hedge_delay": 2.0,
+    "min_hedge_delay": 0.05,
+    "max_attempts": 3,
+    "failure_threshold": 3,
+    "ejection_seconds": 30.0,
+    "max_ejection_seconds": 300.0,
+    "health_interval_seconds": 10.0,
+    "ewma_alpha": 0.3,
+}
+
+DEFAULT_BREAKER = {
+    "window": 20,
+    "min_calls": 5,
+    "max_error_rate": 0.5,
+    "max_p95_ms": 0.0,  # 0 disables the latency limit
+    "open_seconds": 30.0,
+    "half_open_calls": 2,
+}
+
+DEFAULT_INFERENCE = {
+    "processes": "auto",  # 0 runs the model inside the application process
+    "max_processes": 4,
+    "max_batch": 8,
+    # Model variant built by model_variants: "auto" picks the fastest one within
+    # the tolerances below, "reference" the model_file itself, or a variant name
+    "variant": "auto",
+    "max_abs_diff": 0.05,
+    "min_agreement": 0.98,
+}
+
+DEFAULT_STORAGE = {
+    "orphan_grace_days": 7.0,
+    "recompress_after_days": 0.0,  # 0 disables recompression
+    "recompress_mode": "lossless",  # "lossless" or "high_quality"
+    "recompress_min_savings": 0.1,
+    "max_bytes_per_second": 8 * 1024 * 1024,
+    "interval_hours": 24.0,
+}
+
+DEFAULT_RECAPTURE = {
+    "max_distance": 10,  # bits out of 64, for both hashes
+    "recent_hours": 24.0,
+}
+
+DEFAULT_METRICS = {
+    "http_port": 0,  # 0 disables the scrape endpoint
+    "host": "127.0.0.1",
+    "textfile": "",  # e.g. /var/lib/node_exporter/textfile/skinsight.prom
+    "textfile_interval_seconds": 15.0,
+}
+
+DEFAULT_OFFLINE_QUEUE = {
+    "enabled": True,  # queue analyses that fail while the prediction API is unreachable
+    "max_per_minute": 30,
+    "initial_backoff_seconds": 5.0,
+    "max_backoff_seconds": 300.0,
+    "max_attempts": 50,
+}
+
+DEFAULT_CACHES = {
+    "patient_search_entries": 64,
+    "patient_search_rows": 200,
+    "analytics_entries": 32,
+}
+
+SECTIONS = {
+    "database": DEFAULT_DATABASE,
+    "application": DEFAULT_APPLICATION,
+    "prediction": dict(DEFAULT_TIMEOUTS, **DEFAULT_ROUTING),
+    "circuit_breaker": DEFAULT_BREAKER,
+    "local_inference": DEFAULT_INFERENCE,
+    "storage": DEFAULT_STORAGE,
+    "recapture": DEFAULT_RECAPTURE,
+    "metrics": DEFAULT_METRICS,
+    "offline_queue": DEFAULT_OFFLINE_QUEUE,
+    "caches": DEFAULT_CACHES,
+}
+
+# Sections whose unknown keys are kept
+OPEN_SECTIONS = {"database"}
+
+# Values accepted besides those of the default's type
+ALTERNATIVES = {
+    ("local_inference", "processes"): ("auto",),
+}
+CHOICES = {
+    ("storage", "recompress_mode"): ("lossless", "high_quality"),
+}
+
+WATCH_INTERVAL = 2.0
+
+
+class ConfigError(ValueError):
+    """The config file cannot be read or has invalid values."""
+
+    def __init__(self, problems: List[str]):
+        super().__init__("; ".join(problems))
+        self.problems = problems
+
+
+def _check(section: str, key: str, value: Any) -> Any:
+    """``value`` converted to the type of the default; raises ValueError if it does not fit."""
+    if value in ALTERNATIVES.get((section, key), ()):
+        return value
+    default = SECTIONS[section][key]
+    if isinstance(default, bool):
+        if not isinstance(value, bool):
+            raise ValueError("expected true or false")
+    elif isinstance(default, (int, float)):
+        if isinstance(value, bool) or not isinstance(value, (int, float)) \
+                or (isinstance(default, int) and not isinstance(value, int)):
+            raise ValueError(f"expected {'an integer' if isinstance(default, int) else 'a number'}")
+        if value < 0:
+            raise ValueError("must not be negative")
+        value = float(value) if isinstance(default, float) else value
+    elif not isinstance(value, type(default)):
+        raise ValueError(f"expected {'a list' if isinstance(default, list) else 'a string'}")
+    choices = CHOICES.get((section, key))
+    if choices and value not in choices:
+        raise ValueError(f"expected one of {', '.join(choices)}")
+    return value
+
+
+class Section(Mapping):
+    """The read-only settings of one config section."""
+
+    def __init__(self, name: str, values: Dict[str, Any]):
+        self._name = name
+        self._values = values
+
+    def __getitem__(self, key: str) -> Any:
+        value = self._values[key]
+        # Lists are shared between readers
+        return list(value) if isinstance(value, list) else value
+
+    def __getattr__(self, key: str) -> Any:
+        if key.startswith("_"):
+            raise AttributeError(key)
+        try:
+            return self[key]
+        except KeyError:
+            raise AttributeError(f"Config section {self._name} has no setting {key}") from None
+
+    def __iter__(self) -> Iterator[str]:
+        return iter(self._values)
+
+    def __len__(self) -> int:
+        return len(self._values)
+
+    def __repr__(self) -> str:
+        return f"Section({self._name!r}, {self._values!r})"
+
+
+class Config:
+    """Validated settings of every section; missing ones have their defaults."""
+
+    def __init__(self, sections: Optional[Dict[str, Dict[str, Any]]] = None):
+        sections = sections or {}
+        self._sections = {name: Section(name, dict(defaults, **sections.get(name, {})))
+                          for name, defaults in SECTIONS.items()}
+
+    def __getitem__(self, name: str) -> Section:
+        return self._sections[name]
+
+    def __getattr__(self, name: str) -> Section:
+        if name.startswith("_"):
+            raise AttributeError(name)
+        try:
+            return self._sections[name]
+        except KeyError:
+            raise AttributeError(f"No config section {name}") from None
+
+    def changed_sections(self, other: "Config") -> List[str]:
+        """Names of the sections whose settings differ from ``other``."""
+        return [name for name in SECTIONS if dict(self[name]) != dict(other[name])]
+
+
+def parse_config(data: Dict[str, Any]) -> Tuple[Config, List[str]]:
+    """The config described by parsed JSON, and the problems found.
+
+    Invalid values are left at their defaults in the returned config.
+    """
+    problems = []
+    sections = {}
+    for name, values in data.items():
+        if name not in SECTIONS:
+            continue
+        if not isinstance(values, dict):
+            problems.append(f"{name}: expected an object")
+            continue
+        section = sections[name] = {}
+        for key, value in values.items():
+            if key not in SECTIONS[name]:
+                if name in OPEN_SECTIONS:
+                    section[key] = value
+                else:
+                    problems.append(f"{name}.{key}: unknown setting")
+                continue
+            try:
+                section[key] = _check(name, key, value)
+            except ValueError as e:
+                problems.append(f"{name}.{key}: {e}")
+    return Config(sections), problems
+
+
+def load_config(path: Union[str, Path] = CONFIG_PATH) -> Config:
+    """Read and validate a config file; a missing file gives the defaults.
+
+    Raises ConfigError if the file cannot be parsed or has invalid values.
+    """
+    if not os.path.exists(path):
+        return Config()
+    try:
+        with open(path, "r", encoding="utf-8") as f:
+            data = json.load(f)
+    except (OSError, ValueError) as e:
+        raise ConfigError([f"cannot read {path}: {e}"])
+    if not isinstance(data, dict):
+        raise ConfigError([f"{path}: expected an object"])
+    config, problems = parse_config(data)
+    if problems:
+        raise ConfigError(problems)
+    return config
+
+
+class ConfigStore:
+    """The current config of one file, reloaded when the file changes."""
+
+    def __init__(self, path: Union[str, Path] = CONFIG_PATH, interval: float = WATCH_INTERVAL):
+        self.path = Path(path)
+        self.interval = interval
+        self._config: Optional[Config] = None
+        self._stamp = None
+        self._lock = threading.Lock()
+        self._listeners: List[Callable[[Config, List[str]], None]] = []
+        self._stop = threading.Event()
+        self._thread = None
+
+    def _file_stamp(self):
+        try:
+            stat = os.stat(self.path)
+        except OSError:
+            return None
+        return stat.st_mtime_ns, stat.st_size
+
+    def get(self) -> Config:
+        """The current config, read on first use."""
+        with self._lock:
+            if self._config is None:
+                self._stamp = self._file_stamp()
+                self._config = self._initial_load()
+            return self._config
+
+    def _initial_load(self) -> Config:
+        try:
+            with open(self.path, "r", encoding="utf-8") as f:
+                data = json.load(f)
+        except FileNotFoundError:
+            return Config()
+        except (OSError, ValueError) as e:
+            logger.warning("Could not load %s, using defaults: %s", self.path, e)
+            return Config()
+        if not isinstance(data, dict):
+            logger.warning("Could not load %s, using defaults: expected an object", self.path)
+            return Config()
+        config, problems = parse_config(data)
+        for problem in problems:
+            logger.warning("%s: %s; using the default", self.path.name, problem)
+        return config
+
+    def reload(self) -> List[str]:
+        """Read the file again; returns the sections that changed.
+
+        An invalid file is logged and the current config is kept.
+        """
+        current = self.get()
+        stamp = self._file_stamp()
+        try:
+            config = load_config(self.path)
+        except ConfigError as e:
+            with self._lock:
+                self._stamp = stamp  # reported once per change of the file
+            logger.warning("Ignoring the changed %s: %s", self.path.name, e)
+            return []
+        with self._lock:
+            self._stamp = stamp
+            changed = config.changed_sections(current)
+            if changed:
+                self._config = config
+            listeners = list(self._listeners)
+        if changed:
+            logger.info("Configuration reloaded, changed sections: %s", ", ".join(changed))
+            for listener in listeners:
+                try:
+                    listener(config, changed)
+                except Exception as e:
+                    logger.error("Could not apply the new configuration: %s", e)
+        return changed
+
+    def subscribe(self, listener: Callable[[Config, List[str]], None]) -> Callable[[], None]:
+        """Call ``listener(config, changed_sections)`` after each reload; returns the unsubscribe function."""
+        with self._lock:
+            self._listeners.append(listener)
+
+        def unsubscribe():
+            with self._lock:
+                if listener in self._listeners:
+                    self._listeners.remove(listener)
+        return unsubscribe
+
+    def check(self) -> List[str]:
+        """Reload if the file changed since it was last read."""
+        self.get()
+        if self._file_stamp() == self._stamp:
+            return []
+        return self.reload()
+
+    def watch(self) -> bool:
+        """Check the file for changes on a background thread."""
+        if self._thread is not None and self._thread.is_alive():
+            return False
+        self._stop.clear()
+        self._thread = threading.Thread(target=self._watch_loop, name="config-watch", daemon=True)
+        self._thread.start()
+        return True
+
+    def _watch_loop(self):
+        while not self._stop.wait(self.interval):
+            try:
+                self.check()
+            except Exception as e:
+                logger.error("Configuration check failed: %s", e)
+
+    def stop(self):
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join(timeout=5)
+            self._thread = None
+
+
+CONFIG = ConfigStore()
+
+
+def get_config() -> Config:
+    """The current configuration of the application."""
+    return CONFIG.get()
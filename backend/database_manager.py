@@ -1,37 +1,57 @@
 import mysql.connector
 from datetime import datetime
-from typing import Dict, List, Optional, Any
-import os
+from typing import Callable, Dict, Iterator, List, Optional, Any, Tuple
 import json
+import logging
 from pathlib import Path
 
+from .analytics import (AGE_BANDS, PERIOD_FORMATS, AnalyticsCache, ClassMatrix, TimeBound,
+                        age_band_labels, risk_rows, risk_sums_sql)
+from .config import get_config, load_config
+from .metrics import REGISTRY, timed
+
+logger = logging.getLogger(__name__)
+
+QUERY_SECONDS = REGISTRY.histogram("skinsight_db_query_seconds", "Duration of database operations",
+                                   ["operation"])
+QUERY_ERRORS = REGISTRY.counter("skinsight_db_errors_total", "Database operations that failed", ["operation"])
+CONNECTS = REGISTRY.counter("skinsight_db_connects_total", "Database connection attempts", ["outcome"])
+
+
+def parse_metadata(text: Optional[str]) -> Dict[str, str]:
+    """Turn the ``key:value,key:value`` list built by GROUP_CONCAT into a dict."""
+    metadata = {}
+    if not text:
+        return metadata
+    for item in text.split(","):
+        key, sep, value = item.partition(":")
+        if sep:
+            metadata[key] = value
+    return metadata
+
+
 class DatabaseManager:
-    def __init__(self, config_file: str = "config.json"):
+    def __init__(self, config_file: Optional[str] = None):
+        """Connect with the ``database`` settings of the application config, or of ``config_file``."""
         self.connection = None
         self.cursor = None
-        config_path = Path(__file__).parent.parent / config_file
-        self._load_config(str(config_path))
+        if config_file is None:
+            config = get_config()
+        else:
+            config = load_config(Path(__file__).parent.parent / config_file)
+        self.connection_params = dict(config.database)
+        self.analytics_cache = AnalyticsCache(config.caches.analytics_entries)
+        self._class_matrix = ClassMatrix()
         self._connect()
 
-    def _load_config(self, config_file: str):
-        """Load database configuration from a JSON file or use defaults."""
-        default_config = {
-            "host": "localhost",
-            "user": "root",
-            "password": "",
-            "database": "skinsight"
-        }
-        
-        self.connection_params = default_config
-        
-        # Try to load from config file if it exists
-        if os.path.exists(config_file):
-            try:
-                with open(config_file, 'r') as f:
-                    config = json.load(f)
-                    self.connection_params.update(config.get('database', {}))
-            except Exception as e:
-                print(f"Warning: Could not load config file: {e}")
+    def reconfigure(self, connection_params: Dict[str, Any]):
+        """Use new connection settings; the next operation connects with them."""
+        if dict(connection_params) == self.connection_params:
+            return
+        self.close()
+        self.connection_params = dict(connection_params)
+        self.connection = None
+        self.cursor = None
 
     def _connect(self):
         """Attempt to connect to the database, create if not exists."""
@@ -54,9 +74,11 @@ class DatabaseManager:
             
             # Create tables if they don't exist
             self._create_tables()
+            CONNECTS.inc(outcome="ok")
             
         except mysql.connector.Error as err:
-            print(f"Database connection error: {err}")
+            CONNECTS.inc(outcome="error")
+            logger.error("Database connection error: %s", err)
             self.connection = None
             self.cursor = None
             raise
@@ -85,10 +107,12 @@ class DatabaseManager:
             patient_id INT NOT NULL,
             image_path VARCHAR(255) NOT NULL,
             melanoma_probability FLOAT NOT NULL,
+            predictions TEXT,
             diagnosis_text TEXT,
             analyzed_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
             FOREIGN KEY (patient_id) REFERENCES patients(id) ON DELETE CASCADE,
-            INDEX idx_patient_analysis (patient_id, analyzed_at)
+            INDEX idx_patient_analysis (patient_id, analyzed_at),
+            INDEX idx_analyzed_risk (analyzed_at, melanoma_probability)
         )
         """
         
@@ -106,8 +130,20 @@ class DatabaseManager:
         self.cursor.execute(create_patients_table)
         self.cursor.execute(create_analyses_table)
         self.cursor.execute(create_metadata_table)
+        # CREATE TABLE IF NOT EXISTS leaves tables of older databases as they are
+        self._ensure_index("mole_analyses", "idx_analyzed_risk", "analyzed_at, melanoma_probability")
         self.connection.commit()
 
+    def _ensure_index(self, table: str, name: str, columns: str):
+        """Add index ``name`` on ``columns`` to ``table`` unless it exists already."""
+        self.cursor.execute("""
+        SELECT COUNT(*) AS found FROM information_schema.statistics
+        WHERE table_schema = DATABASE() AND table_name = %s AND index_name = %s
+        """, (table, name))
+        if not self.cursor.fetchone()["found"]:
+            logger.info("Adding index %s to %s", name, table)
+            self.cursor.execute(f"ALTER TABLE {table} ADD INDEX {name} ({columns})")
+
     def is_connected(self) -> bool:
         """Check if database connection is active."""
         return self.connection is not None and self.connection.is_connected()
@@ -119,6 +155,7 @@ class DatabaseManager:
         if not self.is_connected():
             raise RuntimeError("Could not establish database connection")
 
+    @timed(QUERY_SECONDS, QUERY_ERRORS, operation="add_patient")
     def add_patient(self, patient_data: Dict[str, Any]) -> int:
         """Add a new patient to the database."""
         self.ensure_connected()
@@ -136,6 +173,7 @@ class DatabaseManager:
             self.connection.rollback()
             raise RuntimeError(f"Error adding patient: {err}")
 
+    @timed(QUERY_SECONDS, QUERY_ERRORS, operation="add_analysis")
     def add_analysis(self, analysis_data: Dict[str, Any]) -> int:
         """Add a new analysis record and its metadata."""
         self.ensure_connected()
@@ -149,7 +187,7 @@ class DatabaseManager:
             self.cursor.execute(query, analysis_data)
             #self.connection.commit()
             analysis_id = self.cursor.lastrowid
-            print("Analysis added")
+            logger.debug("Analysis %s added", analysis_id)
             
             # Add metadata if present
             if "metadata" in analysis_data and analysis_data["metadata"]:
@@ -157,10 +195,11 @@ class DatabaseManager:
                     self._add_analysis_metadata(analysis_id, key, value)
             
             self.connection.commit()
+            self.analytics_cache.invalidate()
             return analysis_id
         except Exception as err:# mysql.connector.Error as err:
             self.connection.rollback()
-            print(f"Error adding analysis: {err}")
+            logger.error("Error adding analysis: %s", err)
             raise RuntimeError(f"Error adding analysis: {err}")
 
     def _add_analysis_metadata(self, analysis_id: int, key: str, value: str):
@@ -171,6 +210,7 @@ class DatabaseManager:
         """
         self.cursor.execute(query, (analysis_id, key, value))
 
+    @timed(QUERY_SECONDS, QUERY_ERRORS, operation="get_patient")
     def get_patient(self, patient_id: int) -> Optional[Dict[str, Any]]:
         """Get patient details by ID."""
         self.ensure_connected()
@@ -193,6 +233,7 @@ class DatabaseManager:
         
         return result
 
+    @timed(QUERY_SECONDS, QUERY_ERRORS, operation="get_patient_analyses")
     def get_patient_analyses(self, patient_id: int) -> List[Dict[str, Any]]:
         """Get all analyses for a patient with their metadata."""
         self.ensure_connected()
@@ -216,24 +257,24 @@ class DatabaseManager:
             analysis['analyzed_at'] = analysis['analyzed_at'].isoformat()
             pred = json.loads(analysis['predictions'])
             analysis['predictions'] = pred
-            print(pred)
         
         return analyses
 
-    def search_patients(self, search_term: str) -> List[Dict[str, Any]]:
-        """Search for patients by name or phone number."""
+    @timed(QUERY_SECONDS, QUERY_ERRORS, operation="search_patients")
+    def search_patients(self, search_term: str, limit: int = 20, offset: int = 0) -> List[Dict[str, Any]]:
+        """Search for patients by name or phone number, one page at a time."""
         self.ensure_connected()
         
         query = """
         SELECT id, full_name, gender, birth_date, phone
         FROM patients
         WHERE full_name LIKE %s OR phone LIKE %s
-        ORDER BY full_name
-        LIMIT 20
+        ORDER BY full_name, id
+        LIMIT %s OFFSET %s
         """
         
         search_pattern = f"%{search_term}%"
-        self.cursor.execute(query, (search_pattern, search_pattern))
+        self.cursor.execute(query, (search_pattern, search_pattern, limit, offset))
         results = self.cursor.fetchall()
         
         # Convert datetime objects to strings
@@ -242,6 +283,7 @@ class DatabaseManager:
         
         return results
 
+    @timed(QUERY_SECONDS, QUERY_ERRORS, operation="update_patient")
     def update_patient(self, patient_data: Dict[str, Any]) -> bool:
         """Update an existing patient's information."""
         self.ensure_connected()
@@ -263,11 +305,253 @@ class DatabaseManager:
         try:
             self.cursor.execute(query, patient_data)
             self.connection.commit()
+            # Gender and birth date feed the analytics
+            self.analytics_cache.invalidate()
             return self.cursor.rowcount > 0
         except mysql.connector.Error as err:
             self.connection.rollback()
             raise RuntimeError(f"Error updating patient: {err}")
 
+    @timed(QUERY_SECONDS, QUERY_ERRORS, operation="get_image_path_counts")
+    def get_image_path_counts(self) -> Dict[str, int]:
+        """Number of saved analyses per referenced image path, as stored."""
+        self.ensure_connected()
+
+        self.cursor.execute("SELECT image_path, COUNT(*) AS analyses FROM mole_analyses GROUP BY image_path")
+        return {row['image_path']: row['analyses'] for row in self.cursor.fetchall()}
+
+    def get_analysis_images(self, after_id: int = 0, batch_size: int = 10000) -> Iterator[Dict[str, Any]]:
+        """Id, patient and image of every analysis after ``after_id``, in id order."""
+        self.ensure_connected()
+
+        query = """
+        SELECT id, patient_id, image_path
+        FROM mole_analyses
+        WHERE id > %s
+        ORDER BY id
+        LIMIT %s
+        """
+        while True:
+            self.cursor.execute(query, (after_id, batch_size))
+            rows = self.cursor.fetchall()
+            if not rows:
+                return
+            yield from rows
+            after_id = rows[-1]["id"]
+
+    @timed(QUERY_SECONDS, QUERY_ERRORS, operation="get_analyses_by_ids")
+    def get_analyses_by_ids(self, analysis_ids: List[int]) -> List[Dict[str, Any]]:
+        """Analyses with their patient's name, in the order of ``analysis_ids``."""
+        if not analysis_ids:
+            return []
+        self.ensure_connected()
+
+        placeholders = ", ".join(["%s"] * len(analysis_ids))
+        query = f"""
+        SELECT a.id, a.patient_id, p.full_name, a.image_path, a.melanoma_probability,
+               a.diagnosis_text, a.analyzed_at
+        FROM mole_analyses a
+        JOIN patients p ON p.id = a.patient_id
+        WHERE a.id IN ({placeholders})
+        """
+        self.cursor.execute(query, list(analysis_ids))
+        rows = {row["id"]: row for row in self.cursor.fetchall()}
+        for row in rows.values():
+            row["analyzed_at"] = row["analyzed_at"].isoformat()
+        return [rows[analysis_id] for analysis_id in analysis_ids if analysis_id in rows]
+
+    @timed(QUERY_SECONDS, QUERY_ERRORS, operation="get_analysis")
+    def get_analysis(self, analysis_id: int) -> Optional[Dict[str, Any]]:
+        """One analysis with its predictions and metadata."""
+        self.ensure_connected()
+
+        query = """
+        SELECT a.id, a.patient_id, a.image_path, a.melanoma_probability,
+               a.predictions, a.diagnosis_text, a.analyzed_at,
+               GROUP_CONCAT(CONCAT(m.key_name, ':', m.value_text)) as metadata
+        FROM mole_analyses a
+        LEFT JOIN analysis_metadata m ON a.id = m.analysis_id
+        WHERE a.id = %s
+        GROUP BY a.id
+        """
+        self.cursor.execute(query, (analysis_id,))
+        analysis = self.cursor.fetchone()
+        if analysis:
+            analysis['analyzed_at'] = analysis['analyzed_at'].isoformat()
+            analysis['predictions'] = json.loads(analysis['predictions'] or "{}")
+            analysis['metadata'] = parse_metadata(analysis['metadata'])
+        return analysis
+
+    @timed(QUERY_SECONDS, QUERY_ERRORS, operation="get_analysis_hashes")
+    def get_analysis_hashes(self, since: datetime) -> List[Dict[str, Any]]:
+        """Perceptual hashes of the analyses saved since ``since`` that have them."""
+        self.ensure_connected()
+
+        query = """
+        SELECT a.id, a.patient_id, a.analyzed_at,
+               MAX(CASE WHEN m.key_name = 'phash' THEN m.value_text END) AS phash,
+               MAX(CASE WHEN m.key_name = 'dhash' THEN m.value_text END) AS dhash
+        FROM mole_analyses a
+        JOIN analysis_metadata m ON a.id = m.analysis_id AND m.key_name IN ('phash', 'dhash')
+        WHERE a.analyzed_at >= %s
+        GROUP BY a.id
+        """
+        self.cursor.execute(query, (since,))
+        return self.cursor.fetchall()
+
+    @timed(QUERY_SECONDS, QUERY_ERRORS, operation="update_image_path")
+    def update_image_path(self, old_path: str, new_path: str) -> int:
+        """Point all analyses that use one image file at another one."""
+        self.ensure_connected()
+
+        query = """
+        UPDATE mole_analyses
+        SET image_path = %s
+        WHERE image_path = %s
+        """
+
+        try:
+            self.cursor.execute(query, (new_path, old_path))
+            self.connection.commit()
+            return self.cursor.rowcount
+        except mysql.connector.Error as err:
+            self.connection.rollback()
+            raise RuntimeError(f"Error updating image path: {err}")
+
+    @timed(QUERY_SECONDS, QUERY_ERRORS, operation="get_clinic_analytics")
+    def get_clinic_analytics(self, period: str = "month", since: TimeBound = None,
+                             until: TimeBound = None) -> Dict[str, Any]:
+        """Risk distribution by period, age band and gender, and class statistics, for a date range.
+
+        ``period`` is one of day, week, month or year; ``since`` is inclusive
+        and ``until`` exclusive. Results are cached until an analysis is added.
+        """
+        if period not in PERIOD_FORMATS:
+            raise ValueError(f"Unknown period {period!r}, expected one of {', '.join(PERIOD_FORMATS)}")
+        return self._cached_analytics(
+            ("clinic", period, str(since), str(until)),
+            lambda: self._compute_clinic_analytics(period, since, until)
+        )
+
+    def get_risk_by_period(self, period: str = "month", since: TimeBound = None,
+                           until: TimeBound = None) -> List[Dict[str, Any]]:
+        """Analyses per risk level for every day, week, month or year."""
+        return self.get_clinic_analytics(period, since, until)["by_period"]
+
+    def get_risk_by_age_band(self, since: TimeBound = None, until: TimeBound = None) -> List[Dict[str, Any]]:
+        """Analyses per risk level by the patient's age at the time of the analysis."""
+        return self.get_clinic_analytics("month", since, until)["by_age_band"]
+
+    def get_risk_by_gender(self, since: TimeBound = None, until: TimeBound = None) -> List[Dict[str, Any]]:
+        """Analyses per risk level by the patient's gender."""
+        return self.get_clinic_analytics("month", since, until)["by_gender"]
+
+    def get_class_summary(self, since: TimeBound = None, until: TimeBound = None) -> List[Dict[str, Any]]:
+        """Mean probability and top-class share of every predicted class."""
+        return self.get_clinic_analytics("month", since, until)["classes"]
+
+    def _cached_analytics(self, key: Tuple, compute: Callable[[], Any]) -> Any:
+        self.ensure_connected()
+        # End the read snapshot so that analyses saved through other connections are seen
+        self.connection.commit()
+        generation = self.analytics_cache.generation
+        self.cursor.execute("SELECT COALESCE(MAX(id), 0) AS last_id FROM mole_analyses")
+        stamp = self.cursor.fetchone()["last_id"]
+        result = self.analytics_cache.get(key, stamp)
+        if result is None:
+            result = compute()
+            self.analytics_cache.put(key, stamp, result, generation)
+        return result
+
+    @staticmethod
+    def _analytics_filter(since: TimeBound, until: TimeBound) -> Tuple[str, List[Any]]:
+        clauses, params = [], []
+        if since is not None:
+            clauses.append("a.analyzed_at >= %s")
+            params.append(since)
+        if until is not None:
+            clauses.append("a.analyzed_at < %s")
+            params.append(until)
+        return ("WHERE " + " AND ".join(clauses)) if clauses else "", params
+
+    def _compute_clinic_analytics(self, period: str, since: TimeBound, until: TimeBound) -> Dict[str, Any]:
+        where, params = self._analytics_filter(since, until)
+        risk = f"{risk_sums_sql()}, AVG(a.melanoma_probability) AS mean_probability"
+
+        self.cursor.execute(f"""
+        SELECT DATE_FORMAT(a.analyzed_at, %s) AS period, {risk}
+        FROM mole_analyses a
+        {where}
+        GROUP BY period
+        ORDER BY period
+        """, [PERIOD_FORMATS[period]] + params)
+        by_period = risk_rows(self.cursor.fetchall(), "period")
+
+        bands = ", ".join(str(age) for age in AGE_BANDS)
+        self.cursor.execute(f"""
+        SELECT INTERVAL(TIMESTAMPDIFF(YEAR, p.birth_date, a.analyzed_at), {bands}) AS age_band, {risk}
+        FROM mole_analyses a
+        JOIN patients p ON p.id = a.patient_id
+        {where}
+        GROUP BY age_band
+        ORDER BY age_band
+        """, params)
+        by_age_band = risk_rows(self.cursor.fetchall(), "age_band", age_band_labels())
+
+        self.cursor.execute(f"""
+        SELECT p.gender, {risk}
+        FROM mole_analyses a
+        JOIN patients p ON p.id = a.patient_id
+        {where}
+        GROUP BY p.gender
+        ORDER BY p.gender
+        """, params)
+        by_gender = risk_rows(self.cursor.fetchall(), "gender")
+
+        self._update_class_matrix()
+        return {
+            "analyses": sum(row["analyses"] for row in by_period),
+            "by_period": by_period,
+            "by_age_band": by_age_band,
+            "by_gender": by_gender,
+            "classes": self._class_matrix.summary(since, until),
+        }
+
+    def _update_class_matrix(self, batch_size: int = 50000):
+        """Fetch the class probabilities of the analyses added since the last update."""
+        last_id = self._class_matrix.last_id
+        self.cursor.execute(
+            """
+            SELECT DISTINCT JSON_KEYS(predictions) AS classes
+            FROM mole_analyses
+            WHERE id > %s AND JSON_VALID(predictions)
+            """,
+            (last_id,)
+        )
+        classes = sorted({name for row in self.cursor.fetchall() for name in json.loads(row["classes"] or "[]")})
+        if not classes:
+            return
+        # "+ 0" turns the JSON number into a DOUBLE (and a missing class into NULL)
+        columns = ", ".join("JSON_EXTRACT(predictions, %s) + 0" for _ in classes)
+        cursor = self.connection.cursor()  # tuples convert to an array directly
+        try:
+            cursor.execute(
+                f"""
+                SELECT id, TIMESTAMPDIFF(SECOND, '1970-01-01', analyzed_at), {columns}
+                FROM mole_analyses
+                WHERE id > %s AND JSON_VALID(predictions)
+                ORDER BY id
+                """,
+                ["$." + json.dumps(name) for name in classes] + [last_id]
+            )
+            while True:
+                rows = cursor.fetchmany(batch_size)
+                if not rows:
+                    break
+                self._class_matrix.append(classes, rows)
+        finally:
+            cursor.close()
+
     def close(self):
         """Close database connection."""
         if self.cursor:
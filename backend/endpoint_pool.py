@@ -0,0 +1,418 @@
+"""Latency-aware routing over several prediction API endpoints.
+
+Each endpoint keeps an exponentially weighted moving average (EWMA) of its
+response times and a count of requests in flight. A request goes to an
+endpoint picked at random with a weight of ``1 / (ewma * (in_flight + 1))``,
+so fast and idle instances get most of the traffic while slower ones still
+see enough of it to notice when they recover.
+
+An endpoint that fails several times in a row is ejected for a while
+(doubling with every repeated ejection). During that time a background
+thread probes it, and it is re-admitted as soon as it answers again; once
+the ejection has run out it also gets a single trial request.
+
+``RoutedCall`` has the interface of ``PredictionCall``. It fails over to
+another endpoint on connection errors, timeouts and HTTP 5xx. When hedging
+is enabled and the first attempt has not answered within the pool's recent
+p95 latency, it sends a second attempt to a different endpoint and keeps
+whichever answers first.
+"""
+
+import logging
+import queue
+import random
+import threading
+import time
+from collections import deque
+from http.client import HTTPConnection, HTTPSConnection
+from typing import Any, Callable, Deque, Dict, Iterable, List, Optional
+from urllib.parse import urlsplit
+
+from .config import DEFAULT_ROUTING, DEFAULT_TIMEOUTS
+from .prediction_client import PredictionCall, PredictionCancelled, PredictionTimeout
+from .tracing import latency_stats
+
+logger = logging.getLogger(__name__)
+
+
+# Latency samples needed before the hedge delay follows the observed p95
+HEDGE_MIN_SAMPLES = 20
+
+
+def probe(url: str, timeout: float) -> bool:
+    """Whether the server behind ``url`` answers; any response below HTTP 500 counts."""
+    parts = urlsplit(url)
+    connection_class = HTTPSConnection if parts.scheme == "https" else HTTPConnection
+    connection = connection_class(parts.hostname, parts.port, timeout=timeout)
+    try:
+        # A GET of the predict URL is answered with 405 by a healthy server
+        connection.request("GET", parts.path or "/")
+        return connection.getresponse().status < 500
+    except OSError:
+        return False
+    finally:
+        connection.close()
+
+
+class Endpoint:
+    """Routing state of one prediction API instance."""
+
+    def __init__(self, url: str):
+        self.url = url
+        self.ewma_ms: Optional[float] = None
+        self.in_flight = 0
+        self.consecutive_failures = 0
+        self.ejections = 0
+        self.ejected_until = 0.0
+
+    def ejected(self, now: float) -> bool:
+        return self.ejected_until > now
+
+    def to_dict(self, now: float) -> Dict[str, Any]:
+        return {
+            "url": self.url,
+            "ewma_ms": None if self.ewma_ms is None else round(self.ewma_ms, 3),
+            "in_flight": self.in_flight,
+            "consecutive_failures": self.consecutive_failures,
+            "ejected": self.ejected(now),
+        }
+
+
+class EndpointPool:
+    """Endpoint choice, latency tracking, ejection and re-admission; thread-safe."""
+
+    def __init__(self, urls: Iterable[str], settings: Optional[Dict[str, Any]] = None,
+                 probe=probe, rng: Optional[random.Random] = None):
+        self.settings = dict(DEFAULT_ROUTING)
+        self.settings.update(settings or {})
+        self.endpoints = [Endpoint(url) for url in dict.fromkeys(urls)]
+        if not self.endpoints:
+            raise ValueError("At least one prediction endpoint is required")
+        self._probe = probe
+        self._random = rng or random.Random()
+        self._lock = threading.Lock()
+        self._latencies: Deque[float] = deque(maxlen=200)
+        self._health_thread = None
+
+    def __len__(self) -> int:
+        return len(self.endpoints)
+
+    @property
+    def urls(self) -> List[str]:
+        return [endpoint.url for endpoint in self.endpoints]
+
+    def reconfigure(self, urls: Iterable[str], settings: Optional[Dict[str, Any]] = None):
+        """Apply new endpoints and settings; endpoints kept keep their statistics.
+
+        Attempts already running on a removed endpoint finish normally.
+        """
+        urls = list(dict.fromkeys(urls))
+        if not urls:
+            raise ValueError("At least one prediction endpoint is required")
+        with self._lock:
+            if settings is not None:
+                self.settings = dict(DEFAULT_ROUTING)
+                self.settings.update(settings)
+            current = {endpoint.url: endpoint for endpoint in self.endpoints}
+            self.endpoints = [current.get(url) or Endpoint(url) for url in urls]
+
+    def choose(self, exclude: Iterable[Endpoint] = ()) -> Optional[Endpoint]:
+        """Pick an endpoint for the next attempt; None once all have been excluded."""
+        excluded = set(map(id, exclude))
+        now = time.monotonic()
+        with self._lock:
+            remaining = [e for e in self.endpoints if id(e) not in excluded]
+            if not remaining:
+                return None
+            # An endpoint whose ejection ran out gets one trial request at a time
+            candidates = [e for e in remaining if not e.ejected(now)
+                          and (e.consecutive_failures < self.settings["failure_threshold"] or e.in_flight == 0)]
+            if not candidates:
+                # Everything is down: trying the one back soonest beats failing outright
+                return min(remaining, key=lambda e: e.ejected_until)
+            known = [e.ewma_ms for e in candidates if e.ewma_ms is not None]
+            # Unmeasured endpoints are assumed as fast as the best one so that they get tried
+            optimistic = min(known) if known else 1.0
+            weights = [1.0 / (max(e.ewma_ms if e.ewma_ms is not None else optimistic, 0.001)
+                              * (e.in_flight + 1)) for e in candidates]
+            return self._random.choices(candidates, weights)[0]
+
+    def acquire(self, endpoint: Endpoint):
+        with self._lock:
+            endpoint.in_flight += 1
+
+    def release(self, endpoint: Endpoint, latency_ms: Optional[float] = None, failed: bool = False,
+                abandoned: bool = False):
+        """End an attempt; a latency is recorded for successes and for abandoned slow attempts.
+
+        The time an ``abandoned`` attempt ran is only a lower bound of its
+        latency, so it can raise the endpoint's average but never lower it.
+        """
+        eject = False
+        with self._lock:
+            endpoint.in_flight = max(0, endpoint.in_flight - 1)
+            if abandoned and latency_ms is not None and endpoint.ewma_ms is not None:
+                latency_ms = max(latency_ms, endpoint.ewma_ms)
+            if latency_ms is not None:
+                alpha = self.settings["ewma_alpha"]
+                endpoint.ewma_ms = latency_ms if endpoint.ewma_ms is None \
+                    else alpha * latency_ms + (1 - alpha) * endpoint.ewma_ms
+            if failed:
+                endpoint.consecutive_failures += 1
+                if endpoint.consecutive_failures >= self.settings["failure_threshold"]:
+                    eject = True
+                    period = min(self.settings["ejection_seconds"] * 2 ** endpoint.ejections,
+                                 self.settings["max_ejection_seconds"])
+                    endpoint.ejections += 1
+                    endpoint.ejected_until = time.monotonic() + period
+                    logger.warning("Ejecting prediction endpoint %s for %.0fs", endpoint.url, period)
+        if eject:
+            self._start_health_checks()
+
+    def record_success(self, endpoint: Endpoint, latency_ms: float):
+        self.release(endpoint, latency_ms)
+        with self._lock:
+            self._latencies.append(latency_ms)
+            if endpoint.consecutive_failures or endpoint.ejections:
+                logger.info("Prediction endpoint %s is healthy again", endpoint.url)
+            endpoint.consecutive_failures = 0
+            endpoint.ejections = 0
+            endpoint.ejected_until = 0.0
+
+    def hedge_delay(self) -> float:
+        """Seconds to wait for an attempt before hedging it: the recent p95 latency."""
+        with self._lock:
+            samples = list(self._latencies)
+        if len(samples) < HEDGE_MIN_SAMPLES:
+            return self.settings["initial_hedge_delay"]
+        return max(latency_stats(samples)["p95_ms"] / 1000, self.settings["min_hedge_delay"])
+
+    def readmit(self, endpoint: Endpoint):
+        """Take an ejected endpoint back after a successful health check."""
+        with self._lock:
+            endpoint.ejected_until = 0.0
+            endpoint.consecutive_failures = 0
+        logger.info("Re-admitting prediction endpoint %s", endpoint.url)
+
+    def check_health(self, timeout: float = 5.0) -> int:
+        """Probe every ejected endpoint once; returns the number still ejected."""
+        now = time.monotonic()
+        with self._lock:
+            ejected = [e for e in self.endpoints if e.ejected(now)]
+        for endpoint in ejected:
+            if self._probe(endpoint.url, timeout):
+                self.readmit(endpoint)
+        now = time.monotonic()
+        with self._lock:
+            return sum(1 for e in self.endpoints if e.ejected(now))
+
+    def _start_health_checks(self):
+        with self._lock:
+            if self._health_thread is not None and self._health_thread.is_alive():
+                return
+            self._health_thread = threading.Thread(target=self._health_loop,
+                                                   name="endpoint-health", daemon=True)
+            self._health_thread.start()
+
+    def _health_loop(self):
+        # Runs only while some endpoint is ejected
+        interval = self.settings["health_interval_seconds"]
+        while True:
+            time.sleep(interval)
+            if self.check_health(timeout=interval) == 0:
+                return
+
+    def snapshot(self) -> List[Dict[str, Any]]:
+        now = time.monotonic()
+        with self._lock:
+            return [endpoint.to_dict(now) for endpoint in self.endpoints]
+
+
+class _Attempt:
+    __slots__ = ("endpoint", "call", "started", "released", "status")
+
+    def __init__(self, endpoint: Endpoint, call: PredictionCall):
+        self.endpoint = endpoint
+        self.call = call
+        self.started = time.monotonic()
+        self.released = False
+        self.status = 0
+
+    def elapsed_ms(self) -> float:
+        return (time.monotonic() - self.started) * 1000
+
+
+class RoutedCall:
+    """A cancellable prediction request spread over the endpoints of a pool.
+
+    Same interface as ``PredictionCall``: ``send()`` returns the status of
+    the winning attempt, ``read()`` its body and ``cancel()`` aborts every
+    attempt. ``url`` is the endpoint that answered. The whole call, a local
+    fallback included, is due once all its phase budgets have passed since
+    it was created; ``remaining()`` tells how long is left. Attempts share
+    that deadline: their phases end with it at the latest, and no further
+    attempt starts once it has passed.
+    """
+
+    def __init__(self, pool: EndpointPool, timeouts: Optional[Dict[str, float]] = None,
+                 hedge: Optional[bool] = None):
+        self.pool = pool
+        self.timeouts = timeouts
+        self.hedge = pool.settings["hedge"] if hedge is None else hedge
+        self.url: Optional[str] = None
+        self._cancelled = threading.Event()
+        self._lock = threading.Lock()
+        self._attempts: List[_Attempt] = []
+        self._winner: Optional[_Attempt] = None
+        self._on_cancel: List[Callable[[], None]] = []
+        budgets = dict(DEFAULT_TIMEOUTS)
+        budgets.update(timeouts or {})
+        self.deadline = time.monotonic() + sum(budgets.values())
+
+    @property
+    def cancelled(self) -> bool:
+        return self._cancelled.is_set()
+
+    def remaining(self) -> float:
+        """Seconds left until the call is due, at least 0."""
+        return max(0.0, self.deadline - time.monotonic())
+
+    def on_cancel(self, callback: Callable[[], None]):
+        """Call ``callback`` when the call is cancelled, at once if it already is."""
+        with self._lock:
+            if not self._cancelled.is_set():
+                self._on_cancel.append(callback)
+                return
+        callback()
+
+    def cancel(self):
+        with self._lock:
+            self._cancelled.set()
+            attempts = list(self._attempts)
+            callbacks, self._on_cancel = self._on_cancel, []
+        for attempt in attempts:
+            attempt.call.cancel()
+        for callback in callbacks:
+            callback()
+
+    def _release(self, attempt: _Attempt, latency_ms: Optional[float] = None, failed: bool = False,
+                 abandoned: bool = False):
+        if not attempt.released:
+            attempt.released = True
+            self.pool.release(attempt.endpoint, latency_ms, failed, abandoned)
+
+    def _start(self, endpoint: Endpoint, body: bytes, content_type: str, results: "queue.Queue") -> _Attempt:
+        attempt = _Attempt(endpoint, PredictionCall(endpoint.url, self.timeouts, deadline=self.deadline))
+        with self._lock:
+            if self._cancelled.is_set():
+                raise PredictionCancelled("Analysis was cancelled")
+            if self.remaining() <= 0:
+                raise PredictionTimeout(f"Prediction deadline exceeded before trying {endpoint.url}")
+            self._attempts.append(attempt)
+        self.pool.acquire(endpoint)
+
+        def run():
+            try:
+                results.put((attempt, attempt.call.send(body, content_type), None))
+            except Exception as e:
+                results.put((attempt, None, e))
+
+        threading.Thread(target=run, name="prediction-attempt", daemon=True).start()
+        return attempt
+
+    def send(self, body: bytes, content_type: str) -> int:
+        """Send the request, failing over and hedging as configured; returns the HTTP status."""
+        results: "queue.Queue" = queue.Queue()
+        tried = [self.pool.choose()]
+        self._start(tried[0], body, content_type, results)
+        pending = 1
+        max_attempts = min(self.pool.settings["max_attempts"], len(self.pool))
+        hedge_at = time.monotonic() + self.pool.hedge_delay() \
+            if self.hedge and max_attempts > 1 else None
+        failure: Optional[Exception] = None
+        failed_status: Optional[_Attempt] = None
+
+        while pending:
+            wait = None if hedge_at is None else max(0.0, hedge_at - time.monotonic())
+            try:
+                attempt, status, error = results.get(timeout=wait)
+            except queue.Empty:
+                hedge_at = None
+                endpoint = self.pool.choose(exclude=tried) if len(tried) < max_attempts else None
+                if endpoint is not None:
+                    logger.debug("Hedging prediction request to %s", endpoint.url)
+                    tried.append(endpoint)
+                    self._start(endpoint, body, content_type, results)
+                    pending += 1
+                continue
+            pending -= 1
+            attempt.status = status or 0
+
+            if error is None and status < 500:
+                self._win(attempt)
+                return status
+            if self._cancelled.is_set():
+                raise PredictionCancelled("Analysis was cancelled")
+
+            # A failed attempt counts against its endpoint; another one is tried if any is left
+            self._release(attempt, failed=True)
+            logger.warning("Prediction attempt at %s failed: %s", attempt.endpoint.url,
+                           error or f"HTTP {status}")
+            if error is None:
+                if failed_status is not None:
+                    failed_status.call.close()
+                failed_status = attempt
+            else:
+                attempt.call.close()
+                failure = error
+            endpoint = self.pool.choose(exclude=tried) if len(tried) < max_attempts else None
+            if endpoint is not None:
+                tried.append(endpoint)
+                self._start(endpoint, body, content_type, results)
+                pending += 1
+
+        if failed_status is not None:
+            # Every endpoint answered with an error; the caller reports the status
+            self._winner = failed_status
+            self.url = failed_status.endpoint.url
+            return failed_status.status
+        raise failure
+
+    def _win(self, attempt: _Attempt):
+        self._winner = attempt
+        self.url = attempt.endpoint.url
+        with self._lock:
+            others = [a for a in self._attempts if a is not attempt]
+        for other in others:
+            # The slower attempt still tells how slow its endpoint is at least
+            other.call.cancel()
+            self._release(other, latency_ms=other.elapsed_ms(), abandoned=True)
+
+    def read(self) -> bytes:
+        """Read the body of the winning attempt and record its latency."""
+        attempt = self._winner
+        try:
+            content = attempt.call.read()
+        except (PredictionCancelled, PredictionTimeout, OSError):
+            if not self._cancelled.is_set():
+                self._release(attempt, failed=True)
+            raise
+        if not attempt.released:
+            attempt.released = True
+            self.pool.record_success(attempt.endpoint, attempt.elapsed_ms())
+        return content
+
+    def close(self):
+        with self._lock:
+            attempts = list(self._attempts)
+        for attempt in attempts:
+            if attempt is not self._winner:
+                attempt.call.cancel()
+            attempt.call.close()
+            self._release(attempt)
+
+    def __enter__(self) -> "RoutedCall":
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
@@ -0,0 +1,203 @@
+"""Local stand-in for the prediction API.
+
+Answers ``POST /predict`` like the production service: a multipart upload
+with an ``image_file`` field returns ``is_mole``, ``mole_detection_probability``
+and, for moles, ``predictions`` per diagnosis. Latency, error rate and
+response size are configurable, so the client and the GUI can be exercised
+and load-tested without a network connection.
+
+    python -m backend.fake_prediction_server --port 8000 --latency-ms 300 --error-rate 0.05
+
+and point ``application.api_url`` (or ``--api-url``) at
+``http://127.0.0.1:8000/predict``.
+"""
+
+import argparse
+import json
+import logging
+import random
+import threading
+import time
+import zlib
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Any, Dict, Optional
+
+logger = logging.getLogger(__name__)
+
+DIAGNOSES = (
+    "Melanoma",
+    "Nevus",
+    "Basal cell carcinoma",
+    "Actinic keratosis",
+    "Benign keratosis-like lesions",
+    "Dermatofibroma",
+    "Vascular lesions",
+)
+
+
+class _Handler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+
+    def log_message(self, format, *args):
+        logger.debug("%s - %s", self.address_string(), format % args)
+
+    def _reply(self, status: int, payload: Dict[str, Any]):
+        content = json.dumps(payload).encode("utf-8")
+        try:
+            self.send_response(status)
+            self.send_header("Content-Type", "application/json")
+            self.send_header("Content-Length", str(len(content)))
+            self.end_headers()
+            self.wfile.write(content)
+        except (BrokenPipeError, ConnectionResetError):
+            # Cancelled and hedged clients hang up without waiting for the answer
+            logger.debug("Client %s disconnected", self.address_string())
+            self.close_connection = True
+
+    def do_POST(self):
+        fake = self.server.fake
+        length = int(self.headers.get("Content-Length") or 0)
+        body = self.rfile.read(length)
+        if self.path.split("?")[0] != fake.path:
+            self._reply(404, {"detail": "Not Found"})
+            return
+        if not self.headers.get("Content-Type", "").startswith("multipart/form-data") \
+                or b'name="image_file"' not in body:
+            fake.record("rejected")
+            self._reply(422, {"detail": "image_file is required"})
+            return
+
+        time.sleep(fake.next_latency())
+        if fake.next_failure():
+            fake.record("errors")
+            self._reply(500, {"detail": "Simulated server error"})
+            return
+        fake.record("ok")
+        self._reply(200, fake.make_result(body))
+
+
+class FakePredictionServer:
+    """The fake API on a background thread; use as a context manager or call start()/stop().
+
+    ``latency_ms`` plus a uniform ``jitter_ms`` is spent before every answer,
+    ``error_rate`` of the requests fail with HTTP 500, ``not_mole_rate`` of the
+    images are reported as not a mole and ``payload_bytes`` pads successful
+    responses to at least that size. ``seed`` makes the sequence reproducible.
+    """
+
+    def __init__(self, host: str = "127.0.0.1", port: int = 0, path: str = "/predict",
+                 latency_ms: float = 0.0, jitter_ms: float = 0.0, error_rate: float = 0.0,
+                 not_mole_rate: float = 0.0, payload_bytes: int = 0, seed: Optional[int] = None):
+        self.path = path
+        self.latency_ms = latency_ms
+        self.jitter_ms = jitter_ms
+        self.error_rate = error_rate
+        self.not_mole_rate = not_mole_rate
+        self.payload_bytes = payload_bytes
+        self._random = random.Random(seed)
+        self._lock = threading.Lock()
+        self._counts = {"ok": 0, "errors": 0, "rejected": 0}
+        self._httpd = ThreadingHTTPServer((host, port), _Handler)
+        self._httpd.daemon_threads = True
+        self._httpd.fake = self
+        self._thread = None
+
+    @property
+    def url(self) -> str:
+        host, port = self._httpd.server_address[:2]
+        return f"http://{host}:{port}{self.path}"
+
+    def stats(self) -> Dict[str, int]:
+        with self._lock:
+            return dict(self._counts, requests=sum(self._counts.values()))
+
+    def record(self, outcome: str):
+        with self._lock:
+            self._counts[outcome] += 1
+
+    def next_latency(self) -> float:
+        with self._lock:
+            jitter = self._random.uniform(0, self.jitter_ms) if self.jitter_ms else 0.0
+        return max(0.0, self.latency_ms + jitter) / 1000
+
+    def next_failure(self) -> bool:
+        with self._lock:
+            return self._random.random() < self.error_rate
+
+    def make_result(self, body: bytes) -> Dict[str, Any]:
+        """A plausible response; the same upload always gets the same probabilities."""
+        # Seeded by the file content only, the multipart boundary differs per upload
+        image = body.split(b"\r\n\r\n", 1)[-1].rsplit(b"\r\n--", 1)[0]
+        image_random = random.Random(zlib.crc32(image))
+        with self._lock:
+            is_mole = self._random.random() >= self.not_mole_rate
+        result: Dict[str, Any] = {"is_mole": is_mole}
+        if is_mole:
+            weights = [image_random.random() for _ in DIAGNOSES]
+            total = sum(weights)
+            result["mole_detection_probability"] = round(image_random.uniform(0.6, 1.0), 4)
+            result["predictions"] = {name: round(w / total, 4) for name, w in zip(DIAGNOSES, weights)}
+        else:
+            result["mole_detection_probability"] = round(image_random.uniform(0.0, 0.4), 4)
+        size = len(json.dumps(result))
+        if self.payload_bytes > size:
+            # Extra field sized so that the encoded response reaches payload_bytes
+            result["padding"] = "x" * max(0, self.payload_bytes - size - len(', "padding": ""'))
+        return result
+
+    def start(self) -> "FakePredictionServer":
+        self._thread = threading.Thread(target=self._httpd.serve_forever,
+                                        name="fake-prediction-server", daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        if self._thread is not None:
+            self._httpd.shutdown()
+            self._thread.join()
+            self._thread = None
+        self._httpd.server_close()
+
+    def serve_forever(self):
+        self._httpd.serve_forever()
+
+    def __enter__(self) -> "FakePredictionServer":
+        return self.start()
+
+    def __exit__(self, *exc):
+        self.stop()
+
+
+def build_parser() -> argparse.ArgumentParser:
+    parser = argparse.ArgumentParser(prog="fake_prediction_server",
+                                     description="Serve a local stand-in for the prediction API.")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8000)
+    parser.add_argument("--latency-ms", type=float, default=0.0, help="time spent per request")
+    parser.add_argument("--jitter-ms", type=float, default=0.0, help="uniform extra latency")
+    parser.add_argument("--error-rate", type=float, default=0.0, help="share of HTTP 500 answers")
+    parser.add_argument("--not-mole-rate", type=float, default=0.0, help="share of 'not a mole' answers")
+    parser.add_argument("--payload-bytes", type=int, default=0, help="minimum response size")
+    parser.add_argument("--seed", type=int)
+    return parser
+
+
+def main(argv=None) -> int:
+    args = build_parser().parse_args(argv)
+    logging.basicConfig(level=logging.INFO, format="%(asctime)s %(levelname)s %(name)s: %(message)s")
+    server = FakePredictionServer(args.host, args.port, latency_ms=args.latency_ms,
+                                  jitter_ms=args.jitter_ms, error_rate=args.error_rate,
+                                  not_mole_rate=args.not_mole_rate,
+                                  payload_bytes=args.payload_bytes, seed=args.seed)
+    logger.info("Serving %s", server.url)
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.stop()
+    return 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
@@ -0,0 +1,185 @@
+"""Decode-once image sessions.
+
+An ``ImageSession`` is created when the user loads an image. It reads the
+file once, keeps the raw bytes (used for saving and uploading) and decodes
+one pixel buffer on first use, from which the on-screen preview, thumbnails
+and model input tensors are all derived. The memory is dropped explicitly
+with ``release()`` once the analysis is finished.
+"""
+
+import io
+import itertools
+import logging
+import os
+import threading
+from typing import Dict, Optional, Tuple
+from urllib.parse import unquote
+
+import numpy as np
+from PIL import Image, ImageOps
+from PySide6.QtCore import QSize, Qt
+from PySide6.QtGui import QImage
+from PySide6.QtQuick import QQuickImageProvider
+
+logger = logging.getLogger(__name__)
+
+_MIME_TYPES = {
+    "JPEG": "image/jpeg",
+    "PNG": "image/png",
+    "BMP": "image/bmp",
+    "WEBP": "image/webp",
+}
+
+_session_ids = itertools.count(1)
+
+
+class ImageSession:
+    def __init__(self, source_path: str, raw: bytes, max_decode_edge: int = 2048):
+        self.id = next(_session_ids)
+        self.source_path = source_path
+        self.ext = os.path.splitext(source_path)[1]
+        self.max_decode_edge = max_decode_edge
+        self.stored_path = None
+        self._raw = raw
+        self._image = None
+        self._format = None
+        self._tensors: Dict[Tuple[int, int], np.ndarray] = {}
+        self._lock = threading.Lock()
+
+    @classmethod
+    def open(cls, path: str, max_decode_edge: int = 2048) -> "ImageSession":
+        """Read an image file once."""
+        path = path.replace("file://", "")
+        with open(path, "rb") as f:
+            return cls(path, f.read(), max_decode_edge)
+
+    @property
+    def released(self) -> bool:
+        return self._raw is None
+
+    @property
+    def raw(self) -> bytes:
+        """The file content exactly as loaded."""
+        if self._raw is None:
+            raise RuntimeError("Image session has been released")
+        return self._raw
+
+    @property
+    def image(self) -> Image.Image:
+        """The decoded RGB buffer, decoded on first access only."""
+        with self._lock:
+            if self._image is None:
+                img = Image.open(io.BytesIO(self.raw))
+                self._format = img.format
+                # JPEG decodes at a reduced scale when the full resolution is not needed
+                img.draft("RGB", (self.max_decode_edge, self.max_decode_edge))
+                img = ImageOps.exif_transpose(img).convert("RGB")
+                if max(img.size) > self.max_decode_edge:
+                    img.thumbnail((self.max_decode_edge, self.max_decode_edge), Image.LANCZOS)
+                self._image = img
+            return self._image
+
+    @property
+    def nbytes(self) -> int:
+        """Memory currently held by the session."""
+        total = len(self._raw) if self._raw is not None else 0
+        if self._image is not None:
+            total += self._image.width * self._image.height * 3
+        total += sum(t.nbytes for t in self._tensors.values())
+        return total
+
+    def upload_payload(self) -> Tuple[str, bytes, str]:
+        """(filename, bytes, mime type) for a multipart upload, without re-reading the file."""
+        if self._format is None:
+            with Image.open(io.BytesIO(self.raw)) as img:
+                self._format = img.format
+        mime = _MIME_TYPES.get(self._format, "application/octet-stream")
+        return os.path.basename(self.stored_path or self.source_path), self.raw, mime
+
+    def thumbnail(self, max_edge: int) -> Image.Image:
+        """A downscaled copy of the decoded buffer."""
+        thumb = self.image.copy()
+        thumb.thumbnail((max_edge, max_edge), Image.LANCZOS)
+        return thumb
+
+    def to_tensor(self, size: Tuple[int, int] = (224, 224)) -> np.ndarray:
+        """Model input of shape (1, height, width, 3) scaled to [0, 1]."""
+        with self._lock:
+            tensor = self._tensors.get(size)
+        if tensor is None:
+            resized = self.image.resize(size)
+            tensor = np.expand_dims(np.asarray(resized, dtype=np.float32) / 255.0, axis=0)
+            with self._lock:
+                self._tensors[size] = tensor
+        return tensor
+
+    def to_qimage(self, requested: Optional[QSize] = None) -> QImage:
+        """Preview image for QML, scaled down to the requested size if one is given."""
+        img = self.image
+        if requested is not None and (requested.width() > 0 or requested.height() > 0):
+            # A zero dimension in sourceSize means "keep the aspect ratio"
+            bound = (requested.width() if requested.width() > 0 else img.width,
+                     requested.height() if requested.height() > 0 else img.height)
+            if bound[0] < img.width or bound[1] < img.height:
+                img = img.copy()
+                img.thumbnail(bound, Image.LANCZOS)
+        data = img.tobytes("raw", "RGB")
+        # copy() detaches the QImage from the Python buffer
+        return QImage(data, img.width, img.height, img.width * 3, QImage.Format_RGB888).copy()
+
+    def share(self) -> "ImageSession":
+        """A second session on the same buffers, with the same ``id``, released independently.
+
+        A background analysis works on its own share, so loading the next
+        image (which releases this session) cannot pull the bytes or the
+        decoded buffer away from under it.
+        """
+        with self._lock:
+            shared = ImageSession(self.source_path, self.raw, self.max_decode_edge)
+            shared.id = self.id
+            shared.stored_path = self.stored_path
+            shared._image = self._image
+            shared._format = self._format
+            shared._tensors = dict(self._tensors)
+        return shared
+
+    def release(self):
+        """Drop the raw bytes, the decoded buffer and all derived tensors."""
+        with self._lock:
+            freed = self.nbytes
+            self._raw = None
+            self._image = None
+            self._tensors.clear()
+        logger.debug("Released image session %s (%d bytes)", self.id, freed)
+
+
+class SessionImageProvider(QQuickImageProvider):
+    """Serves ``image://session/<id>`` from the decoded buffer of the current session.
+
+    Once a session has been released the preview falls back to reading the
+    stored (or original) file, so views created later still show the image.
+    """
+
+    def __init__(self, session_getter):
+        super().__init__(QQuickImageProvider.Image)
+        self.session_getter = session_getter
+
+    def requestImage(self, id: str, size: QSize, requestedSize: QSize) -> QImage:
+        session = self.session_getter()
+        try:
+            session_id = int(unquote(id).split("/")[0])
+        except ValueError:
+            return QImage()
+        if session is None or session.id != session_id:
+            return QImage()
+
+        if not session.released:
+            image = session.to_qimage(requestedSize)
+        else:
+            image = QImage(session.stored_path or session.source_path)
+            if not image.isNull() and requestedSize.width() > 0:
+                image = image.scaledToWidth(requestedSize.width(), Qt.SmoothTransformation)
+        if size is not None:
+            size.setWidth(image.width())
+            size.setHeight(image.height())
+        return image
@@ -0,0 +1,204 @@
+"""Content-addressed storage for uploaded mole images.
+
+Files are named by the SHA-256 of their content and sharded into nested
+directories (``ab/cd/abcd....jpg``), so identical uploads are stored once,
+no two different images can collide on a name and no single directory grows
+without bound. Writes go to a temporary file in the destination directory
+and are published with an atomic rename. The file is synced before and its
+directory after the rename, so after a crash a stored path never names a
+missing or truncated image.
+"""
+
+import hashlib
+import logging
+import os
+import shutil
+import tempfile
+import time
+from pathlib import Path
+from typing import Iterator, NamedTuple, Optional
+
+logger = logging.getLogger(__name__)
+
+TEMP_PREFIX = ".tmp-"
+
+
+def _file_mode() -> int:
+    """Mode of a regular new file under the process umask; mkstemp creates files as 0600."""
+    # The umask can only be read by setting it; done once, at import
+    umask = os.umask(0)
+    os.umask(umask)
+    return 0o666 & ~umask
+
+
+FILE_MODE = _file_mode()
+
+
+def _fsync_file(path: str):
+    fd = os.open(path, os.O_RDWR)
+    try:
+        os.fsync(fd)
+    finally:
+        os.close(fd)
+
+
+def _fsync_dir(path: Path):
+    """Persist the entries of a directory, e.g. a rename into it; POSIX only."""
+    if os.name != "posix":
+        return
+    fd = os.open(str(path), os.O_RDONLY)
+    try:
+        os.fsync(fd)
+    finally:
+        os.close(fd)
+
+
+def resolve_uploads_dir(uploads_dir: str) -> Path:
+    """``uploads_dir`` from the config, relative to the project unless absolute."""
+    path = Path(uploads_dir)
+    if not path.is_absolute():
+        path = Path(__file__).parent.parent / path
+    return path
+
+
+class StoredImage(NamedTuple):
+    path: str
+    digest: str
+    size: int
+    deduplicated: bool
+
+
+class ImageStore:
+    def __init__(self, root: str, shard_levels: int = 2, shard_width: int = 2,
+                 chunk_size: int = 1024 * 1024):
+        self.root = Path(root)
+        self.shard_levels = shard_levels
+        self.shard_width = shard_width
+        self.chunk_size = chunk_size
+        self.root.mkdir(parents=True, exist_ok=True)
+
+    def _hash_file(self, path: str) -> str:
+        """Stream the file through SHA-256 without holding it in memory."""
+        digest = hashlib.sha256()
+        buffer = bytearray(self.chunk_size)
+        view = memoryview(buffer)
+        with open(path, "rb") as f:
+            while True:
+                read = f.readinto(buffer)
+                if not read:
+                    break
+                digest.update(view[:read])
+        return digest.hexdigest()
+
+    @staticmethod
+    def _normalize_ext(ext: str) -> str:
+        ext = ext.lower()
+        if ext and not ext.startswith("."):
+            ext = "." + ext
+        return ".jpg" if ext == ".jpeg" else ext
+
+    def path_for(self, digest: str, ext: str) -> Path:
+        """Sharded location of a blob with the given digest."""
+        shards = [digest[i * self.shard_width:(i + 1) * self.shard_width]
+                  for i in range(self.shard_levels)]
+        return self.root.joinpath(*shards, digest + self._normalize_ext(ext))
+
+    def _publish(self, target: Path, write) -> None:
+        """Write through a temp file next to the target and rename it into place."""
+        target.parent.mkdir(parents=True, exist_ok=True)
+        fd, tmp_path = tempfile.mkstemp(prefix=TEMP_PREFIX, dir=str(target.parent))
+        try:
+            write(fd, tmp_path)
+            # The rename must not reach the disk before the content it publishes
+            _fsync_file(tmp_path)
+            # Readable by the other processes of the installation, like any file we create
+            os.chmod(tmp_path, FILE_MODE)
+            os.replace(tmp_path, target)
+        except BaseException:
+            try:
+                os.unlink(tmp_path)
+            except OSError:
+                pass
+            raise
+        _fsync_dir(target.parent)
+
+    def save(self, source_path: str, ext: Optional[str] = None) -> StoredImage:
+        """Store a file, returning the existing blob if the content is already present.
+
+        The file is hashed first; only new content is copied, using
+        ``shutil.copyfile`` which delegates to a kernel-side copy
+        (``sendfile``/``fcopyfile``) where the platform provides one.
+        """
+        if ext is None:
+            ext = os.path.splitext(source_path)[1]
+        digest = self._hash_file(source_path)
+        target = self.path_for(digest, ext)
+        size = os.path.getsize(source_path)
+
+        if target.exists():
+            # Refresh the mtime so storage maintenance treats the blob as recently used
+            os.utime(target)
+            return StoredImage(str(target), digest, size, True)
+
+        def write(fd, tmp_path):
+            os.close(fd)
+            shutil.copyfile(source_path, tmp_path)
+
+        self._publish(target, write)
+        logger.debug("Stored %s as %s", source_path, target)
+        return StoredImage(str(target), digest, size, False)
+
+    def save_bytes(self, data: bytes, ext: str) -> StoredImage:
+        """Store an in-memory image under its content hash."""
+        digest = hashlib.sha256(data).hexdigest()
+        target = self.path_for(digest, ext)
+
+        if target.exists():
+            os.utime(target)
+            return StoredImage(str(target), digest, len(data), True)
+
+        def write(fd, tmp_path):
+            with os.fdopen(fd, "wb") as f:
+                f.write(data)
+
+        self._publish(target, write)
+        return StoredImage(str(target), digest, len(data), False)
+
+    def contains(self, path: str) -> bool:
+        """Whether a path lies inside this store."""
+        try:
+            Path(path).resolve().relative_to(self.root.resolve())
+            return True
+        except ValueError:
+            return False
+
+    def iter_files(self) -> Iterator[Path]:
+        """Walk every stored blob (including legacy flat files in the root)."""
+        for dirpath, dirnames, filenames in os.walk(self.root):
+            # Hidden directories hold derived data (e.g. thumbnails), not originals
+            dirnames[:] = [d for d in dirnames if not d.startswith(".")]
+            for name in filenames:
+                if name.startswith("."):
+                    continue
+                yield Path(dirpath) / name
+
+    def cleanup_temp_files(self, max_age: float = 0.0) -> int:
+        """Remove temp files left behind by an interrupted write.
+
+        Only files older than ``max_age`` seconds are removed, so writes
+        still in progress are left alone.
+        """
+        removed = 0
+        cutoff = time.time() - max_age
+        for dirpath, _, filenames in os.walk(self.root):
+            for name in filenames:
+                if name.startswith(TEMP_PREFIX):
+                    path = os.path.join(dirpath, name)
+                    try:
+                        if max_age and os.path.getmtime(path) > cutoff:
+                            continue
+                        os.unlink(path)
+                        removed += 1
+                    except OSError as e:
+                        logger.warning("Could not remove temp file %s: %s", name, e)
+        return removed
@@ -0,0 +1,408 @@
+"""Local inference in a pool of worker processes.
+
+Running the model in the GUI process ties it to one interpreter and makes it
+compete with Qt for the GIL. Each worker process here loads the model once
+and serves batches from a shared task queue. Input tensors are not pickled:
+the caller writes a batch into one of a fixed set of shared-memory slots
+and only the slot number travels through the queue. Only the small output
+arrays are sent back.
+
+A supervisor thread restarts workers that die. A batch lost in a crash is
+retried once on another worker, and fails with ``InferenceWorkerCrashed`` if
+it crashes that worker as well. A worker can also die between taking a batch
+and reporting it; such a batch is recognised once it stays unclaimed while a
+worker is idle, and is retried the same way. ``stats()`` reports queue depth, in-flight
+batches, restarts and latency.
+
+``InferencePool`` has the interface of ``LocalModel``, so ModelHandler can use
+either one for its local engine.
+"""
+
+import atexit
+import itertools
+import logging
+import multiprocessing
+import os
+import queue
+import threading
+import time
+from collections import deque
+from concurrent.futures import Future, TimeoutError as FutureTimeout
+from importlib import import_module
+from multiprocessing import shared_memory
+from pathlib import Path
+from typing import Any, Deque, Dict, List, Optional, Sequence, Tuple, Union
+
+import numpy as np
+
+from .local_model import DEFAULT_CLASSES, prediction_response, warmup
+from .prediction_client import PredictionCancelled, PredictionTimeout
+from .tracing import latency_stats
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_LOADER = "backend.local_model:load_predictor"
+
+
+class InferenceWorkerCrashed(RuntimeError):
+    """A batch crashed every worker process it was given to."""
+
+
+def available_cores() -> int:
+    try:
+        return len(os.sched_getaffinity(0))
+    except AttributeError:  # Not available on Windows and macOS
+        return os.cpu_count() or 1
+
+
+def worker_count(processes: Union[int, str] = "auto", max_processes: int = 4) -> int:
+    """Workers to start: ``auto`` leaves one core to the GUI, within ``max_processes``."""
+    if processes == "auto":
+        return max(1, min(available_cores() - 1, int(max_processes)))
+    return max(0, int(processes))
+
+
+def _worker_main(worker_id: int, loader: str, model_path: str, slot_names: List[str],
+                 input_shape: Tuple[int, ...], tasks, results):
+    """Entry point of a worker process."""
+    module_name, function_name = loader.split(":")
+    try:
+        predict = getattr(import_module(module_name), function_name)(model_path)
+        warmup(predict, input_shape)
+    except Exception as e:
+        results.put(("failed", worker_id, None, f"{type(e).__name__}: {e}"))
+        return
+    slots: Dict[int, shared_memory.SharedMemory] = {}
+    results.put(("ready", worker_id, None, None))
+    try:
+        while True:
+            task = tasks.get()
+            if task is None:
+                break
+            job_id, slot, count = task
+            # Written synchronously, so the supervisor knows the batch even if we crash next
+            results.put(("taken", worker_id, job_id, None))
+            try:
+                if slot not in slots:
+                    slots[slot] = shared_memory.SharedMemory(name=slot_names[slot])
+                batch = np.ndarray((count,) + tuple(input_shape), dtype=np.float32, buffer=slots[slot].buf)
+                output = np.asarray(predict(batch), dtype=np.float64)
+                results.put(("done", worker_id, job_id, output.tolist()))
+            except Exception as e:
+                results.put(("error", worker_id, job_id, f"{type(e).__name__}: {e}"))
+    finally:
+        for shm in slots.values():
+            shm.close()
+
+
+class _Job:
+    __slots__ = ("job_id", "slot", "count", "future", "submitted", "queued", "worker", "attempts",
+                 "unclaimed")
+
+    def __init__(self, job_id: int, slot: int, count: int):
+        self.job_id = job_id
+        self.slot = slot
+        self.count = count
+        self.future: Future = Future()
+        self.submitted = time.monotonic()
+        # When the batch was last put on the task queue
+        self.queued = self.submitted
+        self.worker: Optional[int] = None
+        self.attempts = 1
+        # Seen waiting while a worker was idle on the last supervisor round
+        self.unclaimed = False
+
+
+class InferencePool:
+    """Worker processes serving a model, fed through shared-memory slots."""
+
+    def __init__(self, model_path: str, classes: Sequence[str] = DEFAULT_CLASSES,
+                 processes: int = 1, input_shape: Tuple[int, ...] = (224, 224, 3),
+                 max_batch: int = 8, slots: Optional[int] = None,
+                 loader: str = DEFAULT_LOADER, supervise_interval: float = 0.2):
+        self.model_path = Path(model_path)
+        self.classes = list(classes)
+        self.processes = max(1, processes)
+        self.input_shape = tuple(input_shape)
+        self.max_batch = max_batch
+        self.slot_count = slots or self.processes * 2
+        self.loader = loader
+        self.supervise_interval = supervise_interval
+        self._context = multiprocessing.get_context("spawn")
+        self._lock = threading.Lock()
+        self._start_lock = threading.Lock()
+        self._started = False
+        self._stopping = False
+        self._job_ids = itertools.count(1)
+        self._worker_ids = itertools.count(1)
+        self._jobs: Dict[int, _Job] = {}
+        # (worker id, process) per worker slot; a restarted worker gets a new id
+        self._workers: List[Tuple[int, Any]] = []
+        self._dead: List[int] = []
+        self._last_death: Optional[float] = None
+        self._ready = set()
+        self._load_error: Optional[str] = None
+        self._slots: List[shared_memory.SharedMemory] = []
+        self._free_slots = None
+        self._latencies: Deque[float] = deque(maxlen=500)
+        self._counts = {"completed": 0, "failed": 0, "restarts": 0, "retried": 0}
+
+    # LocalModel interface
+
+    @property
+    def available(self) -> bool:
+        return self.model_path.is_file()
+
+    @property
+    def loaded(self) -> bool:
+        return bool(self._ready)
+
+    def preload(self):
+        """Start the workers; they load the model in parallel to the caller."""
+        if self.available:
+            self.start()
+
+    def predict(self, image: np.ndarray, timeout: Optional[float] = None, call=None) -> Dict[str, Any]:
+        """Classify a preprocessed batch of one image; returns a prediction API response.
+
+        Raises PredictionTimeout after ``timeout`` seconds, and PredictionCancelled
+        as soon as ``call`` (a RoutedCall) is cancelled.
+        """
+        future = self.submit(image)
+        if call is not None:
+            call.on_cancel(lambda: self._resolve(future, error=PredictionCancelled("Analysis was cancelled")))
+        try:
+            output = future.result(timeout)
+        except FutureTimeout:
+            error = PredictionTimeout(f"local inference deadline of {timeout:g}s exceeded")
+            self._resolve(future, error=error)
+            raise error
+        return prediction_response(output[0], self.classes)
+
+    # Pool
+
+    def start(self):
+        with self._start_lock:
+            if self._started:
+                return
+            slot_bytes = int(np.prod((self.max_batch,) + self.input_shape)) * np.dtype(np.float32).itemsize
+            self._slots = [shared_memory.SharedMemory(create=True, size=slot_bytes)
+                           for _ in range(self.slot_count)]
+            self._free_slots = queue.Queue()
+            for slot in range(self.slot_count):
+                self._free_slots.put(slot)
+            self._tasks = self._context.Queue()
+            # SimpleQueue writes immediately, nothing is lost when a worker dies right after
+            self._results = self._context.SimpleQueue()
+            self._workers = [self._spawn(index) for index in range(self.processes)]
+            self._collector = threading.Thread(target=self._collect, name="inference-results", daemon=True)
+            self._collector.start()
+            self._supervisor = threading.Thread(target=self._supervise, name="inference-supervisor", daemon=True)
+            self._supervisor.start()
+            self._started = True
+            atexit.register(self.shutdown)
+            logger.info("Started %d inference workers for %s", self.processes, self.model_path)
+
+    def _spawn(self, index: int) -> Tuple[int, Any]:
+        worker_id = next(self._worker_ids)
+        process = self._context.Process(
+            target=_worker_main, name=f"inference-worker-{index}", daemon=True,
+            args=(worker_id, self.loader, str(self.model_path), [s.name for s in self._slots],
+                  self.input_shape, self._tasks, self._results)
+        )
+        process.start()
+        return worker_id, process
+
+    def submit(self, batch: np.ndarray) -> Future:
+        """Queue a batch of preprocessed images; the future resolves to one output row per image.
+
+        Blocks while every shared-memory slot is in use, which bounds the
+        memory and the queue in front of slow workers.
+        """
+        batch = np.asarray(batch, dtype=np.float32)
+        if batch.ndim == len(self.input_shape):
+            batch = batch[np.newaxis]
+        if batch.shape[1:] != self.input_shape or not 1 <= len(batch) <= self.max_batch:
+            raise ValueError(f"Expected up to {self.max_batch} images of shape {self.input_shape}, "
+                             f"got {batch.shape}")
+        if self._stopping:
+            raise RuntimeError("Inference pool is shut down")
+        if self._load_error:
+            raise RuntimeError(f"Local model could not be loaded: {self._load_error}")
+        self.start()
+        slot = self._free_slots.get()
+        view = np.ndarray(batch.shape, dtype=np.float32, buffer=self._slots[slot].buf)
+        view[:] = batch
+        job = _Job(next(self._job_ids), slot, len(batch))
+        with self._lock:
+            self._jobs[job.job_id] = job
+        self._tasks.put((job.job_id, slot, job.count))
+        return job.future
+
+    def _resolve(self, future: Future, output=None, error: Optional[Exception] = None):
+        """Settle a future unless its caller already gave up on it."""
+        with self._lock:
+            if future.done():
+                return
+            if error is None:
+                future.set_result(output)
+            else:
+                future.set_exception(error)
+
+    def _finish(self, job: _Job, output=None, error: Optional[Exception] = None):
+        """Complete a job removed from ``_jobs``; called without the lock held."""
+        # The slot is only reused once the worker is done with it, even if the caller is not waiting
+        self._free_slots.put(job.slot)
+        self._resolve(job.future, output, error)
+
+    def _collect(self):
+        while True:
+            kind, worker_id, job_id, payload = self._results.get()
+            if kind == "stop":
+                return
+            if kind == "failed":
+                self._fail_loading(payload)
+                continue
+            finished = None
+            with self._lock:
+                if kind == "ready":
+                    self._ready.add(worker_id)
+                elif kind == "taken" and job_id in self._jobs:
+                    self._jobs[job_id].worker = worker_id
+                elif kind in ("done", "error") and job_id in self._jobs:
+                    finished = self._jobs.pop(job_id)
+                    if kind == "done":
+                        self._counts["completed"] += 1
+                        self._latencies.append((time.monotonic() - finished.submitted) * 1000)
+                    else:
+                        self._counts["failed"] += 1
+            if finished is not None:
+                if kind == "done":
+                    self._finish(finished, payload)
+                else:
+                    self._finish(finished, error=RuntimeError(f"Local inference failed: {payload}"))
+
+    def _fail_loading(self, error: str):
+        """A worker could not load the model; restarting would only fail again."""
+        logger.error("Inference worker could not load the model: %s", error)
+        with self._lock:
+            self._load_error = error
+            pending, self._jobs = list(self._jobs.values()), {}
+            self._counts["failed"] += len(pending)
+        for job in pending:
+            self._finish(job, error=RuntimeError(f"Local model could not be loaded: {error}"))
+
+    def _supervise(self):
+        while not self._stopping:
+            time.sleep(self.supervise_interval)
+            # Batches of workers found dead on the previous round: by now the
+            # collector has seen every message those workers wrote
+            dead, self._dead = self._dead, []
+            for worker_id in dead:
+                self._recover(worker_id)
+            if self._load_error:
+                continue
+            self._reclaim_unclaimed()
+            for index, (worker_id, process) in enumerate(list(self._workers)):
+                if process.is_alive() or self._stopping:
+                    continue
+                logger.warning("Inference worker %d exited with code %s, restarting",
+                               index, process.exitcode)
+                with self._lock:
+                    self._ready.discard(worker_id)
+                    self._counts["restarts"] += 1
+                    self._last_death = time.monotonic()
+                self._dead.append(worker_id)
+                self._workers[index] = self._spawn(index)
+
+    def _recover(self, worker_id: int):
+        """Retry or fail the batches a dead worker had taken."""
+        with self._lock:
+            lost = [job for job in self._jobs.values() if job.worker == worker_id]
+        self._retry_lost(lost)
+
+    def _reclaim_unclaimed(self):
+        """Retry batches that a worker took but died before reporting.
+
+        Such a batch looks queued forever. A queued batch is taken within
+        moments once a worker is idle, so one still waiting on two rounds in
+        a row while a worker was idle, and queued before a worker died, was lost.
+        """
+        with self._lock:
+            if self._last_death is None:
+                return
+            busy = {job.worker for job in self._jobs.values() if job.worker is not None}
+            idle = bool(self._ready - busy)
+            lost = []
+            for job in self._jobs.values():
+                waiting = idle and job.worker is None and job.queued < self._last_death
+                if waiting and job.unclaimed:
+                    lost.append(job)
+                job.unclaimed = waiting
+        if lost:
+            logger.warning("Inference batches %s were never reported by a worker",
+                           [job.job_id for job in lost])
+        self._retry_lost(lost)
+
+    def _retry_lost(self, lost: List[_Job]):
+        retry, failed = [], []
+        with self._lock:
+            for job in lost:
+                if self._jobs.get(job.job_id) is not job:
+                    continue
+                if job.attempts >= 2:
+                    del self._jobs[job.job_id]
+                    self._counts["failed"] += 1
+                    failed.append(job)
+                else:
+                    job.attempts += 1
+                    job.worker = None
+                    job.unclaimed = False
+                    job.queued = time.monotonic()
+                    self._counts["retried"] += 1
+                    retry.append(job)
+        for job in retry:
+            self._tasks.put((job.job_id, job.slot, job.count))
+        for job in failed:
+            self._finish(job, error=InferenceWorkerCrashed(
+                f"Local inference crashed worker processes {job.attempts} times"))
+
+    def stats(self) -> Dict[str, Any]:
+        """Queue depth, in-flight batches, worker health and latency of recent batches."""
+        with self._lock:
+            queued = sum(1 for job in self._jobs.values() if job.worker is None)
+            return dict(
+                self._counts,
+                workers=self.processes,
+                alive=sum(1 for _, p in self._workers if p.is_alive()),
+                ready=len(self._ready),
+                queue_depth=queued,
+                in_flight=len(self._jobs) - queued,
+                latency=latency_stats(self._latencies),
+            )
+
+    def shutdown(self, timeout: float = 5.0):
+        """Stop the workers, fail unfinished batches and free the shared memory."""
+        with self._start_lock:
+            if not self._started or self._stopping:
+                return
+            self._stopping = True
+        for _ in self._workers:
+            self._tasks.put(None)
+        deadline = time.monotonic() + timeout
+        for _, process in self._workers:
+            process.join(max(0.0, deadline - time.monotonic()))
+            if process.is_alive():
+                process.terminate()
+                process.join(1.0)
+        self._results.put(("stop", -1, None, None))
+        self._collector.join(timeout)
+        with self._lock:
+            pending, self._jobs = list(self._jobs.values()), {}
+        for job in pending:
+            self._resolve(job.future, error=RuntimeError("Inference pool was shut down"))
+        for shm in self._slots:
+            shm.close()
+            shm.unlink()
+        self._tasks.close()
+        atexit.unregister(self.shutdown)
@@ -0,0 +1,157 @@
+"""Concurrency load test of the prediction client.
+
+N client threads send the same image through ``ModelHandler.predict`` back to
+back, the way several workstations or a batch run would, and the run
+reports throughput, latency percentiles and errors. Without ``--api-url`` a
+``FakePredictionServer`` is started in-process, so the client side can be
+measured without touching the production service:
+
+    skinsight-loadtest mole.jpg --clients 1,4,16 --requests 50 --latency-ms 200
+"""
+
+import argparse
+import json
+import logging
+import os
+import sys
+import threading
+import time
+from collections import Counter
+from typing import Any, Callable, Dict, List, Optional
+
+from .tracing import latency_stats
+
+logger = logging.getLogger(__name__)
+
+
+def run_load_test(model, image_path: str, clients: int, requests_per_client: int,
+                  on_result: Optional[Callable[[float, Optional[Exception]], None]] = None) -> Dict[str, Any]:
+    """Run ``clients`` threads sending ``requests_per_client`` predictions each.
+
+    All clients are released at the same time so that the requests really
+    overlap. Answers of the local model (a result ``engine`` other than
+    "remote", after a failed request or while the circuit breaker is open)
+    are counted as ``local`` and left out of latency and throughput, which
+    describe the remote service only.
+    """
+    latencies: List[float] = []
+    errors: Counter = Counter()
+    local = 0
+    lock = threading.Lock()
+    start = threading.Barrier(clients + 1)
+
+    def client():
+        nonlocal local
+        start.wait()
+        for _ in range(requests_per_client):
+            began = time.perf_counter()
+            error = None
+            engine = "remote"
+            try:
+                result = model.predict(image_path)
+                engine = result.get("engine", "remote")
+            except Exception as e:
+                error = e
+            latency_ms = (time.perf_counter() - began) * 1000
+            with lock:
+                if engine != "remote":
+                    local += 1
+                else:
+                    latencies.append(latency_ms)
+                if error is not None:
+                    errors[str(error)] += 1
+            if on_result is not None:
+                on_result(latency_ms, error)
+
+    threads = [threading.Thread(target=client, name=f"load-client-{i}", daemon=True)
+               for i in range(clients)]
+    for thread in threads:
+        thread.start()
+    start.wait()
+    started = time.perf_counter()
+    for thread in threads:
+        thread.join()
+    wall_s = time.perf_counter() - started
+
+    total = clients * requests_per_client
+    remote = total - local
+    return {
+        "clients": clients,
+        "requests": total,
+        "ok": remote - sum(errors.values()),
+        "local": local,
+        "errors": sum(errors.values()),
+        "error_kinds": dict(errors.most_common(5)),
+        "wall_s": round(wall_s, 3),
+        "throughput_per_s": round(remote / wall_s, 3) if wall_s > 0 else 0.0,
+        "latency": latency_stats(latencies),
+    }
+
+
+def format_stats(stats: Dict[str, Any]) -> str:
+    latency = stats["latency"]
+    return (
+        f"clients {stats['clients']:>3}  requests {stats['requests']}  errors {stats['errors']}  "
+        f"local {stats['local']}  "
+        f"throughput {stats['throughput_per_s']:.2f}/s  "
+        f"latency ms p50 {latency['p50_ms']:.1f}  p95 {latency['p95_ms']:.1f}  "
+        f"p99 {latency['p99_ms']:.1f}  max {latency['max_ms']:.1f}"
+    )
+
+
+def _client_counts(value: str) -> List[int]:
+    try:
+        counts = [int(part) for part in value.split(",") if part.strip()]
+    except ValueError:
+        raise argparse.ArgumentTypeError(f"not a comma-separated list of numbers: {value}")
+    if not counts or min(counts) < 1:
+        raise argparse.ArgumentTypeError("client counts must be positive")
+    return counts
+
+
+def build_parser() -> argparse.ArgumentParser:
+    parser = argparse.ArgumentParser(prog="skinsight-loadtest",
+                                     description="Load-test the prediction client with concurrent requests.")
+    parser.add_argument("image", help="image sent with every request")
+    parser.add_argument("--clients", type=_client_counts, default=[1, 4, 16],
+                        help="concurrent clients, a comma-separated list runs one round each (default: 1,4,16)")
+    parser.add_argument("--requests", type=int, default=20, help="requests per client (default: 20)")
+    parser.add_argument("--api-url", help="prediction endpoint; a local fake server is used if omitted")
+    parser.add_argument("--latency-ms", type=float, default=100.0, help="fake server latency")
+    parser.add_argument("--jitter-ms", type=float, default=50.0, help="fake server latency jitter")
+    parser.add_argument("--error-rate", type=float, default=0.0, help="fake server share of HTTP 500")
+    parser.add_argument("--payload-bytes", type=int, default=0, help="fake server response size")
+    parser.add_argument("--json", action="store_true", help="print one JSON line per round")
+    return parser
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    args = build_parser().parse_args(argv)
+    logging.basicConfig(level=os.environ.get("SKINSIGHT_LOG_LEVEL", "WARNING").upper(),
+                        format="%(asctime)s %(levelname)s %(name)s: %(message)s")
+    if not os.path.isfile(args.image):
+        print(f"skinsight-loadtest: no such file: {args.image}", file=sys.stderr)
+        return 2
+
+    from .fake_prediction_server import FakePredictionServer
+    from .model_handler import ModelHandler
+
+    server = None
+    if not args.api_url:
+        server = FakePredictionServer(latency_ms=args.latency_ms, jitter_ms=args.jitter_ms,
+                                      error_rate=args.error_rate,
+                                      payload_bytes=args.payload_bytes).start()
+    model = ModelHandler()
+    model.api_url = args.api_url or server.url
+    try:
+        for clients in args.clients:
+            stats = run_load_test(model, args.image, clients, args.requests)
+            print(json.dumps(stats) if args.json else format_stats(stats))
+    finally:
+        if server is not None:
+            server.stop()
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,152 @@
+"""On-device inference with the model from the ``models`` directory.
+
+Used as the fallback while the remote prediction API is unavailable. The
+model is loaded on first use (or ahead of time with ``preload()``) and
+warmed up with one inference, and its output is returned in the same shape
+as an API response so that the rest of the application does not care which
+engine produced it. Both the Keras model and its TFLite variants (see
+``model_variants``) can be loaded.
+
+The bundled model classifies an already framed mole; it has no mole
+detector, so every image is reported as a mole and
+``mole_detection_probability`` is None.
+"""
+
+import logging
+import threading
+import time
+from pathlib import Path
+from typing import Any, Dict, List, Optional, Sequence, Tuple
+
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+# Output order of the two-class model (index 1 is melanoma)
+DEFAULT_CLASSES = ("Nevus", "Melanoma")
+
+
+class LocalModel:
+    def __init__(self, model_path: str, classes: Sequence[str] = DEFAULT_CLASSES,
+                 input_shape: Tuple[int, ...] = (224, 224, 3)):
+        self.model_path = Path(model_path)
+        self.classes: List[str] = list(classes)
+        self.input_shape = tuple(input_shape)
+        self._model = None
+        self._lock = threading.Lock()
+
+    @property
+    def available(self) -> bool:
+        """Whether there is a model file to fall back to."""
+        return self._model is not None or self.model_path.is_file()
+
+    @property
+    def loaded(self) -> bool:
+        return self._model is not None
+
+    def load(self):
+        """Load the model once; safe to call from several threads."""
+        with self._lock:
+            if self._model is None:
+                logger.info("Loading local model %s", self.model_path)
+                predict = load_predictor(str(self.model_path))
+                warmup(predict, self.input_shape)
+                self._model = predict
+        return self._model
+
+    def shutdown(self):
+        """Nothing to release; the model lives as long as the process."""
+
+    def preload(self):
+        """Load the model on a background thread, e.g. as soon as the remote path degrades."""
+        if self.available and not self.loaded:
+            threading.Thread(target=self._preload, name="local-model-load", daemon=True).start()
+
+    def _preload(self):
+        try:
+            self.load()
+        except Exception as e:
+            logger.error("Could not load local model: %s", e)
+
+    def predict(self, image: np.ndarray, timeout: Optional[float] = None, call=None) -> Dict[str, Any]:
+        """Classify a preprocessed batch of one image; returns a prediction API response.
+
+        Runs in the calling thread and cannot be interrupted, so ``timeout``
+        and ``call`` are only accepted for the interface of InferencePool.
+        """
+        output = np.asarray(self.load()(image))[0]
+        return prediction_response(output, self.classes)
+
+
+def prediction_response(output: Sequence[float], classes: Sequence[str]) -> Dict[str, Any]:
+    """A prediction API response for the model output of one image."""
+    if len(output) != len(classes):
+        raise RuntimeError(f"Local model returned {len(output)} classes, expected {len(classes)}")
+    return {
+        "is_mole": True,
+        "mole_detection_probability": None,
+        "predictions": {name: float(p) for name, p in zip(classes, output)},
+    }
+
+
+def load_keras_predictor(model_path: str):
+    """Load the Keras model and return a function from an input batch to class probabilities."""
+    import tensorflow as tf
+    model = tf.keras.models.load_model(model_path, compile=False)
+    return lambda batch: model.predict(batch, verbose=0)
+
+
+def _tflite_interpreter(model_path: str):
+    # The standalone runtimes are much smaller than TensorFlow; use one if installed
+    try:
+        from ai_edge_litert.interpreter import Interpreter
+    except ImportError:
+        try:
+            from tflite_runtime.interpreter import Interpreter
+        except ImportError:
+            import tensorflow as tf
+            Interpreter = tf.lite.Interpreter
+    return Interpreter(model_path=model_path)
+
+
+def load_tflite_predictor(model_path: str):
+    """Load a TFLite model and return a function from an input batch to class probabilities."""
+    interpreter = _tflite_interpreter(model_path)
+    input_index = interpreter.get_input_details()[0]["index"]
+    output_index = interpreter.get_output_details()[0]["index"]
+    interpreter.allocate_tensors()
+    lock = threading.Lock()  # an interpreter runs one inference at a time
+
+    def predict(batch):
+        batch = np.asarray(batch, dtype=np.float32)
+        with lock:
+            if tuple(interpreter.get_input_details()[0]["shape"]) != batch.shape:
+                interpreter.resize_tensor_input(input_index, batch.shape)
+                interpreter.allocate_tensors()
+            interpreter.set_tensor(input_index, batch)
+            interpreter.invoke()
+            return interpreter.get_tensor(output_index).copy()
+    return predict
+
+
+def load_predictor(model_path: str):
+    """Load a Keras or TFLite model, depending on the file extension."""
+    if Path(model_path).suffix.lower() == ".tflite":
+        return load_tflite_predictor(model_path)
+    return load_keras_predictor(model_path)
+
+
+def warmup(predict, input_shape: Tuple[int, ...]):
+    """Run one inference so that the first analysis does not pay for graph setup."""
+    started = time.monotonic()
+    predict(np.zeros((1,) + tuple(input_shape), dtype=np.float32))
+    logger.info("Local model warmed up in %.0f ms", (time.monotonic() - started) * 1000)
+
+
+def resolve_model_path(models_dir: str, model_file: str) -> Path:
+    """``models_dir``/``model_file``, relative to the project unless absolute."""
+    path = Path(models_dir)
+    if not path.is_absolute():
+        path = Path(__file__).parent.parent / path
+    return path / model_file
+
@@ -0,0 +1,430 @@
+"""Runtime metrics of the application in the Prometheus text format.
+
+Counters, gauges and histograms are registered once per process in
+``REGISTRY`` (``skinsight_*`` names) and updated where the work happens:
+the bridge counts analyses, the model handler times predictions and the
+database manager times its queries. Recording a value takes a lock and a
+dictionary lookup, cheap enough to stay enabled in production.
+
+Values that other objects already keep, such as cache hits, queue depths
+or the circuit breaker state, are read by collectors only when the
+metrics are rendered.
+
+``MetricsExporter`` serves the metrics on ``http://127.0.0.1:<port>/metrics``
+and/or writes them to a file for node_exporter's textfile collector, as
+set in the ``metrics`` config section. The hidden diagnostics panel
+(Ctrl+Shift+D) shows ``snapshot()``.
+"""
+
+import bisect
+import functools
+import logging
+import math
+import os
+import threading
+import time
+from contextlib import contextmanager
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from pathlib import Path
+from typing import Any, Callable, Dict, Iterator, List, Optional, Sequence, Tuple
+
+from .config import DEFAULT_METRICS
+
+logger = logging.getLogger(__name__)
+
+
+# Seconds; analyses over the network take up to tens of seconds
+LATENCY_BUCKETS = (0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+
+CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+
+
+def _format_value(value: float) -> str:
+    if math.isnan(value):
+        return "NaN"
+    if math.isinf(value):
+        return "+Inf" if value > 0 else "-Inf"
+    if value == int(value) and abs(value) < 1e15:
+        return str(int(value))
+    return repr(float(value))
+
+
+def _escape(value: str) -> str:
+    return value.replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _format_labels(labels: Sequence[Tuple[str, str]]) -> str:
+    if not labels:
+        return ""
+    return "{" + ",".join(f'{name}="{_escape(value)}"' for name, value in labels) + "}"
+
+
+class _Metric:
+    kind = ""
+
+    def __init__(self, name: str, documentation: str, labelnames: Sequence[str] = ()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self._values: Dict[Tuple[str, ...], Any] = {}
+        self._lock = threading.Lock()
+
+    def _key(self, labels: Dict[str, Any]) -> Tuple[str, ...]:
+        try:
+            key = tuple(str(labels[name]) for name in self.labelnames)
+        except KeyError:
+            key = None
+        if key is None or len(labels) != len(self.labelnames):
+            raise ValueError(f"{self.name} takes the labels {', '.join(self.labelnames) or 'none'}")
+        return key
+
+    def clear(self):
+        """Forget all label combinations, e.g. before a collector sets the current ones."""
+        with self._lock:
+            self._values.clear()
+
+    def samples(self) -> List[Tuple[str, Tuple[Tuple[str, str], ...], float]]:
+        """``(name, labels, value)`` of every series."""
+        with self._lock:
+            items = list(self._values.items())
+        return [(self.name, tuple(zip(self.labelnames, key)), float(value)) for key, value in items]
+
+
+class Counter(_Metric):
+    """A total that only goes up."""
+
+    kind = "counter"
+
+    def inc(self, amount: float = 1.0, **labels):
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0.0) + amount
+
+    def set_total(self, value: float, **labels):
+        """Set a total counted elsewhere (e.g. cache hits), from a collector."""
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = value
+
+    def value(self, **labels) -> float:
+        with self._lock:
+            return self._values.get(self._key(labels), 0.0)
+
+
+class Gauge(_Metric):
+    """A value that goes up and down."""
+
+    kind = "gauge"
+
+    def set(self, value: float, **labels):
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = value
+
+    def inc(self, amount: float = 1.0, **labels):
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0.0) + amount
+
+    def dec(self, amount: float = 1.0, **labels):
+        self.inc(-amount, **labels)
+
+    def value(self, **labels) -> float:
+        with self._lock:
+            return self._values.get(self._key(labels), 0.0)
+
+
+class Histogram(_Metric):
+    """Observations counted in cumulative buckets, with their sum and count."""
+
+    kind = "histogram"
+
+    def __init__(self, name: str, documentation: str, labelnames: Sequence[str] = (),
+                 buckets: Sequence[float] = LATENCY_BUCKETS):
+        super().__init__(name, documentation, labelnames)
+        self.buckets = tuple(sorted(buckets))
+
+    def observe(self, value: float, **labels):
+        key = self._key(labels)
+        index = bisect.bisect_left(self.buckets, value)
+        with self._lock:
+            series = self._values.get(key)
+            if series is None:
+                # Counts per bucket (the last one is +Inf), sum
+                series = self._values[key] = [[0] * (len(self.buckets) + 1), 0.0]
+            series[0][index] += 1
+            series[1] += value
+
+    @contextmanager
+    def time(self, **labels) -> Iterator[None]:
+        """Observe the duration of the enclosed block in seconds."""
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(time.perf_counter() - started, **labels)
+
+    def _series(self) -> List[Tuple[Tuple[str, ...], List[int], float]]:
+        with self._lock:
+            return [(key, list(counts), total) for key, (counts, total) in self._values.items()]
+
+    def samples(self) -> List[Tuple[str, Tuple[Tuple[str, str], ...], float]]:
+        samples = []
+        for key, counts, total in self._series():
+            labels = tuple(zip(self.labelnames, key))
+            cumulative = 0
+            for bound, count in zip(self.buckets + (math.inf,), counts):
+                cumulative += count
+                samples.append((f"{self.name}_bucket", labels + (("le", _format_value(bound)),), cumulative))
+            samples.append((f"{self.name}_sum", labels, total))
+            samples.append((f"{self.name}_count", labels, cumulative))
+        return samples
+
+    def summary(self) -> List[Dict[str, Any]]:
+        """Count, mean and bucket-interpolated p50/p95 per label combination."""
+        result = []
+        for key, counts, total in self._series():
+            count = sum(counts)
+            result.append({
+                "labels": dict(zip(self.labelnames, key)),
+                "count": count,
+                "mean": total / count if count else 0.0,
+                "p50": self._quantile(counts, 0.5),
+                "p95": self._quantile(counts, 0.95),
+            })
+        return result
+
+    def _quantile(self, counts: List[int], fraction: float) -> float:
+        """Linear interpolation within the bucket holding the quantile, like histogram_quantile()."""
+        rank = fraction * sum(counts)
+        cumulative = 0
+        for i, count in enumerate(counts):
+            if count and cumulative + count >= rank:
+                if i == len(self.buckets):  # above the largest bound
+                    return self.buckets[-1]
+                lower = self.buckets[i - 1] if i else 0.0
+                return lower + (self.buckets[i] - lower) * (rank - cumulative) / count
+            cumulative += count
+        return 0.0
+
+
+class MetricsRegistry:
+    """The metrics of a process and the collectors that update some of them when read."""
+
+    def __init__(self):
+        self._metrics: Dict[str, _Metric] = {}
+        self._collectors: Dict[str, Callable[[], None]] = {}
+        self._lock = threading.Lock()
+
+    def _register(self, cls, name: str, documentation: str, labelnames: Sequence[str], **kwargs) -> Any:
+        with self._lock:
+            metric = self._metrics.get(name)
+            if metric is None:
+                metric = self._metrics[name] = cls(name, documentation, labelnames, **kwargs)
+            elif type(metric) is not cls or metric.labelnames != tuple(labelnames):
+                raise ValueError(f"Metric {name} is already registered as another {metric.kind}")
+            return metric
+
+    def counter(self, name: str, documentation: str, labelnames: Sequence[str] = ()) -> Counter:
+        """The counter ``name``, created on first use."""
+        return self._register(Counter, name, documentation, labelnames)
+
+    def gauge(self, name: str, documentation: str, labelnames: Sequence[str] = ()) -> Gauge:
+        return self._register(Gauge, name, documentation, labelnames)
+
+    def histogram(self, name: str, documentation: str, labelnames: Sequence[str] = (),
+                  buckets: Sequence[float] = LATENCY_BUCKETS) -> Histogram:
+        return self._register(Histogram, name, documentation, labelnames, buckets=buckets)
+
+    def get(self, name: str) -> Optional[_Metric]:
+        return self._metrics.get(name)
+
+    def add_collector(self, key: str, collect: Callable[[], None]):
+        """Run ``collect`` before the metrics are read; a collector with the same key is replaced."""
+        with self._lock:
+            self._collectors[key] = collect
+
+    def remove_collector(self, key: str):
+        with self._lock:
+            self._collectors.pop(key, None)
+
+    def collect(self) -> List[_Metric]:
+        with self._lock:
+            collectors = list(self._collectors.items())
+            metrics = list(self._metrics.values())
+        for key, collect in collectors:
+            try:
+                collect()
+            except Exception as e:
+                logger.warning("Metrics collector %s failed: %s", key, e)
+        return sorted(metrics, key=lambda metric: metric.name)
+
+    def render(self) -> str:
+        """All metrics in the Prometheus text exposition format."""
+        lines = []
+        for metric in self.collect():
+            lines.append(f"# HELP {metric.name} {_escape(metric.documentation)}")
+            lines.append(f"# TYPE {metric.name} {metric.kind}")
+            for name, labels, value in metric.samples():
+                lines.append(f"{name}{_format_labels(labels)} {_format_value(value)}")
+        return "\n".join(lines) + "\n"
+
+    def snapshot(self) -> List[Dict[str, Any]]:
+        """One readable row per series, for the diagnostics panel."""
+        rows = []
+        for metric in self.collect():
+            if isinstance(metric, Histogram):
+                for series in metric.summary():
+                    rows.append({
+                        "name": metric.name,
+                        "labels": ", ".join(f"{k}={v}" for k, v in series["labels"].items()),
+                        "value": (f"n={series['count']}  mean={series['mean'] * 1000:.1f} ms  "
+                                  f"p50={series['p50'] * 1000:.1f} ms  p95={series['p95'] * 1000:.1f} ms"),
+                    })
+                continue
+            for _, labels, value in metric.samples():
+                rows.append({
+                    "name": metric.name,
+                    "labels": ", ".join(f"{k}={v}" for k, v in labels),
+                    "value": _format_value(round(value, 3)),
+                })
+        return rows
+
+
+def timed(histogram: Histogram, errors: Optional[Counter] = None, **labels):
+    """Decorator observing the duration of each call, and counting the calls that raise."""
+    def decorate(function):
+        @functools.wraps(function)
+        def wrapper(*args, **kwargs):
+            started = time.perf_counter()
+            try:
+                return function(*args, **kwargs)
+            except Exception:
+                if errors is not None:
+                    errors.inc(**labels)
+                raise
+            finally:
+                histogram.observe(time.perf_counter() - started, **labels)
+        return wrapper
+    return decorate
+
+
+REGISTRY = MetricsRegistry()
+
+_RESIDENT_MEMORY = REGISTRY.gauge("process_resident_memory_bytes", "Resident memory size in bytes")
+_CPU_SECONDS = REGISTRY.counter("process_cpu_seconds_total", "User and system CPU time spent in seconds")
+_THREADS = REGISTRY.gauge("skinsight_threads", "Python threads of the application")
+
+
+def _resident_memory_bytes() -> int:
+    try:
+        with open("/proc/self/statm", "r") as f:
+            return int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE")
+    except (OSError, ValueError, AttributeError):
+        pass
+    try:
+        import resource
+    except ImportError:  # Not available on Windows
+        return 0
+    # Peak rather than current size; kilobytes on Linux, bytes on macOS
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * 1024
+
+
+def _collect_process():
+    _RESIDENT_MEMORY.set(_resident_memory_bytes())
+    _CPU_SECONDS.set_total(time.process_time())
+    _THREADS.set(threading.active_count())
+
+
+REGISTRY.add_collector("process", _collect_process)
+
+
+class _Handler(BaseHTTPRequestHandler):
+    def log_message(self, format, *args):
+        logger.debug("%s - %s", self.address_string(), format % args)
+
+    def do_GET(self):
+        if self.path.split("?")[0] not in ("/metrics", "/"):
+            self.send_error(404)
+            return
+        content = self.server.registry.render().encode("utf-8")
+        self.send_response(200)
+        self.send_header("Content-Type", CONTENT_TYPE)
+        self.send_header("Content-Length", str(len(content)))
+        self.end_headers()
+        self.wfile.write(content)
+
+
+class MetricsExporter:
+    """Serves the metrics over HTTP and/or writes them to a file, on background threads."""
+
+    def __init__(self, registry: MetricsRegistry = REGISTRY, settings: Optional[Dict[str, Any]] = None):
+        self.registry = registry
+        self.settings = dict(DEFAULT_METRICS)
+        self.settings.update(settings or {})
+        self._server = None
+        self._stop = threading.Event()
+        self._threads: List[threading.Thread] = []
+
+    @property
+    def url(self) -> Optional[str]:
+        if self._server is None:
+            return None
+        host, port = self._server.server_address[:2]
+        return f"http://{host}:{port}/metrics"
+
+    def start(self):
+        port = int(self.settings["http_port"])
+        if port and self._server is None:
+            try:
+                self._server = ThreadingHTTPServer((self.settings["host"], port), _Handler)
+            except OSError as e:
+                # Another instance of the application already serves the port
+                logger.warning("Could not serve metrics on port %d: %s", port, e)
+            else:
+                self._server.daemon_threads = True
+                self._server.registry = self.registry
+                self._spawn(self._server.serve_forever, "metrics-http")
+                logger.info("Serving metrics on %s", self.url)
+        if self.settings["textfile"]:
+            self._spawn(self._write_loop, "metrics-textfile")
+
+    def _spawn(self, target, name: str):
+        thread = threading.Thread(target=target, name=name, daemon=True)
+        thread.start()
+        self._threads.append(thread)
+
+    def write_textfile(self):
+        """Write the metrics atomically, so a scraper never reads a partial file."""
+        path = Path(self.settings["textfile"])
+        path.parent.mkdir(parents=True, exist_ok=True)
+        tmp = path.with_name(f".{path.name}.{os.getpid()}.tmp")
+        tmp.write_text(self.registry.render(), encoding="utf-8")
+        os.replace(tmp, path)
+
+    def _write_loop(self):
+        while True:
+            try:
+                self.write_textfile()
+            except OSError as e:
+                logger.warning("Could not write metrics to %s: %s", self.settings["textfile"], e)
+            if self._stop.wait(float(self.settings["textfile_interval_seconds"])):
+                return
+
+    def reconfigure(self, settings: Dict[str, Any]):
+        """Restart serving and writing with new settings."""
+        self.stop()
+        self._stop.clear()
+        self.settings = dict(DEFAULT_METRICS)
+        self.settings.update(settings)
+        self.start()
+
+    def stop(self):
+        self._stop.set()
+        if self._server is not None:
+            self._server.shutdown()
+            self._server.server_close()
+            self._server = None
+        for thread in self._threads:
+            thread.join(timeout=5)
+        self._threads.clear()
@@ -1,42 +1,74 @@
 import os
+import time
+import logging
 import numpy as np
-import tensorflow as tf
-from PIL import Image
-from typing import Dict, Tuple
-import json
-from pathlib import Path
-import requests
+import threading
+from http.client import HTTPException
+from typing import Dict, List, Optional, Tuple, Union
 import json
 
+from .tracing import Tracer
+from .image_session import ImageSession
+from .circuit_breaker import CLOSED, HALF_OPEN, OPEN, CircuitBreaker
+from .config import DEFAULT_TIMEOUTS, Config, get_config
+from .endpoint_pool import EndpointPool, RoutedCall
+from .inference_pool import InferencePool, worker_count
+from .local_model import LocalModel, resolve_model_path
+from .metrics import REGISTRY
+from .model_variants import select_model
+from .prediction_client import (PredictionCancelled, PredictionRejected, PredictionTimeout,
+                                PredictionUnavailable, PredictionUnreachable, encode_multipart)
+
+logger = logging.getLogger(__name__)
+
+PREDICTION_SECONDS = REGISTRY.histogram("skinsight_prediction_seconds",
+                                        "Duration of successful predictions", ["engine"])
+PREDICTIONS = REGISTRY.counter("skinsight_predictions_total", "Predictions by outcome", ["outcome"])
+LOCAL_FALLBACKS = REGISTRY.counter("skinsight_local_fallbacks_total",
+                                   "Predictions answered locally after the remote path failed")
+BREAKER_STATE = REGISTRY.gauge("skinsight_circuit_breaker_state",
+                               "1 for the current state of the prediction API circuit breaker", ["state"])
+ENDPOINT_IN_FLIGHT = REGISTRY.gauge("skinsight_endpoint_in_flight", "Requests in flight per endpoint", ["url"])
+ENDPOINT_LATENCY = REGISTRY.gauge("skinsight_endpoint_latency_ewma_seconds",
+                                  "Smoothed response time per endpoint", ["url"])
+ENDPOINT_EJECTED = REGISTRY.gauge("skinsight_endpoint_ejected", "1 while an endpoint is ejected", ["url"])
+LOCAL_QUEUE = REGISTRY.gauge("skinsight_local_inference_queue_depth",
+                             "Local inference batches waiting for a worker process")
+LOCAL_IN_FLIGHT = REGISTRY.gauge("skinsight_local_inference_in_flight",
+                                 "Local inference batches being run by worker processes")
+LOCAL_WORKERS = REGISTRY.gauge("skinsight_local_inference_workers_alive", "Live local inference processes")
+LOCAL_BATCHES = REGISTRY.counter("skinsight_local_inference_batches_total",
+                                 "Local inference pool events", ["event"])
+
 class ModelHandler:
-    def __init__(self):
-        # Load config to get model path
-        config_path = Path(__file__).parent.parent / "config.json"
-        try:
-            with open(config_path, "r") as f:
-                config = json.load(f)
-                self.api_url = config["application"]["api_url"]
-                model_file = config["application"]["model_file"]
-        except Exception as e:
-            raise RuntimeError(f"Error loading config: {e}")
+    def __init__(self, tracer: Optional[Tracer] = None, config: Optional[Config] = None):
+        self.tracer = tracer or Tracer()
+        config = config or get_config()
+        if not config.application.api_url:
+            raise RuntimeError("Error loading config: application.api_url is not set")
+        self.timeouts = {key: config.prediction[key] for key in DEFAULT_TIMEOUTS}
+        # Requests are spread over api_url and any further endpoints in config.json
+        self.routing = dict(config.prediction)
+        self._explicit_url = None
+        self.pool = EndpointPool(self._endpoint_urls(config), self.routing)
 
-        # Construct absolute model path
-        #model_path = Path(__file__).parent.parent / models_dir / model_file
-        #if not model_path.exists():
-        #    raise FileNotFoundError(f"Model file not found at {model_path}")
-            
-        #self.model = tf.keras.models.load_model(str(model_path))
+        # The local model answers while the breaker keeps the remote path switched off
+        self.local_model = self._create_local_model(config)
+        self.breaker = CircuitBreaker(dict(config.circuit_breaker), on_change=self._on_breaker_change)
         self.image_size = (224, 224)  # Standard input size for many CNN models
+        REGISTRY.add_collector("model_handler", self._collect_metrics)
         
-    # def preprocess_image(self, image_path: str) -> np.ndarray:
-    #     """Preprocesses an image for model prediction."""
-    #     try:
-    #         img = Image.open(image_path).convert('RGB')
-    #         img = img.resize(self.image_size)
-    #         img_array = np.array(img).astype('float32') / 255.0
-    #         return np.expand_dims(img_array, axis=0)
-    #     except Exception as e:
-    #         raise RuntimeError(f"Error preprocessing image: {e}")
+    def preprocess_image(self, image: Union[str, ImageSession]) -> np.ndarray:
+        """Preprocesses an image (path or loaded session) for model prediction."""
+        try:
+            if not isinstance(image, ImageSession):
+                # Decoded like an image loaded in the GUI (orientation, size limit), so
+                # batch and queued analyses see the same input as interactive ones
+                image = ImageSession.open(image)
+            # Derived from the session's decoded buffer, no second decode
+            return image.to_tensor(self.image_size)
+        except Exception as e:
+            raise RuntimeError(f"Error preprocessing image: {e}")
 
     # def predict(self, image_path: str) -> Dict[str, float]:
     #     """
@@ -58,37 +90,230 @@ class ModelHandler:
     #     except Exception as e:
     #         raise RuntimeError(f"Error during prediction: {e}")
 
-    def predict(self, image_path: str) -> Dict[str, float]:
+    @property
+    def api_url(self) -> str:
+        """The primary prediction endpoint."""
+        return self.pool.urls[0]
+
+    @api_url.setter
+    def api_url(self, url: str):
+        # An explicit URL replaces the configured endpoints, also after a reload
+        self._explicit_url = url
+        self.pool = EndpointPool([url], self.routing)
+
+    def _endpoint_urls(self, config: Config) -> List[str]:
+        if self._explicit_url:
+            return [self._explicit_url]
+        return [config.application.api_url] + config.prediction.endpoints
+
+    def reconfigure(self, config: Config, changed: List[str]):
+        """Apply a reloaded config; ``changed`` names the sections that differ.
+
+        Endpoints that stay keep their statistics, and the breaker keeps its
+        recent calls. A new local model is started before the old one is shut
+        down, so analyses running meanwhile finish on the old one.
+        """
+        if "application" in changed and not config.application.api_url:
+            logger.warning("Ignoring the new prediction settings: application.api_url is not set")
+            return
+        if "prediction" in changed or "application" in changed:
+            self.timeouts = {key: config.prediction[key] for key in DEFAULT_TIMEOUTS}
+            self.routing = dict(config.prediction)
+            self.pool.reconfigure(self._endpoint_urls(config), self.routing)
+        if "circuit_breaker" in changed:
+            self.breaker.reconfigure(dict(config.circuit_breaker))
+        if "local_inference" in changed or "application" in changed:
+            model = self._create_local_model(config)
+            if model.model_path == self.local_model.model_path and "local_inference" not in changed:
+                return
+            old, self.local_model = self.local_model, model
+            if self.breaker.state == OPEN:
+                model.preload()
+            threading.Thread(target=old.shutdown, name="local-model-shutdown", daemon=True).start()
+
+    def create_call(self) -> RoutedCall:
+        """A cancellable request to the prediction API with the configured deadlines."""
+        return RoutedCall(self.pool, self.timeouts)
+
+    def predict(self, image_path: str, trace_id: Optional[str] = None,
+                session: Optional[ImageSession] = None,
+                call: Optional[RoutedCall] = None) -> Dict[str, float]:
         """
         Analyzes an image and returns prediction probabilities.
         Returns dict with melanoma_probability and benign_probability.
+        When the image is loaded in a session its bytes are uploaded directly.
+        Pass a ``call`` from ``create_call()`` to be able to cancel the request.
+        The result's ``engine`` is "remote", or "local" when the local model
+        answered because the remote path failed or its circuit breaker is open.
         """
-        try: 
-            image_file = {
-                "image_file": (os.path.basename(image_path), open(image_path, 'rb'), 'image/jpeg') 
-            }
-            # payload_metadata = {
-            #     "metadata": json.dumps({"age": 30, "sex": "Male", "location": "Trunk"})
-            # }   #'{"metadata": {"age": 30, "sex": "Male", "location": "Trunk"} }'
-            response = requests.post(
-                self.api_url, 
-                files = image_file
-                #data = payload_metadata
-            )
-            response_dict = json.loads(response.text)
+        started = time.perf_counter()
+        try:
+            result = self._predict(image_path, trace_id, session, call)
+        except PredictionCancelled:
+            PREDICTIONS.inc(outcome="cancelled")
+            raise
+        except PredictionRejected:
+            PREDICTIONS.inc(outcome="rejected")
+            raise
+        except Exception:
+            PREDICTIONS.inc(outcome="error")
+            raise
+        PREDICTIONS.inc(outcome="ok")
+        PREDICTION_SECONDS.observe(time.perf_counter() - started, engine=result["engine"])
+        return result
+
+    def _predict(self, image_path: str, trace_id: Optional[str], session: Optional[ImageSession],
+                 call: Optional[RoutedCall]) -> Dict:
+        call = call or self.create_call()
+        if not self.breaker.allow():
+            if not self.local_model.available:
+                raise PredictionUnavailable(
+                    f"Prediction service is unavailable, retrying in {self.breaker.retry_in():.0f}s"
+                )
+            return self._predict_locally(image_path, trace_id, session, call)
+
+        started = time.monotonic()
+        try:
+            result = self._predict_remote(image_path, trace_id, session, call)
+        except PredictionCancelled:
+            self.breaker.discard()
+            raise
+        except PredictionRejected:
+            self.breaker.record(True, (time.monotonic() - started) * 1000)
+            raise
+        except Exception as e:
+            self.breaker.record(False, (time.monotonic() - started) * 1000)
+            if not self.local_model.available:
+                raise
+            logger.warning("Remote prediction failed, using the local model: %s", e)
+            LOCAL_FALLBACKS.inc()
+            return self._predict_locally(image_path, trace_id, session, call)
+        self.breaker.record(True, (time.monotonic() - started) * 1000)
+        result["engine"] = "remote"
+        return result
+
+    def _predict_locally(self, image_path: str, trace_id: Optional[str],
+                         session: Optional[ImageSession], call: RoutedCall) -> Dict:
+        if call.cancelled:
+            raise PredictionCancelled("Analysis was cancelled")
+        try:
+            with self.tracer.span("local_inference", trace_id):
+                image = session if session is not None and not session.released else image_path
+                result = self.local_model.predict(self.preprocess_image(image), timeout=call.remaining(),
+                                                  call=call)
+        except (PredictionCancelled, PredictionTimeout):
+            raise
+        except Exception as e:
+            raise RuntimeError(f"Error during local prediction: {e}")
+        result["engine"] = "local"
+        return result
+
+    @staticmethod
+    def _create_local_model(config: Config):
+        """A pool of inference processes, or the in-process model when ``processes`` is 0.
+
+        Runs the fastest verified variant of ``model_file`` built by ``model_variants``.
+        """
+        settings = dict(config.local_inference)
+        model_path = str(select_model(resolve_model_path(config.application.models_dir,
+                                                         config.application.model_file), settings))
+        processes = worker_count(settings["processes"], settings["max_processes"])
+        if processes == 0:
+            return LocalModel(model_path)
+        return InferencePool(model_path, processes=processes, max_batch=int(settings["max_batch"]))
+
+    def _collect_metrics(self):
+        state = self.breaker.state
+        for name in (CLOSED, OPEN, HALF_OPEN):
+            BREAKER_STATE.set(1 if name == state else 0, state=name)
+        # Endpoints change when api_url is replaced
+        for gauge in (ENDPOINT_IN_FLIGHT, ENDPOINT_LATENCY, ENDPOINT_EJECTED):
+            gauge.clear()
+        for endpoint in self.pool.snapshot():
+            ENDPOINT_IN_FLIGHT.set(endpoint["in_flight"], url=endpoint["url"])
+            ENDPOINT_EJECTED.set(1 if endpoint["ejected"] else 0, url=endpoint["url"])
+            if endpoint["ewma_ms"] is not None:
+                ENDPOINT_LATENCY.set(endpoint["ewma_ms"] / 1000, url=endpoint["url"])
+        if isinstance(self.local_model, InferencePool):
+            stats = self.local_model.stats()
+            LOCAL_QUEUE.set(stats["queue_depth"])
+            LOCAL_IN_FLIGHT.set(stats["in_flight"])
+            LOCAL_WORKERS.set(stats["alive"])
+            for event in ("completed", "failed", "restarts", "retried"):
+                LOCAL_BATCHES.set_total(stats[event], event=event)
+
+    def _on_breaker_change(self, old: str, new: str):
+        if new == OPEN:
+            # Loading takes seconds; do it before the next analysis needs it
+            self.local_model.preload()
+
+    def _predict_remote(self, image_path: str, trace_id: Optional[str],
+                        session: Optional[ImageSession], call: RoutedCall) -> Dict:
+        try:
+            with self.tracer.span("encode", trace_id) as span:
+                if session is not None and not session.released:
+                    filename, data, mime = session.upload_payload()
+                else:
+                    with open(image_path, 'rb') as f:
+                        filename, data, mime = os.path.basename(image_path), f.read(), 'image/jpeg'
+                # payload_metadata = {
+                #     "metadata": json.dumps({"age": 30, "sex": "Male", "location": "Trunk"})
+                # }   #'{"metadata": {"age": 30, "sex": "Male", "location": "Trunk"} }'
+                body, content_type = encode_multipart("image_file", filename, data, mime)
+                span.add_bytes(len(body))
+
+            try:
+                with call:
+                    # Headers arrive once the upload is done and the server has run inference
+                    with self.tracer.span("request", trace_id) as span:
+                        status = call.send(body, content_type)
+                        span.add_bytes(len(body))
+                        span.set(url=call.url, status=status)
+
+                    with self.tracer.span("download", trace_id) as span:
+                        content = call.read()
+                        span.add_bytes(len(content))
+            except (OSError, HTTPException) as e:
+                raise PredictionUnreachable(f"Error during prediction: {e}") from e
+
+            if 400 <= status < 500:
+                raise PredictionRejected(f"Error during prediction: Prediction API returned HTTP {status}")
+            if status >= 500:
+                raise PredictionUnreachable(f"Error during prediction: Prediction API returned HTTP {status}")
+
+            with self.tracer.span("parse", trace_id) as span:
+                response_dict = json.loads(content)
+                span.add_bytes(len(content))
 
             return response_dict
+        except (PredictionCancelled, PredictionTimeout, PredictionRejected, PredictionUnreachable):
+            raise
         except Exception as e:
             raise RuntimeError(f"Error during prediction: {e}")
-        finally:
-            # Ensure the file is closed if it was opened
-            if 'image_file' in image_file and image_file['image_file'][1]:
-                try:
-                    image_file['image_file'][1].close()
-                except Exception as fe:
-                    print(f"Error closing file: {fe}")
 
 
+    def to_analysis_result(self, model_result: Dict, image_path: str) -> Dict:
+        """Turn a prediction API response into the analysis result shown and saved."""
+        engine = model_result.get("engine", "remote")
+        if not model_result["is_mole"]:
+            return {
+                "image_path": image_path,
+                "is_mole": model_result["is_mole"],
+                "mole_detection_probability": model_result["mole_detection_probability"],
+                "engine": engine
+            }
+        diagnosis, detail_text = self.get_prediction_text(model_result["predictions"]["Melanoma"])
+        return {
+            "melanoma_probability": model_result["predictions"]["Melanoma"],
+            "predictions": model_result["predictions"],
+            "diagnosis": "Melanoma", #diagnosis,
+            "detail_text": detail_text,
+            "image_path": image_path,
+            "is_mole": model_result["is_mole"],
+            "mole_detection_probability": model_result["mole_detection_probability"],
+            "engine": engine
+        }
+
     def get_prediction_text(self, melanoma_prob: float) -> Tuple[str, str]:
         """Returns a tuple of (diagnosis, detailed_text) based on probabilities."""
         
@@ -0,0 +1,279 @@
+"""Optimized CPU variants of the local model.
+
+    skinsight-model-variants validation_images/
+    skinsight-model-variants validation_images/ --variants float16,dynamic --limit 200
+
+The Keras ``model_file`` is converted to TFLite variants next to it
+(``model.float16.tflite`` etc.):
+
+- ``float32``: the same weights without the Keras runtime overhead
+- ``float16``: half-precision weights, half the file size
+- ``dynamic``: int8 weights, activations quantized on the fly
+- ``int8``: int8 weights and activations, calibrated on every fourth
+  validation image; those images are left out of the evaluation
+
+Every variant is run on the validation images next to the reference model
+and its largest probability difference, top-1 agreement and single-image
+latency are written to ``variants.json`` in the models directory. Run the
+tool on the machine the application runs on, since the latencies decide.
+
+At startup ``select_model()`` reads that manifest and picks the fastest
+variant within the tolerances of the ``local_inference`` config section.
+Variants built from a different model file are ignored; the model file is
+only hashed to find out when its size or modification time has changed.
+"""
+
+import argparse
+import hashlib
+import json
+import logging
+import os
+import sys
+import threading
+import time
+from functools import partial
+from pathlib import Path
+from typing import Any, Callable, Dict, List, Optional, Sequence, Tuple
+
+import numpy as np
+
+from .batch_cli import iter_images
+from .config import get_config
+from .image_session import ImageSession
+from .local_model import load_tflite_predictor, resolve_model_path
+from .tracing import latency_stats
+
+logger = logging.getLogger(__name__)
+
+VARIANTS = ("float32", "float16", "dynamic", "int8")
+MANIFEST_FILE = "variants.json"
+REFERENCE = "reference"
+# Every CALIBRATION_STRIDE-th validation image calibrates the int8 variant
+CALIBRATION_STRIDE = 4
+
+# Path -> (mtime_ns, size, digest) of files hashed by this process
+_digests: Dict[str, Tuple[int, int, str]] = {}
+_digests_lock = threading.Lock()
+
+
+def variant_path(model_path: Path, name: str) -> Path:
+    """Where the variant ``name`` of a model is stored, e.g. ``model.float16.tflite``."""
+    return model_path.with_name(f"{model_path.stem}.{name}.tflite")
+
+
+def file_sha256(path: Path, chunk_size: int = 1 << 20) -> str:
+    """SHA-256 of a file, remembered until its modification time or size changes."""
+    stat = os.stat(path)
+    key = os.path.abspath(path)
+    with _digests_lock:
+        cached = _digests.get(key)
+    if cached is not None and cached[:2] == (stat.st_mtime_ns, stat.st_size):
+        return cached[2]
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(chunk_size), b""):
+            digest.update(chunk)
+    with _digests_lock:
+        _digests[key] = (stat.st_mtime_ns, stat.st_size, digest.hexdigest())
+    return digest.hexdigest()
+
+
+def is_source(manifest: Dict[str, Any], model_path: Path) -> bool:
+    """Whether a manifest was built from ``model_path``; hashes it only if it was touched since."""
+    if manifest.get("source") != model_path.name:
+        return False
+    stat = model_path.stat()
+    if (manifest.get("source_mtime_ns"), manifest.get("source_size")) == (stat.st_mtime_ns, stat.st_size):
+        return True
+    return manifest.get("source_sha256") == file_sha256(model_path)
+
+
+def split_calibration(images: np.ndarray) -> Tuple[Optional[np.ndarray], np.ndarray]:
+    """(calibration, evaluation) images; a variant must not be judged on its calibration data."""
+    if len(images) < 2:
+        return None, images
+    held_out = np.zeros(len(images), dtype=bool)
+    held_out[::CALIBRATION_STRIDE] = True
+    return images[held_out], images[~held_out]
+
+
+def load_validation_images(directory: str, image_size: Sequence[int],
+                           limit: Optional[int] = None) -> np.ndarray:
+    """Validation images preprocessed like ``ModelHandler.preprocess_image``."""
+    images = []
+    for path in iter_images(Path(directory)):
+        images.append(ImageSession.open(str(path)).to_tensor(tuple(image_size))[0])
+        if limit and len(images) >= limit:
+            break
+    if not images:
+        raise ValueError(f"No validation images in {directory}")
+    return np.stack(images)
+
+
+def convert(model, name: str, representative: Optional[np.ndarray] = None) -> bytes:
+    """Convert a Keras model to the TFLite variant ``name``."""
+    import tensorflow as tf
+    converter = tf.lite.TFLiteConverter.from_keras_model(model)
+    if name == "float16":
+        converter.optimizations = [tf.lite.Optimize.DEFAULT]
+        converter.target_spec.supported_types = [tf.float16]
+    elif name == "dynamic":
+        converter.optimizations = [tf.lite.Optimize.DEFAULT]
+    elif name == "int8":
+        if representative is None:
+            raise ValueError("The int8 variant needs representative images")
+        converter.optimizations = [tf.lite.Optimize.DEFAULT]
+        converter.representative_dataset = lambda: ([image[np.newaxis]] for image in representative)
+        # Inputs and outputs stay float32, so the variant is a drop-in replacement
+        converter.target_spec.supported_ops = [tf.lite.OpsSet.TFLITE_BUILTINS_INT8]
+    elif name != "float32":
+        raise ValueError(f"Unknown variant {name!r}, expected one of {', '.join(VARIANTS)}")
+    return converter.convert()
+
+
+def evaluate(reference: np.ndarray, predict: Callable[[np.ndarray], Any],
+             images: np.ndarray) -> Dict[str, Any]:
+    """Agreement of a model with the reference outputs, and its latency on single images."""
+    predict(images[:1])  # warmup
+    outputs, durations = [], []
+    for image in images:
+        started = time.perf_counter()
+        outputs.append(np.asarray(predict(image[np.newaxis]))[0])
+        durations.append((time.perf_counter() - started) * 1000)
+    outputs = np.stack(outputs)
+    return {
+        "max_abs_diff": round(float(np.max(np.abs(outputs - reference))), 6),
+        "agreement": round(float(np.mean(outputs.argmax(axis=1) == reference.argmax(axis=1))), 4),
+        "latency_ms": latency_stats(durations)["p50_ms"],
+    }
+
+
+def build_variants(model_path: str, validation_dir: str, variants: Sequence[str] = VARIANTS,
+                   limit: Optional[int] = None) -> Dict[str, Any]:
+    """Convert and evaluate the variants of a Keras model and write the manifest next to it."""
+    import tensorflow as tf
+    source = Path(model_path)
+    model = tf.keras.models.load_model(str(source), compile=False)
+    images = load_validation_images(validation_dir, model.input_shape[1:3], limit)
+    calibration = None
+    if "int8" in variants:
+        calibration, images = split_calibration(images)
+
+    keras_predict = partial(model.predict, verbose=0)  # as in load_keras_predictor
+    reference = np.stack([np.asarray(keras_predict(image[np.newaxis]))[0] for image in images])
+    entries = [dict(name=REFERENCE, file=source.name, **evaluate(reference, keras_predict, images))]
+    for name in variants:
+        target = variant_path(source, name)
+        try:
+            target.write_bytes(convert(model, name, calibration))
+            entry = evaluate(reference, load_tflite_predictor(str(target)), images)
+        except Exception as e:
+            logger.error("Could not build the %s variant: %s", name, e)
+            continue
+        entries.append(dict(name=name, file=target.name, size_bytes=target.stat().st_size, **entry))
+
+    stat = source.stat()
+    manifest = {
+        "source": source.name,
+        "source_sha256": file_sha256(source),
+        "source_size": stat.st_size,
+        "source_mtime_ns": stat.st_mtime_ns,
+        "validation_images": len(images),
+        "calibration_images": 0 if calibration is None else len(calibration),
+        "variants": entries,
+    }
+    with open(source.parent / MANIFEST_FILE, "w") as f:
+        json.dump(manifest, f, indent=2)
+    return manifest
+
+
+def select_model(model_path: Path, settings: Dict[str, Any]) -> Path:
+    """The model file to run: the fastest variant within tolerances, or ``model_path`` itself.
+
+    ``settings`` is the ``local_inference`` config section; its ``variant`` is
+    "auto", "reference" or the name of a variant to use unconditionally.
+    """
+    choice = settings.get("variant", "auto")
+    if choice == REFERENCE:
+        return model_path
+    if choice != "auto":
+        path = variant_path(model_path, choice)
+        if path.is_file():
+            return path
+        logger.warning("Model variant %s not found, using %s", path.name, model_path.name)
+        return model_path
+
+    manifest_path = model_path.parent / MANIFEST_FILE
+    if not manifest_path.is_file() or not model_path.is_file():
+        return model_path
+    try:
+        with open(manifest_path, "r") as f:
+            manifest = json.load(f)
+        if not is_source(manifest, model_path):
+            logger.warning("%s was built for another model file, using %s", MANIFEST_FILE, model_path.name)
+            return model_path
+        candidates = [
+            entry for entry in manifest["variants"]
+            if (entry["name"] == REFERENCE
+                or (entry["max_abs_diff"] <= float(settings["max_abs_diff"])
+                    and entry["agreement"] >= float(settings["min_agreement"])))
+            and (model_path.parent / entry["file"]).is_file()
+        ]
+    except Exception as e:
+        logger.warning("Could not read %s: %s", MANIFEST_FILE, e)
+        return model_path
+    if not candidates:
+        return model_path
+    best = min(candidates, key=lambda entry: entry["latency_ms"])
+    logger.info("Using model variant %s (%.1f ms per image)", best["name"], best["latency_ms"])
+    return model_path.parent / best["file"]
+
+
+def format_manifest(manifest: Dict[str, Any]) -> str:
+    calibration = manifest.get("calibration_images")
+    lines = [f"{manifest['source']}, {manifest['validation_images']} validation images"
+             + (f" ({calibration} more for int8 calibration)" if calibration else ""),
+             f"{'variant':<10} {'max diff':>9} {'agreement':>10} {'p50 ms':>8}"]
+    for entry in manifest["variants"]:
+        lines.append(f"{entry['name']:<10} {entry['max_abs_diff']:>9.4f} "
+                     f"{entry['agreement']:>10.2%} {entry['latency_ms']:>8.2f}")
+    return "\n".join(lines)
+
+
+def build_parser() -> argparse.ArgumentParser:
+    parser = argparse.ArgumentParser(prog="skinsight-model-variants",
+                                     description="Build and verify optimized CPU variants of the local model.")
+    parser.add_argument("validation_dir", help="directory with validation images")
+    parser.add_argument("--model", help="Keras model file (default: models_dir/model_file from config.json)")
+    parser.add_argument("--variants", default=",".join(VARIANTS),
+                        help=f"comma-separated variants to build (default: {','.join(VARIANTS)})")
+    parser.add_argument("--limit", type=int, help="use at most this many validation images")
+    parser.add_argument("--json", action="store_true", help="print the manifest as JSON")
+    return parser
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    args = build_parser().parse_args(argv)
+    logging.basicConfig(level=os.environ.get("SKINSIGHT_LOG_LEVEL", "WARNING").upper(),
+                        format="%(asctime)s %(levelname)s %(name)s: %(message)s")
+    model_path = args.model
+    if model_path is None:
+        application = get_config().application
+        model_path = str(resolve_model_path(application.models_dir, application.model_file))
+
+    variants = [name.strip() for name in args.variants.split(",") if name.strip()]
+    unknown = set(variants) - set(VARIANTS)
+    if unknown:
+        print(f"skinsight-model-variants: unknown variants: {', '.join(sorted(unknown))}", file=sys.stderr)
+        return 2
+    try:
+        manifest = build_variants(model_path, args.validation_dir, variants, args.limit)
+    except (OSError, ValueError) as e:
+        print(f"skinsight-model-variants: {e}", file=sys.stderr)
+        return 2
+    print(json.dumps(manifest, indent=2) if args.json else format_manifest(manifest))
+    return 0 if len(manifest["variants"]) == len(variants) + 1 else 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())
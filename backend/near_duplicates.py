@@ -0,0 +1,184 @@
+"""Perceptual hashes for spotting re-captured lesion photos.
+
+Two photos of the same lesion taken minutes apart never have the same
+bytes, so the content-addressed image store treats them as different
+images. Perceptual hashes do not change much with small shifts in
+exposure, framing or compression:
+
+- ``phash``: signs of the lowest 8x8 DCT frequencies of a 32x32 grayscale
+  image, relative to their median
+- ``dhash``: whether each pixel of a 9x8 grayscale image is brighter than
+  its right neighbour
+
+Both are 64-bit integers, compared by Hamming distance. The hashes of
+every saved analysis are stored in its metadata. ``NearDuplicateIndex``
+keeps the recent ones in a BK-tree, so the analyses of a patient within a
+Hamming radius of a new photo are found without comparing against all
+of them.
+"""
+
+import logging
+import threading
+import time
+from datetime import datetime
+from pathlib import Path
+from typing import Any, Dict, List, Optional, Tuple, Union
+
+import numpy as np
+from PIL import Image
+
+from .config import DEFAULT_RECAPTURE
+
+logger = logging.getLogger(__name__)
+
+
+_DCT_SIZE = 32
+_HASH_SIZE = 8
+
+
+def _dct_matrix(n: int) -> np.ndarray:
+    k = np.arange(n)[:, np.newaxis]
+    return np.cos(np.pi * (2 * np.arange(n) + 1) * k / (2 * n))
+
+
+_DCT = _dct_matrix(_DCT_SIZE)
+
+
+def _bits_to_int(bits: np.ndarray) -> int:
+    return int("".join("1" if b else "0" for b in bits.ravel()), 2)
+
+
+def phash(image: Image.Image) -> int:
+    pixels = np.asarray(image.convert("L").resize((_DCT_SIZE, _DCT_SIZE), Image.BILINEAR, reducing_gap=2.0),
+                        dtype=np.float64)
+    low = (_DCT @ pixels @ _DCT.T)[:_HASH_SIZE, :_HASH_SIZE].ravel()
+    # The DC term only reflects overall brightness
+    return _bits_to_int(low > np.median(low[1:]))
+
+
+def dhash(image: Image.Image) -> int:
+    pixels = np.asarray(image.convert("L").resize((_HASH_SIZE + 1, _HASH_SIZE), Image.BILINEAR, reducing_gap=2.0),
+                        dtype=np.int16)
+    return _bits_to_int(pixels[:, 1:] > pixels[:, :-1])
+
+
+def perceptual_hashes(image: Union[str, Path, Image.Image]) -> Dict[str, str]:
+    """Both hashes of an image as 16-digit hex strings, the form stored in analysis metadata."""
+    if not isinstance(image, Image.Image):
+        with Image.open(image) as source:
+            source.draft("RGB", (256, 256))
+            return perceptual_hashes(source.convert("RGB"))
+    return {"phash": f"{phash(image):016x}", "dhash": f"{dhash(image):016x}"}
+
+
+def hamming(a: int, b: int) -> int:
+    return bin(a ^ b).count("1")
+
+
+class BKTree:
+    """Burkhard-Keller tree of 64-bit hashes under Hamming distance.
+
+    A node's children are keyed by their distance to it. By the triangle
+    inequality only children within ``radius`` of the query's distance to
+    the node can hold matches, which prunes most of the tree.
+    """
+
+    def __init__(self):
+        self._root: Optional[Tuple[int, List[Any], Dict[int, Any]]] = None
+        self._size = 0
+
+    def __len__(self) -> int:
+        return self._size
+
+    def add(self, value: int, item: Any):
+        self._size += 1
+        if self._root is None:
+            self._root = (value, [item], {})
+            return
+        node = self._root
+        while True:
+            distance = hamming(value, node[0])
+            if distance == 0:
+                node[1].append(item)
+                return
+            child = node[2].get(distance)
+            if child is None:
+                node[2][distance] = (value, [item], {})
+                return
+            node = child
+
+    def search(self, value: int, radius: int) -> List[Tuple[int, Any]]:
+        """``(distance, item)`` for every item within ``radius`` of ``value``."""
+        found = []
+        stack = [self._root] if self._root is not None else []
+        while stack:
+            node_value, items, children = stack.pop()
+            distance = hamming(value, node_value)
+            if distance <= radius:
+                found.extend((distance, item) for item in items)
+            for child_distance, child in children.items():
+                if distance - radius <= child_distance <= distance + radius:
+                    stack.append(child)
+        return found
+
+
+class NearDuplicateIndex:
+    """Hashes of recent analyses, queried per patient for re-captured photos."""
+
+    def __init__(self, settings: Optional[Dict[str, Any]] = None, clock=time.time):
+        self.settings = dict(DEFAULT_RECAPTURE)
+        self.settings.update(settings or {})
+        self._clock = clock
+        self._tree = BKTree()
+        self._ids = set()
+        self._loaded = False
+        self._lock = threading.Lock()
+
+    @property
+    def loaded(self) -> bool:
+        return self._loaded
+
+    def __len__(self) -> int:
+        return len(self._tree)
+
+    def add(self, analysis_id: int, patient_id: int, analyzed_at: float, hashes: Dict[str, str]):
+        """Index the hashes of a saved analysis; ``analyzed_at`` is a Unix time."""
+        if not hashes.get("phash") or not hashes.get("dhash"):
+            return
+        with self._lock:
+            if analysis_id in self._ids:
+                return
+            self._ids.add(analysis_id)
+            self._tree.add(int(hashes["phash"], 16),
+                           (analysis_id, patient_id, analyzed_at, int(hashes["dhash"], 16)))
+
+    def load(self, db):
+        """Index the analyses saved within the recent window."""
+        since = datetime.fromtimestamp(self._clock() - self.settings["recent_hours"] * 3600)
+        for row in db.get_analysis_hashes(since):
+            self.add(row["id"], row["patient_id"], row["analyzed_at"].timestamp(), row)
+        self._loaded = True
+
+    def find(self, patient_id: int, hashes: Dict[str, str]) -> Optional[Dict[str, Any]]:
+        """The closest recent analysis of the patient whose photo looks the same, if any."""
+        radius = int(self.settings["max_distance"])
+        cutoff = self._clock() - self.settings["recent_hours"] * 3600
+        query_dhash = int(hashes["dhash"], 16)
+        with self._lock:
+            candidates = self._tree.search(int(hashes["phash"], 16), radius)
+        best = None
+        for distance, (analysis_id, owner, analyzed_at, candidate_dhash) in candidates:
+            if owner != patient_id or analyzed_at < cutoff:
+                continue
+            dhash_distance = hamming(query_dhash, candidate_dhash)
+            if dhash_distance > radius:
+                continue
+            # Closest first, the most recent of equally close ones
+            key = (distance + dhash_distance, -analyzed_at)
+            if best is None or key < best[0]:
+                best = (key, {
+                    "analysis_id": analysis_id,
+                    "analyzed_at": datetime.fromtimestamp(analyzed_at).isoformat(timespec="seconds"),
+                    "distance": distance + dhash_distance,
+                })
+        return best[1] if best else None
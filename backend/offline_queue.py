@@ -0,0 +1,308 @@
+"""Analyses waiting for the prediction API, kept on disk until they succeed.
+
+When an analysis fails because the prediction API cannot be reached (and
+no local model answered instead), the bridge puts the stored image and the
+patient into an ``OfflineQueue``: a SQLite file that survives restarts of
+the application. The clinician can go on photographing lesions meanwhile.
+
+``OfflineDrain`` works through the queue on a background thread, oldest
+first and at most ``max_per_minute`` analyses a minute. A failure means the
+service is still away, so the whole queue pauses with an exponential,
+jittered backoff instead of trying every waiting analysis in turn. An
+analysis the API refuses (HTTP 4xx) or that failed ``max_attempts`` times
+is dropped and reported, as is one that failed for any reason other than
+the network or the service (the image or the model, say): trying again
+would not help.
+
+If the analysis ran but saving its result failed, the result is kept with
+the entry and only saving is retried, for that entry alone: the prediction
+API is fine, so the queue does not pause and the analysis does not run
+again. Results are saved at least once: if the application stops between saving
+a result and removing its queue entry, the analysis runs again.
+"""
+
+import json
+import logging
+import random
+import sqlite3
+import threading
+import time
+from pathlib import Path
+from typing import Any, Callable, Dict, List, NamedTuple, Optional, Union
+
+from .config import DEFAULT_OFFLINE_QUEUE
+from .metrics import REGISTRY
+from .prediction_client import PredictionTimeout, PredictionUnavailable, PredictionUnreachable
+
+logger = logging.getLogger(__name__)
+
+QUEUE_DEPTH = REGISTRY.gauge("skinsight_offline_queue_depth", "Analyses waiting for the prediction API")
+QUEUED_ANALYSES = REGISTRY.counter("skinsight_offline_analyses_total",
+                                   "Queued analysis attempts by outcome", ["outcome"])
+
+# Wait at most this long without checking the queue, e.g. for entries queued by another process
+IDLE_SECONDS = 60.0
+
+
+class QueuedAnalysis(NamedTuple):
+    id: int
+    patient_id: int
+    image_path: str
+    metadata: Dict[str, str]
+    queued_at: float
+    attempts: int
+    last_error: Optional[str]
+    # The analysis result, once the analysis ran but could not be saved yet
+    result: Optional[Dict[str, Any]] = None
+
+
+# Failures of the network or the prediction service, as opposed to the image, the model or a bug
+RETRYABLE_ERRORS = (PredictionTimeout, PredictionUnreachable, PredictionUnavailable, ConnectionError)
+
+
+def is_retryable(error: Exception) -> bool:
+    """Whether an analysis that failed with ``error`` may succeed once the service is back."""
+    return isinstance(error, RETRYABLE_ERRORS)
+
+
+class SaveFailed(RuntimeError):
+    """The analysis ran but its result could not be saved; ``result`` is kept for the next attempt."""
+
+    def __init__(self, message: str, result: Dict[str, Any]):
+        super().__init__(message)
+        self.result = result
+
+
+class OfflineQueue:
+    """Durable FIFO of analyses; thread-safe."""
+
+    _COLUMNS = "id, patient_id, image_path, metadata, queued_at, attempts, last_error, result"
+
+    def __init__(self, path: Union[str, Path]):
+        self.path = Path(path)
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        self._lock = threading.Lock()
+        self._db = sqlite3.connect(str(self.path), check_same_thread=False, isolation_level=None)
+        self._db.execute("PRAGMA journal_mode=WAL")
+        # A queued analysis must survive a power cut right after it was accepted
+        self._db.execute("PRAGMA synchronous=FULL")
+        self._db.execute("""
+            CREATE TABLE IF NOT EXISTS queued_analyses (
+                id INTEGER PRIMARY KEY AUTOINCREMENT,
+                patient_id INTEGER NOT NULL,
+                image_path TEXT NOT NULL,
+                metadata TEXT NOT NULL DEFAULT '{}',
+                queued_at REAL NOT NULL,
+                attempts INTEGER NOT NULL DEFAULT 0,
+                next_attempt_at REAL NOT NULL DEFAULT 0,
+                last_error TEXT,
+                result TEXT
+            )
+        """)
+        columns = {row[1] for row in self._db.execute("PRAGMA table_info(queued_analyses)")}
+        if "result" not in columns:
+            self._db.execute("ALTER TABLE queued_analyses ADD COLUMN result TEXT")
+
+    def __len__(self) -> int:
+        with self._lock:
+            return self._db.execute("SELECT COUNT(*) FROM queued_analyses").fetchone()[0]
+
+    def put(self, patient_id: int, image_path: str, metadata: Optional[Dict[str, str]] = None,
+            now: Optional[float] = None) -> int:
+        """Queue an analysis; returns its queue id."""
+        with self._lock:
+            cursor = self._db.execute(
+                "INSERT INTO queued_analyses (patient_id, image_path, metadata, queued_at) VALUES (?, ?, ?, ?)",
+                (patient_id, image_path, json.dumps(metadata or {}), time.time() if now is None else now)
+            )
+            return cursor.lastrowid
+
+    def next_due(self, now: float) -> Optional[QueuedAnalysis]:
+        """The oldest analysis whose retry time has come."""
+        with self._lock:
+            row = self._db.execute(
+                f"SELECT {self._COLUMNS} FROM queued_analyses WHERE next_attempt_at <= ? ORDER BY id LIMIT 1",
+                (now,)
+            ).fetchone()
+        return None if row is None else self._entry(row)
+
+    def next_attempt_at(self) -> Optional[float]:
+        """When the earliest analysis may be tried, None if the queue is empty."""
+        with self._lock:
+            return self._db.execute("SELECT MIN(next_attempt_at) FROM queued_analyses").fetchone()[0]
+
+    def defer(self, analysis_id: int, until: float, error: str):
+        """Count a failed attempt and try the analysis again at ``until``."""
+        with self._lock:
+            self._db.execute(
+                "UPDATE queued_analyses SET attempts = attempts + 1, next_attempt_at = ?, last_error = ?"
+                " WHERE id = ?", (until, error, analysis_id)
+            )
+
+    def keep_result(self, analysis_id: int, result: Dict[str, Any], until: float, error: str):
+        """Like defer(), keeping the result of an analysis that ran but could not be saved."""
+        with self._lock:
+            self._db.execute(
+                "UPDATE queued_analyses SET attempts = attempts + 1, next_attempt_at = ?, last_error = ?,"
+                " result = ? WHERE id = ?", (until, error, json.dumps(result), analysis_id)
+            )
+
+    def remove(self, analysis_id: int):
+        with self._lock:
+            self._db.execute("DELETE FROM queued_analyses WHERE id = ?", (analysis_id,))
+
+    def entries(self) -> List[QueuedAnalysis]:
+        with self._lock:
+            rows = self._db.execute(f"SELECT {self._COLUMNS} FROM queued_analyses ORDER BY id").fetchall()
+        return [self._entry(row) for row in rows]
+
+    def image_paths(self) -> List[str]:
+        """Images that must be kept until their analyses ran."""
+        with self._lock:
+            return [row[0] for row in self._db.execute("SELECT DISTINCT image_path FROM queued_analyses")]
+
+    def close(self):
+        with self._lock:
+            self._db.close()
+
+    @staticmethod
+    def _entry(row) -> QueuedAnalysis:
+        return QueuedAnalysis(row[0], row[1], row[2], json.loads(row[3]), row[4], row[5], row[6],
+                              None if row[7] is None else json.loads(row[7]))
+
+
+class OfflineDrain:
+    """Runs queued analyses on a background thread.
+
+    ``process(entry)`` analyzes and saves one entry and returns a dict
+    passed on to ``on_finished(entry, outcome, error)``; it raises if the
+    analysis failed, and ``SaveFailed`` if only saving did (it then gets
+    the entry back with ``result`` set). ``on_finished`` is also called,
+    with an error message, for entries that are dropped.
+    """
+
+    def __init__(self, queue: OfflineQueue, process: Callable[[QueuedAnalysis], Dict[str, Any]],
+                 on_finished: Optional[Callable[[QueuedAnalysis, Dict[str, Any], str], None]] = None,
+                 settings: Optional[Dict[str, Any]] = None,
+                 clock: Callable[[], float] = time.time, rng: Optional[random.Random] = None):
+        self.queue = queue
+        self.process = process
+        self.on_finished = on_finished
+        self.settings = dict(DEFAULT_OFFLINE_QUEUE)
+        self.settings.update(settings or {})
+        self._clock = clock
+        self._random = rng or random.Random()
+        self._wake = threading.Event()
+        self._stop = threading.Event()
+        self._thread = None
+        self._failures = 0
+        self._paused_until = 0.0
+        self._last_attempt = None
+
+    def is_running(self) -> bool:
+        return self._thread is not None and self._thread.is_alive()
+
+    def start(self) -> bool:
+        if self.is_running():
+            return False
+        self._stop.clear()
+        self._thread = threading.Thread(target=self._run, name="offline-queue", daemon=True)
+        self._thread.start()
+        return True
+
+    def stop(self, timeout: Optional[float] = None):
+        """Finish after the analysis in progress, if any."""
+        self._stop.set()
+        self._wake.set()
+        if self._thread is not None:
+            self._thread.join(timeout)
+            self._thread = None
+
+    def wake(self):
+        """Look at the queue now, e.g. after an analysis was queued; a backoff still applies."""
+        self._wake.set()
+
+    def backoff(self, failures: int) -> float:
+        """Seconds to pause after ``failures`` failed attempts in a row, with jitter."""
+        delay = min(self.settings["initial_backoff_seconds"] * 2 ** (failures - 1),
+                    self.settings["max_backoff_seconds"])
+        # Several clinics' queues coming back at once should not retry in lockstep
+        return delay * self._random.uniform(0.5, 1.0)
+
+    def _delay(self, now: float) -> float:
+        """Seconds until the next attempt is allowed by the backoff and the rate limit."""
+        delay = self._paused_until - now
+        rate = self.settings["max_per_minute"]
+        if rate and self._last_attempt is not None:
+            delay = max(delay, self._last_attempt + 60.0 / rate - now)
+        return delay
+
+    def run_once(self) -> Optional[bool]:
+        """Try the next due analysis; True if it succeeded, None if nothing was tried."""
+        now = self._clock()
+        if self._delay(now) > 0:
+            return None
+        entry = self.queue.next_due(now)
+        if entry is None:
+            return None
+        self._last_attempt = now
+        try:
+            outcome = self.process(entry)
+        except Exception as e:
+            self._failed(entry, e)
+            return False
+        self._failures = 0
+        self._paused_until = 0.0
+        self.queue.remove(entry.id)
+        QUEUED_ANALYSES.inc(outcome="completed")
+        logger.info("Queued analysis %d of patient %d completed", entry.id, entry.patient_id)
+        self._notify(entry, outcome, "")
+        return True
+
+    def _failed(self, entry: QueuedAnalysis, error: Exception):
+        attempts = entry.attempts + 1
+        saving = isinstance(error, SaveFailed)
+        if not (saving or is_retryable(error)) or attempts >= self.settings["max_attempts"]:
+            self.queue.remove(entry.id)
+            QUEUED_ANALYSES.inc(outcome="dropped")
+            logger.error("Dropping queued analysis %d after %d attempts: %s", entry.id, attempts, error)
+            self._notify(entry, {}, str(error))
+            return
+        if saving:
+            # The prediction API answered; only this entry waits for the database
+            delay = self.backoff(attempts)
+            self.queue.keep_result(entry.id, error.result, self._clock() + delay, str(error))
+            QUEUED_ANALYSES.inc(outcome="retried")
+            logger.warning("Could not save queued analysis %d, retrying in %.0fs: %s", entry.id, delay, error)
+            return
+        self._failures += 1
+        delay = self.backoff(self._failures)
+        # The service is most likely still unreachable: the whole queue waits, not just this entry
+        self._paused_until = self._clock() + delay
+        self.queue.defer(entry.id, self._paused_until, str(error))
+        QUEUED_ANALYSES.inc(outcome="retried")
+        logger.warning("Queued analysis %d failed, retrying in %.0fs: %s", entry.id, delay, error)
+
+    def _notify(self, entry: QueuedAnalysis, outcome: Dict[str, Any], error: str):
+        if self.on_finished is None:
+            return
+        try:
+            self.on_finished(entry, outcome, error)
+        except Exception as e:
+            logger.error("Could not report queued analysis %d: %s", entry.id, e)
+
+    def _run(self):
+        while not self._stop.is_set():
+            self._wake.clear()
+            try:
+                if self.run_once() is not None:
+                    continue
+                now = self._clock()
+                next_at = self.queue.next_attempt_at()
+                wait = IDLE_SECONDS if next_at is None else next_at - now
+                wait = min(max(wait, self._delay(now), 0.05), IDLE_SECONDS)
+            except Exception as e:
+                # The queue file itself failed; try again later rather than end the thread
+                logger.error("Offline queue failed: %s", e)
+                wait = self.settings["initial_backoff_seconds"]
+            self._wake.wait(wait)
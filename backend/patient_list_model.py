@@ -0,0 +1,198 @@
+"""List model for patient search results.
+
+QML views bind to a ``PatientListModel`` instead of receiving a fresh list of
+dicts on every keystroke. Queries run asynchronously on the ``SearchService``;
+results are fetched page by page through ``canFetchMore``/``fetchMore``, and
+a new result set is applied as row insertions and removals so unchanged
+delegates are kept.
+"""
+
+from typing import Any, Dict, List
+
+from PySide6.QtCore import QAbstractListModel, QByteArray, QModelIndex, Qt, Property, Signal, Slot
+
+from .search_service import SearchService
+
+PATIENT_FIELDS = ["id", "full_name", "gender", "birth_date", "phone"]
+
+
+class PatientListModel(QAbstractListModel):
+    countChanged = Signal()
+    searchTermChanged = Signal()
+    loadingChanged = Signal()
+
+    _ROLES = {Qt.UserRole + i: name for i, name in enumerate(PATIENT_FIELDS, start=1)}
+
+    def __init__(self, service: SearchService, key: str, page_size: int = 20,
+                 min_term_length: int = 3, parent=None):
+        super().__init__(parent)
+        self._service = service
+        self._key = key
+        self._page_size = page_size
+        self._min_term_length = min_term_length
+        self._rows: List[Dict[str, Any]] = []
+        self._term = ""
+        self._has_more = False
+        self._seq = 0
+        self._loading = False
+        service.resultsReady.connect(self._on_results)
+        service.searchFailed.connect(self._on_failed)
+
+    # --- QAbstractListModel interface ---
+
+    def rowCount(self, parent=QModelIndex()) -> int:
+        if parent.isValid():
+            return 0
+        return len(self._rows)
+
+    def data(self, index, role=Qt.DisplayRole) -> Any:
+        if not index.isValid() or not 0 <= index.row() < len(self._rows):
+            return None
+        row = self._rows[index.row()]
+        if role == Qt.DisplayRole:
+            return row.get("full_name")
+        name = self._ROLES.get(role)
+        return row.get(name) if name else None
+
+    def roleNames(self) -> Dict[int, QByteArray]:
+        return {role: QByteArray(name.encode()) for role, name in self._ROLES.items()}
+
+    def canFetchMore(self, parent=QModelIndex()) -> bool:
+        return not parent.isValid() and self._has_more
+
+    def fetchMore(self, parent=QModelIndex()):
+        if not self.canFetchMore(parent):
+            return
+        # Cleared first so that a view asking again while this page loads does not refetch
+        self._has_more = False
+        self._submit(len(self._rows))
+
+    # --- QML API ---
+
+    @Property(int, notify=countChanged)
+    def count(self) -> int:
+        return len(self._rows)
+
+    @Property(str, notify=searchTermChanged)
+    def searchTerm(self) -> str:
+        return self._term
+
+    @Property(bool, notify=loadingChanged)
+    def loading(self) -> bool:
+        return self._loading
+
+    def _set_loading(self, loading: bool):
+        if self._loading != loading:
+            self._loading = loading
+            self.loadingChanged.emit()
+
+    def _submit(self, offset: int):
+        self._seq += 1
+        self._set_loading(True)
+        self._service.submit(self._key, self._seq, self._term, self._page_size, offset)
+
+    @Slot(str)
+    def search(self, term: str):
+        """Request the first page of results for a term (too short a term clears the list).
+
+        Returns immediately; the rows are applied when the query completes.
+        """
+        term = term.strip()
+        if term != self._term:
+            self._term = term
+            self.searchTermChanged.emit()
+        if len(term) < self._min_term_length:
+            # Supersedes anything still in flight for this search box
+            self._seq += 1
+            self._service.cancel(self._key)
+            self._set_loading(False)
+            self.set_rows([], False)
+            return
+        self._submit(0)
+
+    def _on_results(self, key: str, seq: int, offset: int, rows: List[Dict[str, Any]], has_more: bool):
+        if key != self._key or seq != self._seq:
+            return
+        self._set_loading(False)
+        if offset == 0:
+            self.set_rows(rows, has_more)
+        else:
+            self.append_page(rows, has_more)
+
+    def _on_failed(self, key: str, seq: int, message: str):
+        if key == self._key and seq == self._seq:
+            self._set_loading(False)
+
+    @Slot()
+    def refresh(self):
+        """Re-run the current search, e.g. after a patient was added or changed."""
+        self.search(self._term)
+
+    @Slot()
+    def clear(self):
+        self.search("")
+
+    @Slot(int, result=dict)
+    def get(self, row: int) -> Dict[str, Any]:
+        """Patient fields of one row as a plain object."""
+        if 0 <= row < len(self._rows):
+            return dict(self._rows[row])
+        return {}
+
+    # --- Updates ---
+
+    def append_page(self, rows: List[Dict[str, Any]], has_more: bool):
+        """Append the next page of the current result set."""
+        self._has_more = has_more
+        known = {row["id"] for row in self._rows}
+        rows = [row for row in rows if row["id"] not in known]
+        if not rows:
+            return
+        start = len(self._rows)
+        self.beginInsertRows(QModelIndex(), start, start + len(rows) - 1)
+        self._rows.extend(rows)
+        self.endInsertRows()
+        self.countChanged.emit()
+
+    def set_rows(self, rows: List[Dict[str, Any]], has_more: bool):
+        """Replace the results, applying only the row insertions/removals/changes needed."""
+        self._has_more = has_more
+        old_count = len(self._rows)
+        new_ids = [row["id"] for row in rows]
+        new_id_set = set(new_ids)
+
+        # Remove rows that are gone, last first so indexes stay valid
+        row = len(self._rows) - 1
+        while row >= 0:
+            if self._rows[row]["id"] in new_id_set:
+                row -= 1
+                continue
+            end = row
+            while row >= 0 and self._rows[row]["id"] not in new_id_set:
+                row -= 1
+            self.beginRemoveRows(QModelIndex(), row + 1, end)
+            del self._rows[row + 1:end + 1]
+            self.endRemoveRows()
+
+        kept_ids = [r["id"] for r in self._rows]
+        kept_id_set = set(kept_ids)
+        if kept_ids != [i for i in new_ids if i in kept_id_set]:
+            # Relative order of kept rows changed, a diff would not be cheaper than a reset
+            self.beginResetModel()
+            self._rows = list(rows)
+            self.endResetModel()
+        else:
+            # Insert new rows and refresh kept ones in the order of the new result
+            for position, new_row in enumerate(rows):
+                if position < len(self._rows) and self._rows[position]["id"] == new_row["id"]:
+                    if self._rows[position] != new_row:
+                        self._rows[position] = new_row
+                        index = self.index(position, 0)
+                        self.dataChanged.emit(index, index)
+                    continue
+                self.beginInsertRows(QModelIndex(), position, position)
+                self._rows.insert(position, new_row)
+                self.endInsertRows()
+
+        if len(self._rows) != old_count:
+            self.countChanged.emit()
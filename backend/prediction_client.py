@@ -0,0 +1,190 @@
+"""HTTP calls to the prediction API with deadlines and cancellation.
+
+Every call has three budgets: connecting, uploading the image and receiving
+the complete response. Each budget is a deadline for the whole phase, not a
+per-read timeout, so a server trickling bytes cannot stretch a call
+indefinitely. ``cancel()`` may be called from any thread; it shuts the
+socket down, which aborts a transfer blocked in the middle of a send or
+receive immediately.
+"""
+
+import logging
+import socket
+import threading
+import time
+import uuid
+from http.client import HTTPConnection, HTTPException, HTTPSConnection
+from typing import Dict, Optional, Tuple
+from urllib.parse import urlsplit
+
+from .config import DEFAULT_TIMEOUTS
+
+logger = logging.getLogger(__name__)
+
+
+class PredictionCancelled(RuntimeError):
+    """The call was cancelled by the user."""
+
+
+class PredictionTimeout(RuntimeError):
+    """A phase of the call exceeded its deadline."""
+
+
+class PredictionRejected(RuntimeError):
+    """The API refused the request itself (HTTP 4xx); the service is up."""
+
+
+class PredictionUnreachable(RuntimeError):
+    """The API could not be reached or failed on its side (connection error, HTTP 5xx)."""
+
+
+class PredictionUnavailable(RuntimeError):
+    """The remote path is switched off by the circuit breaker and there is no fallback."""
+
+
+def encode_multipart(field: str, filename: str, data: bytes, content_type: str) -> Tuple[bytes, str]:
+    """Encode one file as a multipart/form-data body; returns (body, content type header)."""
+    boundary = uuid.uuid4().hex
+    head = (f"--{boundary}\r\n"
+            f'Content-Disposition: form-data; name="{field}"; filename="{filename}"\r\n'
+            f"Content-Type: {content_type}\r\n\r\n").encode("utf-8")
+    tail = f"\r\n--{boundary}--\r\n".encode("ascii")
+    return head + data + tail, f"multipart/form-data; boundary={boundary}"
+
+
+class PredictionCall:
+    """A single cancellable POST request; use as a context manager to always close the socket.
+
+    Every phase gets its own timeout; a ``deadline`` (``time.monotonic()``
+    value) additionally caps all of them, for calls that are one attempt of
+    a larger request.
+    """
+
+    def __init__(self, url: str, timeouts: Optional[Dict[str, float]] = None,
+                 chunk_size: int = 64 * 1024, deadline: Optional[float] = None):
+        self.url = url
+        self.timeouts = dict(DEFAULT_TIMEOUTS)
+        self.timeouts.update(timeouts or {})
+        self.deadline = deadline
+        self.chunk_size = chunk_size
+        self._cancelled = threading.Event()
+        self._lock = threading.Lock()
+        self._connection = None
+        self._sock = None
+        self._response = None
+        self._phase = "connect"
+        self._deadline = 0.0
+
+    @property
+    def cancelled(self) -> bool:
+        return self._cancelled.is_set()
+
+    def cancel(self):
+        """Abort the call; the thread running it raises PredictionCancelled."""
+        self._cancelled.set()
+        with self._lock:
+            sock = self._sock
+        if sock is not None:
+            try:
+                sock.shutdown(socket.SHUT_RDWR)
+            except OSError:
+                pass
+
+    def _start_phase(self, phase: str):
+        self._phase = phase
+        self._deadline = time.monotonic() + self.timeouts[f"{phase}_timeout"]
+        if self.deadline is not None:
+            self._deadline = min(self._deadline, self.deadline)
+
+    def _timeout(self) -> PredictionTimeout:
+        if self.deadline is not None and self._deadline == self.deadline:
+            return PredictionTimeout(f"Prediction deadline exceeded during {self._phase}")
+        return PredictionTimeout(
+            f"{self._phase} deadline of {self.timeouts[self._phase + '_timeout']:g}s exceeded"
+        )
+
+    def _remaining(self) -> float:
+        """Time left in the current phase; raises once it is cancelled or over."""
+        if self._cancelled.is_set():
+            raise PredictionCancelled("Analysis was cancelled")
+        remaining = self._deadline - time.monotonic()
+        if remaining <= 0:
+            raise self._timeout()
+        return remaining
+
+    def _failure(self, error: Exception) -> Exception:
+        if self._cancelled.is_set():
+            return PredictionCancelled("Analysis was cancelled")
+        if isinstance(error, socket.timeout):
+            return self._timeout()
+        return error
+
+    def send(self, body: bytes, content_type: str) -> int:
+        """Connect, upload the body and wait for the response headers; returns the HTTP status."""
+        parts = urlsplit(self.url)
+        connection_class = HTTPSConnection if parts.scheme == "https" else HTTPConnection
+        path = (parts.path or "/") + (f"?{parts.query}" if parts.query else "")
+        try:
+            self._start_phase("connect")
+            connection = connection_class(parts.hostname, parts.port, timeout=self._remaining())
+            self._connection = connection
+            connection.connect()
+            with self._lock:
+                # Kept separately: the connection drops its reference once the response owns the socket
+                self._sock = connection.sock
+            self._remaining()
+
+            self._start_phase("upload")
+            connection.putrequest("POST", path)
+            connection.putheader("Content-Type", content_type)
+            connection.putheader("Content-Length", str(len(body)))
+            connection.endheaders()
+            view = memoryview(body)
+            for start in range(0, len(body), self.chunk_size):
+                self._sock.settimeout(self._remaining())
+                self._sock.sendall(view[start:start + self.chunk_size])
+
+            self._start_phase("response")
+            self._sock.settimeout(self._remaining())
+            self._response = connection.getresponse()
+            return self._response.status
+        except (OSError, HTTPException) as e:
+            raise self._failure(e) from e
+
+    def read(self) -> bytes:
+        """Read the complete response body within the response deadline."""
+        chunks = []
+        try:
+            # One socket read per iteration so the deadline bounds the whole body;
+            # the response closes the socket as soon as the body is complete
+            while not self._response.isclosed():
+                self._sock.settimeout(self._remaining())
+                chunk = self._response.read1(self.chunk_size)
+                if not chunk:
+                    break
+                chunks.append(chunk)
+        except (OSError, HTTPException) as e:
+            raise self._failure(e) from e
+        # A shut down socket reads as a regular end of stream
+        if self._cancelled.is_set():
+            raise PredictionCancelled("Analysis was cancelled")
+        return b"".join(chunks)
+
+    def close(self):
+        """Close the connection and drop any partially received response."""
+        with self._lock:
+            sock, self._sock = self._sock, None
+        if self._response is not None:
+            self._response.close()
+            self._response = None
+        if self._connection is not None:
+            self._connection.close()
+            self._connection = None
+        if sock is not None:
+            sock.close()
+
+    def __enter__(self) -> "PredictionCall":
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
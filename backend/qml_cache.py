@@ -0,0 +1,58 @@
+"""Ahead-of-time compilation of the QML frontend.
+
+Qt stores compiled QML (bytecode) in a disk cache and reuses it as long as
+the source file is unchanged. The cache is kept in the application
+directory so that it can be filled once when the application is installed
+or packaged (``python main.py --precompile-qml``) instead of on the first
+launch of every user.
+"""
+
+import logging
+import os
+from pathlib import Path
+from typing import List, Tuple
+
+logger = logging.getLogger(__name__)
+
+PROJECT_ROOT = Path(__file__).parent.parent
+QML_ROOT = PROJECT_ROOT / "frontend"
+QML_CACHE_DIR = PROJECT_ROOT / ".qmlcache"
+
+
+def configure_disk_cache(cache_dir: Path = QML_CACHE_DIR):
+    """Point Qt's QML disk cache at the application cache; call before creating the engine."""
+    if os.environ.get("QML_DISABLE_DISK_CACHE") or os.environ.get("QML_DISK_CACHE_PATH"):
+        # Explicit settings of the environment win
+        return
+    try:
+        os.makedirs(cache_dir, exist_ok=True)
+    except OSError as e:
+        logger.warning("QML disk cache unavailable: %s", e)
+        return
+    os.environ["QML_DISK_CACHE_PATH"] = str(cache_dir)
+
+
+def qml_files(qml_root: Path = QML_ROOT) -> List[Path]:
+    """All QML documents of the frontend."""
+    return sorted(qml_root.rglob("*.qml"))
+
+
+def precompile(qml_root: Path = QML_ROOT) -> Tuple[int, List[str]]:
+    """Compile every QML document into the disk cache; returns (compiled, errors).
+
+    Requires a QGuiApplication; nothing is instantiated, so no backend is needed.
+    """
+    from PySide6.QtCore import QUrl
+    from PySide6.QtQml import QQmlComponent, QQmlEngine
+
+    engine = QQmlEngine()
+    engine.addImportPath(str(qml_root))
+    compiled = 0
+    errors = []
+    for path in qml_files(qml_root):
+        component = QQmlComponent(engine, QUrl.fromLocalFile(str(path)))
+        if component.isError():
+            errors.append(component.errorString().strip())
+        else:
+            compiled += 1
+    return compiled, errors
@@ -0,0 +1,95 @@
+"""Refinement cache for patient search results.
+
+Patient search matches ``full_name LIKE %term% OR phone LIKE %term%``, so the
+results for a term are a subset of the results for any substring of it.
+When the user types "Ива" -> "Иван" -> "Иванов", the complete result set of
+the first term is enough to answer every following keystroke by filtering in
+memory. Only complete result sets (not truncated by the fetch limit) can be
+used this way.
+"""
+
+import threading
+from collections import OrderedDict
+from typing import Any, Dict, List, Optional, Tuple
+
+SEARCHED_FIELDS = ("full_name", "phone")
+
+
+def normalize(text: Optional[str]) -> str:
+    """Approximate the case-insensitive database collation for substring matching."""
+    return (text or "").casefold().replace("ё", "е")
+
+
+class SearchCache:
+    def __init__(self, max_entries: int = 64, max_rows: int = 200):
+        self.max_entries = max_entries
+        # Result sets up to this size are fetched (and cached) in full
+        self.max_rows = max_rows
+        self._entries: "OrderedDict[str, List[Tuple[str, Dict[str, Any]]]]" = OrderedDict()
+        self._generation = 0
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    @property
+    def generation(self) -> int:
+        """Changes on every invalidation; results fetched before it must not be stored."""
+        return self._generation
+
+    def lookup(self, term: str) -> Optional[List[Dict[str, Any]]]:
+        """All rows matching a term, if a cached complete result set can answer it."""
+        key = normalize(term)
+        with self._lock:
+            best = None
+            for cached_term in self._entries:
+                # The longest cached substring leaves the fewest rows to filter
+                if cached_term in key and (best is None or len(cached_term) > len(best)):
+                    best = cached_term
+            if best is None:
+                self.misses += 1
+                return None
+            self._entries.move_to_end(best)
+            entries = self._entries[best]
+            self.hits += 1
+
+        if best == key:
+            return [row for _, row in entries]
+        return [row for haystack, row in entries if key in haystack]
+
+    def store(self, term: str, rows: List[Dict[str, Any]], generation: int):
+        """Cache a complete result set fetched while ``generation`` was current."""
+        if len(rows) > self.max_rows:
+            return
+        key = normalize(term)
+        # Matching text is precomputed once per row
+        entries = [("\n".join(normalize(row.get(field)) for field in SEARCHED_FIELDS), row)
+                   for row in rows]
+        with self._lock:
+            if generation != self._generation:
+                return
+            self._entries[key] = entries
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def resize(self, max_entries: int, max_rows: Optional[int] = None):
+        """Change the limits, dropping the least recently used entries beyond them."""
+        with self._lock:
+            self.max_entries = max_entries
+            if max_rows is not None and max_rows < self.max_rows:
+                for term in [term for term, entries in self._entries.items() if len(entries) > max_rows]:
+                    del self._entries[term]
+            if max_rows is not None:
+                self.max_rows = max_rows
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def invalidate(self, *args):
+        """Drop every entry (patients were added or changed)."""
+        with self._lock:
+            self._entries.clear()
+            self._generation += 1
+
+    def stats(self) -> Dict[str, int]:
+        with self._lock:
+            return {"entries": len(self._entries), "hits": self.hits, "misses": self.misses}
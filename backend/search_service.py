@@ -0,0 +1,131 @@
+"""Asynchronous patient search.
+
+Search boxes submit their terms without waiting. A single worker thread with
+its own database connection runs the queries; for every search box only the
+latest pending request is kept, requests superseded while waiting are never
+run, and results of a query that was superseded while it was running are
+dropped instead of being delivered. Every result carries the sequence number
+of the request that produced it.
+
+With a ``SearchCache`` the first page of a term is fetched with a larger
+limit so that small result sets are complete and can answer longer terms
+(and further pages) in memory.
+"""
+
+import logging
+import threading
+from collections import OrderedDict
+from typing import Any, Callable, Dict, List, NamedTuple, Optional
+
+from PySide6.QtCore import QObject, Signal
+
+from .search_cache import SearchCache
+
+logger = logging.getLogger(__name__)
+
+
+class SearchRequest(NamedTuple):
+    key: str
+    seq: int
+    term: str
+    limit: int
+    offset: int
+
+
+class SearchService(QObject):
+    # key, seq, offset, rows, has_more
+    resultsReady = Signal(str, int, int, list, bool)
+    # key, seq, error message
+    searchFailed = Signal(str, int, str)
+
+    def __init__(self, db_factory: Callable[[], Any], cache: Optional[SearchCache] = None,
+                 parent=None):
+        super().__init__(parent)
+        self._db_factory = db_factory
+        self.cache = cache
+        self._db = None
+        self._pending: "OrderedDict[str, SearchRequest]" = OrderedDict()
+        self._latest: Dict[str, int] = {}
+        self._condition = threading.Condition()
+        self._stopped = False
+        self._thread = threading.Thread(target=self._run, name="patient-search", daemon=True)
+        self._thread.start()
+
+    def submit(self, key: str, seq: int, term: str, limit: int, offset: int = 0):
+        """Queue a search, replacing any request of the same search box still waiting."""
+        with self._condition:
+            self._latest[key] = seq
+            self._pending.pop(key, None)
+            self._pending[key] = SearchRequest(key, seq, term, limit, offset)
+            self._condition.notify()
+
+    def cancel(self, key: str):
+        """Forget the pending request of a search box and ignore the one in flight."""
+        with self._condition:
+            self._pending.pop(key, None)
+            self._latest[key] = self._latest.get(key, 0) + 1
+
+    def invalidate_cache(self, *args):
+        """Forget cached results, e.g. after a patient was added or changed."""
+        if self.cache is not None:
+            self.cache.invalidate()
+
+    def is_current(self, key: str, seq: int) -> bool:
+        with self._condition:
+            return self._latest.get(key) == seq
+
+    def stop(self, timeout: Optional[float] = None):
+        with self._condition:
+            self._stopped = True
+            self._condition.notify()
+        self._thread.join(timeout)
+
+    def _next_request(self) -> Optional[SearchRequest]:
+        with self._condition:
+            while not self._pending and not self._stopped:
+                self._condition.wait()
+            if self._stopped:
+                return None
+            _, request = self._pending.popitem(last=False)
+            return request
+
+    def _query(self, request: SearchRequest) -> List[Dict[str, Any]]:
+        # One extra row tells whether another page exists
+        end = request.offset + request.limit + 1
+        if self.cache is not None:
+            rows = self.cache.lookup(request.term)
+            if rows is not None:
+                return rows[request.offset:end]
+
+        if self._db is None:
+            self._db = self._db_factory()
+        if self.cache is not None and request.offset == 0:
+            generation = self.cache.generation
+            rows = self._db.search_patients(request.term, self.cache.max_rows + 1, 0)
+            if len(rows) <= self.cache.max_rows:
+                self.cache.store(request.term, rows, generation)
+            return rows[:end]
+        return self._db.search_patients(request.term, request.limit + 1, request.offset)
+
+    def _run(self):
+        while True:
+            request = self._next_request()
+            if request is None:
+                break
+            try:
+                rows = self._query(request)
+            except Exception as e:
+                logger.error("Patient search failed: %s", e)
+                if self.is_current(request.key, request.seq):
+                    self.searchFailed.emit(request.key, request.seq, str(e))
+                continue
+
+            if not self.is_current(request.key, request.seq):
+                logger.debug("Dropping stale search result %s#%d", request.key, request.seq)
+                continue
+            has_more = len(rows) > request.limit
+            self.resultsReady.emit(request.key, request.seq, request.offset,
+                                   rows[:request.limit], has_more)
+
+        if self._db is not None:
+            self._db.close()
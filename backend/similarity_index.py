@@ -0,0 +1,286 @@
+"""Similarity search over the images of saved analyses.
+
+Every saved analysis gets a small feature vector of its image: a colour
+histogram, a coarse brightness layout and a histogram of edge directions,
+normalized so that the dot product of two vectors is their cosine
+similarity. The vectors are appended to a float32 matrix on disk that is
+memory-mapped for search, next to a matrix of (analysis id, patient id)
+rows, so an index of a million lesions is searched without loading it.
+
+Search is exact: one matrix-vector product and a partial sort. A search
+restricted to one patient only touches that patient's rows. If ``hnswlib``
+is installed, clinic-wide searches in large indexes use an approximate
+HNSW graph instead, built on first use.
+
+New analyses are added as they are saved (``add_async``); ``start_sync``
+indexes analyses saved elsewhere, e.g. by the batch CLI.
+"""
+
+import json
+import logging
+import os
+import threading
+from concurrent.futures import Future, ThreadPoolExecutor
+from pathlib import Path
+from typing import Any, Callable, Dict, Iterable, List, Optional, Union
+
+import numpy as np
+from PIL import Image, ImageOps
+
+try:
+    import hnswlib
+except ImportError:  # approximate search is optional
+    hnswlib = None
+
+logger = logging.getLogger(__name__)
+
+EMBEDDING_VERSION = 1
+HUE_BINS, SATURATION_BINS, VALUE_BINS = 8, 4, 4
+LAYOUT_SIZE = 8
+ORIENTATION_BINS = 16
+EMBEDDING_DIM = HUE_BINS * SATURATION_BINS * VALUE_BINS + LAYOUT_SIZE * LAYOUT_SIZE + ORIENTATION_BINS
+
+ImageSource = Union[str, Path, Image.Image]
+
+
+def _unit(vector: np.ndarray) -> np.ndarray:
+    norm = np.linalg.norm(vector)
+    return vector / norm if norm > 0 else vector
+
+
+def image_embedding(image: ImageSource, size: int = 64) -> np.ndarray:
+    """Feature vector of a lesion image with unit length."""
+    if not isinstance(image, Image.Image):
+        with Image.open(image) as source:
+            source.draft("RGB", (size * 4, size * 4))  # JPEG decodes at reduced size
+            return image_embedding(source.convert("RGB"), size)
+    img = ImageOps.fit(image.convert("RGB"), (size, size))
+
+    hsv = np.asarray(img.convert("HSV"), dtype=np.int32)
+    bins = ((hsv[..., 0] * HUE_BINS >> 8) * SATURATION_BINS * VALUE_BINS
+            + (hsv[..., 1] * SATURATION_BINS >> 8) * VALUE_BINS
+            + (hsv[..., 2] * VALUE_BINS >> 8))
+    colour = np.sqrt(np.bincount(bins.ravel(), minlength=HUE_BINS * SATURATION_BINS * VALUE_BINS))
+
+    gray = np.asarray(img.convert("L"), dtype=np.float32) / 255.0
+    layout = gray.reshape(LAYOUT_SIZE, size // LAYOUT_SIZE, LAYOUT_SIZE, size // LAYOUT_SIZE).mean(axis=(1, 3))
+    layout = (layout - layout.mean()).ravel()
+
+    dy, dx = np.gradient(gray)
+    # Orientation modulo 180 degrees, so that an edge and its mirror count the same
+    orientation = ((np.arctan2(dy, dx) % np.pi) / np.pi * ORIENTATION_BINS).astype(np.int32) % ORIENTATION_BINS
+    texture = np.bincount(orientation.ravel(), weights=np.hypot(dx, dy).ravel(), minlength=ORIENTATION_BINS)
+
+    return _unit(np.concatenate([
+        _unit(colour), 0.7 * _unit(layout), 0.7 * _unit(texture)
+    ]).astype(np.float32))
+
+
+class SimilarityIndex:
+    def __init__(self, index_dir: str, base_dir: Optional[str] = None,
+                 embed: Callable[[ImageSource], np.ndarray] = image_embedding,
+                 dim: int = EMBEDDING_DIM, version: int = EMBEDDING_VERSION,
+                 ann_threshold: int = 50000):
+        self.index_dir = Path(index_dir)
+        self.base_dir = Path(base_dir) if base_dir else Path(__file__).parent.parent
+        self.embed = embed
+        self.dim = dim
+        self.version = version
+        # Below this size exact search is fast enough and always right
+        self.ann_threshold = ann_threshold
+        self._vectors_path = self.index_dir / "vectors.f32"
+        self._rows_path = self.index_dir / "rows.i64"
+        self._meta_path = self.index_dir / "meta.json"
+        self._lock = threading.Lock()
+        self._executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="similarity")
+        self._sync_thread = None
+        self._ann = None
+        self._open()
+
+    def _open(self):
+        self.index_dir.mkdir(parents=True, exist_ok=True)
+        meta = {}
+        if self._meta_path.exists():
+            try:
+                meta = json.loads(self._meta_path.read_text())
+            except ValueError:
+                pass
+        if meta.get("version") != self.version or meta.get("dim") != self.dim:
+            # Vectors of another feature extractor cannot be compared; start over
+            for path in (self._vectors_path, self._rows_path):
+                if path.exists():
+                    path.unlink()
+            meta = {"version": self.version, "dim": self.dim, "synced_through": 0}
+            self._write_meta(meta)
+        self._meta = meta
+        for path in (self._vectors_path, self._rows_path):
+            path.touch()
+        # A write interrupted between the two files leaves extra vectors; rows decide the count
+        self._count = min(self._vectors_path.stat().st_size // (4 * self.dim),
+                          self._rows_path.stat().st_size // 16)
+        self._mapped_count = -1
+        self._vectors = self._rows = None
+        self._ids = set(self._map()[1][:, 0].tolist())
+
+    def _write_meta(self, meta: Dict[str, Any]):
+        tmp = self._meta_path.with_suffix(".tmp")
+        tmp.write_text(json.dumps(meta))
+        os.replace(tmp, self._meta_path)
+
+    def _map(self):
+        """Memory maps of the vectors and rows; remapped after the index grew."""
+        with self._lock:
+            if self._mapped_count != self._count:
+                if self._count:
+                    self._vectors = np.memmap(self._vectors_path, dtype=np.float32, mode="r",
+                                              shape=(self._count, self.dim))
+                    self._rows = np.memmap(self._rows_path, dtype=np.int64, mode="r", shape=(self._count, 2))
+                else:
+                    self._vectors = np.empty((0, self.dim), dtype=np.float32)
+                    self._rows = np.empty((0, 2), dtype=np.int64)
+                self._mapped_count = self._count
+            return self._vectors, self._rows
+
+    def __len__(self) -> int:
+        return self._count
+
+    def __contains__(self, analysis_id: int) -> bool:
+        return analysis_id in self._ids
+
+    def _resolve(self, image_path: str) -> Path:
+        path = Path(image_path.replace("file://", ""))
+        return path if path.is_absolute() else self.base_dir / path
+
+    def add(self, analysis_id: int, patient_id: int, image: ImageSource) -> bool:
+        """Index the image of a saved analysis; returns False if it is already indexed."""
+        if analysis_id in self._ids:
+            return False
+        vector = self.embed(self._resolve(image) if isinstance(image, str) else image)
+        vector = np.asarray(vector, dtype=np.float32).reshape(self.dim)
+        with self._lock:
+            if analysis_id in self._ids:
+                return False
+            # Vectors first: a crash in between leaves a vector without a row, which is ignored
+            with open(self._vectors_path, "r+b") as f:
+                f.seek(self._count * 4 * self.dim)
+                f.write(vector.tobytes())
+            with open(self._rows_path, "r+b") as f:
+                f.seek(self._count * 16)
+                f.write(np.array([analysis_id, patient_id], dtype=np.int64).tobytes())
+            self._ids.add(analysis_id)
+            self._count += 1
+            if self._ann is not None:
+                self._ann.add_items(vector[np.newaxis], [self._count - 1])
+        return True
+
+    def add_async(self, analysis_id: int, patient_id: int, image: ImageSource) -> Future:
+        """Index on a background thread; failures are logged."""
+        future = self._executor.submit(self.add, analysis_id, patient_id, image)
+        future.add_done_callback(self._log_failure)
+        return future
+
+    @staticmethod
+    def _log_failure(future: Future):
+        if future.exception() is not None:
+            logger.warning("Could not index analysis image: %s", future.exception())
+
+    def search(self, query: Union[np.ndarray, ImageSource], k: int = 5,
+               patient_id: Optional[int] = None, exclude: Iterable[int] = ()) -> List[Dict[str, Any]]:
+        """The ``k`` most similar indexed analyses, best first.
+
+        ``query`` is an image or a vector from ``embed``. ``patient_id``
+        restricts the search to one patient; ``exclude`` skips analysis ids.
+        """
+        if not isinstance(query, np.ndarray):
+            query = self.embed(self._resolve(query) if isinstance(query, str) else query)
+        query = np.asarray(query, dtype=np.float32).reshape(self.dim)
+        exclude = set(exclude)
+        vectors, rows = self._map()
+        if not len(rows):
+            return []
+
+        if patient_id is None and self._use_ann(len(rows)):
+            labels, distances = self._ann.knn_query(query, k=min(len(rows), k + len(exclude)))
+            candidates, scores = labels[0].astype(np.int64), 1.0 - distances[0]
+        else:
+            candidates = np.flatnonzero(rows[:, 1] == patient_id) if patient_id is not None else None
+            scores = (vectors[candidates] if candidates is not None else vectors) @ query
+            if candidates is None:
+                candidates = np.arange(len(scores))
+            if exclude:
+                keep = ~np.isin(rows[candidates, 0], list(exclude))
+                candidates, scores = candidates[keep], scores[keep]
+            if len(scores) > k:
+                top = np.argpartition(-scores, k)[:k]
+                candidates, scores = candidates[top], scores[top]
+
+        order = np.argsort(-scores)
+        results = []
+        for i in order:
+            analysis_id, owner = (int(v) for v in rows[candidates[i]])
+            if analysis_id in exclude:
+                continue
+            results.append({"analysis_id": analysis_id, "patient_id": owner, "score": round(float(scores[i]), 4)})
+        return results[:k]
+
+    def _use_ann(self, count: int) -> bool:
+        if hnswlib is None or count < self.ann_threshold:
+            return False
+        with self._lock:
+            if self._ann is None:
+                logger.info("Building approximate similarity index over %d lesions", count)
+                index = hnswlib.Index(space="ip", dim=self.dim)
+                index.init_index(max_elements=max(count * 2, 1024), ef_construction=200, M=16)
+                index.add_items(np.asarray(self._vectors), np.arange(count))
+                index.set_ef(64)
+                self._ann = index
+            if self._ann.get_max_elements() < self._count + 1:
+                self._ann.resize_index(self._count * 2)
+        return True
+
+    def sync(self, db) -> int:
+        """Index saved analyses not indexed yet, e.g. from the batch CLI; returns how many were added."""
+        added = 0
+        last_id = self._meta.get("synced_through", 0)
+        for row in db.get_analysis_images(after_id=last_id):
+            last_id = max(last_id, row["id"])
+            if row["id"] in self._ids:
+                continue
+            try:
+                added += self.add(row["id"], row["patient_id"], row["image_path"])
+            except Exception as e:
+                logger.warning("Could not index analysis %s: %s", row["id"], e)
+        self._meta["synced_through"] = last_id
+        self._write_meta(self._meta)
+        return added
+
+    def start_sync(self, db_factory: Callable[[], Any]) -> bool:
+        """Run ``sync`` on a background thread with its own connection."""
+        if self._sync_thread is not None and self._sync_thread.is_alive():
+            return False
+
+        def target():
+            try:
+                db = db_factory()
+                try:
+                    added = self.sync(db)
+                finally:
+                    db.close()
+                logger.info("Similarity index synced, %d analyses added", added)
+            except Exception as e:
+                logger.error("Similarity index sync failed: %s", e)
+
+        self._sync_thread = threading.Thread(target=target, name="similarity-sync", daemon=True)
+        self._sync_thread.start()
+        return True
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "lesions": self._count,
+            "dim": self.dim,
+            "bytes": self._count * 4 * self.dim,
+            "approximate": self._ann is not None,
+        }
+
+    def shutdown(self):
+        self._executor.shutdown(wait=True)
@@ -0,0 +1,211 @@
+"""Background reclamation of upload storage.
+
+Uploads that no saved analysis refers to (images that were never analyzed,
+or whose result was never saved) are deleted once they are older than a
+grace period. Optionally, old originals are re-encoded into a smaller
+lossless (or high-quality) format and their analyses are repointed to the
+new file. All file I/O is throttled so the job never competes with the
+interactive part of the application.
+"""
+
+import io
+import logging
+import os
+import threading
+import time
+from pathlib import Path
+from typing import Any, Callable, Dict, Iterable, Optional, Set, Tuple
+
+from PIL import Image
+
+from .config import DEFAULT_STORAGE
+from .image_store import ImageStore
+from .thumbnails import ThumbnailCache
+
+logger = logging.getLogger(__name__)
+
+
+# Formats that can be re-encoded without losing information
+LOSSLESS_SOURCE_FORMATS = {"PNG", "BMP", "TIFF"}
+
+
+def _normalize(path: str, base_dir: Path) -> str:
+    candidate = Path(path.replace("file://", ""))
+    if not candidate.is_absolute():
+        candidate = base_dir / candidate
+    return os.path.normcase(os.path.realpath(str(candidate)))
+
+
+class _Throttle:
+    """Keeps the average I/O rate below a byte budget by sleeping."""
+
+    def __init__(self, bytes_per_second: float, stop_event: threading.Event):
+        self.bytes_per_second = bytes_per_second
+        self.stop_event = stop_event
+        self._started = time.monotonic()
+        self._consumed = 0
+
+    def consume(self, count: int):
+        if not self.bytes_per_second:
+            return
+        self._consumed += count
+        ahead = self._consumed / self.bytes_per_second - (time.monotonic() - self._started)
+        if ahead > 0:
+            # Waiting on the event keeps stop() responsive during long pauses
+            self.stop_event.wait(ahead)
+
+
+class StorageMaintenance:
+    def __init__(self, image_store: ImageStore, db_factory: Callable[[], Any],
+                 thumbnails: Optional[ThumbnailCache] = None,
+                 protected_paths: Optional[Callable[[], Iterable[str]]] = None,
+                 settings: Optional[Dict[str, Any]] = None,
+                 base_dir: Optional[str] = None):
+        self.image_store = image_store
+        self.db_factory = db_factory
+        self.thumbnails = thumbnails
+        self.protected_paths = protected_paths or (lambda: ())
+        self.settings = dict(DEFAULT_STORAGE)
+        self.settings.update(settings or {})
+        self.base_dir = Path(base_dir) if base_dir else Path(__file__).parent.parent
+        self._stop = threading.Event()
+        self._thread = None
+
+    def is_running(self) -> bool:
+        return self._thread is not None and self._thread.is_alive()
+
+    def start(self, on_finished: Optional[Callable[[Dict[str, Any]], None]] = None) -> bool:
+        """Run the job on a background thread; returns False if it is already running."""
+        if self.is_running():
+            return False
+        self._stop.clear()
+
+        def target():
+            try:
+                report = self.run()
+            except Exception as e:
+                logger.error("Storage maintenance failed: %s", e)
+                report = {"error": str(e)}
+            if on_finished:
+                on_finished(report)
+
+        self._thread = threading.Thread(target=target, name="storage-maintenance", daemon=True)
+        self._thread.start()
+        return True
+
+    def stop(self, timeout: Optional[float] = None):
+        """Ask a running job to finish after the current file."""
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join(timeout)
+
+    def _referenced_paths(self, db) -> Tuple[Dict[str, Dict[str, int]], Set[str]]:
+        """Stored path forms with their analysis counts per file, and the files in use right now."""
+        referenced: Dict[str, Dict[str, int]] = {}
+        for stored, count in db.get_image_path_counts().items():
+            if stored:
+                referenced.setdefault(_normalize(stored, self.base_dir), {})[stored] = count
+        protected = {_normalize(p, self.base_dir) for p in self.protected_paths() if p}
+        return referenced, protected
+
+    def run(self) -> Dict[str, Any]:
+        """Delete orphaned uploads and optionally recompress old ones."""
+        report = {
+            "scanned": 0,
+            "orphans_deleted": 0,
+            "recompressed": 0,
+            "bytes_reclaimed": 0,
+            "temp_files_removed": 0,
+            "errors": 0,
+            "duration_s": 0.0,
+        }
+        started = time.monotonic()
+        throttle = _Throttle(self.settings["max_bytes_per_second"], self._stop)
+        now = time.time()
+        grace_cutoff = now - self.settings["orphan_grace_days"] * 86400
+        recompress_days = self.settings["recompress_after_days"]
+        recompress_cutoff = now - recompress_days * 86400 if recompress_days else None
+
+        report["temp_files_removed"] = self.image_store.cleanup_temp_files(max_age=3600)
+
+        db = self.db_factory()
+        try:
+            referenced, protected = self._referenced_paths(db)
+            for path in self.image_store.iter_files():
+                if self._stop.is_set():
+                    report["stopped"] = True
+                    break
+                report["scanned"] += 1
+                try:
+                    stat = path.stat()
+                    normalized = _normalize(str(path), self.base_dir)
+                    if normalized not in referenced and normalized not in protected:
+                        if stat.st_mtime < grace_cutoff:
+                            report["bytes_reclaimed"] += self._delete(path, stat.st_size)
+                            report["orphans_deleted"] += 1
+                            throttle.consume(stat.st_size)
+                    elif recompress_cutoff and stat.st_mtime < recompress_cutoff and normalized not in protected:
+                        throttle.consume(stat.st_size)
+                        saved = self._recompress(db, path, stat.st_size, referenced.get(normalized, {}))
+                        if saved:
+                            report["recompressed"] += 1
+                            report["bytes_reclaimed"] += saved
+                except Exception as e:
+                    report["errors"] += 1
+                    logger.warning("Storage maintenance skipped %s: %s", path, e)
+        finally:
+            db.close()
+
+        report["duration_s"] = round(time.monotonic() - started, 3)
+        logger.info("Storage maintenance finished: %s", report)
+        return report
+
+    def _delete(self, path: Path, size: int) -> int:
+        freed = size
+        if self.thumbnails is not None:
+            freed += self.thumbnails.remove(str(path))
+        path.unlink()
+        return freed
+
+    def _encode(self, path: Path) -> Optional[bytes]:
+        """Re-encode an image according to the configured mode, or None if not applicable."""
+        with Image.open(path) as img:
+            lossless = img.format in LOSSLESS_SOURCE_FORMATS
+            if img.format == "WEBP" or (not lossless and self.settings["recompress_mode"] != "high_quality"):
+                return None
+            img.load()
+            buffer = io.BytesIO()
+            if lossless:
+                img.save(buffer, "WEBP", lossless=True, quality=100, method=6)
+            else:
+                img.convert("RGB").save(buffer, "WEBP", quality=95, method=6)
+            return buffer.getvalue()
+
+    def _recompress(self, db, path: Path, size: int, references: Dict[str, int]) -> int:
+        """Replace an original with a smaller encoding, returning the bytes saved.
+
+        ``references`` maps each form in which analyses store this file's
+        path to the number of those analyses.
+        """
+        data = self._encode(path)
+        if not references or data is None or len(data) > size * (1.0 - self.settings["recompress_min_savings"]):
+            return 0
+
+        # Write the new blob and repoint the analyses before the old file disappears,
+        # so an interruption at any point leaves at most an orphan behind
+        stored = self.image_store.save_bytes(data, ".webp")
+        repointed = {old_path: db.update_image_path(old_path, stored.path) for old_path in references}
+        if any(repointed[old_path] < count for old_path, count in references.items()):
+            # Some analysis still names the original (e.g. it was edited meanwhile): keep it.
+            # A blob that existed before may be used by other analyses, so only a new one is undone.
+            if not stored.deduplicated:
+                for old_path, count in repointed.items():
+                    if count:
+                        db.update_image_path(stored.path, old_path)
+                Path(stored.path).unlink()
+            logger.warning("Kept %s: only %d of %d analyses could be repointed",
+                           path, sum(repointed.values()), sum(references.values()))
+            return 0
+        self._delete(path, size)
+        logger.debug("Recompressed %s -> %s (%d -> %d bytes)", path, stored.path, size, len(data))
+        return size - len(data)
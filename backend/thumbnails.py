@@ -0,0 +1,180 @@
+"""Thumbnail generation, on-disk cache and QML image provider.
+
+History views only need small previews, so instead of letting QML decode the
+full-resolution upload on the GUI thread, thumbnails in a few fixed sizes are
+generated off-thread (eagerly after an upload, or lazily on first request),
+cached next to the uploads and served through the ``image://thumbnails``
+provider, e.g. ``image://thumbnails/small/<image path>``.
+"""
+
+import hashlib
+import logging
+import os
+import re
+import tempfile
+from concurrent.futures import Future, ThreadPoolExecutor
+from pathlib import Path
+from typing import Dict, Iterable, Optional
+from urllib.parse import unquote
+
+from PIL import Image, ImageOps
+from PySide6.QtCore import QSize
+from PySide6.QtGui import QImage
+from PySide6.QtQuick import QQuickAsyncImageProvider, QQuickImageResponse, QQuickTextureFactory
+
+logger = logging.getLogger(__name__)
+
+# Longest edge in pixels for every thumbnail size
+THUMBNAIL_SIZES = {
+    "small": 96,
+    "medium": 320,
+    "large": 1024,
+}
+
+_DIGEST_RE = re.compile(r"^[0-9a-f]{64}$")
+
+
+class ThumbnailCache:
+    def __init__(self, cache_dir: str, base_dir: Optional[str] = None,
+                 sizes: Optional[Dict[str, int]] = None, quality: int = 85, workers: int = 2):
+        self.cache_dir = Path(cache_dir)
+        self.base_dir = Path(base_dir) if base_dir else Path(__file__).parent.parent
+        self.sizes = dict(sizes or THUMBNAIL_SIZES)
+        self.quality = quality
+        self.executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="thumbnails")
+
+    def _resolve(self, image_path: str) -> Path:
+        path = Path(image_path.replace("file://", ""))
+        return path if path.is_absolute() else self.base_dir / path
+
+    def _key(self, source: Path) -> str:
+        """Content-addressed uploads are keyed by their digest, anything else by path and mtime."""
+        if _DIGEST_RE.match(source.stem):
+            return source.stem
+        stat = source.stat()
+        return hashlib.sha1(f"{source.resolve()}:{stat.st_mtime_ns}:{stat.st_size}".encode()).hexdigest()
+
+    def thumbnail_path(self, image_path: str, size_name: str) -> Path:
+        """Location of a cached thumbnail (which may not exist yet)."""
+        if size_name not in self.sizes:
+            raise ValueError(f"Unknown thumbnail size: {size_name}")
+        key = self._key(self._resolve(image_path))
+        return self.cache_dir / size_name / key[:2] / f"{key}.jpg"
+
+    def generate(self, image_path: str, size_names: Optional[Iterable[str]] = None,
+                 image: Optional[Image.Image] = None) -> Dict[str, Path]:
+        """Create the missing thumbnails of an image, decoding the source at most once.
+
+        An already decoded ``image`` may be passed to skip reading the file.
+        """
+        size_names = list(size_names or self.sizes)
+        targets = {name: self.thumbnail_path(image_path, name) for name in size_names}
+        missing = [name for name, target in targets.items() if not target.exists()]
+        if not missing:
+            return targets
+
+        # Largest first, so every smaller size is resampled from the previous one
+        missing.sort(key=lambda name: self.sizes[name], reverse=True)
+        largest = self.sizes[missing[0]]
+
+        if image is None:
+            source = Image.open(self._resolve(image_path))
+            # JPEG can decode directly at a reduced scale (1/2, 1/4, 1/8)
+            source.draft("RGB", (largest, largest))
+            source = ImageOps.exif_transpose(source)
+        else:
+            source = image
+        # convert() always returns a new image, so a caller's image is never modified
+        current = source.convert("RGB")
+
+        for name in missing:
+            edge = self.sizes[name]
+            current.thumbnail((edge, edge), Image.LANCZOS)
+            self._save(current, targets[name])
+        return targets
+
+    def _save(self, image: Image.Image, target: Path):
+        target.parent.mkdir(parents=True, exist_ok=True)
+        fd, tmp_path = tempfile.mkstemp(prefix=".tmp-", suffix=".jpg", dir=str(target.parent))
+        try:
+            with os.fdopen(fd, "wb") as f:
+                image.save(f, "JPEG", quality=self.quality, optimize=True)
+            os.replace(tmp_path, target)
+        except BaseException:
+            try:
+                os.unlink(tmp_path)
+            except OSError:
+                pass
+            raise
+
+    def get(self, image_path: str, size_name: str) -> Path:
+        """Path of a thumbnail, generating it if it is not cached yet."""
+        target = self.thumbnail_path(image_path, size_name)
+        if not target.exists():
+            self.generate(image_path, [size_name])
+        return target
+
+    def prefetch(self, image_path: str, image: Optional[Image.Image] = None) -> Future:
+        """Generate all sizes in the background (e.g. right after an upload)."""
+        future = self.executor.submit(self.generate, image_path, None, image)
+        future.add_done_callback(self._log_failure)
+        return future
+
+    def remove(self, image_path: str) -> int:
+        """Delete every cached thumbnail of an image, returning the bytes freed."""
+        freed = 0
+        for name in self.sizes:
+            try:
+                target = self.thumbnail_path(image_path, name)
+            except OSError:
+                continue
+            if target.exists():
+                freed += target.stat().st_size
+                target.unlink()
+        return freed
+
+    @staticmethod
+    def _log_failure(future: Future):
+        if future.exception() is not None:
+            logger.warning("Thumbnail generation failed: %s", future.exception())
+
+    def shutdown(self):
+        self.executor.shutdown(wait=False)
+
+
+class _ThumbnailResponse(QQuickImageResponse):
+    def __init__(self):
+        super().__init__()
+        self._image = QImage()
+        self._error = ""
+
+    def set_result(self, future: Future):
+        """Called from a worker thread; ``finished`` may be emitted from any thread."""
+        try:
+            self._image = QImage(str(future.result()))
+            if self._image.isNull():
+                self._error = "Could not load thumbnail"
+        except Exception as e:
+            self._error = str(e)
+        self.finished.emit()
+
+    def textureFactory(self) -> QQuickTextureFactory:
+        return QQuickTextureFactory.textureFactoryForImage(self._image)
+
+    def errorString(self) -> str:
+        return self._error
+
+
+class ThumbnailProvider(QQuickAsyncImageProvider):
+    """Serves ``image://thumbnails/<size>/<image path>`` without blocking the GUI thread."""
+
+    def __init__(self, cache: ThumbnailCache):
+        super().__init__()
+        self.cache = cache
+
+    def requestImageResponse(self, id: str, requestedSize: QSize) -> QQuickImageResponse:
+        response = _ThumbnailResponse()
+        size_name, _, image_path = unquote(id).partition("/")
+        future = self.cache.executor.submit(self.cache.get, image_path, size_name)
+        future.add_done_callback(response.set_result)
+        return response
@@ -0,0 +1,209 @@
+"""Structured per-stage tracing for the analysis pipeline.
+
+Every stage of an analysis (image copy, upload, server inference, response
+parsing, database insert) is recorded as a span carrying its duration and
+byte count. Spans belonging to one analysis share a trace id, are written as
+JSON lines to a rotating local log and are aggregated in memory so that a
+p50/p95 summary per stage is available at any time.
+"""
+
+import json
+import logging
+import math
+import sys
+import threading
+import time
+import uuid
+from collections import defaultdict, deque
+from contextlib import contextmanager
+from logging.handlers import RotatingFileHandler
+from pathlib import Path
+from typing import Any, Deque, Dict, Iterable, Iterator, List, Optional
+
+logger = logging.getLogger(__name__)
+
+
+class Span:
+    """A single timed pipeline stage."""
+
+    __slots__ = ("stage", "trace_id", "started_at", "duration_ms", "bytes", "attrs", "error")
+
+    def __init__(self, stage: str, trace_id: str, attrs: Optional[Dict[str, Any]] = None):
+        self.stage = stage
+        self.trace_id = trace_id
+        self.started_at = time.time()
+        self.duration_ms = 0.0
+        self.bytes = 0
+        self.attrs = dict(attrs or {})
+        self.error = None
+
+    def add_bytes(self, count: int):
+        """Account bytes moved by this stage."""
+        self.bytes += count
+
+    def set(self, **attrs):
+        """Attach extra attributes (e.g. the analysis id once it is known)."""
+        self.attrs.update(attrs)
+
+    def to_dict(self) -> Dict[str, Any]:
+        record = {
+            "trace_id": self.trace_id,
+            "stage": self.stage,
+            "ts": round(self.started_at, 3),
+            "duration_ms": round(self.duration_ms, 3),
+            "bytes": self.bytes,
+        }
+        if self.attrs:
+            record["attrs"] = self.attrs
+        if self.error:
+            record["error"] = self.error
+        return record
+
+
+def _percentile(sorted_values: List[float], fraction: float) -> float:
+    """Nearest-rank percentile of an already sorted list."""
+    if not sorted_values:
+        return 0.0
+    rank = max(1, int(math.ceil(fraction * len(sorted_values))))
+    return sorted_values[rank - 1]
+
+
+def latency_stats(durations_ms: Iterable[float]) -> Dict[str, float]:
+    """count/mean/p50/p95/p99/max of a set of latencies in milliseconds."""
+    values = sorted(float(d) for d in durations_ms)
+    if not values:
+        return {"count": 0, "mean_ms": 0.0, "p50_ms": 0.0, "p95_ms": 0.0, "p99_ms": 0.0, "max_ms": 0.0}
+    return {
+        "count": len(values),
+        "mean_ms": round(sum(values) / len(values), 3),
+        "p50_ms": round(_percentile(values, 0.50), 3),
+        "p95_ms": round(_percentile(values, 0.95), 3),
+        "p99_ms": round(_percentile(values, 0.99), 3),
+        "max_ms": round(values[-1], 3),
+    }
+
+
+def summarize(records: Iterable[Dict[str, Any]]) -> Dict[str, Dict[str, float]]:
+    """Aggregate span records into count/p50/p95/max/bytes per stage."""
+    durations: Dict[str, List[float]] = defaultdict(list)
+    byte_totals: Dict[str, int] = defaultdict(int)
+    errors: Dict[str, int] = defaultdict(int)
+    for record in records:
+        stage = record["stage"]
+        durations[stage].append(float(record["duration_ms"]))
+        byte_totals[stage] += int(record.get("bytes", 0))
+        if record.get("error"):
+            errors[stage] += 1
+
+    summary = {}
+    for stage, values in durations.items():
+        values.sort()
+        summary[stage] = {
+            "count": len(values),
+            "p50_ms": round(_percentile(values, 0.50), 3),
+            "p95_ms": round(_percentile(values, 0.95), 3),
+            "max_ms": round(values[-1], 3),
+            "bytes": byte_totals[stage],
+            "errors": errors[stage],
+        }
+    return summary
+
+
+class Tracer:
+    """Records spans to a rotating JSON-lines log and keeps a rolling window per stage."""
+
+    def __init__(self, log_path: Optional[str] = None, max_bytes: int = 5 * 1024 * 1024,
+                 backup_count: int = 5, window: int = 1000):
+        self._lock = threading.Lock()
+        self._window = window
+        self._recent: Dict[str, Deque[Dict[str, Any]]] = defaultdict(lambda: deque(maxlen=self._window))
+        self._trace_logger = None
+
+        if log_path:
+            try:
+                Path(log_path).parent.mkdir(parents=True, exist_ok=True)
+                handler = RotatingFileHandler(log_path, maxBytes=max_bytes,
+                                              backupCount=backup_count, encoding="utf-8")
+                handler.setFormatter(logging.Formatter("%(message)s"))
+                # A dedicated, non-propagating logger keeps span records out of the console
+                self._trace_logger = logging.getLogger(f"{__name__}.spans.{id(self)}")
+                self._trace_logger.setLevel(logging.INFO)
+                self._trace_logger.propagate = False
+                self._trace_logger.addHandler(handler)
+            except OSError as e:
+                logger.warning("Could not open trace log %s: %s", log_path, e)
+
+    @staticmethod
+    def new_trace_id() -> str:
+        """Generate an id used to correlate all spans of one analysis."""
+        return uuid.uuid4().hex[:16]
+
+    @contextmanager
+    def span(self, stage: str, trace_id: Optional[str] = None, **attrs) -> Iterator[Span]:
+        """Time the enclosed block as one pipeline stage."""
+        span = Span(stage, trace_id or "-", attrs)
+        start = time.perf_counter()
+        try:
+            yield span
+        except BaseException:
+            span.error = repr(sys.exc_info()[1])
+            raise
+        finally:
+            span.duration_ms = (time.perf_counter() - start) * 1000.0
+            self.record(span)
+
+    def record(self, span: Span):
+        """Store a finished span."""
+        record = span.to_dict()
+        with self._lock:
+            self._recent[span.stage].append(record)
+        if self._trace_logger is not None:
+            self._trace_logger.info(json.dumps(record, ensure_ascii=False))
+
+    def summary(self) -> Dict[str, Dict[str, float]]:
+        """p50/p95 per stage over the in-memory window."""
+        with self._lock:
+            records = [r for stage_records in self._recent.values() for r in stage_records]
+        return summarize(records)
+
+    def trace(self, trace_id: str) -> List[Dict[str, Any]]:
+        """All spans still in memory for one analysis, in start order."""
+        with self._lock:
+            records = [r for stage_records in self._recent.values()
+                       for r in stage_records if r["trace_id"] == trace_id]
+        return sorted(records, key=lambda r: r["ts"])
+
+
+def load_log(paths: Iterable[str]) -> List[Dict[str, Any]]:
+    """Read span records from trace log files, skipping damaged lines."""
+    records = []
+    for path in paths:
+        try:
+            with open(path, "r", encoding="utf-8") as f:
+                for line in f:
+                    try:
+                        records.append(json.loads(line))
+                    except ValueError:
+                        continue
+        except OSError as e:
+            logger.warning("Could not read trace log %s: %s", path, e)
+    return records
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    """Print a per-stage latency summary of one or more trace logs."""
+    paths = argv if argv is not None else sys.argv[1:]
+    if not paths:
+        print("Usage: python -m backend.tracing <trace.log> [<trace.log.1> ...]")
+        return 1
+
+    summary = summarize(load_log(paths))
+    print(f"{'stage':<16}{'count':>8}{'p50 ms':>12}{'p95 ms':>12}{'max ms':>12}{'bytes':>14}{'errors':>8}")
+    for stage, stats in sorted(summary.items()):
+        print(f"{stage:<16}{stats['count']:>8}{stats['p50_ms']:>12.1f}{stats['p95_ms']:>12.1f}"
+              f"{stats['max_ms']:>12.1f}{stats['bytes']:>14}{stats['errors']:>8}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
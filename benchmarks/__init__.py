@@ -0,0 +1 @@
+"""Performance benchmarks of the backend hot paths; run with ``python -m benchmarks``."""
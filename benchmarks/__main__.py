@@ -0,0 +1,101 @@
+"""Run the benchmark suite and compare it with the stored baseline.
+
+    python -m benchmarks                      # all groups, compared with baseline.json
+    python -m benchmarks metadata save_image  # selected groups
+    python -m benchmarks --update-baseline    # record the results as the new baseline
+    python -m benchmarks database --rows 10000,100000
+
+Exits with 1 if any benchmark is slower than its baseline by more than the
+threshold. The first run on a machine has nothing to compare with and
+records its results as the baseline.
+"""
+
+import argparse
+import json
+import logging
+import sys
+import tempfile
+from pathlib import Path
+
+from . import bench_database, bench_metadata, bench_predict, bench_save_image
+from .harness import (BASELINE_FILE, DEFAULT_THRESHOLD, BenchmarkSkipped, compare, load_baseline,
+                      record_first_baseline, save_baseline)
+
+GROUPS = {
+    "metadata": bench_metadata.run,
+    "save_image": bench_save_image.run,
+    "predict": bench_predict.run,
+    "database": bench_database.run,
+}
+
+
+def _rows(value: str):
+    return [int(part) for part in value.split(",") if part.strip()]
+
+
+def build_parser() -> argparse.ArgumentParser:
+    parser = argparse.ArgumentParser(prog="python -m benchmarks", description="SkinSight backend benchmarks.")
+    parser.add_argument("groups", nargs="*", metavar="group",
+                        help=f"groups to run: {', '.join(GROUPS)} (default: all)")
+    parser.add_argument("--repeat", type=int, default=20, help="timed samples per benchmark (default: 20)")
+    parser.add_argument("--rows", type=_rows, default=[10000, 100000, 1000000],
+                        help="patient table sizes for the database group (default: 10000,100000,1000000)")
+    parser.add_argument("--database", default="skinsight_bench", help="database filled for the database group")
+    parser.add_argument("--baseline", type=Path, default=BASELINE_FILE)
+    parser.add_argument("--threshold", type=float, default=DEFAULT_THRESHOLD,
+                        help="allowed slowdown of the median, as a fraction (default: 0.25)")
+    parser.add_argument("--update-baseline", action="store_true", help="store the results as the new baseline")
+    parser.add_argument("--json", action="store_true", help="print results and comparison as JSON")
+    return parser
+
+
+def main(argv=None) -> int:
+    parser = build_parser()
+    args = parser.parse_args(argv)
+    unknown = set(args.groups) - set(GROUPS)
+    if unknown:
+        parser.error(f"unknown groups: {', '.join(sorted(unknown))}")
+    logging.basicConfig(level=logging.INFO, format="%(asctime)s %(levelname)s %(name)s: %(message)s")
+
+    # The bridge's timers and worker signals need an application object
+    from PySide6.QtCore import QCoreApplication
+    app = QCoreApplication.instance() or QCoreApplication(sys.argv[:1])  # noqa: F841
+
+    results = {}
+    skipped = {}
+    with tempfile.TemporaryDirectory(prefix="skinsight-bench-") as work_dir:
+        args.work_dir = Path(work_dir)
+        for group in args.groups or list(GROUPS):
+            try:
+                group_results = GROUPS[group](args)
+            except BenchmarkSkipped as e:
+                skipped[group] = str(e)
+                continue
+            results.update(group_results)
+            if not args.json:
+                for name, stats in group_results.items():
+                    print(f"{name:<48} p50 {stats['p50_ms']:>10.3f} ms  p95 {stats['p95_ms']:>10.3f} ms")
+
+    comparison = compare(results, load_baseline(args.baseline), args.threshold)
+    regressions = [entry for entry in comparison if entry["regressed"]]
+    if args.json:
+        print(json.dumps({"results": results, "comparison": comparison, "skipped": skipped}, ensure_ascii=False))
+    else:
+        for group, reason in skipped.items():
+            print(f"skipped {group}: {reason}")
+        for entry in regressions:
+            print(f"REGRESSION {entry['name']}: {entry['baseline_p50_ms']:.3f} -> {entry['p50_ms']:.3f} ms "
+                  f"({entry['change']:+.0%})")
+        print(f"{len(results)} benchmarks, {len(comparison)} compared with the baseline, "
+              f"{len(regressions)} regressions")
+
+    if args.update_baseline:
+        save_baseline(results, args.baseline)
+        return 0
+    if record_first_baseline(results, args.baseline):
+        print(f"no baseline yet, recorded these results in {args.baseline}", file=sys.stderr)
+    return 1 if regressions else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
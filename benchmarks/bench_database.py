@@ -0,0 +1,132 @@
+"""DatabaseManager queries on tables of 10k, 100k and 1M patients.
+
+Runs against a separate database (``skinsight_bench`` by default) on the
+MySQL server from config.json. The tables are filled once and topped up to
+each size in turn, so later runs only pay for the rows that are missing;
+filling a million patients takes a few minutes. Every patient has one
+analysis, and one patient has a long history with metadata for
+get_patient_analyses.
+"""
+
+import json
+import logging
+import tempfile
+from pathlib import Path
+
+from .harness import BenchmarkSkipped, Results, measure
+
+logger = logging.getLogger(__name__)
+
+BATCH_SIZE = 5000
+HISTORY_LENGTH = 50
+SURNAMES = ("Иванов", "Смирнов", "Кузнецов", "Попов", "Васильев", "Петров", "Соколов",
+            "Михайлов", "Новиков", "Фёдоров", "Морозов", "Волков", "Алексеев", "Лебедев")
+FIRST_NAMES = ("Александр", "Дмитрий", "Максим", "Сергей", "Андрей", "Алексей", "Артём",
+               "Илья", "Кирилл", "Михаил", "Никита", "Матвей", "Роман", "Егор")
+
+
+def _patient(i: int):
+    surname = SURNAMES[i % len(SURNAMES)]
+    first_name = FIRST_NAMES[i // len(SURNAMES) % len(FIRST_NAMES)]
+    return (f"{surname} {first_name} {i}", "male" if i % 2 else "female",
+            f"{1940 + i % 70}-{1 + i % 12:02d}-{1 + i % 28:02d}", f"+7{9000000000 + i}")
+
+
+def _count(db, table: str) -> int:
+    db.cursor.execute(f"SELECT COUNT(*) AS n FROM {table}")
+    return db.cursor.fetchone()["n"]
+
+
+def _fill(db, rows: int):
+    """Top the patients table up to ``rows`` patients, each with one analysis."""
+    have = _count(db, "patients")
+    if have >= rows:
+        return
+    logger.info("Filling %s patients (have %s)", rows, have)
+    db.cursor.execute("SELECT COALESCE(MAX(id), 0) AS last_id FROM patients")
+    last_id = db.cursor.fetchone()["last_id"]
+    for start in range(have, rows, BATCH_SIZE):
+        db.cursor.executemany(
+            "INSERT INTO patients (full_name, gender, birth_date, phone) VALUES (%s, %s, %s, %s)",
+            [_patient(i) for i in range(start, min(rows, start + BATCH_SIZE))]
+        )
+        db.connection.commit()
+    db.cursor.execute(
+        """
+        INSERT INTO mole_analyses (patient_id, image_path, melanoma_probability, predictions, diagnosis_text)
+        SELECT id, CONCAT('bench/', id, '.jpg'), RAND(id), %s, 'Melanoma'
+        FROM patients WHERE id > %s
+        """,
+        (json.dumps({"Melanoma": 0.2, "Nevus": 0.8}), last_id)
+    )
+    db.connection.commit()
+
+
+def _history_patient(db) -> int:
+    """The first patient, given a long history with metadata on first use."""
+    db.cursor.execute("SELECT MIN(id) AS id FROM patients")
+    patient_id = db.cursor.fetchone()["id"]
+    db.cursor.execute("SELECT COUNT(*) AS n FROM mole_analyses WHERE patient_id = %s", (patient_id,))
+    for _ in range(db.cursor.fetchone()["n"], HISTORY_LENGTH):
+        db.add_analysis({
+            "patient_id": patient_id,
+            "image_path": "bench/history.jpg",
+            "melanoma_probability": 0.3,
+            "predictions": json.dumps({"Melanoma": 0.3, "Nevus": 0.7}),
+            "diagnosis_text": "Melanoma",
+            "metadata": {"detail_text": "Low Risk", "mole_detection_probability": "0.9", "engine": "remote"},
+        })
+    return patient_id
+
+
+def _connect(database: str):
+    import mysql.connector
+    from backend.database_manager import DatabaseManager
+
+    config_path = Path(__file__).parent.parent / "config.json"
+    with open(config_path, "r", encoding="utf-8") as f:
+        config = json.load(f)
+    config.setdefault("database", {})["database"] = database
+    with tempfile.NamedTemporaryFile("w", suffix=".json", delete=False) as f:
+        json.dump(config, f)
+    try:
+        return DatabaseManager(f.name)
+    except mysql.connector.Error as e:
+        raise BenchmarkSkipped(f"MySQL is not available: {e}")
+    finally:
+        Path(f.name).unlink()
+
+
+def run(options) -> Results:
+    db = _connect(options.database)
+    results = {}
+    try:
+        for rows in sorted(options.rows):
+            _fill(db, rows)
+            label = f"{rows // 1000}k" if rows < 1000000 else f"{rows // 1000000}M"
+            patient_id = _history_patient(db)
+            searches = {
+                "common name": "Иванов",
+                "phone": "+790000012",
+                "no match": "Несуществующий",
+            }
+            for kind, term in searches.items():
+                results[f"search_patients[{kind}, {label}]"] = measure(
+                    lambda: db.search_patients(term), repeat=options.repeat
+                )
+            results[f"search_patients[page 50, {label}]"] = measure(
+                lambda: db.search_patients("Иванов", offset=50 * 20), repeat=options.repeat
+            )
+            results[f"get_patient_analyses[{HISTORY_LENGTH} analyses, {label}]"] = measure(
+                lambda: db.get_patient_analyses(patient_id), repeat=options.repeat
+            )
+            # Uncached still reuses the parsed class matrix; only the SQL aggregation is repeated
+            results[f"get_clinic_analytics[uncached, {label}]"] = measure(
+                db.get_clinic_analytics, repeat=options.repeat, setup=db.analytics_cache.invalidate
+            )
+            results[f"get_clinic_analytics[cached, {label}]"] = measure(
+                db.get_clinic_analytics, repeat=options.repeat
+            )
+    finally:
+        db.close()
+    return results
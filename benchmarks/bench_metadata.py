@@ -0,0 +1,41 @@
+"""Parsing of analysis metadata as returned by get_patient_analyses."""
+
+import json
+import random
+
+from backend.database_manager import parse_metadata
+
+from .harness import Results, measure
+
+
+def _metadata_text(rng: random.Random, keys: int) -> str:
+    return ",".join(f"key_{k}:{rng.random():.6f}" for k in range(keys))
+
+
+def _history(rng: random.Random, analyses: int):
+    predictions = json.dumps({"Melanoma": 0.2, "Nevus": 0.7, "Dermatofibroma": 0.1})
+    return [{"predictions": predictions, "metadata": _metadata_text(rng, 4)} for _ in range(analyses)]
+
+
+def run(options) -> Results:
+    rng = random.Random(0)
+    results = {}
+    for keys in (3, 30):
+        texts = [_metadata_text(rng, keys) for _ in range(1000)]
+
+        def parse_all():
+            for text in texts:
+                parse_metadata(text)
+
+        results[f"parse_metadata[1000 x {keys} keys]"] = measure(parse_all, repeat=options.repeat)
+
+    # Everything a history view does per row after the query
+    history = _history(rng, 200)
+
+    def parse_history():
+        for row in history:
+            json.loads(row["predictions"])
+            parse_metadata(row["metadata"])
+
+    results["parse_history[200 analyses]"] = measure(parse_history, repeat=options.repeat, number=10)
+    return results
@@ -0,0 +1,41 @@
+"""ModelHandler.predict against the local fake prediction server.
+
+The server answers immediately, so the numbers are the client side of a
+prediction: reading and encoding the image, HTTP round trip on loopback and
+parsing the response.
+"""
+
+from PIL import Image
+
+from backend.fake_prediction_server import FakePredictionServer
+
+from .harness import Results, measure
+
+IMAGE_SIZES = (("640x480", (640, 480)), ("4000x3000", (4000, 3000)))
+
+
+def _write_jpeg(path, size):
+    Image.effect_noise(size, 64).convert("RGB").save(path, "JPEG", quality=90)
+
+
+def run(options) -> Results:
+    from backend.model_handler import ModelHandler
+
+    model = ModelHandler()
+    images = {}
+    for label, size in IMAGE_SIZES:
+        images[label] = str(options.work_dir / f"predict_{label}.jpg")
+        _write_jpeg(images[label], size)
+
+    results = {}
+    with FakePredictionServer() as server:
+        model.api_url = server.url
+        for label, image_path in images.items():
+            results[f"predict[{label}]"] = measure(lambda: model.predict(image_path),
+                                                   repeat=options.repeat)
+
+    with FakePredictionServer(payload_bytes=256 * 1024) as server:
+        model.api_url = server.url
+        results["predict[256KB response]"] = measure(lambda: model.predict(images["640x480"]),
+                                                     repeat=options.repeat)
+    return results
@@ -0,0 +1,45 @@
+"""BackendBridge.save_image for photos of several sizes.
+
+Every timed call saves a different file, so the content-addressed store
+really copies and hashes it; a separate benchmark covers re-saving an image
+that is already stored.
+"""
+
+import os
+
+from PIL import Image
+
+from backend.backend_bridge import BackendBridge
+from backend.tracing import Tracer
+
+from .harness import Results, measure
+
+IMAGE_SIZES = (("0.3MP", (640, 480)), ("2MP", (1920, 1080)), ("12MP", (4000, 3000)))
+
+
+def run(options) -> Results:
+    bridge = BackendBridge(deferred_init=True, upload_dir=str(options.work_dir / "uploads"))
+    bridge.tracer = Tracer()
+
+    results = {}
+    try:
+        for label, size in IMAGE_SIZES:
+            source = Image.effect_noise(size, 64).convert("RGB")
+            paths = []
+            for i in range(options.repeat + 2):
+                # One changed pixel is enough for a distinct content hash
+                source.putpixel((0, 0), (i % 256, i // 256 % 256, 0))
+                path = options.work_dir / f"save_{label}_{i}.jpg"
+                source.save(path, "JPEG", quality=95)
+                paths.append(str(path))
+
+            files = iter(paths)
+            results[f"save_image[{label}]"] = measure(lambda: bridge.save_image(next(files)),
+                                                      repeat=options.repeat)
+            results[f"save_image[{label}]"]["file_mb"] = round(os.path.getsize(paths[0]) / 1e6, 2)
+
+        results[f"save_image[{label} already stored]"] = measure(lambda: bridge.save_image(paths[0]),
+                                                        repeat=options.repeat)
+    finally:
+        bridge.thumbnails.shutdown()
+    return results
@@ -0,0 +1,105 @@
+"""Timing, baseline storage and regression checks for the benchmark suite.
+
+A benchmark result is the ``latency_stats`` of repeated calls of one
+operation. Results are compared by their median, which is far less noisy
+than the mean on a desktop machine; a benchmark regresses when its median
+grows by more than the threshold (and by more than a small absolute amount,
+so that microsecond-scale benchmarks do not flap).
+"""
+
+import json
+import platform
+import time
+from pathlib import Path
+from typing import Any, Callable, Dict, List, Optional
+
+from backend.tracing import latency_stats
+
+BASELINE_FILE = Path(__file__).parent / "baseline.json"
+DEFAULT_THRESHOLD = 0.25
+MIN_REGRESSION_MS = 0.05
+
+Results = Dict[str, Dict[str, float]]
+
+
+class BenchmarkSkipped(Exception):
+    """A benchmark group cannot run here, e.g. because MySQL is not available."""
+
+
+def measure(operation: Callable[[], Any], repeat: int = 20, warmup: int = 2,
+            number: int = 1, setup: Optional[Callable[[], Any]] = None) -> Dict[str, float]:
+    """Time ``repeat`` samples of ``operation``; ``setup`` runs untimed before each sample.
+
+    A sample calls the operation ``number`` times and records the time per
+    call, which keeps the timer overhead out of microsecond-scale operations.
+    """
+    for _ in range(warmup):
+        if setup is not None:
+            setup()
+        operation()
+    durations = []
+    for _ in range(repeat):
+        if setup is not None:
+            setup()
+        started = time.perf_counter()
+        for _ in range(number):
+            operation()
+        durations.append((time.perf_counter() - started) * 1000 / number)
+    return latency_stats(durations)
+
+
+def environment() -> Dict[str, str]:
+    return {
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "machine": platform.machine(),
+    }
+
+
+def load_baseline(path: Path = BASELINE_FILE) -> Results:
+    if not Path(path).exists():
+        return {}
+    with open(path, "r", encoding="utf-8") as f:
+        return json.load(f).get("results", {})
+
+
+def save_baseline(results: Results, path: Path = BASELINE_FILE, merge: bool = True):
+    """Store results as the new baseline; benchmarks not run this time are kept when merging."""
+    stored = load_baseline(path) if merge else {}
+    stored.update(results)
+    with open(path, "w", encoding="utf-8") as f:
+        json.dump({"environment": environment(), "results": dict(sorted(stored.items()))},
+                  f, indent=2, ensure_ascii=False)
+        f.write("\n")
+
+
+def record_first_baseline(results: Results, path: Path = BASELINE_FILE) -> bool:
+    """Store ``results`` as the baseline if there is none yet; returns whether it did.
+
+    Medians only compare on the same machine, so no baseline ships with the
+    repository: the first run on a machine records its own.
+    """
+    if Path(path).exists() or not results:
+        return False
+    save_baseline(results, path, merge=False)
+    return True
+
+
+def compare(results: Results, baseline: Results,
+            threshold: float = DEFAULT_THRESHOLD) -> List[Dict[str, Any]]:
+    """One entry per benchmark present in both sets, ``regressed`` set for slowdowns."""
+    comparison = []
+    for name, current in sorted(results.items()):
+        previous = baseline.get(name)
+        if not previous:
+            continue
+        before, after = previous["p50_ms"], current["p50_ms"]
+        change = (after - before) / before if before > 0 else 0.0
+        comparison.append({
+            "name": name,
+            "baseline_p50_ms": before,
+            "p50_ms": after,
+            "change": round(change, 3),
+            "regressed": change > threshold and after - before > MIN_REGRESSION_MS,
+        })
+    return comparison
@@ -28,9 +28,14 @@ CREATE TABLE IF NOT EXISTS mole_analyses (
     diagnosis_text TEXT,
     analyzed_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
     FOREIGN KEY (patient_id) REFERENCES patients(id) ON DELETE CASCADE,
-    INDEX idx_patient_analysis (patient_id, analyzed_at)
+    INDEX idx_patient_analysis (patient_id, analyzed_at),
+    INDEX idx_analyzed_risk (analyzed_at, melanoma_probability)
 );
 
+-- Databases created before idx_analyzed_risk existed get it from the application
+-- on connect; to add it by hand:
+-- ALTER TABLE mole_analyses ADD INDEX idx_analyzed_risk (analyzed_at, melanoma_probability);
+
 -- Analysis metadata table for storing additional analysis information
 CREATE TABLE IF NOT EXISTS analysis_metadata (
     id INT PRIMARY KEY AUTO_INCREMENT,
@@ -3,6 +3,8 @@ import QtQuick.Controls
 import QtQuick.Layouts
 
 import "./screens" as Screens
+import "./components" as Components
+import "." as App
 
 Window {
     id: root
@@ -20,4 +22,53 @@ Window {
             anchors.fill: parent
         }
     }
+
+    // Скрытая панель метрик для поддержки
+    Components.DiagnosticsPanel {
+        id: diagnosticsPanel
+    }
+
+    Shortcut {
+        sequence: "Ctrl+Shift+D"
+        context: Qt.ApplicationShortcut
+        onActivated: diagnosticsPanel.visible ? diagnosticsPanel.close() : diagnosticsPanel.open()
+    }
+
+    // Заставка, пока база данных и модель загружаются в фоне
+    Rectangle {
+        id: splash
+        anchors.fill: parent
+        color: App.Constants.appBackground
+        visible: opacity > 0
+        opacity: backend.initializing ? 1 : 0
+        Behavior on opacity { NumberAnimation { duration: 250 } }
+
+        // Не пропускаем клики к интерфейсу под заставкой
+        MouseArea {
+            anchors.fill: parent
+            hoverEnabled: true
+        }
+
+        ColumnLayout {
+            anchors.centerIn: parent
+            spacing: 20
+
+            Components.Logo {
+                implicitWidth: 100
+                implicitHeight: 100
+                Layout.alignment: Qt.AlignHCenter
+            }
+            BusyIndicator {
+                running: splash.visible
+                Layout.alignment: Qt.AlignHCenter
+            }
+            Text {
+                text: !backend.databaseReady ? qsTr("Подключение к базе данных...")
+                                             : qsTr("Загрузка модели...")
+                color: App.Constants.textPrimary
+                font.pixelSize: 16
+                Layout.alignment: Qt.AlignHCenter
+            }
+        }
+    }
 }
\ No newline at end of file
@@ -39,6 +39,13 @@ Rectangle {
                 anchors.margins: 10
                 spacing: 10
 
+                Text {
+                    text: qsTr("Фото")
+                    font.bold: true
+                    color: App.Constants.textPrimary
+                    Layout.preferredWidth: 48
+                }
+
                 Text {
                     text: qsTr("Дата")
                     font.bold: true
@@ -67,6 +74,7 @@ Rectangle {
             Layout.fillWidth: true
             Layout.fillHeight: true
             clip: true
+            reuseItems: true
             model: root.analyses
 
             ScrollBar.vertical: ScrollBar {}
@@ -87,6 +95,16 @@ Rectangle {
                     anchors.margins: 4
                     spacing: 10
 
+                    Image {
+                        // Small cached preview instead of decoding the full upload
+                        Layout.preferredWidth: 48
+                        Layout.preferredHeight: 48
+                        source: modelData.image_path ? "image://thumbnails/small/" + encodeURIComponent(modelData.image_path) : ""
+                        sourceSize: Qt.size(96, 96)
+                        fillMode: Image.PreserveAspectCrop
+                        asynchronous: true
+                    }
+
                     Text {
                         text: Qt.formatDateTime(new Date(modelData.analyzed_at), "dd.MM.yyyy HH:mm")
                         color: App.Constants.textPrimary
@@ -0,0 +1,109 @@
+// DiagnosticsPanel.qml
+// Скрытая панель диагностики (Ctrl+Shift+D): текущие значения метрик backend.get_diagnostics()
+import QtQuick
+import QtQuick.Controls
+import QtQuick.Layouts
+
+import "../" as App
+
+Popup {
+    id: root
+    modal: false
+    width: 760
+    height: 520
+    anchors.centerIn: Overlay.overlay
+    padding: 12
+
+    // Строки {name, labels, value}
+    property var rows: []
+    property string filterText: ""
+
+    function refresh() {
+        var all = backend.get_diagnostics()
+        if (!filterText) {
+            rows = all
+            return
+        }
+        var needle = filterText.toLowerCase()
+        rows = all.filter(function(row) {
+            return (row.name + " " + row.labels).toLowerCase().indexOf(needle) >= 0
+        })
+    }
+
+    onOpened: refresh()
+    onFilterTextChanged: refresh()
+
+    // Обновляется только пока панель открыта
+    Timer {
+        interval: 1000
+        repeat: true
+        running: root.visible
+        onTriggered: root.refresh()
+    }
+
+    background: Rectangle {
+        color: "white"
+        border.color: App.Constants.divider
+        border.width: 1
+        radius: 6
+    }
+
+    ColumnLayout {
+        anchors.fill: parent
+        spacing: 8
+
+        RowLayout {
+            Layout.fillWidth: true
+
+            Text {
+                text: qsTr("Диагностика")
+                font.pixelSize: 16
+                font.bold: true
+                color: App.Constants.textPrimary
+            }
+
+            Item { Layout.fillWidth: true }
+
+            TextField {
+                placeholderText: qsTr("Фильтр")
+                Layout.preferredWidth: 220
+                onTextChanged: root.filterText = text
+            }
+
+            Button {
+                text: qsTr("Закрыть")
+                onClicked: root.close()
+            }
+        }
+
+        ListView {
+            id: metricsList
+            Layout.fillWidth: true
+            Layout.fillHeight: true
+            clip: true
+            model: root.rows
+            ScrollBar.vertical: ScrollBar {}
+
+            delegate: RowLayout {
+                width: metricsList.width
+                spacing: 12
+
+                Text {
+                    text: modelData.labels ? modelData.name + " {" + modelData.labels + "}" : modelData.name
+                    color: App.Constants.textSecondary
+                    font.pixelSize: 12
+                    font.family: "monospace"
+                    elide: Text.ElideMiddle
+                    Layout.fillWidth: true
+                }
+                Text {
+                    text: modelData.value
+                    color: App.Constants.textPrimary
+                    font.pixelSize: 12
+                    font.family: "monospace"
+                    horizontalAlignment: Text.AlignRight
+                }
+            }
+        }
+    }
+}
@@ -15,7 +15,7 @@ Dialog {
     signal patientSelected(var patientData)
 
     // Search results model
-    ListModel { id: searchResultsModel }
+    property var searchResultsModel: backend.patient_search_model("dialog")
 
     background: Rectangle {
                 color: "white"
@@ -56,32 +56,19 @@ Dialog {
             id: searchField
             Layout.fillWidth: true
             placeholderText: qsTr("Введите ФИО или телефон пациента")
-            
-            Timer {
-                id: searchTimer
-                interval: 500
-                onTriggered: {
-                    const results = backend.search_patients(searchField.text)
-                    searchResultsModel.clear()
-                    results.forEach(patient => searchResultsModel.append(patient))
-                }
-            }
 
-            onTextChanged: {
-                if (text.length >= 3) {
-                    searchTimer.restart()
-                } else {
-                    searchResultsModel.clear()
-                }
-            }
+
+            // The backend coalesces keystrokes and drops stale results; short terms clear the list
+            onTextChanged: searchResultsModel.search(text)
         }
 
         ListView {
             id: resultsList
             Layout.fillWidth: true
             Layout.fillHeight: true
-            model: searchResultsModel
+            model: root.searchResultsModel
             clip: true
+            reuseItems: true
 
             delegate: ItemDelegate {
                 width: parent.width
@@ -108,7 +95,7 @@ Dialog {
                 }
 
                 onClicked: {
-                    root.patientSelected(model)
+                    root.patientSelected(root.searchResultsModel.get(index))
                     root.accept()
                 }
             }
@@ -126,7 +113,7 @@ Dialog {
         Text {
             text: qsTr("Ничего не найдено")
             color: App.Constants.textPlaceholder
-            visible: searchField.text.length >= 3 && searchResultsModel.count === 0
+            visible: searchField.text.length >= 3 && !searchResultsModel.loading && searchResultsModel.count === 0
             Layout.alignment: Qt.AlignHCenter
         }
     }
@@ -14,9 +14,9 @@ Rectangle {
     property string imageName: "" // Имя файла для отображения
     property real melanomaProbability: 0 // Вероятность меланомы (0-100)
     property list<variant> modelProbabilities: []
-    property string diagnosisText: "" // Текст диагноза
-    property string detailText: "" // Детальный текст
-    property bool isSaved: false // Сохранен ли результат
+    property string diagnosisText: backend.currentResult.diagnosis // Текст диагноза
+    property string detailText: backend.currentResult.detailText // Детальный текст
+    property bool isSaved: backend.currentResult.saved // Сохранен ли результат
 
     // Сигналы для кнопок
     signal backClicked()
@@ -102,7 +102,7 @@ Rectangle {
                     spacing: 20
 
                     Text {
-                        text: resultsWorkspaceRoot.detail_text //diagnosisText
+                        text: resultsWorkspaceRoot.detailText //diagnosisText
                         color: getRiskColor(melanomaProbability)
                         font.bold: true
                         font.pixelSize: 20
@@ -128,6 +128,24 @@ Rectangle {
                         wrapMode: Text.WordWrap
                     }
 
+                    Text { // Сервер был недоступен, ответила локальная модель
+                        text: qsTr("Результат получен локальной моделью")
+                        visible: backend.currentResult.engine === "local"
+                        color: App.Constants.textSecondary
+                        font.pixelSize: 12
+                        font.italic: true
+                        Layout.alignment: Qt.AlignHCenter
+                    }
+
+                    Text { // Повторный снимок, показан результат прежнего анализа
+                        text: qsTr("Результат повторно использован из анализа №%1").arg(backend.currentResult.reusedFrom)
+                        visible: backend.currentResult.reusedFrom > 0
+                        color: App.Constants.textSecondary
+                        font.pixelSize: 12
+                        font.italic: true
+                        Layout.alignment: Qt.AlignHCenter
+                    }
+
                     Item { Layout.fillHeight: true }
 
                     Rectangle {
@@ -192,7 +210,7 @@ Rectangle {
                 id: saveResultButton
                 text: qsTr("Сохранить результат")
                 Layout.fillWidth: true
-                enabled: !isSaved
+                enabled: !isSaved && backend.databaseReady
                 onClicked: {
                     isSaved = true
                     resultsWorkspaceRoot.saveResultClicked()
@@ -217,13 +235,4 @@ Rectangle {
         }
         return App.Constants.melanomaProbabilityLow
     }
-
-    Component.onCompleted: {
-        const result = backend.get_current_analysis_result()
-        if (result) {
-            diagnosisText = result.diagnosis || ""
-            detailText = result.detail_text || ""
-            // Other properties are set by MainScreen
-        }
-    }
 }
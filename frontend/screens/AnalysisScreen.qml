@@ -85,7 +85,7 @@ Rectangle {
                 stackView.push(analysisResults, {
                     imageSourceToDisplay: imageSource,
                     imageName: imageName,
-                    melanomaProbability: backend.get_current_analysis_result().melanoma_probability * 100
+                    melanomaProbability: backend.currentResult.melanomaProbability * 100
                 })
             }
         }
@@ -96,8 +96,7 @@ Rectangle {
         AnalysisResultsWorkspace {
             onBackClicked: stackView.pop()
             onSaveResultClicked: {
-                const result = backend.get_current_analysis_result()
-                if (result && !result.saved) {
+                if (backend.currentResult.available && !backend.currentResult.saved) {
                     backend.save_analysis_result()
                 }
             }
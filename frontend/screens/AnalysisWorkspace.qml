@@ -16,8 +16,17 @@ Rectangle {
     
     // Properties to track state
     property bool isAnalyzing: false
+    property int analysisJobId: 0 // Running backend.start_analysis() job
+    property url selectedFileUrl: "" // Original file; loadedImage shows the backend's decoded copy
     property bool hasValidImage: loadedImage.source !== ""
     property bool hasValidPatient: patientForm.patientId > 0
+    property var patientsModel: backend.patient_search_model("analysis")
+
+    function startAnalysis() {
+        // The result arrives in onAnalysisComplete
+        analysisJobId = backend.start_analysis()
+        isAnalyzing = analysisJobId > 0
+    }
 
     ColumnLayout {
         anchors.fill: parent
@@ -51,6 +60,7 @@ Rectangle {
                         anchors.margins: 5
                         source: ""
                         fillMode: Image.PreserveAspectFit
+                        asynchronous: true
                         visible: source !== ""
                     }
 
@@ -140,21 +150,8 @@ Rectangle {
                             implicitWidth: 200
                         }
 
-                        Timer {
-                            id: searchTimer
-                            interval: 500
-                            onTriggered: {
-                                var currentSearchTerm = searchField.text
-                                if (currentSearchTerm.length >= 3) {
-                                    const results = backend.search_patients(currentSearchTerm)
-                                    patientsListView.model = results
-                                } else {
-                                    patientsListView.model = []
-                                }
-                            }
-                        }
-
-                        onTextChanged: searchTimer.restart()
+                        // The backend coalesces keystrokes and drops stale results, no debounce needed
+                        onTextChanged: patientsModel.search(text)
                     }
 
                     RowLayout {
@@ -183,7 +180,8 @@ Rectangle {
                                     anchors.fill: parent
                                     anchors.margins: 1
                                     clip: true
-                                    model: []
+                                    reuseItems: true
+                                    model: analysisWorkspaceRoot.patientsModel
 
                                     delegate: ItemDelegate {
                                         width: parent.width
@@ -199,30 +197,31 @@ Rectangle {
                                             spacing: 4
 
                                             Text {
-                                                text: modelData.full_name
+                                                text: model.full_name
                                                 font.bold: true
                                                 color: App.Constants.textPrimary
                                             }
 
                                             Text {
-                                                text: qsTr("Телефон: ") + (modelData.phone || qsTr("Не указан"))
+                                                text: qsTr("Телефон: ") + (model.phone || qsTr("Не указан"))
                                                 color: App.Constants.textSecondary
                                                 font.pixelSize: 12
                                             }
 
                                             Text {
-                                                text: qsTr("Дата рождения: ") + Qt.formatDate(new Date(modelData.birth_date), "dd.MM.yyyy")
+                                                text: qsTr("Дата рождения: ") + Qt.formatDate(new Date(model.birth_date), "dd.MM.yyyy")
                                                 color: App.Constants.textSecondary
                                                 font.pixelSize: 12
                                             }
                                         }
 
                                         onClicked: {
-                                            patientForm.updateFromData(modelData)
-                                            backend.currentPatientId = modelData.id
+                                            const patient = analysisWorkspaceRoot.patientsModel.get(index)
+                                            patientForm.updateFromData(patient)
+                                            backend.currentPatientId = patient.id
                                             patientSearchComp.visible = false
                                             patientForm.visible = true
-                                            console.log("Set patient id:", modelData.id)
+                                            console.log("Set patient id:", patient.id)
                                             console.log(backend.currentPatientId)
                                         }
                                     }
@@ -235,6 +234,8 @@ Rectangle {
                                     text: {
                                         if (searchField.text.length < 3) 
                                             return qsTr("Введите минимум 3 символа для поиска")
+                                        if (analysisWorkspaceRoot.patientsModel.loading)
+                                            return qsTr("Поиск...")
                                         if (patientsListView.count === 0) 
                                             return qsTr("Ничего не найдено")
                                         return ""
@@ -301,35 +302,54 @@ Rectangle {
 
             Item { Layout.fillWidth: true }
 
+            Label {
+                id: offlineQueueLabel
+                // Analyses waiting for the prediction server; they are saved automatically
+                text: qsTr("В очереди: %1").arg(backend.offlineQueueSize)
+                color: App.Constants.textSecondary
+                visible: backend.offlineQueueSize > 0
+            }
+
             Components.AccentActionButton {
                 id: analyzeDataButton
                 text: qsTr("Анализировать")
                 Layout.preferredWidth: 250
                 Layout.preferredHeight: 50
-                enabled: hasValidImage &&  !isAnalyzing  //hasValidPatient &&
+                enabled: hasValidImage &&  !isAnalyzing && backend.modelReady  //hasValidPatient &&
                 onClicked: {
                     if (!patientForm.isFormValid()){
                         return
                     }
                     isAnalyzing = true
-                    var savedPath = backend.save_image(loadedImage.source.toString()) 
+                    var savedPath = backend.save_image(selectedFileUrl.toString())
                     if (!patientForm.patientId) {
                         var patientId = backend.add_patient(patientForm.getFormData()) 
                         patientForm.patientId = patientId
                         backend.currentPatientId = patientId
                     }
                     console.log("currentPatientId set")
-                    if (savedPath) {
-                        var result = backend.analyze_current_image()
-                        if (result) {
-                            analysisTriggered(loadedImage.source, 
-                                           savedPath.split('/').pop(), 
-                                           patientId)
-                        }
+                    if (!savedPath) {
+                        isAnalyzing = false
+                        return
+                    }
+                    var recapture = backend.find_recapture()
+                    if (recapture.analysis_id) {
+                        recaptureDialog.recapture = recapture
+                        recaptureDialog.open()
+                    } else {
+                        startAnalysis()
                     }
-                    isAnalyzing = false
                 }
             }
+
+            Components.LargeActionButton {
+                id: cancelAnalysisButton
+                text: qsTr("Отменить")
+                Layout.preferredWidth: 150
+                Layout.preferredHeight: 50
+                visible: isAnalyzing && analysisJobId > 0
+                onClicked: backend.cancel_analysis(analysisJobId)
+            }
         }
     }
 
@@ -339,7 +359,8 @@ Rectangle {
         nameFilters: ["Image files (*.jpg *.jpeg *.png *.bmp)"]
         onAccepted: {
             console.log(selectedFile)
-            loadedImage.source = selectedFile
+            selectedFileUrl = selectedFile
+            loadedImage.source = backend.load_image(selectedFile.toString())
         }
     }
 
@@ -353,16 +374,86 @@ Rectangle {
         function onAnalysisComplete(result) {
             isAnalyzing = false
             // Analysis results will be handled by MainScreen
+            if (analysisJobId > 0) {
+                analysisJobId = 0
+                analysisTriggered(loadedImage.source,
+                                  backend.currentImagePath.split('/').pop(),
+                                  patientForm.patientId)
+            }
+        }
+
+        function onAnalysisCancelled(jobId) {
+            if (jobId === analysisJobId) {
+                analysisJobId = 0
+                isAnalyzing = false
+            }
         }
         
-        function onErrorOccurred(error) {
-            isAnalyzing = false
+        function onAnalysisQueued(queueId, jobId) {
+            if (jobId === analysisJobId) {
+                analysisJobId = 0
+                isAnalyzing = false
+            }
+            queuedDialog.open()
+        }
+
+        // errorOccurred also reports failures unrelated to the running job
+        function onAnalysisFailed(jobId, error) {
+            if (jobId === analysisJobId) {
+                analysisJobId = 0
+                isAnalyzing = false
+            }
             // Show error dialog
             //errorDialog.text = error
             //errorDialog.open()
         }
     }
 
+    Dialog {
+        id: recaptureDialog
+        // Earlier analysis from backend.find_recapture()
+        property var recapture: ({})
+        title: qsTr("Повторный снимок")
+        anchors.centerIn: parent
+        modal: true
+        closePolicy: Popup.NoAutoClose
+        standardButtons: Dialog.Yes | Dialog.No
+
+        Label {
+            width: 420
+            wrapMode: Text.WordWrap
+            text: qsTr("Этот снимок почти совпадает со снимком пациента от %1 (вероятность меланомы %2%). Использовать прежний результат вместо нового анализа?")
+                  .arg(recaptureDialog.recapture.analyzed_at ? recaptureDialog.recapture.analyzed_at.replace("T", " ") : "")
+                  .arg(Math.round((recaptureDialog.recapture.melanoma_probability || 0) * 100))
+        }
+
+        onAccepted: {
+            if (backend.reuse_analysis(recapture.analysis_id)) {
+                isAnalyzing = false
+                analysisTriggered(loadedImage.source,
+                                  backend.currentImagePath.split('/').pop(),
+                                  patientForm.patientId)
+            } else {
+                startAnalysis()
+            }
+        }
+        onRejected: startAnalysis()
+    }
+
+    Dialog {
+        id: queuedDialog
+        title: qsTr("Сервер недоступен")
+        anchors.centerIn: parent
+        modal: true
+        standardButtons: Dialog.Ok
+
+        Label {
+            width: 420
+            wrapMode: Text.WordWrap
+            text: qsTr("Анализ поставлен в очередь и будет выполнен автоматически, когда сервер станет доступен. Результат сохранится в истории пациента.")
+        }
+    }
+
     Components.PatientSearchDialog {
         id: patientSearchDialog
         anchors.centerIn: parent
@@ -99,16 +99,16 @@ Rectangle {
                     onMenuItemClicked: (buttonText) => {
                         // leftMenu.activeMenuButtonText = buttonText;
                         if (buttonText === qsTr("Главное меню")) {
-                            workspaceLoader.sourceComponent = mainScreenContent;
+                            showComponent(mainScreenContent);
                         } else if (buttonText === qsTr("Пациенты")) {
-                            workspaceLoader.sourceComponent = patientsScreenContentComponent;
+                            showWorkspace(patientsWorkspaceUrl);
                         } else if (buttonText === qsTr("Анализы")) {
                             // При выборе "Анализы" всегда начинаем с настройки
-                            workspaceLoader.sourceComponent =  analysisSetupScreenContentComponent;
+                            showWorkspace(analysisWorkspaceUrl);
                         } else if (buttonText === qsTr("Выход")) {
                             Qt.quit();
                         } else {
-                            workspaceLoader.sourceComponent = placeholderContentComponent;
+                            showComponent(placeholderContentComponent);
                         }
                     }
                 }
@@ -121,60 +121,87 @@ Rectangle {
                     Loader {
                         id: workspaceLoader
                         anchors.fill: parent
+                        // Создание рабочей области не блокирует интерфейс
+                        asynchronous: true
                         sourceComponent: mainScreenContent // Начальный контент
                     }
+
+                    BusyIndicator {
+                        anchors.centerIn: parent
+                        running: workspaceLoader.status === Loader.Loading
+                    }
                 }
             }
         }
     }
 
-    Component {
-        id: analysisScreenContentComponent
-        Screens.AnalysisScreen { // Используем наш новый компонент
-            anchors.fill: parent
-        }
+    // Рабочие области загружаются по URL: их QML компилируется и создаётся
+    // только при первом показе, а не при запуске приложения
+    readonly property url analysisWorkspaceUrl: Qt.resolvedUrl("AnalysisWorkspace.qml")
+    readonly property url analysisResultsWorkspaceUrl: Qt.resolvedUrl("AnalysisResultsWorkspace.qml")
+    readonly property url patientsWorkspaceUrl: Qt.resolvedUrl("PatientsWorkspace.qml")
+
+    function showWorkspace(url, properties) {
+        workspaceLoader.setSource(url, properties || {})
     }
 
-    Component {
-       id: analysisResultsScreenContentComponent
-       Screens.AnalysisResultsWorkspace {
-           anchors.fill: parent
-           // Передаем данные в компонент результатов
-           imageSourceToDisplay: mainScreenRoot.currentAnalyzedImageSource
-           imageName: mainScreenRoot.currentAnalyzedImageName
-           melanomaProbability: mainScreenRoot.currentMelanomaProbability
-           modelProbabilities: mainScreenRoot.modelProbabilities
-
-           onBackClicked: {
-               // Вернуться к настройке анализа
-               workspaceLoader.sourceComponent = analysisSetupScreenContentComponent;
-               // Опционально, сбросить активную кнопку меню, если нужно
-               // leftMenu.activeMenuButtonText = qsTr("Анализы"); // Она и так должна быть "Анализы"
-           }
-           onSaveResultClicked: {
-               console.log("Сохранить результат: ", imageName, melanomaProbability + "%");
-               // TODO: Логика сохранения
-                const result = backend.get_current_analysis_result()
-                if (result && !result.saved) {
-                    backend.save_analysis_result()
-                }
-           }
-           onFinishAnalysisClicked: {
-               console.log("Закончить анализ для: ", imageName);
-               // Вернуться на главный экран или к списку анализов/пациентов
-               workspaceLoader.sourceComponent = mainScreenContent;
-               leftMenu.activeMenuButtonText = qsTr("Главное меню");
-           }
-       }
-   }
+    function showComponent(component) {
+        workspaceLoader.source = ""
+        workspaceLoader.sourceComponent = component
+    }
 
+    // Обработчики сигналов загруженной рабочей области
+    Connections {
+        target: workspaceLoader.item
+        ignoreUnknownSignals: true
+
+        // AnalysisWorkspace
+        function onAnalysisTriggered(imgSrc, imgName, patId) {
+            console.log("Запущен анализ для:", imgSrc, imgName, "пациент:", patId);
+            // Обновляем свойства в mainScreenRoot для передачи в AnalysisResultsWorkspace
+            mainScreenRoot.currentAnalyzedImageSource = imgSrc;
+            mainScreenRoot.currentAnalyzedImageName = imgName; // Или более осмысленное имя
+
+            var modelResult = backend.currentResult
+            if(!modelResult.isMole){
+                warningPopup.show(
+                    "warning",
+                    "Ошбика в обработке изображения",
+                    "Загруженное изображение не похоже на родинку на коже. Пожалуйста, загрузите четкое изображение родинки крупным планом для анализа."
+                )
+                return
+            }
 
-    Component {
-           id: patientsScreenContentComponent
-           Screens.PatientsWorkspace { // Используем наш новый компонент
-               anchors.fill: parent
-           }
-       }
+            mainScreenRoot.currentMelanomaProbability = modelResult.melanomaProbability * 100
+            mainScreenRoot.modelProbabilities = mainScreenRoot.modelPredictionsToArray(modelResult.predictions)//modelProbabilitiesData
+
+            // Переключаем Loader на компонент с результатами, передавая ему данные
+            showWorkspace(analysisResultsWorkspaceUrl, {
+                imageSourceToDisplay: mainScreenRoot.currentAnalyzedImageSource,
+                imageName: mainScreenRoot.currentAnalyzedImageName,
+                melanomaProbability: mainScreenRoot.currentMelanomaProbability,
+                modelProbabilities: mainScreenRoot.modelProbabilities
+            });
+        }
+
+        // AnalysisResultsWorkspace
+        function onBackClicked() {
+            // Вернуться к настройке анализа
+            showWorkspace(analysisWorkspaceUrl);
+        }
+        function onSaveResultClicked() {
+            console.log("Сохранить результат: ", mainScreenRoot.currentAnalyzedImageName, mainScreenRoot.currentMelanomaProbability + "%");
+            if (backend.currentResult.available && !backend.currentResult.saved) {
+                backend.save_analysis_result()
+            }
+        }
+        function onFinishAnalysisClicked() {
+            console.log("Закончить анализ для: ", mainScreenRoot.currentAnalyzedImageName);
+            // Вернуться на главный экран или к списку анализов/пациентов
+            showComponent(mainScreenContent);
+            leftMenu.activeMenuButtonText = qsTr("Главное меню");
+        }
+    }
 
     // Заглушка для других секций (если нужна)
     Component {
@@ -190,39 +217,6 @@ Rectangle {
         }
     }
 
-    Component {
-            id: analysisSetupScreenContentComponent
-            Screens.AnalysisWorkspace {
-                anchors.fill: parent
-                onAnalysisTriggered: (imgSrc, imgName, patId) => {
-                    console.log("Запущен анализ для:", imgSrc, imgName, "пациент:", patId);
-                    // Обновляем свойства в mainScreenRoot для передачи в AnalysisResultsWorkspace
-                    mainScreenRoot.currentAnalyzedImageSource = imgSrc;
-                    mainScreenRoot.currentAnalyzedImageName = imgName; // Или более осмысленное имя
-                    
-                    var modelResult = backend.get_current_analysis_result()
-                    console.log(modelResult)
-                    if(!modelResult.is_mole){
-                        warningPopup.show(
-                            "warning",
-                            "Ошбика в обработке изображения",
-                            "Загруженное изображение не похоже на родинку на коже. Пожалуйста, загрузите четкое изображение родинки крупным планом для анализа."
-                        )
-                        return
-                    }
-                    console.log("After show")
-
-                    mainScreenRoot.currentMelanomaProbability = modelResult.melanoma_probability * 100 
-                    mainScreenRoot.modelProbabilities = mainScreenRoot.modelPredictionsToArray(modelResult.predictions)//modelProbabilitiesData
-
-                    // Переключаем Loader на компонент с результатами
-                    workspaceLoader.sourceComponent = analysisResultsScreenContentComponent;
-                }
-
-            }
-        }
-
-
     Component {
         id: mainScreenContent
         ColumnLayout {
@@ -260,7 +254,7 @@ Rectangle {
                 onClicked: {
                     console.log("Кнопка 'Новый анализ' нажата")
                     leftMenu.activeMenuButtonText = qsTr("Анализы")
-                    workspaceLoader.sourceComponent = analysisSetupScreenContentComponent
+                    showWorkspace(analysisWorkspaceUrl)
                 }
             }
             // Заглушка для текстового вывода, если другой контент не загружен
@@ -11,6 +11,7 @@ Rectangle {
     color: "transparent"
 
     property string currentSearchTerm: ""
+    property var patientsModel: backend.patient_search_model("patients")
     property list<variant> modelProbabilities: []
 
     ColumnLayout {
@@ -36,21 +37,11 @@ Rectangle {
                 implicitWidth: 200
             }
 
-            Timer {
-                id: searchTimer
-                interval: 500
-                onTriggered: {
-                    currentSearchTerm = searchField.text
-                    if (currentSearchTerm.length >= 3) {
-                        const results = backend.search_patients(currentSearchTerm)
-                        patientsListView.model = results
-                    } else {
-                        patientsListView.model = []
-                    }
-                }
+            // The backend coalesces keystrokes and drops stale results, no debounce needed
+            onTextChanged: {
+                currentSearchTerm = text
+                patientsModel.search(text)
             }
-
-            onTextChanged: searchTimer.restart()
         }
 
         RowLayout {
@@ -79,7 +70,8 @@ Rectangle {
                         anchors.fill: parent
                         anchors.margins: 1
                         clip: true
-                        model: []
+                        reuseItems: true
+                        model: patientsWorkspaceRoot.patientsModel
 
                         delegate: ItemDelegate {
                             width: parent.width
@@ -95,27 +87,28 @@ Rectangle {
                                 spacing: 4
 
                                 Text {
-                                    text: modelData.full_name
+                                    text: model.full_name
                                     font.bold: true
                                     color: App.Constants.textPrimary
                                 }
 
                                 Text {
-                                    text: qsTr("Телефон: ") + (modelData.phone || qsTr("Не указан"))
+                                    text: qsTr("Телефон: ") + (model.phone || qsTr("Не указан"))
                                     color: App.Constants.textSecondary
                                     font.pixelSize: 12
                                 }
 
                                 Text {
-                                    text: qsTr("Дата рождения: ") + Qt.formatDate(new Date(modelData.birth_date), "dd.MM.yyyy")
+                                    text: qsTr("Дата рождения: ") + Qt.formatDate(new Date(model.birth_date), "dd.MM.yyyy")
                                     color: App.Constants.textSecondary
                                     font.pixelSize: 12
                                 }
                             }
 
                             onClicked: {
-                                patientDetailsForm.updateFromData(modelData)
-                                const analyses = backend.get_patient_analyses(modelData.id)
+                                const patient = patientsWorkspaceRoot.patientsModel.get(index)
+                                patientDetailsForm.updateFromData(patient)
+                                const analyses = backend.get_patient_analyses(patient.id)
                                 patientHistoryTable.analyses = analyses
                             }
                         }
@@ -128,6 +121,8 @@ Rectangle {
                         text: {
                             if (searchField.text.length < 3) 
                                 return qsTr("Введите минимум 3 символа для поиска")
+                            if (patientsWorkspaceRoot.patientsModel.loading)
+                                return qsTr("Поиск...")
                             if (patientsListView.count === 0) 
                                 return qsTr("Ничего не найдено")
                             return ""
@@ -177,7 +172,7 @@ Rectangle {
 
                     onAnalysisSelected: function(analysis) {
                         // Show analysis details in a dialog
-                        analysisDetailsDialog.imageSource = "../../" + analysis.image_path // Temp because of /frontend/screens
+                        analysisDetailsDialog.imageSource = "image://thumbnails/large/" + encodeURIComponent(analysis.image_path)
                         analysisDetailsDialog.melanomaProbability = analysis.melanoma_probability * 100
                         analysisDetailsDialog.diagnosisText = analysis.diagnosis_text
                         //patientsWorkspaceRoot.modelProbabilities = analysis.predictions //modelProbabilities
@@ -250,6 +245,7 @@ Rectangle {
                     anchors.margins: 10
                     source: analysisDetailsDialog.imageSource
                     fillMode: Image.PreserveAspectFit
+                    asynchronous: true
                 }
             }
 
@@ -317,4 +313,15 @@ Rectangle {
 
         standardButtons: Dialog.Close
     }
+
+    Connections {
+        target: backend
+
+        // A queued analysis of the patient shown was saved in the background
+        function onQueuedAnalysisFinished(queueId, patientId, analysisId) {
+            if (analysisId > 0 && patientDetailsForm.patientId === patientId) {
+                patientHistoryTable.analyses = backend.get_patient_analyses(patientId)
+            }
+        }
+    }
 }
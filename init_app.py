@@ -1,24 +1,23 @@
-import os
 import sys
-import json
 from pathlib import Path
 
+from backend.config import ConfigError, load_config
+
 def init_directories():
     """Initialize required directories and check model."""
     base_dir = Path(__file__).parent
     
     # Load config
     try:
-        with open(base_dir / "config.json", "r") as f:
-            config = json.load(f)
-    except Exception as e:
+        application = load_config(base_dir / "config.json").application
+    except ConfigError as e:
         print(f"Error loading config.json: {e}")
         return False
 
     # Create directories
     dirs_to_create = [
-        config["application"]["uploads_dir"],
-        config["application"]["models_dir"]
+        application.uploads_dir,
+        application.models_dir
     ]
 
     for dir_path in dirs_to_create:
@@ -31,7 +30,7 @@ def init_directories():
             return False
 
     # Check model file
-    model_path = base_dir / config["application"]["models_dir"] / config["application"]["model_file"]
+    model_path = base_dir / application.models_dir / application.model_file
     if not model_path.exists():
         print(f"Warning: Model file not found at {model_path}")
         print("Please ensure the ML model is placed in the correct location")
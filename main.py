@@ -1,33 +1,94 @@
 import os
 import sys
+import json
+import time
+import logging
+import argparse
 from pathlib import Path
 
+_STARTED = time.monotonic()
+
 # Add the project root directory to Python path
 project_root = Path(__file__).parent
 sys.path.insert(0, str(project_root))
 
-from PySide6.QtCore import QUrl, Qt
+from PySide6.QtCore import QTimer, QUrl, Qt
 from PySide6.QtGui import QGuiApplication, QIcon
 from PySide6.QtQml import QQmlApplicationEngine
 from backend import BackendBridge
+from backend.thumbnails import ThumbnailProvider
+from backend.image_session import SessionImageProvider
+from backend import qml_cache
+
+def _max_rss_mb() -> float:
+    try:
+        import resource
+    except ImportError:  # Not available on Windows
+        return 0.0
+    # Kilobytes on Linux
+    return round(resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024, 1)
+
+def _benchmark_startup(app, window, backend):
+    """Print startup timings as JSON and quit once the window is drawn and the backend is ready."""
+    marks = {"qml_loaded_s": round(time.monotonic() - _STARTED, 3)}
+
+    def mark(name):
+        if name in marks:
+            return
+        marks[name] = round(time.monotonic() - _STARTED, 3)
+        if "first_frame_s" in marks and "backend_ready_s" in marks:
+            marks["interactive_s"] = max(marks["first_frame_s"], marks["backend_ready_s"])
+            marks["max_rss_mb"] = _max_rss_mb()
+            print(json.dumps(marks))
+            app.quit()
+
+    window.frameSwapped.connect(lambda: mark("first_frame_s"))
+    backend.initializingChanged.connect(lambda: backend.initializing or mark("backend_ready_s"))
+    QTimer.singleShot(120000, app.quit)
 
 def main():
+    parser = argparse.ArgumentParser(description="SkinSight")
+    parser.add_argument("--precompile-qml", action="store_true",
+                        help="compile all QML files into the disk cache and exit")
+    parser.add_argument("--startup-benchmark", action="store_true",
+                        help="print startup timings as JSON and exit once the app is interactive")
+    args, qt_args = parser.parse_known_args()
+
+    # Debug output of the backend is only produced when explicitly requested
+    logging.basicConfig(
+        level=os.environ.get("SKINSIGHT_LOG_LEVEL", "WARNING").upper(),
+        format="%(asctime)s %(levelname)s %(name)s: %(message)s"
+    )
+
     # Enable High DPI scaling
     QGuiApplication.setHighDpiScaleFactorRoundingPolicy(Qt.HighDpiScaleFactorRoundingPolicy.PassThrough)
     os.environ["QT_ENABLE_HIGHDPI_SCALING"] = "1"
     
+    # Compiled QML is reused from the application's disk cache
+    qml_cache.configure_disk_cache()
+
     # Create the Qt Application
-    app = QGuiApplication(sys.argv)
+    app = QGuiApplication(sys.argv[:1] + qt_args)
     app.setApplicationName("SkinSight")
     app.setOrganizationName("SkinSight")
     app.setWindowIcon(QIcon(os.path.join("frontend", "assets", "images", "логотип.svg")))
 
+    if args.precompile_qml:
+        compiled, errors = qml_cache.precompile()
+        for error in errors:
+            print(error, file=sys.stderr)
+        print(f"Compiled {compiled} QML files into {os.environ.get('QML_DISK_CACHE_PATH', 'the default cache')}")
+        return 1 if errors else 0
+
     # Create QML engine
     engine = QQmlApplicationEngine()
     
-    # Create and register the backend bridge
-    backend = BackendBridge()
+    # Create and register the backend bridge; the database and the model are
+    # loaded in the background once the window is shown
+    backend = BackendBridge(deferred_init=True)
     engine.rootContext().setContextProperty("backend", backend)
+    engine.addImageProvider("thumbnails", ThumbnailProvider(backend.thumbnails))
+    engine.addImageProvider("session", SessionImageProvider(lambda: backend.image_session))
 
     # Set up QML import paths and dependencies
     qml_root = project_root / "frontend"
@@ -40,6 +101,10 @@ def main():
     
     if not engine.rootObjects():
         sys.exit(-1)
+
+    if args.startup_benchmark:
+        _benchmark_startup(app, engine.rootObjects()[0], backend)
+    QTimer.singleShot(0, backend.initialize)
         
     return app.exec()
 
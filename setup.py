@@ -3,7 +3,7 @@ from setuptools import setup, find_packages
 setup(
     name="skinsight",
     version="1.0.0",
-    packages=find_packages(),
+    packages=find_packages(exclude=['benchmarks']),
     install_requires=[
         'PySide6>=6.0.0',
         'tensorflow>=2.7.0',
@@ -39,6 +39,9 @@ setup(
     entry_points={
         'console_scripts': [
             'skinsight=skinsight.main:main',
+            'skinsight-batch=backend.batch_cli:main',
+            'skinsight-loadtest=backend.load_test:main',
+            'skinsight-model-variants=backend.model_variants:main',
         ],
     },
     author='SkinSight Team',
@@ -0,0 +1,72 @@
+import sys
+from pathlib import Path
+import pytest
+
+# Add project root to Python path
+project_root = Path(__file__).parent.parent
+sys.path.insert(0, str(project_root))
+
+from backend.analysis_result import AnalysisResult
+
+RESULT = {
+    "melanoma_probability": 0.8,
+    "predictions": {"Melanoma": 0.8, "Nevus": 0.2},
+    "diagnosis": "Melanoma",
+    "detail_text": "Высокий риск",
+    "image_path": "uploads/ab/cd/abcd.jpg",
+    "is_mole": True,
+    "mole_detection_probability": 0.95,
+}
+
+@pytest.fixture
+def result(qapp):
+    return AnalysisResult()
+
+def test_empty_result(result):
+    """Test the defaults before any analysis."""
+    assert not result.available
+    assert result.melanomaProbability == 0.0
+    assert result.diagnosis == ""
+    assert result.predictions == {}
+
+def test_update_exposes_typed_properties(result, qtbot):
+    """Test that a new result notifies once and exposes its fields."""
+    with qtbot.waitSignal(result.changed, timeout=1000):
+        result.update(RESULT)
+
+    assert result.available
+    assert result.isMole
+    assert result.melanomaProbability == pytest.approx(0.8)
+    assert result.moleDetectionProbability == pytest.approx(0.95)
+    assert result.predictions == RESULT["predictions"]
+    assert result.detailText == "Высокий риск"
+    assert result.imagePath == RESULT["image_path"]
+    assert not result.saved
+
+def test_mark_saved_notifies_once(result):
+    """Test that saving notifies and is idempotent."""
+    result.update(RESULT)
+    emitted = []
+    result.changed.connect(lambda: emitted.append(True))
+
+    result.mark_saved()
+    result.mark_saved()
+
+    assert result.saved
+    assert result.to_dict()["saved"]
+    assert len(emitted) == 1
+
+def test_update_copies_input(result):
+    """Test that later changes to the source dict do not leak into the result."""
+    data = dict(RESULT)
+    result.update(data)
+    data["diagnosis"] = "Nevus"
+
+    assert result.diagnosis == "Melanoma"
+
+def test_local_engine_result(result):
+    """Test that a result of the local model shows its engine and no detection probability."""
+    result.update(dict(RESULT, engine="local", mole_detection_probability=None))
+
+    assert result.engine == "local"
+    assert result.moleDetectionProbability == 0.0
@@ -0,0 +1,76 @@
+import sys
+from datetime import datetime
+from decimal import Decimal
+from pathlib import Path
+import pytest
+
+# Add project root to Python path
+project_root = Path(__file__).parent.parent
+sys.path.insert(0, str(project_root))
+
+from backend.analytics import AnalyticsCache, ClassMatrix, age_band_labels, risk_rows, risk_sums_sql
+
+def test_age_band_labels():
+    """Test that every INTERVAL() result has a label."""
+    assert age_band_labels((18, 30, 45)) == ["<18", "18-29", "30-44", "45+"]
+
+def test_risk_sums_match_prediction_text_thresholds():
+    """Test that the SQL risk levels use the same boundaries as the result screen."""
+    sql = risk_sums_sql("p")
+    assert "SUM(p <= 0.4) AS low" in sql and "SUM(p > 0.7) AS high" in sql
+
+def test_risk_rows():
+    """Test that grouped SQL rows get shares and labels."""
+    rows = [
+        {"age_band": 0, "low": Decimal(3), "medium": Decimal(1), "high": None, "mean_probability": 0.25},
+        {"age_band": 2, "low": Decimal(0), "medium": Decimal(0), "high": Decimal(2), "mean_probability": 0.9},
+    ]
+
+    result = risk_rows(rows, "age_band", ["<18", "18-29", "30+"])
+
+    assert result[0] == {"age_band": "<18", "analyses": 4, "low": 3, "medium": 1, "high": 0,
+                         "low_share": 0.75, "medium_share": 0.25, "high_share": 0.0,
+                         "mean_probability": 0.25}
+    assert result[1]["age_band"] == "30+" and result[1]["high_share"] == 1.0
+
+def seconds(*args):
+    return (datetime(*args) - datetime(1970, 1, 1)).total_seconds()
+
+def test_class_matrix_summary():
+    """Test class statistics, a class appearing later and date filtering."""
+    matrix = ClassMatrix()
+    matrix.append(["Melanoma", "Nevus"], [
+        (1, seconds(2024, 1, 5), 0.8, 0.2),
+        (2, seconds(2024, 2, 5), 0.1, 0.9),
+    ])
+    matrix.append(["Keratosis", "Melanoma", "Nevus"], [
+        (4, seconds(2024, 3, 1), 0.6, 0.1, 0.3),
+        (5, seconds(2024, 3, 2), None, 0.7, None),
+    ])
+
+    summary = {row["class"]: row for row in matrix.summary()}
+    assert len(matrix) == 4 and matrix.last_id == 5
+    assert summary["Melanoma"]["analyses"] == 4
+    assert summary["Melanoma"]["mean_probability"] == pytest.approx(0.425)
+    assert summary["Keratosis"] == {"class": "Keratosis", "analyses": 1, "mean_probability": 0.6,
+                                    "top_share": 0.25, "above_half": 1}
+    assert summary["Melanoma"]["top_share"] == 0.5
+
+    february = {row["class"]: row for row in matrix.summary(since="2024-02-01", until=datetime(2024, 3, 1))}
+    assert february["Nevus"]["mean_probability"] == pytest.approx(0.9)
+    assert february["Nevus"]["top_share"] == 1.0
+    assert "Keratosis" not in february
+
+def test_analytics_cache():
+    """Test that entries expire when the data version changes or the cache is invalidated."""
+    cache = AnalyticsCache(max_entries=2)
+    cache.put("a", 10, {"analyses": 1}, cache.generation)
+
+    assert cache.get("a", 10) == {"analyses": 1}
+    assert cache.get("a", 11) is None  # an analysis was added elsewhere
+
+    stale_generation = cache.generation
+    cache.invalidate()
+    cache.put("a", 10, {"analyses": 1}, stale_generation)
+    assert cache.get("a", 10) is None
+    assert cache.stats() == {"entries": 0, "hits": 1, "misses": 2}
@@ -0,0 +1,153 @@
+import sys
+import threading
+from pathlib import Path
+import pytest
+from PIL import Image
+
+# Add project root to Python path
+project_root = Path(__file__).parent.parent
+sys.path.insert(0, str(project_root))
+
+import backend.backend_bridge as backend_bridge
+import backend.model_handler as model_handler
+from backend.backend_bridge import BackendBridge
+
+class FakeDatabase:
+    def close(self):
+        pass
+
+class SlowModelHandler:
+    """Model handler whose construction waits until released by the test."""
+    release = threading.Event()
+
+    def __init__(self, tracer=None):
+        self.release.wait(5)
+
+@pytest.fixture
+def subsystems(monkeypatch):
+    SlowModelHandler.release = threading.Event()
+    monkeypatch.setattr(backend_bridge, "DatabaseManager", FakeDatabase)
+    monkeypatch.setattr(model_handler, "ModelHandler", SlowModelHandler)
+    yield
+    SlowModelHandler.release.set()
+
+def test_deferred_init_loads_nothing(qapp, subsystems, temp_uploads_dir):
+    """Test that a deferred bridge is usable before the database and the model exist."""
+    bridge = BackendBridge(deferred_init=True, upload_dir=str(temp_uploads_dir))
+
+    assert bridge.db is None
+    assert not bridge.databaseReady
+    assert not bridge.modelReady
+    assert not bridge.initializing
+    # Analyses are refused until the model is ready
+    bridge._current_image_path = "uploads/image.jpg"
+    assert bridge.start_analysis() == 0
+
+def test_initialize_reports_each_subsystem(qapp, qtbot, subsystems, temp_uploads_dir):
+    """Test that the database becomes ready while the model is still loading."""
+    bridge = BackendBridge(deferred_init=True, upload_dir=str(temp_uploads_dir))
+
+    with qtbot.waitSignal(bridge.databaseReadyChanged, timeout=5000):
+        bridge.initialize()
+    assert bridge.initializing
+    assert bridge.databaseReady
+    assert not bridge.modelReady
+
+    with qtbot.waitSignal(bridge.initializingChanged, timeout=5000):
+        SlowModelHandler.release.set()
+    assert bridge.modelReady
+    assert not bridge.initializing
+
+def test_initialization_errors_are_reported(qapp, qtbot, monkeypatch, subsystems, temp_uploads_dir):
+    """Test that a failing subsystem reports an error without blocking the others."""
+    def broken_database():
+        raise RuntimeError("Database connection error")
+    monkeypatch.setattr(backend_bridge, "DatabaseManager", broken_database)
+    SlowModelHandler.release.set()
+    bridge = BackendBridge(deferred_init=True, upload_dir=str(temp_uploads_dir))
+
+    with qtbot.waitSignal(bridge.errorOccurred, timeout=5000) as blocker:
+        bridge.initialize()
+    assert blocker.args == ["Database connection error"]
+    qtbot.waitUntil(lambda: not bridge.initializing, timeout=5000)
+    assert not bridge.databaseReady
+    assert bridge.modelReady
+
+def test_uploads_dir_from_config(qapp, subsystems, monkeypatch, tmp_path):
+    """Test that uploads and the files kept beside them go to application.uploads_dir."""
+    from backend.config import parse_config
+    config, _ = parse_config({"application": {"uploads_dir": str(tmp_path / "clinic")}})
+    monkeypatch.setattr(backend_bridge, "get_config", lambda: config)
+
+    bridge = BackendBridge(deferred_init=True)
+
+    assert bridge.upload_dir == str(tmp_path / "clinic")
+    assert Path(bridge.offline_queue.path).parent.parent == tmp_path / "clinic"
+    assert bridge.image_store.contains(str(tmp_path / "clinic" / "ab" / "cd" / "image.jpg"))
+
+class Call:
+    cancelled = False
+
+    def cancel(self):
+        self.cancelled = True
+
+class BlockingModel:
+    """Model handler whose prediction ignores cancellation and finishes once released."""
+
+    def __init__(self):
+        self.release = threading.Event()
+        self.call = Call()
+
+    def create_call(self):
+        return self.call
+
+    def predict(self, image_path, trace_id=None, session=None, call=None):
+        self.release.wait(5)
+        return {"is_mole": True, "predictions": {"Melanoma": 0.2}, "mole_detection_probability": 0.9}
+
+    def to_analysis_result(self, model_result, image_path):
+        return {"image_path": image_path, "is_mole": True, "melanoma_probability": 0.2}
+
+def test_result_for_replaced_image_is_dropped(qapp, qtbot, subsystems, temp_uploads_dir):
+    """Test that replacing the image cancels its analysis and a late result is not shown."""
+    bridge = BackendBridge(deferred_init=True, upload_dir=str(temp_uploads_dir))
+    bridge.model = BlockingModel()
+    bridge.currentImagePath = "uploads/first.jpg"
+    completed = []
+    bridge.analysisComplete.connect(completed.append)
+
+    job_id = bridge.start_analysis()
+    bridge.currentImagePath = "uploads/second.jpg"
+    assert bridge.model.call.cancelled
+    with qtbot.waitSignal(bridge.analysisCancelled, timeout=5000) as blocker:
+        bridge.model.release.set()
+
+    assert blocker.args == [job_id]
+    assert completed == []
+
+class UploadingModel(BlockingModel):
+    """Blocking model that reads the image from its session only once released."""
+
+    def predict(self, image_path, trace_id=None, session=None, call=None):
+        self.release.wait(5)
+        self.uploaded = session.upload_payload()[1]
+        return super().predict(image_path, trace_id, session, call)
+
+def test_loading_next_image_keeps_running_analysis_input(qapp, qtbot, subsystems, temp_uploads_dir, tmp_path):
+    """Test that loading another image does not release the bytes a running analysis uploads."""
+    first, second = tmp_path / "first.jpg", tmp_path / "second.jpg"
+    Image.new("RGB", (64, 48), color="brown").save(first)
+    Image.new("RGB", (64, 48), color="white").save(second)
+    bridge = BackendBridge(deferred_init=True, upload_dir=str(temp_uploads_dir))
+    bridge.model = UploadingModel()
+    bridge.load_image(str(first))
+    bridge._current_image_path = str(first)
+
+    bridge.start_analysis()
+    bridge.load_image(str(second))
+    with qtbot.waitSignal(bridge.analysisComplete, timeout=5000):
+        bridge.model.release.set()
+
+    assert bridge.model.uploaded == first.read_bytes()
+    # The job's share is released, the newly loaded image is not
+    assert not bridge.image_session.released
@@ -0,0 +1,139 @@
+import io
+import json
+import sys
+from pathlib import Path
+import pytest
+
+# Add project root to Python path
+project_root = Path(__file__).parent.parent
+sys.path.insert(0, str(project_root))
+
+import backend.batch_cli as batch_cli
+from backend.batch_cli import BatchItem, collect_items, main, read_manifest, run_batch
+from backend.image_store import ImageStore
+
+class FakeModel:
+    """Model handler answering from the file name: 'skin' is not a mole, 'broken' fails."""
+
+    def predict(self, image_path):
+        name = Path(image_path).name
+        if "broken" in name:
+            raise RuntimeError("Error during prediction: HTTP 500")
+        if "skin" in name:
+            return {"is_mole": False, "mole_detection_probability": 0.1}
+        return {"is_mole": True, "mole_detection_probability": 0.9, "predictions": {"Melanoma": 0.2}}
+
+    def to_analysis_result(self, model_result, image_path):
+        result = dict(model_result, image_path=image_path)
+        if model_result["is_mole"]:
+            result.update(melanoma_probability=model_result["predictions"]["Melanoma"], diagnosis="Melanoma")
+        return result
+
+class FakeDatabase:
+    def __init__(self):
+        self.analyses = []
+
+    def add_analysis(self, data):
+        self.analyses.append(data)
+        return len(self.analyses)
+
+    def close(self):
+        pass
+
+@pytest.fixture
+def images(tmp_path):
+    root = tmp_path / "images"
+    (root / "visit").mkdir(parents=True)
+    for name in ["a.jpg", "visit/b.PNG", "visit/skin.jpg", "broken.jpg", "notes.txt"]:
+        (root / name).write_bytes(name.encode())
+    return root
+
+def test_collect_items_from_directory(images):
+    """Test that directories are searched recursively for images only."""
+    items = collect_items([str(images)], patient_id=7)
+
+    names = [Path(item.image_path).name for item in items]
+    assert names == ["a.jpg", "broken.jpg", "b.PNG", "skin.jpg"]
+    assert all(item.patient_id == 7 for item in items)
+
+def test_read_csv_and_jsonl_manifests(images):
+    """Test that manifests tie images to patients and resolve relative paths."""
+    csv_manifest = images / "manifest.csv"
+    csv_manifest.write_text("image_path,patient_id\na.jpg,3\nvisit/skin.jpg,\n")
+    jsonl_manifest = images / "manifest.jsonl"
+    jsonl_manifest.write_text('{"image_path": "a.jpg", "patient_id": 3}\n\n{"image_path": "visit/b.PNG"}\n')
+
+    expected = [BatchItem(str(images / "a.jpg"), 3), BatchItem(str(images / "visit/skin.jpg"), None)]
+    assert read_manifest(str(csv_manifest)) == expected
+    assert read_manifest(str(jsonl_manifest))[1] == BatchItem(str(images / "visit/b.PNG"), None)
+
+def test_missing_input_is_an_error(tmp_path):
+    """Test that a mistyped input path is reported instead of ignored."""
+    with pytest.raises(FileNotFoundError):
+        collect_items([str(tmp_path / "missing")])
+
+def test_run_batch_writes_records_and_stats(images):
+    """Test that every image produces one JSON line and is counted in the statistics."""
+    items = collect_items([str(images)])
+    output = io.StringIO()
+
+    stats = run_batch(items, FakeModel(), workers=3, output=output)
+
+    records = [json.loads(line) for line in output.getvalue().splitlines()]
+    assert sorted(r["index"] for r in records) == [0, 1, 2, 3]
+    by_name = {Path(r["image_path"]).name: r for r in records}
+    assert by_name["broken.jpg"]["status"] == "error"
+    assert by_name["a.jpg"]["result"]["melanoma_probability"] == 0.2
+    assert stats["images"] == 4
+    assert stats["ok"] == 3
+    assert stats["errors"] == 1
+    assert stats["not_mole"] == 1
+    assert stats["latency"]["count"] == 4
+    assert stats["throughput_per_s"] > 0
+
+def test_run_batch_saves_patient_moles_only(images, tmp_path):
+    """Test that only successful mole analyses of known patients are stored."""
+    items = [
+        BatchItem(str(images / "a.jpg"), 5),
+        BatchItem(str(images / "visit" / "b.PNG"), None),
+        BatchItem(str(images / "visit" / "skin.jpg"), 5),
+        BatchItem(str(images / "broken.jpg"), 5),
+    ]
+    db = FakeDatabase()
+    store = ImageStore(str(tmp_path / "uploads"))
+
+    stats = run_batch(items, FakeModel(), workers=2, db=db, image_store=store)
+
+    assert stats["saved"] == 1
+    assert len(db.analyses) == 1
+    saved = db.analyses[0]
+    assert saved["patient_id"] == 5
+    assert json.loads(saved["predictions"]) == {"Melanoma": 0.2}
+    # Stored like an analysis saved from the GUI
+    assert saved["metadata"]["engine"] == "remote"
+    assert saved["metadata"]["mole_detection_probability"] == "0.9"
+    # The database refers to the managed copy, not to the batch input
+    assert store.contains(saved["image_path"])
+
+def test_saved_images_go_to_configured_uploads_dir(images, tmp_path, monkeypatch):
+    """Test that --save stores the images in application.uploads_dir."""
+    import backend.database_manager as database_manager
+    import backend.model_handler as model_handler
+    from backend.config import parse_config
+    config, _ = parse_config({"application": {"uploads_dir": str(tmp_path / "clinic")}})
+    databases = []
+
+    class RecordingDatabase(FakeDatabase):
+        def __init__(self):
+            super().__init__()
+            databases.append(self)
+
+    monkeypatch.setattr(batch_cli, "get_config", lambda: config)
+    monkeypatch.setattr(model_handler, "ModelHandler", FakeModel)
+    monkeypatch.setattr(database_manager, "DatabaseManager", RecordingDatabase)
+
+    assert main([str(images / "a.jpg"), "--patient-id", "5", "--save",
+                 "--output", str(tmp_path / "results.jsonl")]) == 0
+
+    saved = databases[0].analyses[0]["image_path"]
+    assert ImageStore(str(tmp_path / "clinic")).contains(saved)
@@ -0,0 +1,63 @@
+import json
+import sys
+from pathlib import Path
+import pytest
+
+# Add project root to Python path
+project_root = Path(__file__).parent.parent
+sys.path.insert(0, str(project_root))
+
+from backend.database_manager import parse_metadata
+from benchmarks.harness import compare, load_baseline, measure, record_first_baseline, save_baseline
+
+def stats(p50):
+    return {"count": 20, "mean_ms": p50, "p50_ms": p50, "p95_ms": p50, "p99_ms": p50, "max_ms": p50}
+
+def test_parse_metadata():
+    """Test that GROUP_CONCAT metadata is split into keys and values."""
+    assert parse_metadata("detail_text:Low Risk,engine:remote") == {"detail_text": "Low Risk", "engine": "remote"}
+    assert parse_metadata("url:http://host:8000") == {"url": "http://host:8000"}
+    assert parse_metadata("broken,key:value") == {"key": "value"}
+    assert parse_metadata(None) == {}
+
+def test_measure_times_every_sample():
+    """Test that measure runs warmup and setup around the timed calls."""
+    calls = []
+    result = measure(lambda: calls.append("op"), repeat=5, warmup=2, setup=lambda: calls.append("setup"))
+
+    assert result["count"] == 5
+    assert calls.count("op") == 7
+    assert calls.count("setup") == 7
+
+def test_compare_flags_regressions_beyond_threshold():
+    """Test that only slowdowns above the threshold and the noise floor regress."""
+    baseline = {"slow": stats(10.0), "steady": stats(10.0), "tiny": stats(0.01), "gone": stats(1.0)}
+    results = {"slow": stats(13.0), "steady": stats(11.0), "tiny": stats(0.03), "new": stats(5.0)}
+
+    comparison = {entry["name"]: entry for entry in compare(results, baseline, threshold=0.25)}
+
+    assert set(comparison) == {"slow", "steady", "tiny"}
+    assert comparison["slow"]["regressed"]
+    assert comparison["slow"]["change"] == 0.3
+    assert not comparison["steady"]["regressed"]
+    assert not comparison["tiny"]["regressed"]
+
+def test_baseline_round_trip_keeps_other_results(tmp_path):
+    """Test that updating the baseline merges with benchmarks that were not run."""
+    path = tmp_path / "baseline.json"
+    save_baseline({"a": stats(1.0), "b": stats(2.0)}, path)
+    save_baseline({"b": stats(3.0)}, path)
+
+    baseline = load_baseline(path)
+    assert baseline["a"]["p50_ms"] == 1.0
+    assert baseline["b"]["p50_ms"] == 3.0
+    assert "environment" in json.loads(path.read_text())
+    assert load_baseline(tmp_path / "missing.json") == {}
+
+def test_first_run_records_baseline(tmp_path):
+    """Test that a baseline is recorded only when there is none yet."""
+    path = tmp_path / "baseline.json"
+    assert not record_first_baseline({}, path)
+    assert record_first_baseline({"a": stats(1.0)}, path)
+    assert not record_first_baseline({"a": stats(5.0)}, path)
+    assert load_baseline(path)["a"]["p50_ms"] == 1.0
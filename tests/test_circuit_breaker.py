@@ -0,0 +1,143 @@
+import socket
+import sys
+from pathlib import Path
+import pytest
+
+# Add project root to Python path
+project_root = Path(__file__).parent.parent
+sys.path.insert(0, str(project_root))
+
+from backend.circuit_breaker import CLOSED, HALF_OPEN, OPEN, CircuitBreaker
+from backend.prediction_client import PredictionUnavailable
+
+class Clock:
+    def __init__(self):
+        self.now = 1000.0
+
+    def __call__(self):
+        return self.now
+
+SETTINGS = {"window": 10, "min_calls": 4, "max_error_rate": 0.5, "open_seconds": 30, "half_open_calls": 2}
+
+@pytest.fixture
+def clock():
+    return Clock()
+
+@pytest.fixture
+def breaker(clock):
+    return CircuitBreaker(SETTINGS, clock=clock)
+
+def fail(breaker, times):
+    for _ in range(times):
+        assert breaker.allow()
+        breaker.record(False)
+
+def test_opens_on_error_rate(breaker, clock):
+    """Test that the breaker opens once the error rate of the window is exceeded."""
+    breaker.record(True, 10)
+    fail(breaker, 2)
+    assert breaker.state == CLOSED  # below min_calls
+
+    fail(breaker, 1)
+    assert breaker.state == OPEN
+    assert not breaker.allow()
+    assert breaker.retry_in() == 30
+
+def test_opens_on_latency(clock):
+    """Test that a p95 above the limit opens the breaker even without errors."""
+    breaker = CircuitBreaker(dict(SETTINGS, max_p95_ms=500), clock=clock)
+    for latency in (100, 100, 100, 2000):
+        breaker.record(True, latency)
+
+    assert breaker.state == OPEN
+
+def test_half_open_trials_close_the_breaker(breaker, clock):
+    """Test that after the open period a limited number of trials decide the state."""
+    changes = []
+    breaker.on_change = lambda old, new: changes.append((old, new))
+    fail(breaker, 4)
+    clock.now += 30
+
+    assert breaker.allow()
+    assert breaker.allow()
+    assert not breaker.allow()  # only two trials at a time
+    breaker.record(True, 10)
+    assert breaker.state == HALF_OPEN
+    breaker.record(True, 10)
+
+    assert breaker.state == CLOSED
+    assert changes == [(CLOSED, OPEN), (OPEN, HALF_OPEN), (HALF_OPEN, CLOSED)]
+
+def test_failed_trial_reopens(breaker, clock):
+    """Test that one failed trial opens the breaker for another period."""
+    fail(breaker, 4)
+    clock.now += 30
+    assert breaker.allow()
+    breaker.record(False)
+
+    assert breaker.state == OPEN
+    assert breaker.retry_in() == 30
+
+def test_discarded_trial_frees_its_slot(breaker, clock):
+    """Test that a cancelled trial does not block the half-open breaker."""
+    fail(breaker, 4)
+    clock.now += 30
+    assert breaker.allow() and breaker.allow()
+    breaker.discard()
+
+    assert breaker.allow()
+
+class FakeLocalModel:
+    available = True
+
+    def __init__(self):
+        self.calls = 0
+        self.timeouts = []
+
+    def predict(self, image, timeout=None, call=None):
+        self.calls += 1
+        self.timeouts.append(timeout)
+        return {"is_mole": True, "mole_detection_probability": None,
+                "predictions": {"Nevus": 0.9, "Melanoma": 0.1}}
+
+def dead_url():
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        port = sock.getsockname()[1]
+    return f"http://127.0.0.1:{port}/predict"
+
+def test_model_handler_falls_back_to_local_engine(clock):
+    """Test that failed remote calls are answered locally and skipped once the breaker opens."""
+    from backend.model_handler import ModelHandler
+
+    image_path = str(project_root / "tests" / "test_files" / "test_mole.jpg")
+    handler = ModelHandler()
+    handler.api_url = dead_url()
+    handler.local_model = FakeLocalModel()
+    handler.breaker = CircuitBreaker(SETTINGS, clock=clock)
+
+    results = [handler.predict(image_path) for _ in range(5)]
+
+    assert {r["engine"] for r in results} == {"local"}
+    # The local engine gets what is left of the call's deadline
+    assert all(0 < timeout <= 95 for timeout in handler.local_model.timeouts)
+    assert handler.breaker.state == OPEN
+    assert handler.pool.endpoints[0].consecutive_failures == 4  # the fifth never went out
+    analysis = handler.to_analysis_result(results[0], image_path)
+    assert analysis["engine"] == "local"
+    assert analysis["melanoma_probability"] == 0.1
+
+    handler.local_model.available = False
+    with pytest.raises(PredictionUnavailable, match="retrying in 30s"):
+        handler.predict(image_path)
+
+def test_reconfigure_keeps_recent_calls(breaker, clock):
+    """Test that new limits apply to the calls already in the window."""
+    breaker.record(True, 10)
+    fail(breaker, 2)
+    assert breaker.state == CLOSED  # below min_calls
+
+    breaker.reconfigure(dict(SETTINGS, window=3, min_calls=3))
+
+    assert breaker.state == OPEN
+    assert breaker.settings["window"] == 3
@@ -0,0 +1,145 @@
+import json
+import os
+import sys
+from pathlib import Path
+import pytest
+
+# Add project root to Python path
+project_root = Path(__file__).parent.parent
+sys.path.insert(0, str(project_root))
+
+from backend.config import ConfigError, ConfigStore, load_config, parse_config
+from backend.search_cache import SearchCache
+
+def write(path, data):
+    path.write_text(json.dumps(data), encoding="utf-8")
+    # Successive writes within the file system's timestamp resolution still count as changes
+    stat = path.stat()
+    os.utime(path, ns=(stat.st_atime_ns, stat.st_mtime_ns + 1_000_000_000))
+
+def test_defaults_fill_missing_settings():
+    """Test that missing sections and keys get their defaults and ints are taken as floats."""
+    config, problems = parse_config({"prediction": {"connect_timeout": 2, "endpoints": ["http://b/predict"]}})
+
+    assert problems == []
+    assert config.prediction.connect_timeout == 2.0
+    assert isinstance(config["prediction"]["connect_timeout"], float)
+    assert config.prediction.endpoints == ["http://b/predict"]
+    assert config.prediction.response_timeout == 60.0
+    assert config.caches.analytics_entries == 32
+    assert config.local_inference.processes == "auto"
+
+def test_invalid_values_are_reported():
+    """Test that wrong types, negative numbers, unknown keys and bad choices are reported."""
+    config, problems = parse_config({
+        "circuit_breaker": {"window": 2.5, "open_seconds": -1},
+        "prediction": {"hedge": "yes", "hegde": True},
+        "storage": {"recompress_mode": "lossy"},
+        "database": {"port": 3307},
+    })
+
+    assert sorted(problem.split(":")[0] for problem in problems) == [
+        "circuit_breaker.open_seconds", "circuit_breaker.window", "prediction.hedge",
+        "prediction.hegde", "storage.recompress_mode",
+    ]
+    # Invalid values keep their defaults; the database section passes extra keys on
+    assert config.circuit_breaker.window == 20
+    assert config.prediction.hedge is True
+    assert config.database.port == 3307
+
+def test_sections_are_read_only():
+    """Test that a section cannot be modified through its values."""
+    config, _ = parse_config({"prediction": {"endpoints": ["http://b/predict"]}})
+
+    config.prediction.endpoints.append("http://c/predict")
+    assert config.prediction.endpoints == ["http://b/predict"]
+    with pytest.raises(TypeError):
+        config.prediction["hedge"] = False
+    with pytest.raises(AttributeError):
+        config.prediction.hedge_delay
+
+def test_load_config_is_strict(tmp_path):
+    """Test that an unparsable or invalid file raises and a missing one gives the defaults."""
+    path = tmp_path / "config.json"
+    assert load_config(path).application.model_file == "model.h5"
+    path.write_text("{", encoding="utf-8")
+    with pytest.raises(ConfigError):
+        load_config(path)
+    write(path, {"recapture": {"max_distance": "10"}})
+    with pytest.raises(ConfigError) as error:
+        load_config(path)
+    assert error.value.problems == ["recapture.max_distance: expected an integer"]
+
+def test_startup_falls_back_to_defaults(tmp_path):
+    """Test that the first load of an invalid value uses its default instead of failing."""
+    path = tmp_path / "config.json"
+    write(path, {"recapture": {"max_distance": "10", "recent_hours": 6}})
+
+    config = ConfigStore(path).get()
+
+    assert config.recapture.max_distance == 10
+    assert config.recapture.recent_hours == 6.0
+
+def test_reload_notifies_changed_sections(tmp_path):
+    """Test that a changed file replaces the config and listeners learn which sections changed."""
+    path = tmp_path / "config.json"
+    write(path, {"caches": {"analytics_entries": 8}, "recapture": {"max_distance": 10}})
+    store = ConfigStore(path)
+    first = store.get()
+    received = []
+    store.subscribe(lambda config, changed: received.append((config, changed)))
+
+    assert store.check() == []
+    write(path, {"caches": {"analytics_entries": 16}, "recapture": {"max_distance": 10}})
+    assert store.check() == ["caches"]
+
+    assert store.get().caches.analytics_entries == 16
+    assert first.caches.analytics_entries == 8
+    assert received == [(store.get(), ["caches"])]
+
+def test_invalid_reload_keeps_config(tmp_path):
+    """Test that an invalid edit is ignored, reported once, and a later fix is applied."""
+    path = tmp_path / "config.json"
+    write(path, {"circuit_breaker": {"window": 20}})
+    store = ConfigStore(path)
+    current = store.get()
+    received = []
+    unsubscribe = store.subscribe(lambda config, changed: received.append(changed))
+
+    write(path, {"circuit_breaker": {"window": "many"}})
+    assert store.check() == []
+    assert store.get() is current
+
+    write(path, {"circuit_breaker": {"window": 40}})
+    assert store.check() == ["circuit_breaker"]
+    unsubscribe()
+    write(path, {"circuit_breaker": {"window": 50}})
+    assert store.check() == ["circuit_breaker"]
+    assert received == [["circuit_breaker"]]
+
+def test_listener_failure_does_not_stop_others(tmp_path):
+    """Test that a failing listener does not keep the others from being notified."""
+    path = tmp_path / "config.json"
+    write(path, {})
+    store = ConfigStore(path)
+    store.get()
+    received = []
+    store.subscribe(lambda config, changed: 1 / 0)
+    store.subscribe(lambda config, changed: received.append(changed))
+
+    write(path, {"metrics": {"http_port": 9464}})
+    store.check()
+
+    assert received == [["metrics"]]
+
+def test_search_cache_resize():
+    """Test that shrinking the cache drops the least recently used and oversized result sets."""
+    cache = SearchCache(max_entries=3, max_rows=10)
+    for term, count in (("ан", 6), ("бо", 1), ("ве", 1)):
+        cache.store(term, [{"full_name": f"{term} {i}", "phone": ""} for i in range(count)], cache.generation)
+
+    cache.resize(2, max_rows=5)
+
+    assert cache.lookup("ан") is None
+    assert cache.stats()["entries"] == 2
+    assert cache.lookup("бо") is not None
@@ -171,6 +171,46 @@ def test_update_patient(db_manager):
     assert result["full_name"] == "Updated Name"
     assert result["phone"] == "9999999999"
 
+def test_clinic_analytics(db_manager):
+    """Test the risk distribution and that a new analysis invalidates the cached result."""
+    patient_id = db_manager.add_patient({
+        "full_name": "Analytics Test Patient",
+        "gender": "female",
+        "birth_date": date(1960, 1, 1),
+        "phone": "7777777777"
+    })
+    for probability in (0.1, 0.5, 0.9):
+        db_manager.add_analysis({
+            "patient_id": patient_id,
+            "image_path": "/test/image.jpg",
+            "melanoma_probability": probability,
+            "predictions": json.dumps({"Melanoma": probability, "Nevus": 1 - probability}),
+            "diagnosis_text": ""
+        })
+
+    analytics = db_manager.get_clinic_analytics("year")
+    assert analytics["analyses"] == 3
+    assert [(row["low"], row["medium"], row["high"]) for row in analytics["by_period"]] == [(1, 1, 1)]
+    assert analytics["by_gender"][0]["gender"] == "female"
+    assert analytics["by_age_band"][0]["age_band"] == "60-74"
+    assert {row["class"] for row in analytics["classes"]} == {"Melanoma", "Nevus"}
+
+    assert db_manager.get_clinic_analytics("year") is analytics
+    db_manager.add_analysis({
+        "patient_id": patient_id, "image_path": "/test/image.jpg",
+        "melanoma_probability": 0.95, "predictions": None, "diagnosis_text": ""
+    })
+    assert db_manager.get_clinic_analytics("year")["analyses"] == 4
+
+def test_missing_index_is_added(db_manager):
+    """Test that connecting adds idx_analyzed_risk to an older mole_analyses table."""
+    db_manager.cursor.execute("ALTER TABLE mole_analyses DROP INDEX idx_analyzed_risk")
+    db_manager._create_tables()
+    db_manager.cursor.execute("SHOW INDEX FROM mole_analyses WHERE Key_name = 'idx_analyzed_risk'")
+    assert [row["Column_name"] for row in db_manager.cursor.fetchall()] == ["analyzed_at", "melanoma_probability"]
+    # Running it again leaves the index alone
+    db_manager._create_tables()
+
 def test_error_handling(db_manager):
     """Test error handling in database operations."""
     # Test invalid patient data
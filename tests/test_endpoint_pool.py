@@ -0,0 +1,158 @@
+import json
+import random
+import socket
+import sys
+import threading
+import time
+from pathlib import Path
+import pytest
+
+# Add project root to Python path
+project_root = Path(__file__).parent.parent
+sys.path.insert(0, str(project_root))
+
+from backend.endpoint_pool import EndpointPool, RoutedCall
+from backend.fake_prediction_server import FakePredictionServer
+from backend.prediction_client import PredictionCancelled, PredictionTimeout, encode_multipart
+
+class FirstChoice(random.Random):
+    """Always routes to the first eligible endpoint, in configuration order."""
+
+    def choices(self, population, weights=None, **kwargs):
+        return [population[0]]
+
+def dead_url():
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        port = sock.getsockname()[1]
+    return f"http://127.0.0.1:{port}/predict"
+
+def post(pool, **kwargs):
+    body, content_type = encode_multipart("image_file", "mole.jpg", b"image-bytes", "image/jpeg")
+    with RoutedCall(pool, **kwargs) as call:
+        status = call.send(body, content_type)
+        return status, call.read(), call.url
+
+def test_choice_follows_latency():
+    """Test that the faster endpoint gets most of the traffic but the slower one still some."""
+    pool = EndpointPool(["http://fast/predict", "http://slow/predict"], rng=random.Random(0))
+    fast, slow = pool.endpoints
+    for _ in range(3):
+        pool.acquire(fast)
+        pool.record_success(fast, 20)
+        pool.acquire(slow)
+        pool.record_success(slow, 400)
+
+    picks = [pool.choose() for _ in range(1000)]
+
+    assert picks.count(fast) > 900
+    assert picks.count(slow) > 0
+
+def test_failover_and_ejection():
+    """Test that a dead endpoint is failed over and ejected after repeated failures."""
+    with FakePredictionServer() as server:
+        pool = EndpointPool([dead_url(), server.url], {"failure_threshold": 2, "hedge": False},
+                            probe=lambda url, timeout: False, rng=FirstChoice())
+        dead, alive = pool.endpoints
+
+        for _ in range(3):
+            status, content, url = post(pool)
+            assert status == 200
+            assert url == server.url
+            assert "is_mole" in json.loads(content)
+
+        # Ejected after two failures, so the third request went straight to the live server
+        assert pool.snapshot()[0]["ejected"]
+        assert dead.consecutive_failures == 2
+        assert server.stats()["ok"] == 3
+
+def test_readmission_after_health_check():
+    """Test that an ejected endpoint is taken back once its health check succeeds."""
+    healthy = {"value": False}
+    pool = EndpointPool(["http://a/predict", "http://b/predict"], {"failure_threshold": 1},
+                        probe=lambda url, timeout: healthy["value"])
+    endpoint = pool.endpoints[0]
+    pool.acquire(endpoint)
+    pool.release(endpoint, failed=True)
+
+    assert pool.check_health() == 1
+    assert pool.choose(exclude=[pool.endpoints[1]]) is endpoint  # only fallback while everything is down
+    healthy["value"] = True
+    assert pool.check_health() == 0
+    assert not pool.snapshot()[0]["ejected"]
+
+def test_hedged_request_beats_slow_endpoint():
+    """Test that a second attempt goes to another endpoint once the first is slower than the hedge delay."""
+    with FakePredictionServer(latency_ms=2000) as slow, FakePredictionServer() as fast:
+        pool = EndpointPool([slow.url, fast.url], {"initial_hedge_delay": 0.1}, rng=FirstChoice())
+        started = time.monotonic()
+
+        status, _, url = post(pool)
+
+        assert status == 200
+        assert url == fast.url
+        assert time.monotonic() - started < 1.5
+        # The abandoned attempt still marks its endpoint as slow
+        assert pool.endpoints[0].ewma_ms >= 100
+        assert pool.endpoints[0].in_flight == 0
+        assert pool.endpoints[0].consecutive_failures == 0
+
+def test_server_errors_are_reported_when_every_endpoint_fails():
+    """Test that HTTP 500 from all endpoints is returned to the caller."""
+    with FakePredictionServer(error_rate=1.0) as first, FakePredictionServer(error_rate=1.0) as second:
+        pool = EndpointPool([first.url, second.url], {"hedge": False})
+
+        status, content, _ = post(pool)
+
+        assert status == 500
+        assert json.loads(content)["detail"] == "Simulated server error"
+        assert first.stats()["errors"] == second.stats()["errors"] == 1
+
+def test_failover_shares_one_deadline():
+    """Test that a failover attempt only gets what is left of the call's budget."""
+    timeouts = {"connect_timeout": 0.1, "upload_timeout": 0.1, "response_timeout": 1.0}
+    with FakePredictionServer(latency_ms=3000) as first, FakePredictionServer(latency_ms=3000) as second, \
+            FakePredictionServer() as third:
+        pool = EndpointPool([first.url, second.url, third.url], {"hedge": False, "max_attempts": 3},
+                            rng=FirstChoice())
+        started = time.monotonic()
+
+        with pytest.raises(PredictionTimeout):
+            post(pool, timeouts=timeouts)
+
+        # The second attempt ends with the call at 1.2 s instead of after its own 1 s response budget
+        assert time.monotonic() - started < 1.6
+        assert third.stats()["requests"] == 0
+
+def test_cancel_aborts_every_attempt():
+    """Test that cancelling a hedged call interrupts both attempts."""
+    with FakePredictionServer(latency_ms=3000) as first, FakePredictionServer(latency_ms=3000) as second:
+        pool = EndpointPool([first.url, second.url], {"initial_hedge_delay": 0.1})
+        call = RoutedCall(pool)
+        threading.Timer(0.4, call.cancel).start()
+        body, content_type = encode_multipart("image_file", "mole.jpg", b"image-bytes", "image/jpeg")
+        started = time.monotonic()
+
+        with pytest.raises(PredictionCancelled):
+            with call:
+                call.send(body, content_type)
+        assert time.monotonic() - started < 2
+        assert [endpoint.in_flight for endpoint in pool.endpoints] == [0, 0]
+
+def test_reconfigure_keeps_endpoint_statistics():
+    """Test that endpoints kept after a reconfiguration keep their latency and failures."""
+    pool = EndpointPool(["http://a/predict", "http://b/predict"], {"failure_threshold": 3})
+    a, b = pool.endpoints
+    pool.acquire(a)
+    pool.record_success(a, 40.0)
+    pool.acquire(b)
+    pool.release(b, failed=True)
+
+    pool.reconfigure(["http://b/predict", "http://c/predict"], {"failure_threshold": 1})
+
+    assert pool.urls == ["http://b/predict", "http://c/predict"]
+    assert pool.endpoints[0] is b and b.consecutive_failures == 1
+    assert pool.endpoints[1].ewma_ms is None
+    assert pool.settings["failure_threshold"] == 1
+    with pytest.raises(ValueError):
+        pool.reconfigure([])
@@ -0,0 +1,102 @@
+import sys
+from pathlib import Path
+import pytest
+import numpy as np
+from PIL import Image
+
+# Add project root to Python path
+project_root = Path(__file__).parent.parent
+sys.path.insert(0, str(project_root))
+
+from backend.image_session import ImageSession
+
+@pytest.fixture
+def test_image(tmp_path):
+    """Create a test JPEG image."""
+    img_path = tmp_path / "mole.jpg"
+    Image.new('RGB', (640, 480), color='brown').save(img_path)
+    return str(img_path)
+
+def test_session_reads_file_once(test_image):
+    """Test that the session keeps the raw bytes and serves uploads from them."""
+    session = ImageSession.open("file://" + test_image)
+    assert session.source_path == test_image
+    assert session.raw == Path(test_image).read_bytes()
+
+    name, data, mime = session.upload_payload()
+    assert name == "mole.jpg"
+    assert data is session.raw
+    assert mime == "image/jpeg"
+
+def test_decoded_buffer_is_shared(test_image):
+    """Test that derived images come from one decoded buffer."""
+    session = ImageSession.open(test_image)
+    assert session.image is session.image
+
+    thumb = session.thumbnail(64)
+    assert max(thumb.size) == 64
+    assert session.image.size == (640, 480)
+
+def test_tensor_shape_and_cache(test_image):
+    """Test preprocessing for the model input."""
+    session = ImageSession.open(test_image)
+    tensor = session.to_tensor((224, 224))
+
+    assert tensor.shape == (1, 224, 224, 3)
+    assert tensor.dtype == np.float32
+    assert 0.0 <= tensor.min() and tensor.max() <= 1.0
+    assert session.to_tensor((224, 224)) is tensor
+
+def test_large_images_are_decoded_downscaled(tmp_path):
+    """Test that the decoded buffer is bounded in size."""
+    img_path = tmp_path / "large.jpg"
+    Image.new('RGB', (4000, 3000), color='brown').save(img_path)
+    session = ImageSession.open(str(img_path), max_decode_edge=1000)
+
+    assert max(session.image.size) <= 1000
+
+def test_release_frees_memory(test_image):
+    """Test that releasing drops all buffers."""
+    session = ImageSession.open(test_image)
+    session.to_tensor()
+    assert session.nbytes > 0
+
+    session.release()
+    assert session.released
+    assert session.nbytes == 0
+    with pytest.raises(RuntimeError):
+        session.raw
+
+def test_share_outlives_release(test_image):
+    """Test that a shared session keeps its buffers when the original is released."""
+    session = ImageSession.open(test_image)
+    tensor = session.to_tensor()
+    shared = session.share()
+
+    session.release()
+    assert shared.id == session.id
+    assert shared.raw == Path(test_image).read_bytes()
+    assert shared.to_tensor() is tensor
+
+    shared.release()
+    assert shared.released
+
+def test_path_preprocessing_matches_session(tmp_path):
+    """Test that a path is decoded for the model like a loaded image, EXIF orientation included."""
+    from backend.model_handler import ModelHandler
+    from backend.model_variants import load_validation_images
+
+    img = Image.new('RGB', (300, 200), color='brown')
+    img.paste((250, 220, 200), (0, 0, 150, 200))
+    exif = Image.Exif()
+    exif[0x0112] = 6  # rotated 90 degrees clockwise
+    img_path = tmp_path / "rotated.jpg"
+    img.save(img_path, exif=exif)
+
+    expected = ImageSession.open(str(img_path)).to_tensor((224, 224))
+    handler = ModelHandler()
+
+    assert np.array_equal(handler.preprocess_image(str(img_path)), expected)
+    assert np.array_equal(load_validation_images(str(tmp_path), (224, 224)), expected)
+    # The upright image has its light half at the top, not on the left
+    assert expected[0, :100].mean() > expected[0, -100:].mean()
@@ -0,0 +1,97 @@
+import sys
+import os
+from pathlib import Path
+import pytest
+
+# Add project root to Python path
+project_root = Path(__file__).parent.parent
+sys.path.insert(0, str(project_root))
+
+from backend.image_store import ImageStore
+
+@pytest.fixture
+def store(tmp_path):
+    """Create an image store in a temporary uploads directory."""
+    return ImageStore(str(tmp_path / "uploads"))
+
+def _write(path, data):
+    with open(path, "wb") as f:
+        f.write(data)
+    return str(path)
+
+def test_save_is_content_addressed_and_sharded(store, tmp_path):
+    """Test that files are named by hash inside shard directories."""
+    source = _write(tmp_path / "photo.JPEG", b"mole image bytes")
+    stored = store.save(source)
+
+    path = Path(stored.path)
+    assert path.exists()
+    assert path.name == stored.digest + ".jpg"
+    assert path.parent.name == stored.digest[2:4]
+    assert path.parent.parent.name == stored.digest[0:2]
+    assert path.read_bytes() == b"mole image bytes"
+    assert not stored.deduplicated
+
+def test_identical_content_is_deduplicated(store, tmp_path):
+    """Test that saving the same bytes twice reuses one file."""
+    first = store.save(_write(tmp_path / "a.jpg", b"same"))
+    second = store.save(_write(tmp_path / "b.jpg", b"same"))
+
+    assert first.path == second.path
+    assert second.deduplicated
+    assert len(list(store.iter_files())) == 1
+
+def test_different_content_never_collides(store, tmp_path):
+    """Test that two images saved back to back get distinct paths."""
+    first = store.save(_write(tmp_path / "a.jpg", b"first"))
+    second = store.save(_write(tmp_path / "a2.jpg", b"second"))
+
+    assert first.path != second.path
+    assert Path(first.path).read_bytes() == b"first"
+
+def test_save_bytes_and_temp_cleanup(store):
+    """Test in-memory saves and removal of interrupted writes."""
+    stored = store.save_bytes(b"encoded", ".png")
+    assert Path(stored.path).read_bytes() == b"encoded"
+
+    leftover = Path(stored.path).parent / ".tmp-abandoned"
+    leftover.write_bytes(b"partial")
+    assert store.cleanup_temp_files() == 1
+    assert not leftover.exists()
+
+def test_missing_source_leaves_no_files(store, tmp_path):
+    """Test that a failed save does not leave partial files behind."""
+    with pytest.raises(OSError):
+        store.save(str(tmp_path / "missing.jpg"))
+    assert list(store.iter_files()) == []
+
+@pytest.mark.skipif(os.name != "posix", reason="POSIX permissions")
+def test_stored_files_get_the_umask_mode(store, tmp_path):
+    """Test that stored files are not left private to the owner like their temp files."""
+    umask = os.umask(0o022)
+    try:
+        from backend import image_store
+        mode = image_store._file_mode()
+    finally:
+        os.umask(umask)
+
+    stored = [store.save(_write(tmp_path / "a.jpg", b"copied")), store.save_bytes(b"encoded", ".png")]
+
+    assert mode == 0o644
+    for image in stored:
+        assert os.stat(image.path).st_mode & 0o777 == image_store.FILE_MODE
+
+@pytest.mark.skipif(os.name != "posix", reason="directory fsync is POSIX only")
+def test_new_files_are_synced_around_the_rename(store, tmp_path, monkeypatch):
+    """Test that the content is synced before the rename and the directory after it."""
+    events = []
+    fsync, replace = os.fsync, os.replace
+    monkeypatch.setattr(os, "fsync", lambda fd: events.append("fsync") or fsync(fd))
+    monkeypatch.setattr(os, "replace", lambda src, dst: events.append("replace") or replace(src, dst))
+
+    store.save_bytes(b"encoded", ".png")
+    assert events == ["fsync", "replace", "fsync"]
+
+    events.clear()
+    store.save_bytes(b"encoded", ".png")
+    assert events == []
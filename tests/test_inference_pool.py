@@ -0,0 +1,160 @@
+import os
+import sys
+import threading
+import time
+from pathlib import Path
+import numpy as np
+import pytest
+
+# Add project root to Python path
+project_root = Path(__file__).parent.parent
+sys.path.insert(0, str(project_root))
+
+from backend.inference_pool import InferencePool, InferenceWorkerCrashed, _Job, worker_count
+from backend.prediction_client import PredictionCancelled, PredictionTimeout
+
+SHAPE = (4, 4, 3)
+CRASH = -1.0  # a batch starting with this value kills the worker
+SLOW = -2.0  # a batch starting with this value takes two seconds
+
+def fake_loader(model_path):
+    """Stands in for the Keras loader inside the worker processes."""
+    if "broken" in model_path:
+        raise OSError("not a model file")
+
+    def predict(batch):
+        if batch.flat[0] == CRASH:
+            os._exit(1)
+        if batch.flat[0] == SLOW:
+            time.sleep(2)
+        melanoma = batch.reshape(len(batch), -1).mean(axis=1)
+        return np.stack([1 - melanoma, melanoma], axis=1)
+    return predict
+
+@pytest.fixture
+def make_pool(tmp_path):
+    pools = []
+
+    def make(name="model.h5", **kwargs):
+        model_path = tmp_path / name
+        model_path.write_bytes(b"fake")
+        pool = InferencePool(str(model_path), input_shape=SHAPE, max_batch=4,
+                             loader=f"{__name__}:fake_loader", supervise_interval=0.05, **kwargs)
+        pools.append(pool)
+        return pool
+    yield make
+    for pool in pools:
+        pool.shutdown()
+
+def test_worker_count():
+    """Test that auto leaves a core free within the cap and 0 disables the pool."""
+    assert 1 <= worker_count("auto", 2) <= 2
+    assert worker_count(0) == 0
+    assert worker_count("3") == 3
+
+def test_predict_and_batches(make_pool):
+    """Test that images written to shared memory come back classified."""
+    pool = make_pool(processes=2)
+
+    response = pool.predict(np.full((1,) + SHAPE, 0.25))
+    batch = np.stack([np.full(SHAPE, v) for v in (0.1, 0.5, 0.9)])
+    output = pool.submit(batch).result(30)
+
+    assert response["predictions"] == {"Nevus": 0.75, "Melanoma": 0.25}
+    assert np.allclose(output, [[0.9, 0.1], [0.5, 0.5], [0.1, 0.9]])
+    stats = pool.stats()
+    assert stats["completed"] == 2 and stats["queue_depth"] == 0 and stats["in_flight"] == 0
+    assert stats["latency"]["count"] == 2
+
+def test_rejects_wrong_shape(make_pool):
+    """Test that batches which do not fit a slot are refused before queueing."""
+    pool = make_pool()
+
+    with pytest.raises(ValueError):
+        pool.submit(np.zeros((5,) + SHAPE))
+    with pytest.raises(ValueError):
+        pool.submit(np.zeros((1, 8, 8, 3)))
+
+def test_crashing_batch_fails_and_worker_restarts(make_pool):
+    """Test that a batch that kills its worker is retried once, then fails, and the pool recovers."""
+    pool = make_pool()
+
+    with pytest.raises(InferenceWorkerCrashed):
+        pool.submit(np.full(SHAPE, CRASH)).result(60)
+    response = pool.predict(np.full(SHAPE, 0.5), timeout=60)
+
+    assert response["predictions"]["Melanoma"] == 0.5
+    stats = pool.stats()
+    assert stats["restarts"] == 2 and stats["retried"] == 1 and stats["failed"] == 1
+    assert stats["alive"] == 1
+
+def test_load_failure_fails_requests(make_pool):
+    """Test that a model that cannot be loaded fails requests instead of restarting forever."""
+    pool = make_pool(name="broken.h5")
+
+    with pytest.raises(RuntimeError, match="could not be loaded"):
+        pool.predict(np.zeros(SHAPE), timeout=60)
+    with pytest.raises(RuntimeError, match="could not be loaded"):
+        pool.submit(np.zeros(SHAPE))
+    assert pool.stats()["restarts"] == 0
+
+def test_shutdown_frees_shared_memory(make_pool):
+    """Test that shutdown stops the workers and refuses new batches."""
+    pool = make_pool()
+    pool.predict(np.zeros(SHAPE), timeout=60)
+    names = [shm.name for shm in pool._slots]
+
+    pool.shutdown()
+
+    assert pool.stats()["alive"] == 0
+    with pytest.raises(RuntimeError, match="shut down"):
+        pool.submit(np.zeros(SHAPE))
+    from multiprocessing import shared_memory
+    with pytest.raises(FileNotFoundError):
+        shared_memory.SharedMemory(name=names[0])
+
+def test_batch_lost_before_it_was_reported_is_retried(make_pool):
+    """Test that a batch whose worker died before reporting it is retried once a worker is idle."""
+    pool = make_pool()
+    pool.predict(np.zeros(SHAPE), timeout=60)
+
+    # As left behind by a worker that died right after taking the batch from the queue
+    slot = pool._free_slots.get()
+    np.ndarray((1,) + SHAPE, dtype=np.float32, buffer=pool._slots[slot].buf)[:] = 0.5
+    job = _Job(10_000, slot, 1)
+    with pool._lock:
+        pool._jobs[job.job_id] = job
+        pool._last_death = time.monotonic()
+
+    assert np.allclose(job.future.result(30), [[0.5, 0.5]])
+    assert pool.stats()["retried"] == 1
+
+class Call:
+    """Stands in for a RoutedCall that the user cancels."""
+
+    def __init__(self):
+        self.callbacks = []
+
+    def on_cancel(self, callback):
+        self.callbacks.append(callback)
+
+    def cancel(self):
+        for callback in self.callbacks:
+            callback()
+
+def test_predict_deadline_and_cancel(make_pool):
+    """Test that waiting for a slow batch ends at the deadline or as soon as the call is cancelled."""
+    pool = make_pool()
+    pool.predict(np.zeros(SHAPE), timeout=60)
+
+    with pytest.raises(PredictionTimeout):
+        pool.predict(np.full(SHAPE, SLOW), timeout=0.2)
+
+    call = Call()
+    threading.Timer(0.2, call.cancel).start()
+    started = time.monotonic()
+    with pytest.raises(PredictionCancelled):
+        pool.predict(np.full(SHAPE, SLOW), timeout=60, call=call)
+    assert time.monotonic() - started < 1.5
+    # The abandoned batches still finish and free their slots
+    assert pool.predict(np.full(SHAPE, 0.5), timeout=60)["predictions"]["Melanoma"] == 0.5
@@ -0,0 +1,115 @@
+import json
+import sys
+import threading
+import time
+from pathlib import Path
+import pytest
+
+# Add project root to Python path
+project_root = Path(__file__).parent.parent
+sys.path.insert(0, str(project_root))
+
+from backend.fake_prediction_server import DIAGNOSES, FakePredictionServer
+from backend.load_test import run_load_test
+from backend.prediction_client import PredictionCall, encode_multipart
+
+def post(url, data=b"image-bytes", field="image_file"):
+    body, content_type = encode_multipart(field, "mole.jpg", data, "image/jpeg")
+    with PredictionCall(url) as call:
+        status = call.send(body, content_type)
+        return status, call.read()
+
+def test_fake_server_follows_predict_contract():
+    """Test that the fake server answers like the prediction API."""
+    with FakePredictionServer(seed=1) as server:
+        status, content = post(server.url)
+        result = json.loads(content)
+
+        assert status == 200
+        assert result["is_mole"] is True
+        assert 0 <= result["mole_detection_probability"] <= 1
+        assert set(result["predictions"]) == set(DIAGNOSES)
+        assert abs(sum(result["predictions"].values()) - 1) < 0.01
+        # The same image gets the same answer
+        assert json.loads(post(server.url)[1]) == result
+
+def test_fake_server_rejects_missing_image():
+    """Test that an upload without the image_file field is rejected."""
+    with FakePredictionServer() as server:
+        status, _ = post(server.url, field="file")
+
+        assert status == 422
+        assert server.stats()["rejected"] == 1
+
+def test_fake_server_errors_latency_and_payload():
+    """Test that error rate, latency and response size are configurable."""
+    with FakePredictionServer(error_rate=1.0) as server:
+        assert post(server.url)[0] == 500
+        assert server.stats() == {"ok": 0, "errors": 1, "rejected": 0, "requests": 1}
+
+    with FakePredictionServer(latency_ms=200, payload_bytes=4096) as server:
+        started = time.monotonic()
+        status, content = post(server.url)
+
+        assert time.monotonic() - started >= 0.2
+        assert len(content) >= 4096
+        assert "predictions" in json.loads(content)
+
+class FakeModel:
+    """Sleeps per prediction and fails every fifth call."""
+
+    def __init__(self):
+        self.calls = 0
+        self.active = 0
+        self.peak = 0
+        self.lock = threading.Lock()
+
+    def predict(self, image_path):
+        with self.lock:
+            self.calls += 1
+            call = self.calls
+            self.active += 1
+            self.peak = max(self.peak, self.active)
+        time.sleep(0.01)
+        with self.lock:
+            self.active -= 1
+        if call % 5 == 0:
+            raise RuntimeError("Prediction API returned HTTP 500")
+        return {"is_mole": False, "mole_detection_probability": 0.1}
+
+def test_run_load_test_reports_throughput_and_tails():
+    """Test that concurrent clients are counted and summarized."""
+    model = FakeModel()
+    stats = run_load_test(model, "mole.jpg", clients=4, requests_per_client=5)
+
+    assert stats["requests"] == 20
+    assert stats["ok"] == 16
+    assert stats["local"] == 0
+    assert stats["errors"] == 4
+    assert stats["error_kinds"] == {"Prediction API returned HTTP 500": 4}
+    assert stats["latency"]["count"] == 20
+    assert stats["latency"]["p50_ms"] >= 10
+    assert stats["throughput_per_s"] > 0
+    assert model.peak > 1
+
+class FallbackModel:
+    """Answers every other call with the local model, as after a failed remote request."""
+
+    def __init__(self):
+        self.calls = 0
+        self.lock = threading.Lock()
+
+    def predict(self, image_path):
+        with self.lock:
+            self.calls += 1
+            call = self.calls
+        return {"is_mole": False, "engine": "local" if call % 2 == 0 else "remote"}
+
+def test_run_load_test_counts_local_answers_separately():
+    """Test that local model answers do not count as answers of the remote service."""
+    stats = run_load_test(FallbackModel(), "mole.jpg", clients=2, requests_per_client=5)
+
+    assert stats["requests"] == 10
+    assert stats["ok"] == 5
+    assert stats["local"] == 5
+    assert stats["latency"]["count"] == 5
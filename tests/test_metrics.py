@@ -0,0 +1,107 @@
+import socket
+import sys
+import urllib.request
+from pathlib import Path
+import pytest
+
+# Add project root to Python path
+project_root = Path(__file__).parent.parent
+sys.path.insert(0, str(project_root))
+
+from backend.metrics import MetricsExporter, MetricsRegistry, timed
+
+@pytest.fixture
+def registry():
+    return MetricsRegistry()
+
+def free_port():
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+def test_render_text_format(registry):
+    """Test the Prometheus text format of counters and gauges with labels."""
+    requests = registry.counter("app_requests_total", "Requests by outcome", ["outcome"])
+    registry.gauge("app_queue_depth", "Waiting jobs").set(3)
+    requests.inc(outcome="ok")
+    requests.inc(2, outcome="ok")
+    requests.inc(outcome='say "hi"')
+
+    lines = registry.render().splitlines()
+    assert "# TYPE app_requests_total counter" in lines
+    assert 'app_requests_total{outcome="ok"} 3' in lines
+    assert 'app_requests_total{outcome="say \\"hi\\""} 1' in lines
+    assert "app_queue_depth 3" in lines
+    assert lines.index("# HELP app_queue_depth Waiting jobs") < lines.index("app_queue_depth 3")
+
+def test_registration_is_idempotent(registry):
+    """Test that registering a metric again returns it, and a conflicting one is refused."""
+    counter = registry.counter("app_total", "Total", ["kind"])
+    assert registry.counter("app_total", "Total", ["kind"]) is counter
+    with pytest.raises(ValueError):
+        registry.gauge("app_total", "Total", ["kind"])
+    with pytest.raises(ValueError):
+        counter.inc(other="x")
+
+def test_histogram_buckets_and_quantiles(registry):
+    """Test cumulative buckets, sum and count, and the interpolated quantiles."""
+    histogram = registry.histogram("app_seconds", "Latency", buckets=(0.1, 0.5, 1.0))
+    for value in (0.05, 0.2, 0.3, 0.4, 2.0):
+        histogram.observe(value)
+
+    lines = registry.render().splitlines()
+    assert 'app_seconds_bucket{le="0.1"} 1' in lines
+    assert 'app_seconds_bucket{le="0.5"} 4' in lines
+    assert 'app_seconds_bucket{le="+Inf"} 5' in lines
+    assert "app_seconds_count 5" in lines
+    assert any(line.startswith("app_seconds_sum 2.95") for line in lines)
+    summary = histogram.summary()[0]
+    assert summary["count"] == 5
+    assert 0.1 < summary["p50"] < 0.5
+    assert summary["p95"] == 1.0  # above the largest bound
+
+def test_timed_counts_errors(registry):
+    """Test that the decorator times every call and counts the failing ones."""
+    seconds = registry.histogram("app_call_seconds", "Calls", ["operation"])
+    errors = registry.counter("app_call_errors_total", "Failed calls", ["operation"])
+
+    @timed(seconds, errors, operation="load")
+    def load(fail):
+        if fail:
+            raise RuntimeError("boom")
+        return 42
+
+    assert load(False) == 42
+    with pytest.raises(RuntimeError):
+        load(True)
+    assert seconds.summary()[0]["count"] == 2
+    assert errors.value(operation="load") == 1
+
+def test_collectors_run_on_read(registry):
+    """Test that collectors update metrics when read and a failing one does not break the rest."""
+    depth = registry.gauge("app_depth", "Depth")
+    queue = [1, 2]
+    registry.add_collector("queue", lambda: depth.set(len(queue)))
+    registry.add_collector("broken", lambda: 1 / 0)
+
+    queue.append(3)
+    rows = registry.snapshot()
+
+    assert {"name": "app_depth", "labels": "", "value": "3"} in rows
+
+def test_exporter_serves_and_writes(registry, tmp_path):
+    """Test the scrape endpoint and the atomically written text file."""
+    registry.counter("app_total", "Total").inc()
+    textfile = tmp_path / "metrics" / "app.prom"
+    exporter = MetricsExporter(registry, {"http_port": free_port(), "textfile": str(textfile),
+                                          "textfile_interval_seconds": 60})
+    exporter.start()
+    try:
+        with urllib.request.urlopen(exporter.url, timeout=5) as response:
+            body = response.read().decode("utf-8")
+            assert response.headers["Content-Type"].startswith("text/plain; version=0.0.4")
+        assert "app_total 1" in body.splitlines()
+    finally:
+        exporter.stop()
+    assert "app_total 1" in textfile.read_text().splitlines()
+    assert list(textfile.parent.iterdir()) == [textfile]
@@ -0,0 +1,117 @@
+import json
+import shutil
+import sys
+from pathlib import Path
+import numpy as np
+import pytest
+
+# Add project root to Python path
+project_root = Path(__file__).parent.parent
+sys.path.insert(0, str(project_root))
+
+import backend.model_variants as model_variants
+from backend.model_variants import MANIFEST_FILE, build_variants, file_sha256, select_model, split_calibration
+
+SETTINGS = {"variant": "auto", "max_abs_diff": 0.05, "min_agreement": 0.98}
+
+def write_manifest(model_path, variants):
+    """Write a manifest and empty variant files for a fake model."""
+    for entry in variants:
+        (model_path.parent / entry["file"]).write_bytes(b"variant")
+    manifest = {"source": model_path.name, "source_sha256": file_sha256(model_path),
+                "validation_images": 10, "variants": variants}
+    (model_path.parent / MANIFEST_FILE).write_text(json.dumps(manifest))
+
+def entry(name, diff, agreement, latency):
+    file = "model.h5" if name == "reference" else f"model.{name}.tflite"
+    return {"name": name, "file": file, "max_abs_diff": diff, "agreement": agreement, "latency_ms": latency}
+
+@pytest.fixture
+def model_path(tmp_path):
+    path = tmp_path / "model.h5"
+    path.write_bytes(b"weights")
+    return path
+
+def test_selects_fastest_variant_within_tolerance(model_path):
+    """Test that a variant failing the tolerances is skipped even when it is fastest."""
+    write_manifest(model_path, [
+        entry("reference", 0.0, 1.0, 40.0),
+        entry("float16", 0.001, 1.0, 12.0),
+        entry("int8", 0.2, 0.9, 5.0),
+    ])
+
+    assert select_model(model_path, SETTINGS).name == "model.float16.tflite"
+    assert select_model(model_path, dict(SETTINGS, max_abs_diff=0.5, min_agreement=0.5)).name == "model.int8.tflite"
+    assert select_model(model_path, dict(SETTINGS, variant="reference")) == model_path
+    assert select_model(model_path, dict(SETTINGS, variant="dynamic")) == model_path  # not built
+
+def test_ignores_manifest_of_another_model(model_path):
+    """Test that replacing the model file invalidates the variants built from the old one."""
+    write_manifest(model_path, [entry("reference", 0.0, 1.0, 40.0), entry("float16", 0.0, 1.0, 10.0)])
+    model_path.write_bytes(b"new weights")
+
+    assert select_model(model_path, SETTINGS) == model_path
+
+def test_unchanged_model_is_not_hashed(model_path, monkeypatch):
+    """Test that a model with the size and mtime recorded in the manifest is not read again."""
+    write_manifest(model_path, [entry("reference", 0.0, 1.0, 40.0), entry("float16", 0.0, 1.0, 10.0)])
+    manifest = json.loads((model_path.parent / MANIFEST_FILE).read_text())
+    stat = model_path.stat()
+    manifest.update(source_size=stat.st_size, source_mtime_ns=stat.st_mtime_ns)
+    (model_path.parent / MANIFEST_FILE).write_text(json.dumps(manifest))
+
+    def no_hashing(path):
+        raise AssertionError("the model file was hashed")
+    monkeypatch.setattr(model_variants, "file_sha256", no_hashing)
+
+    assert select_model(model_path, SETTINGS).name == "model.float16.tflite"
+
+def test_hash_is_cached_until_the_file_changes(model_path):
+    """Test that a file is hashed again only after its size or mtime changed."""
+    digest = file_sha256(model_path)
+    assert file_sha256(model_path) == digest
+    model_path.write_bytes(b"other weights")
+    assert file_sha256(model_path) != digest
+
+def test_calibration_images_are_held_out():
+    """Test that the int8 calibration images are not among the evaluation images."""
+    images = np.arange(10, dtype=np.float32).reshape(10, 1, 1, 1)
+
+    calibration, evaluation = split_calibration(images)
+
+    assert calibration.ravel().tolist() == [0, 4, 8]
+    assert evaluation.ravel().tolist() == [1, 2, 3, 5, 6, 7, 9]
+    assert split_calibration(images[:1])[0] is None
+
+def test_without_manifest_uses_model_file(model_path):
+    """Test that the reference model is used until variants are built."""
+    assert select_model(model_path, SETTINGS) == model_path
+
+def test_build_variants(tmp_path):
+    """Test that converted variants agree with a small Keras model and can be selected."""
+    tf = pytest.importorskip("tensorflow")
+    model = tf.keras.Sequential([
+        tf.keras.Input((32, 32, 3)),
+        tf.keras.layers.Conv2D(4, 3, activation="relu"),
+        tf.keras.layers.GlobalAveragePooling2D(),
+        tf.keras.layers.Dense(2, activation="softmax"),
+    ])
+    model_path = tmp_path / "model.h5"
+    model.save(str(model_path))
+    validation = tmp_path / "validation"
+    validation.mkdir()
+    for i in range(3):
+        shutil.copy(project_root / "tests" / "test_files" / "test_mole.jpg", validation / f"{i}.jpg")
+
+    manifest = build_variants(str(model_path), str(validation), ["float32", "float16"])
+
+    names = [e["name"] for e in manifest["variants"]]
+    assert names == ["reference", "float32", "float16"]
+    assert all(e["max_abs_diff"] < 0.01 and e["agreement"] == 1.0 for e in manifest["variants"])
+    assert (tmp_path / "model.float16.tflite").is_file()
+    assert select_model(model_path, SETTINGS).parent == tmp_path
+
+    from backend.local_model import LocalModel
+    local = LocalModel(str(tmp_path / "model.float32.tflite"), input_shape=(32, 32, 3))
+    response = local.predict(np.full((1, 32, 32, 3), 0.5, dtype=np.float32))
+    assert sum(response["predictions"].values()) == pytest.approx(1.0, abs=1e-5)
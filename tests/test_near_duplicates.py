@@ -0,0 +1,112 @@
+import sys
+from datetime import datetime
+from pathlib import Path
+import numpy as np
+import pytest
+from PIL import Image, ImageDraw, ImageEnhance, ImageFilter
+
+# Add project root to Python path
+project_root = Path(__file__).parent.parent
+sys.path.insert(0, str(project_root))
+
+from backend.near_duplicates import BKTree, NearDuplicateIndex, hamming, perceptual_hashes
+
+NOW = 1_700_000_000.0
+SKIN = (214, 170, 140)
+
+def lesion(seed, size=400):
+    """A blurred cluster of dark blobs on a skin-coloured background."""
+    rng = np.random.default_rng(seed)
+    img = Image.new("RGB", (size, size), SKIN)
+    draw = ImageDraw.Draw(img)
+    for _ in range(6):
+        cx, cy = rng.integers(size // 4, 3 * size // 4, 2)
+        rx, ry = rng.integers(size // 10, size // 4, 2)
+        draw.ellipse((cx - rx, cy - ry, cx + rx, cy + ry), fill=tuple(int(v) for v in rng.integers(40, 120, 3)))
+    return img.filter(ImageFilter.GaussianBlur(4))
+
+def distances(a, b):
+    return tuple(hamming(int(a[name], 16), int(b[name], 16)) for name in ("phash", "dhash"))
+
+class FakeDatabase:
+    def __init__(self, rows):
+        self.rows = rows
+        self.since = None
+
+    def get_analysis_hashes(self, since):
+        self.since = since
+        return [row for row in self.rows if row["analyzed_at"] >= since]
+
+@pytest.fixture
+def hashes():
+    original = lesion(1)
+    width, height = original.size
+    return {
+        "original": perceptual_hashes(original),
+        "recaptured": perceptual_hashes(original.crop((8, 8, width, height)).rotate(2, fillcolor=SKIN)),
+        "brighter": perceptual_hashes(ImageEnhance.Brightness(original).enhance(1.15)),
+        "other": perceptual_hashes(lesion(2)),
+    }
+
+def test_hashes_survive_recapture(tmp_path, hashes):
+    """Test that shifted, rotated and brightened shots stay close and other lesions do not."""
+    path = tmp_path / "lesion.jpg"
+    lesion(1).save(path, quality=70)
+
+    assert all(len(value) == 16 for value in hashes["original"].values())
+    assert max(distances(hashes["original"], perceptual_hashes(path))) <= 4
+    assert max(distances(hashes["original"], hashes["recaptured"])) <= 6
+    assert max(distances(hashes["original"], hashes["brighter"])) <= 4
+    assert min(distances(hashes["original"], hashes["other"])) > 10
+
+def test_bk_tree_matches_linear_search():
+    """Test that the pruned tree search finds exactly what comparing against everything finds."""
+    rng = np.random.default_rng(0)
+    values = [int(v) for v in rng.integers(0, 2 ** 63, 500, dtype=np.int64)]
+    # Near copies of the first value
+    values += [values[0] ^ (1 << bit) ^ (1 << (bit + 7)) for bit in range(20)]
+    tree = BKTree()
+    for i, value in enumerate(values):
+        tree.add(value, i)
+
+    for query, radius in ((values[0], 4), (values[3], 0), (values[0] ^ 1, 12)):
+        expected = {(hamming(query, value), i) for i, value in enumerate(values) if hamming(query, value) <= radius}
+        assert set(tree.search(query, radius)) == expected
+    assert len(tree) == len(values)
+
+def test_find_filters_patient_and_age(hashes):
+    """Test that only recent analyses of the same patient with both hashes close are offered."""
+    index = NearDuplicateIndex({"max_distance": 10, "recent_hours": 24}, clock=lambda: NOW)
+    index.add(1, 7, NOW - 3600, hashes["original"])
+    index.add(2, 8, NOW - 60, hashes["original"])        # another patient
+    index.add(3, 7, NOW - 3 * 86400, hashes["original"])  # too old
+    index.add(4, 7, NOW - 60, hashes["other"])
+
+    match = index.find(7, hashes["recaptured"])
+    assert match["analysis_id"] == 1 and match["distance"] <= 12
+    assert index.find(7, hashes["other"])["analysis_id"] == 4
+    assert index.find(9, hashes["original"]) is None
+
+def test_find_prefers_closest_then_newest(hashes):
+    """Test the choice between several matching analyses."""
+    index = NearDuplicateIndex(clock=lambda: NOW)
+    index.add(1, 7, NOW - 7200, hashes["original"])
+    index.add(2, 7, NOW - 3600, hashes["original"])
+    index.add(3, 7, NOW - 60, hashes["recaptured"])
+
+    assert index.find(7, hashes["original"])["analysis_id"] == 2
+
+def test_load_indexes_recent_hashes(hashes):
+    """Test loading hashes from the database and skipping analyses without them."""
+    rows = [
+        dict(id=1, patient_id=7, analyzed_at=datetime.fromtimestamp(NOW - 600), **hashes["original"]),
+        dict(id=2, patient_id=7, analyzed_at=datetime.fromtimestamp(NOW - 300), phash=None, dhash=None),
+    ]
+    db = FakeDatabase(rows)
+    index = NearDuplicateIndex({"recent_hours": 2}, clock=lambda: NOW)
+    index.load(db)
+    index.add(1, 7, NOW - 600, hashes["original"])  # already loaded
+
+    assert index.loaded and len(index) == 1
+    assert db.since == datetime.fromtimestamp(NOW - 7200)
+    assert index.find(7, hashes["brighter"])["analysis_id"] == 1
@@ -0,0 +1,276 @@
+import random
+import socket
+import sys
+import threading
+from pathlib import Path
+import pytest
+
+# Add project root to Python path
+project_root = Path(__file__).parent.parent
+sys.path.insert(0, str(project_root))
+
+import backend.backend_bridge as backend_bridge
+from backend.backend_bridge import BackendBridge
+from backend.offline_queue import OfflineDrain, OfflineQueue, SaveFailed, is_retryable
+from backend.prediction_client import PredictionRejected, PredictionTimeout, PredictionUnreachable
+
+IMAGE = str(project_root / "tests" / "test_files" / "test_mole.jpg")
+
+class Clock:
+    def __init__(self):
+        self.now = 1000.0
+
+    def __call__(self):
+        return self.now
+
+class NoJitter(random.Random):
+    def uniform(self, a, b):
+        return b
+
+class Service:
+    """Stands in for analyzing and saving; fails while ``down``."""
+
+    def __init__(self, down=False, error=None):
+        self.down = down
+        self.error = error or PredictionUnreachable("Error during prediction: connection refused")
+        self.processed = []
+
+    def __call__(self, entry):
+        if self.down:
+            raise self.error
+        self.processed.append(entry.id)
+        return {"analysis_id": 100 + entry.id}
+
+SETTINGS = {"max_per_minute": 6, "initial_backoff_seconds": 5, "max_backoff_seconds": 60, "max_attempts": 5}
+
+@pytest.fixture
+def queue(tmp_path):
+    queue = OfflineQueue(tmp_path / "queue.sqlite3")
+    yield queue
+    queue.close()
+
+@pytest.fixture
+def clock():
+    return Clock()
+
+def drain_for(queue, service, clock, finished=None, **settings):
+    on_finished = (lambda entry, outcome, error: finished.append((entry.id, outcome, error))) \
+        if finished is not None else None
+    return OfflineDrain(queue, service, on_finished, dict(SETTINGS, **settings), clock=clock, rng=NoJitter())
+
+def test_queue_survives_reopening(tmp_path):
+    """Test that queued analyses are kept on disk in FIFO order with their metadata."""
+    queue = OfflineQueue(tmp_path / "queue.sqlite3")
+    first = queue.put(7, "uploads/a.jpg", {"phash": "00ff"})
+    queue.put(8, "uploads/b.jpg")
+    queue.close()
+
+    reopened = OfflineQueue(tmp_path / "queue.sqlite3")
+    entry = reopened.next_due(2e9)
+    assert (entry.id, entry.patient_id, entry.image_path, entry.metadata) == (first, 7, "uploads/a.jpg", {"phash": "00ff"})
+    assert len(reopened) == 2
+    assert sorted(reopened.image_paths()) == ["uploads/a.jpg", "uploads/b.jpg"]
+    reopened.close()
+
+def test_drain_saves_and_reports(queue, clock):
+    """Test that a successful analysis leaves the queue and is reported with its outcome."""
+    queue.put(7, "uploads/a.jpg")
+    finished = []
+    drain = drain_for(queue, Service(), clock, finished)
+
+    assert drain.run_once() is True
+    assert drain.run_once() is None
+    assert len(queue) == 0
+    assert finished == [(1, {"analysis_id": 101}, "")]
+
+def test_failure_pauses_whole_queue_with_backoff(queue, clock):
+    """Test that a failure defers the entry and pauses the queue, doubling the pause each time."""
+    queue.put(7, "uploads/a.jpg")
+    queue.put(8, "uploads/b.jpg")
+    service = Service(down=True)
+    drain = drain_for(queue, service, clock, max_per_minute=0)
+
+    assert drain.run_once() is False
+    entry = queue.entries()[0]
+    assert entry.attempts == 1 and "connection refused" in entry.last_error
+    # The second entry is due, but the service is assumed to be still down
+    assert drain.run_once() is None
+    clock.now += 5
+    assert drain.run_once() is False
+    clock.now += 5
+    assert drain.run_once() is None
+    clock.now += 5
+
+    service.down = False
+    assert drain.run_once() is True
+    assert drain.run_once() is True
+    assert service.processed == [1, 2]  # oldest first
+
+def test_rate_limit(queue, clock):
+    """Test that analyses are spaced by the rate limit once the service is back."""
+    for patient in (1, 2, 3):
+        queue.put(patient, "uploads/a.jpg")
+    drain = drain_for(queue, Service(), clock)
+
+    assert drain.run_once() is True
+    assert drain.run_once() is None
+    clock.now += 10  # 6 per minute
+    assert drain.run_once() is True
+
+def test_rejected_and_exhausted_entries_are_dropped(queue, clock):
+    """Test that a refused analysis is dropped at once and a failing one after max_attempts."""
+    queue.put(7, "uploads/a.jpg")
+    finished = []
+    drain = drain_for(queue, Service(down=True, error=PredictionRejected("HTTP 422")), clock, finished)
+    assert drain.run_once() is False
+    assert len(queue) == 0
+    assert finished == [(1, {}, "HTTP 422")]
+
+    queue.put(7, "uploads/b.jpg")
+    drain = drain_for(queue, Service(down=True), clock, finished, max_attempts=2, max_per_minute=0)
+    drain.run_once()
+    clock.now += 60
+    drain.run_once()
+    assert len(queue) == 0
+    assert finished[-1][0] == 2 and "connection refused" in finished[-1][2]
+
+def test_failed_save_keeps_result_without_pausing(queue, clock):
+    """Test that a failed save is retried for that entry alone, without analyzing it again."""
+    queue.put(7, "uploads/a.jpg")
+    queue.put(8, "uploads/b.jpg")
+    analyzed, saved = [], []
+    database_up = [False]
+
+    def process(entry):
+        result = entry.result
+        if result is None:
+            analyzed.append(entry.id)
+            result = {"is_mole": True, "melanoma_probability": 0.2}
+        if not database_up[0] and entry.id == 1:
+            raise SaveFailed("Error saving analysis result: MySQL server has gone away", result)
+        saved.append((entry.id, result["melanoma_probability"]))
+        return {"analysis_id": 100 + entry.id}
+
+    drain = drain_for(queue, process, clock, max_per_minute=0)
+    assert drain.run_once() is False
+    assert queue.entries()[0].result == {"is_mole": True, "melanoma_probability": 0.2}
+    # The next analysis goes ahead: the prediction API is not the problem
+    assert drain.run_once() is True
+    assert drain.run_once() is None
+
+    database_up[0] = True
+    clock.now += 5
+    assert drain.run_once() is True
+    assert analyzed == [1, 2]
+    assert saved == [(2, 0.2), (1, 0.2)]
+    assert len(queue) == 0
+
+class NoLocalModel:
+    available = False
+
+def test_only_service_failures_are_retryable():
+    """Test that network and service failures are retried and anything else is reported."""
+    from backend.model_handler import ModelHandler
+
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        port = sock.getsockname()[1]
+    handler = ModelHandler()
+    handler.api_url = f"http://127.0.0.1:{port}/predict"
+    handler.local_model = NoLocalModel()
+    with pytest.raises(PredictionUnreachable) as refused:
+        handler.predict(IMAGE)
+
+    assert is_retryable(refused.value)
+    assert is_retryable(PredictionTimeout("response deadline of 60s exceeded"))
+    assert not is_retryable(PredictionRejected("HTTP 422"))
+    assert not is_retryable(RuntimeError("Error preprocessing image: cannot identify image file"))
+    assert not is_retryable(AttributeError("'NoneType' object has no attribute 'predict'"))
+
+def test_background_drain(queue):
+    """Test that the drain thread picks up an analysis queued while it waits."""
+    done = threading.Event()
+    drain = OfflineDrain(queue, Service(), lambda entry, outcome, error: done.set(), SETTINGS)
+    drain.start()
+    try:
+        queue.put(7, "uploads/a.jpg")
+        drain.wake()
+        assert done.wait(5)
+    finally:
+        drain.stop(timeout=5)
+    assert len(queue) == 0
+
+class UnreachableModel:
+    """Model handler whose prediction API is down until ``reachable`` is set."""
+
+    def __init__(self):
+        self.reachable = False
+
+    def create_call(self):
+        return None
+
+    def predict(self, image_path, trace_id=None, session=None, call=None):
+        if not self.reachable:
+            raise PredictionUnreachable("Error during prediction: connection refused")
+        return {"is_mole": True, "predictions": {"Melanoma": 0.2}, "mole_detection_probability": 0.9}
+
+    def to_analysis_result(self, model_result, image_path):
+        return {"image_path": image_path, "is_mole": True, "melanoma_probability": 0.2,
+                "predictions": model_result["predictions"], "diagnosis": "Melanoma", "engine": "remote"}
+
+class RecordingDatabase:
+    saved = []
+
+    def add_analysis(self, data):
+        self.saved.append(data)
+        return 42
+
+def test_bridge_queues_unreachable_analysis(qapp, qtbot, monkeypatch, temp_uploads_dir):
+    """Test that an analysis failing on the network is queued, then saved once the API is back."""
+    monkeypatch.setattr(backend_bridge, "DatabaseManager", RecordingDatabase)
+    RecordingDatabase.saved = []
+    bridge = BackendBridge(deferred_init=True, upload_dir=str(temp_uploads_dir))
+    bridge.model = UnreachableModel()
+    bridge._current_image_path = IMAGE
+    bridge._current_patient_id = 7
+    errors = []
+    bridge.errorOccurred.connect(errors.append)
+
+    with qtbot.waitSignal(bridge.analysisQueued, timeout=5000) as blocker:
+        job_id = bridge.start_analysis()
+    assert blocker.args == [1, job_id]
+    assert bridge.offlineQueueSize == 1
+    assert errors == []
+
+    bridge.model.reachable = True
+    with qtbot.waitSignal(bridge.queuedAnalysisFinished, timeout=5000) as blocker:
+        bridge.offline_drain.start()
+    bridge.offline_drain.stop(timeout=5)
+    assert blocker.args == [1, 7, 42]
+    assert bridge.offlineQueueSize == 0
+    saved = RecordingDatabase.saved[0]
+    assert (saved["patient_id"], saved["image_path"]) == (7, IMAGE)
+    assert "captured_at" in saved["metadata"]
+
+class BrokenImageModel(UnreachableModel):
+    def predict(self, image_path, trace_id=None, session=None, call=None):
+        raise RuntimeError("Error during local prediction: Error preprocessing image: truncated file")
+
+def test_bridge_reports_errors_that_are_not_the_network(qapp, qtbot, temp_uploads_dir):
+    """Test that a preprocessing error and a missing model are reported instead of queued."""
+    bridge = BackendBridge(deferred_init=True, upload_dir=str(temp_uploads_dir))
+    bridge._current_image_path = IMAGE
+    bridge._current_patient_id = 7
+    errors = []
+    bridge.errorOccurred.connect(errors.append)
+
+    bridge.model = BrokenImageModel()
+    with qtbot.waitSignal(bridge.analysisFailed, timeout=5000) as blocker:
+        job_id = bridge.start_analysis()
+    assert blocker.args[0] == job_id
+    assert "Error preprocessing image" in blocker.args[1] and errors == [blocker.args[1]]
+
+    bridge.model = None
+    assert bridge.analyze_current_image() == {}
+    assert errors[1] == "The model is not ready yet"
+    assert bridge.offlineQueueSize == 0
@@ -0,0 +1,97 @@
+import sys
+from pathlib import Path
+import pytest
+
+# Add project root to Python path
+project_root = Path(__file__).parent.parent
+sys.path.insert(0, str(project_root))
+
+from backend.patient_list_model import PatientListModel
+from backend.search_service import SearchService
+
+PATIENTS = [
+    {"id": i, "full_name": f"Иванов {i:03d}", "gender": "male",
+     "birth_date": "1990-01-01", "phone": f"{i:010d}"}
+    for i in range(1, 46)
+]
+
+class FakePatients:
+    """Serves search pages from an in-memory patient list."""
+
+    def __init__(self, patients):
+        self.patients = patients
+        self.calls = []
+
+    def search_patients(self, term, limit, offset):
+        self.calls.append((term, limit, offset))
+        matches = [p for p in self.patients if term.lower() in p["full_name"].lower() or term in p["phone"]]
+        return matches[offset:offset + limit]
+
+    def close(self):
+        pass
+
+@pytest.fixture
+def db():
+    return FakePatients(PATIENTS)
+
+@pytest.fixture
+def model(qapp, db):
+    service = SearchService(lambda: db)
+    model = PatientListModel(service, "test", page_size=20)
+    yield model
+    service.stop(timeout=5)
+
+def _search(qtbot, model, term):
+    model.search(term)
+    qtbot.waitUntil(lambda: not model.loading, timeout=5000)
+
+def test_model_consistency(model, qtbot, qtmodeltester):
+    """Test the model against Qt's model consistency checks."""
+    _search(qtbot, model, "Иванов")
+    qtmodeltester.check(model)
+
+def test_paging_with_fetch_more(model, db, qtbot):
+    """Test that results are loaded one page at a time."""
+    _search(qtbot, model, "Иванов")
+    assert model.rowCount() == 20
+    assert model.canFetchMore()
+
+    model.fetchMore()
+    qtbot.waitUntil(lambda: not model.loading, timeout=5000)
+    model.fetchMore()
+    qtbot.waitUntil(lambda: not model.loading, timeout=5000)
+    assert model.rowCount() == 45
+    assert not model.canFetchMore()
+    assert [call[2] for call in db.calls] == [0, 20, 40]
+
+def test_short_terms_clear(model, db, qtbot):
+    """Test that too short a term clears the results without a query."""
+    _search(qtbot, model, "Иванов")
+    model.search("Ив")
+    assert model.rowCount() == 0
+    assert not model.loading
+    assert len(db.calls) == 1
+
+def test_refinement_is_applied_as_row_removals(model, qtbot):
+    """Test that a narrower result removes rows instead of resetting the model."""
+    _search(qtbot, model, "Иванов 00")
+    assert model.rowCount() == 9
+
+    removed = []
+    model.rowsRemoved.connect(lambda parent, first, last: removed.append((first, last)))
+    model.modelReset.connect(lambda: pytest.fail("model was reset"))
+    _search(qtbot, model, "Иванов 005")
+
+    assert model.rowCount() == 1
+    assert model.get(0)["id"] == 5
+    assert removed  # Rows were removed in place
+
+def test_roles_and_get(model, qtbot):
+    """Test role names and row access for QML."""
+    _search(qtbot, model, "0000000007")
+    roles = {bytes(name).decode() for name in model.roleNames().values()}
+    assert {"id", "full_name", "gender", "birth_date", "phone"} <= roles
+
+    assert model.count == 1
+    assert model.get(0)["full_name"] == "Иванов 007"
+    assert model.get(5) == {}
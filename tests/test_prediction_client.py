@@ -0,0 +1,117 @@
+import json
+import sys
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from pathlib import Path
+import pytest
+
+# Add project root to Python path
+project_root = Path(__file__).parent.parent
+sys.path.insert(0, str(project_root))
+
+from backend.prediction_client import (PredictionCall, PredictionCancelled, PredictionTimeout,
+                                       encode_multipart)
+
+RESULT = {"is_mole": True, "mole_detection_probability": 0.9, "predictions": {"Melanoma": 0.3}}
+
+class Handler(BaseHTTPRequestHandler):
+    def log_message(self, *args):
+        pass
+
+    def do_POST(self):
+        body = self.rfile.read(int(self.headers["Content-Length"]))
+        self.server.received.append(body)
+        if self.path == "/stall":
+            # Never answers until the test finishes
+            self.server.release.wait(10)
+            return
+        content = json.dumps(RESULT).encode()
+        self.send_response(200)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(content)))
+        self.end_headers()
+        if self.path == "/trickle":
+            # Sends the body one byte at a time, each well within a per-read timeout
+            for byte in content:
+                if self.server.release.wait(0.05):
+                    return
+                self.wfile.write(bytes([byte]))
+                self.wfile.flush()
+        else:
+            self.wfile.write(content)
+
+@pytest.fixture
+def server():
+    server = ThreadingHTTPServer(("127.0.0.1", 0), Handler)
+    server.daemon_threads = True
+    server.received = []
+    server.release = threading.Event()
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    yield server
+    server.release.set()
+    server.shutdown()
+    server.server_close()
+
+def url(server, path):
+    return f"http://127.0.0.1:{server.server_address[1]}{path}"
+
+def post(call, data=b"image-bytes"):
+    body, content_type = encode_multipart("image_file", "mole.jpg", data, "image/jpeg")
+    with call:
+        status = call.send(body, content_type)
+        return status, call.read()
+
+def test_successful_call(server):
+    """Test that a call uploads the multipart body and returns the response."""
+    status, content = post(PredictionCall(url(server, "/predict")))
+
+    assert status == 200
+    assert json.loads(content) == RESULT
+    assert b'name="image_file"; filename="mole.jpg"' in server.received[0]
+    assert b"image-bytes" in server.received[0]
+
+def test_response_deadline(server):
+    """Test that a server that never answers fails within the response budget."""
+    call = PredictionCall(url(server, "/stall"), {"response_timeout": 0.3})
+    started = time.monotonic()
+
+    with pytest.raises(PredictionTimeout, match="response deadline"):
+        post(call)
+    assert time.monotonic() - started < 3
+
+def test_deadline_covers_whole_phase(server):
+    """Test that a trickling response cannot extend the deadline with every byte."""
+    call = PredictionCall(url(server, "/trickle"), {"response_timeout": 0.5})
+
+    with pytest.raises(PredictionTimeout):
+        post(call)
+
+def test_connect_deadline():
+    """Test that an unroutable address fails within the connect budget."""
+    call = PredictionCall("http://10.255.255.1:81/predict", {"connect_timeout": 0.3})
+    started = time.monotonic()
+
+    with pytest.raises((PredictionTimeout, OSError)):
+        post(call)
+    assert time.monotonic() - started < 3
+
+def test_cancel_aborts_transfer(server):
+    """Test that cancelling from another thread interrupts a blocked call at once."""
+    call = PredictionCall(url(server, "/stall"), {"response_timeout": 30})
+    threading.Timer(0.3, call.cancel).start()
+    started = time.monotonic()
+
+    with pytest.raises(PredictionCancelled):
+        post(call)
+    assert time.monotonic() - started < 3
+
+def test_cancel_before_start(server):
+    """Test that a call cancelled before it starts never contacts the server."""
+    call = PredictionCall(url(server, "/predict"))
+    call.cancel()
+
+    with pytest.raises(PredictionCancelled):
+        post(call)
+    assert server.received == []
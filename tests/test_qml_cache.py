@@ -0,0 +1,36 @@
+import os
+import sys
+from pathlib import Path
+import pytest
+
+# Add project root to Python path
+project_root = Path(__file__).parent.parent
+sys.path.insert(0, str(project_root))
+
+from backend import qml_cache
+
+def test_all_qml_files_compile(qapp):
+    """Test that every QML document of the frontend compiles ahead of time."""
+    compiled, errors = qml_cache.precompile()
+
+    assert errors == []
+    assert compiled == len(qml_cache.qml_files())
+    assert compiled > 0
+
+def test_configure_disk_cache(tmp_path, monkeypatch):
+    """Test that the disk cache is pointed at the application cache directory."""
+    monkeypatch.delenv("QML_DISK_CACHE_PATH", raising=False)
+    monkeypatch.delenv("QML_DISABLE_DISK_CACHE", raising=False)
+
+    qml_cache.configure_disk_cache(tmp_path / "cache")
+
+    assert os.environ["QML_DISK_CACHE_PATH"] == str(tmp_path / "cache")
+    assert (tmp_path / "cache").is_dir()
+
+def test_explicit_environment_wins(tmp_path, monkeypatch):
+    """Test that a cache path set by the environment is not overridden."""
+    monkeypatch.setenv("QML_DISK_CACHE_PATH", str(tmp_path / "custom"))
+
+    qml_cache.configure_disk_cache(tmp_path / "cache")
+
+    assert os.environ["QML_DISK_CACHE_PATH"] == str(tmp_path / "custom")
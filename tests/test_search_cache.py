@@ -0,0 +1,132 @@
+import sys
+from pathlib import Path
+import pytest
+
+# Add project root to Python path
+project_root = Path(__file__).parent.parent
+sys.path.insert(0, str(project_root))
+
+from backend.search_cache import SearchCache
+from backend.search_service import SearchService
+
+PATIENTS = [
+    {"id": 1, "full_name": "Иванов Иван", "phone": "+79001112233"},
+    {"id": 2, "full_name": "Иванова Мария", "phone": "+79004445566"},
+    {"id": 3, "full_name": "Петров Пётр", "phone": "+79007778899"},
+    {"id": 4, "full_name": "Сидоров Иван", "phone": "+79001110000"},
+]
+
+class CountingDatabase:
+    """Fake database implementing the LIKE %term% search of DatabaseManager."""
+
+    def __init__(self, patients):
+        self.patients = patients
+        self.queries = []
+
+    def search_patients(self, term, limit, offset):
+        self.queries.append((term, limit, offset))
+        term = term.lower()
+        rows = [p for p in self.patients
+                if term in p["full_name"].lower() or term in p["phone"]]
+        return rows[offset:offset + limit]
+
+    def close(self):
+        pass
+
+@pytest.fixture
+def cache():
+    return SearchCache(max_entries=4, max_rows=10)
+
+def test_longer_term_is_filtered_from_cache(cache):
+    """Test that a refined term is answered from the result set of its prefix."""
+    cache.store("ива", PATIENTS[:2] + PATIENTS[3:], cache.generation)
+
+    rows = cache.lookup("Иванова")
+    assert [r["id"] for r in rows] == [2]
+    assert cache.hits == 1
+
+def test_substring_anywhere_in_term_is_used(cache):
+    """Test that any cached substring of a term can answer it, not only a prefix."""
+    cache.store("иван", [PATIENTS[0], PATIENTS[1], PATIENTS[3]], cache.generation)
+
+    rows = cache.lookup("Сидоров Иван")
+    assert [r["id"] for r in rows] == [4]
+
+def test_unrelated_term_misses(cache):
+    """Test that a term without a cached substring is not answered."""
+    cache.store("иван", PATIENTS[:2], cache.generation)
+
+    assert cache.lookup("Пет") is None
+    assert cache.misses == 1
+
+def test_matching_is_case_and_yo_insensitive(cache):
+    """Test that matching follows the case-insensitive database collation."""
+    cache.store("пет", [PATIENTS[2]], cache.generation)
+
+    assert [r["id"] for r in cache.lookup("ПЕТРОВ ПЕТР")] == [3]
+
+def test_incomplete_result_set_is_not_cached(cache):
+    """Test that a result set truncated by the fetch limit is never stored."""
+    rows = [{"id": i, "full_name": "Иванов", "phone": ""} for i in range(11)]
+    cache.store("ива", rows, cache.generation)
+
+    assert cache.lookup("Иванов") is None
+
+def test_invalidate_drops_entries_and_late_stores(cache):
+    """Test that results fetched before an invalidation are not stored after it."""
+    cache.store("ива", PATIENTS[:2], cache.generation)
+    generation = cache.generation
+    cache.invalidate()
+    cache.store("пет", [PATIENTS[2]], generation)
+
+    assert cache.lookup("Иванов") is None
+    assert cache.lookup("Петров") is None
+
+def test_least_recently_used_entry_is_evicted(cache):
+    """Test that the cache keeps at most max_entries result sets."""
+    for term in ["aaa", "bbb", "ccc", "ddd"]:
+        cache.store(term, [], cache.generation)
+    cache.lookup("aaa")
+    cache.store("eee", [], cache.generation)
+
+    assert cache.lookup("aaa") == []
+    assert cache.lookup("bbb") is None
+
+def test_service_answers_refinements_without_queries(qapp, qtbot, cache):
+    """Test that typing a longer term after a complete result set does not hit the database."""
+    db = CountingDatabase(PATIENTS)
+    service = SearchService(lambda: db, cache=cache)
+    try:
+        with qtbot.waitSignal(service.resultsReady, timeout=5000):
+            service.submit("box", 1, "Ива", 20)
+        with qtbot.waitSignal(service.resultsReady, timeout=5000) as blocker:
+            service.submit("box", 2, "Иванова", 20)
+
+        assert db.queries == [("Ива", cache.max_rows + 1, 0)]
+        key, seq, offset, rows, has_more = blocker.args
+        assert [r["id"] for r in rows] == [2]
+        assert not has_more
+
+        service.invalidate_cache()
+        with qtbot.waitSignal(service.resultsReady, timeout=5000):
+            service.submit("box", 3, "Иванова", 20)
+        assert len(db.queries) == 2
+    finally:
+        service.stop(timeout=5)
+
+def test_service_pages_from_cache(qapp, qtbot, cache):
+    """Test that further pages of a complete result set come from the cache."""
+    patients = [{"id": i, "full_name": f"Иванов {i:02d}", "phone": ""} for i in range(8)]
+    db = CountingDatabase(patients)
+    service = SearchService(lambda: db, cache=cache)
+    try:
+        with qtbot.waitSignal(service.resultsReady, timeout=5000) as first:
+            service.submit("box", 1, "Иванов", 5)
+        with qtbot.waitSignal(service.resultsReady, timeout=5000) as second:
+            service.submit("box", 2, "Иванов", 5, offset=5)
+
+        assert len(db.queries) == 1
+        assert first.args[4] and [r["id"] for r in first.args[3]] == [0, 1, 2, 3, 4]
+        assert not second.args[4] and [r["id"] for r in second.args[3]] == [5, 6, 7]
+    finally:
+        service.stop(timeout=5)
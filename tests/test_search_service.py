@@ -0,0 +1,85 @@
+import sys
+import threading
+from pathlib import Path
+import pytest
+
+# Add project root to Python path
+project_root = Path(__file__).parent.parent
+sys.path.insert(0, str(project_root))
+
+from backend.search_service import SearchService
+
+class BlockingDatabase:
+    """Fake database whose queries wait until released by the test."""
+
+    def __init__(self):
+        self.terms = []
+        self.started = threading.Event()
+        self.release = threading.Event()
+
+    def search_patients(self, term, limit, offset):
+        self.terms.append(term)
+        self.started.set()
+        self.release.wait(5)
+        return [{"id": 1, "full_name": term}]
+
+    def close(self):
+        pass
+
+@pytest.fixture
+def db():
+    return BlockingDatabase()
+
+@pytest.fixture
+def service(qapp, db):
+    service = SearchService(lambda: db)
+    yield service
+    db.release.set()
+    service.stop(timeout=5)
+
+def test_pending_terms_are_coalesced(service, db, qtbot):
+    """Test that only the latest waiting term of a search box is queried."""
+    results = []
+    service.resultsReady.connect(lambda key, seq, offset, rows, more: results.append((key, seq, rows)))
+
+    service.submit("box", 1, "Ива", 20)
+    assert db.started.wait(5)
+    # These arrive while the first query is still running
+    service.submit("box", 2, "Иван", 20)
+    service.submit("box", 3, "Иванов", 20)
+    db.release.set()
+
+    qtbot.waitUntil(lambda: len(results) == 1, timeout=5000)
+    assert db.terms == ["Ива", "Иванов"]
+    # The superseded first query was ignored, only the latest result is delivered
+    assert results == [("box", 3, [{"id": 1, "full_name": "Иванов"}])]
+
+def test_search_boxes_are_independent(service, db, qtbot):
+    """Test that a search in one box never supersedes another box."""
+    db.release.set()
+    results = []
+    service.resultsReady.connect(lambda key, seq, offset, rows, more: results.append(key))
+
+    service.submit("patients", 1, "Петров", 20)
+    service.submit("dialog", 1, "Сидоров", 20)
+
+    qtbot.waitUntil(lambda: len(results) == 2, timeout=5000)
+    assert sorted(results) == ["dialog", "patients"]
+
+def test_has_more_uses_extra_row(qapp, qtbot):
+    """Test that one extra row is fetched to detect a next page."""
+    class ManyRows:
+        def search_patients(self, term, limit, offset):
+            return [{"id": i} for i in range(offset, offset + limit)]
+        def close(self):
+            pass
+
+    service = SearchService(lambda: ManyRows())
+    try:
+        with qtbot.waitSignal(service.resultsReady, timeout=5000) as blocker:
+            service.submit("box", 1, "abc", 20)
+        key, seq, offset, rows, has_more = blocker.args
+        assert len(rows) == 20
+        assert has_more
+    finally:
+        service.stop(timeout=5)
@@ -0,0 +1,88 @@
+import sys
+from pathlib import Path
+import numpy as np
+import pytest
+from PIL import Image, ImageEnhance
+
+# Add project root to Python path
+project_root = Path(__file__).parent.parent
+sys.path.insert(0, str(project_root))
+
+from backend.similarity_index import EMBEDDING_DIM, SimilarityIndex, image_embedding
+
+MOLE = project_root / "tests" / "test_files" / "test_mole.jpg"
+
+@pytest.fixture
+def images():
+    mole = Image.open(MOLE).convert("RGB")
+    width, height = mole.size
+    rng = np.random.default_rng(0)
+    return {
+        "brighter": ImageEnhance.Brightness(mole).enhance(1.15),
+        "cropped": mole.crop((width // 20, height // 20, width - width // 20, height - height // 20)),
+        "noise": Image.fromarray(rng.integers(0, 255, (128, 128, 3), dtype=np.uint8)),
+        "stripes": Image.fromarray(np.tile(np.array([[0, 0, 255], [255, 255, 0]], dtype=np.uint8)
+                                           .repeat(8, axis=0), (8, 128, 1))),
+    }
+
+@pytest.fixture
+def index(tmp_path, images):
+    index = SimilarityIndex(str(tmp_path / "index"))
+    for analysis_id, (name, patient_id) in enumerate([("noise", 1), ("brighter", 1), ("stripes", 2),
+                                                      ("cropped", 2)], start=10):
+        index.add(analysis_id, patient_id, images[name])
+    return index
+
+def test_embedding_is_unit_vector():
+    """Test that embeddings are comparable by their dot product."""
+    vector = image_embedding(MOLE)
+    assert vector.shape == (EMBEDDING_DIM,) and vector.dtype == np.float32
+    assert np.linalg.norm(vector) == pytest.approx(1.0, abs=1e-5)
+
+def test_search_ranks_the_same_lesion_first(index):
+    """Test that edited copies of a lesion are closer to it than unrelated images."""
+    hits = index.search(str(MOLE), k=4)
+
+    assert {hit["analysis_id"] for hit in hits[:2]} == {11, 13}
+    assert hits[0]["score"] > 0.9 and hits[-1]["score"] < hits[1]["score"]
+
+def test_search_filters(index):
+    """Test the patient restriction, excluded analyses and k."""
+    assert [hit["analysis_id"] for hit in index.search(str(MOLE), k=5, patient_id=2)] == [13, 12]
+    assert {hit["analysis_id"] for hit in index.search(str(MOLE), k=2, exclude=[11, 13])} == {10, 12}
+    assert len(index.search(str(MOLE), k=1)) == 1
+
+def test_index_is_persistent(tmp_path, index, images):
+    """Test that a reopened index keeps its lesions and ignores duplicate ids."""
+    reopened = SimilarityIndex(str(tmp_path / "index"))
+
+    assert len(reopened) == 4 and 11 in reopened
+    assert not reopened.add(11, 1, images["noise"])
+    assert reopened.add(20, 3, images["brighter"])
+    assert reopened.search(str(MOLE), k=1, patient_id=3)[0]["analysis_id"] == 20
+
+def test_other_feature_version_starts_over(tmp_path, index):
+    """Test that vectors of another feature extractor are discarded."""
+    assert len(SimilarityIndex(str(tmp_path / "index"), version=99)) == 0
+
+class FakeDatabase:
+    def __init__(self, rows):
+        self.rows = rows
+        self.after = []
+
+    def get_analysis_images(self, after_id=0):
+        self.after.append(after_id)
+        return [row for row in self.rows if row["id"] > after_id]
+
+def test_sync_indexes_missing_analyses(tmp_path):
+    """Test that sync adds analyses saved elsewhere and only looks at newer ones next time."""
+    index = SimilarityIndex(str(tmp_path / "index"), base_dir=str(project_root))
+    db = FakeDatabase([
+        {"id": 1, "patient_id": 5, "image_path": "tests/test_files/test_mole.jpg"},
+        {"id": 2, "patient_id": 5, "image_path": "tests/test_files/missing.jpg"},
+    ])
+
+    assert index.sync(db) == 1
+    assert index.sync(db) == 0
+    assert db.after == [0, 2]
+    assert index.search(str(MOLE), k=1)[0] == {"analysis_id": 1, "patient_id": 5, "score": 1.0}
@@ -0,0 +1,146 @@
+import sys
+import os
+import time
+from pathlib import Path
+import pytest
+from PIL import Image
+
+# Add project root to Python path
+project_root = Path(__file__).parent.parent
+sys.path.insert(0, str(project_root))
+
+from backend.image_store import ImageStore
+from backend.storage_maintenance import StorageMaintenance
+
+class FakeDatabase:
+    """In-memory stand-in for the analyses table."""
+
+    def __init__(self, paths):
+        self.paths = list(paths)
+
+    def get_image_path_counts(self):
+        counts = {}
+        for path in self.paths:
+            counts[path] = counts.get(path, 0) + 1
+        return counts
+
+    def update_image_path(self, old_path, new_path):
+        updated = 0
+        for i, path in enumerate(self.paths):
+            if path == old_path:
+                self.paths[i] = new_path
+                updated += 1
+        return updated
+
+    def close(self):
+        pass
+
+def _age(path, days):
+    old = time.time() - days * 86400
+    os.utime(path, (old, old))
+
+@pytest.fixture
+def store(tmp_path):
+    return ImageStore(str(tmp_path / "uploads"))
+
+def test_orphans_deleted_after_grace_period(store, tmp_path):
+    """Test that only old, unreferenced uploads are removed."""
+    referenced = store.save_bytes(b"saved analysis", ".jpg").path
+    old_orphan = store.save_bytes(b"never analyzed", ".jpg").path
+    new_orphan = store.save_bytes(b"just uploaded", ".jpg").path
+    for path in (referenced, old_orphan):
+        _age(path, 30)
+
+    db = FakeDatabase([referenced])
+    maintenance = StorageMaintenance(store, lambda: db, base_dir=str(tmp_path),
+                                     settings={"max_bytes_per_second": 0})
+    report = maintenance.run()
+
+    assert report["orphans_deleted"] == 1
+    assert report["bytes_reclaimed"] == len(b"never analyzed")
+    assert os.path.exists(referenced)
+    assert not os.path.exists(old_orphan)
+    assert os.path.exists(new_orphan)
+
+def test_protected_paths_are_kept(store, tmp_path):
+    """Test that the image currently being analyzed is never collected."""
+    current = store.save_bytes(b"in progress", ".jpg").path
+    _age(current, 30)
+
+    maintenance = StorageMaintenance(store, lambda: FakeDatabase([]), base_dir=str(tmp_path),
+                                     protected_paths=lambda: [current],
+                                     settings={"max_bytes_per_second": 0})
+    assert maintenance.run()["orphans_deleted"] == 0
+    assert os.path.exists(current)
+
+def test_lossless_recompression_repoints_analyses(store, tmp_path):
+    """Test that old lossless originals are re-encoded and the database updated."""
+    bmp_path = tmp_path / "mole.bmp"
+    Image.new('RGB', (256, 256), color='brown').save(bmp_path)
+    original = store.save(str(bmp_path)).path
+    _age(original, 100)
+
+    db = FakeDatabase([original])
+    maintenance = StorageMaintenance(store, lambda: db, base_dir=str(tmp_path),
+                                     settings={"recompress_after_days": 90,
+                                               "max_bytes_per_second": 0})
+    report = maintenance.run()
+
+    assert report["recompressed"] == 1
+    assert report["bytes_reclaimed"] > 0
+    assert not os.path.exists(original)
+    assert db.paths[0].endswith(".webp")
+    with Image.open(db.paths[0]) as img:
+        assert img.size == (256, 256)
+
+def test_recompression_repoints_every_stored_form(store, tmp_path):
+    """Test that analyses storing the path in another spelling are repointed too."""
+    bmp_path = tmp_path / "mole.bmp"
+    Image.new('RGB', (256, 256), color='brown').save(bmp_path)
+    original = store.save(str(bmp_path)).path
+    _age(original, 100)
+    relative = os.path.relpath(original, str(tmp_path))
+    other_form = os.path.join(".", "uploads", "..", relative)
+
+    db = FakeDatabase([original, other_form, other_form])
+    maintenance = StorageMaintenance(store, lambda: db, base_dir=str(tmp_path),
+                                     settings={"recompress_after_days": 90,
+                                               "max_bytes_per_second": 0})
+    assert maintenance.run()["recompressed"] == 1
+
+    assert not os.path.exists(original)
+    assert len(set(db.paths)) == 1 and db.paths[0].endswith(".webp")
+
+def test_original_kept_when_analyses_cannot_be_repointed(store, tmp_path):
+    """Test that the original stays and the new blob goes if some analyses were not repointed."""
+    bmp_path = tmp_path / "mole.bmp"
+    Image.new('RGB', (256, 256), color='brown').save(bmp_path)
+    original = store.save(str(bmp_path)).path
+    _age(original, 100)
+    other_form = os.path.join(".", os.path.relpath(original, str(tmp_path)))
+
+    class EditedMeanwhile(FakeDatabase):
+        def update_image_path(self, old_path, new_path):
+            # The row naming ``other_form`` changed after the paths were read
+            return 0 if old_path == other_form else super().update_image_path(old_path, new_path)
+
+    db = EditedMeanwhile([original, other_form])
+    maintenance = StorageMaintenance(store, lambda: db, base_dir=str(tmp_path),
+                                     settings={"recompress_after_days": 90,
+                                               "max_bytes_per_second": 0})
+    report = maintenance.run()
+
+    assert report["recompressed"] == 0
+    assert os.path.exists(original)
+    assert db.paths == [original, other_form]
+    assert not any(path.suffix == ".webp" for path in store.iter_files())
+
+def test_background_run_reports(store, tmp_path):
+    """Test that the background job delivers its report."""
+    reports = []
+    maintenance = StorageMaintenance(store, lambda: FakeDatabase([]), base_dir=str(tmp_path))
+    assert maintenance.start(reports.append)
+    maintenance.stop(timeout=10)
+
+    assert len(reports) == 1
+    assert "bytes_reclaimed" in reports[0]
@@ -0,0 +1,56 @@
+import sys
+from pathlib import Path
+import pytest
+from PIL import Image
+
+# Add project root to Python path
+project_root = Path(__file__).parent.parent
+sys.path.insert(0, str(project_root))
+
+from backend.thumbnails import ThumbnailCache
+
+@pytest.fixture
+def cache(tmp_path):
+    """Create a thumbnail cache in a temporary directory."""
+    cache = ThumbnailCache(str(tmp_path / ".thumbnails"))
+    yield cache
+    cache.shutdown()
+
+@pytest.fixture
+def large_image(tmp_path):
+    """Create a multi-megapixel test image."""
+    img_path = tmp_path / "large.jpg"
+    Image.new('RGB', (3000, 2000), color='brown').save(img_path)
+    return str(img_path)
+
+def test_generate_all_sizes(cache, large_image):
+    """Test that every configured size is generated within its bound."""
+    targets = cache.generate(large_image)
+
+    assert set(targets) == set(cache.sizes)
+    for name, path in targets.items():
+        with Image.open(path) as thumb:
+            assert max(thumb.size) <= cache.sizes[name]
+            assert thumb.size[0] > thumb.size[1]  # Aspect ratio preserved
+
+def test_get_is_lazy_and_cached(cache, large_image):
+    """Test lazy generation and reuse of a cached thumbnail."""
+    path = cache.get(large_image, "small")
+    assert path.exists()
+    mtime = path.stat().st_mtime_ns
+
+    assert cache.get(large_image, "small") == path
+    assert path.stat().st_mtime_ns == mtime
+
+def test_prefetch_and_remove(cache, large_image):
+    """Test background generation and cleanup of cached thumbnails."""
+    cache.prefetch(large_image).result(timeout=30)
+    assert all(cache.thumbnail_path(large_image, name).exists() for name in cache.sizes)
+
+    assert cache.remove(large_image) > 0
+    assert not any(cache.thumbnail_path(large_image, name).exists() for name in cache.sizes)
+
+def test_unknown_size(cache, large_image):
+    """Test that an unknown size name is rejected."""
+    with pytest.raises(ValueError):
+        cache.get(large_image, "huge")
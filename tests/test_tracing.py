@@ -0,0 +1,69 @@
+import sys
+from pathlib import Path
+import pytest
+
+# Add project root to Python path
+project_root = Path(__file__).parent.parent
+sys.path.insert(0, str(project_root))
+
+from backend.tracing import Tracer, summarize, load_log, latency_stats
+
+def test_span_records_duration_and_bytes(tmp_path):
+    """Test that a span is timed, counted and written to the log."""
+    log_path = tmp_path / "trace.log"
+    tracer = Tracer(str(log_path))
+    trace_id = tracer.new_trace_id()
+
+    with tracer.span("save_image", trace_id) as span:
+        span.add_bytes(1024)
+
+    records = load_log([str(log_path)])
+    assert len(records) == 1
+    assert records[0]["stage"] == "save_image"
+    assert records[0]["trace_id"] == trace_id
+    assert records[0]["bytes"] == 1024
+    assert records[0]["duration_ms"] >= 0
+
+def test_span_records_errors():
+    """Test that a failing stage is recorded and the error re-raised."""
+    tracer = Tracer()
+    with pytest.raises(ValueError):
+        with tracer.span("parse", "abc"):
+            raise ValueError("bad json")
+
+    summary = tracer.summary()
+    assert summary["parse"]["errors"] == 1
+
+def test_summary_percentiles():
+    """Test p50/p95 aggregation per stage."""
+    records = [{"stage": "request", "duration_ms": float(ms), "bytes": 10} for ms in range(1, 101)]
+    summary = summarize(records)
+
+    assert summary["request"]["count"] == 100
+    assert summary["request"]["p50_ms"] == 50
+    assert summary["request"]["p95_ms"] == 95
+    assert summary["request"]["max_ms"] == 100
+    assert summary["request"]["bytes"] == 1000
+
+def test_trace_filters_by_id():
+    """Test that spans are correlated by trace id."""
+    tracer = Tracer()
+    with tracer.span("save_image", "first"):
+        pass
+    with tracer.span("save_image", "second"):
+        pass
+    with tracer.span("request", "first"):
+        pass
+
+    assert [r["stage"] for r in tracer.trace("first")] == ["save_image", "request"]
+
+def test_latency_stats():
+    """Test that latency statistics report the mean and the tail percentiles."""
+    stats = latency_stats([float(ms) for ms in range(1, 101)])
+
+    assert stats["count"] == 100
+    assert stats["mean_ms"] == 50.5
+    assert stats["p50_ms"] == 50
+    assert stats["p99_ms"] == 99
+    assert stats["max_ms"] == 100
+    assert latency_stats([])["count"] == 0